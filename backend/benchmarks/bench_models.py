@@ -0,0 +1,117 @@
+"""Memory and CPU cost of job records at cluster scale.
+
+Compares all-string records (the old JobInfo), typed slotted JobInfo and
+the columnar JobBatch. Run from the repository root:
+
+    python -m backend.benchmarks.bench_models --jobs 50000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import List
+
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from backend.slurm import parser
+from backend.slurm.models import JobBatch, JobInfo, JobState
+
+
+@dataclass
+class StringJobInfo:
+    """The all-string job record used before typed JobInfo"""
+    job_id: str
+    name: str
+    status: str
+    time: str
+    nodes: str
+    cpus: str
+    memory: str
+    hours_ago: float = 0.0
+    dependency: str = ""
+    end_time: float = 0.0
+    partition: str = ""
+    submit_time: str = ""
+    user: str = ""
+    gpus: str = ""
+    start_time: str = ""
+
+
+def make_squeue_lines(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    states = ["RUNNING", "PENDING", "COMPLETED", "FAILED"]
+    return [
+        f"{2_000_000 + i}|{rng.choice(states)}|{rng.randint(0, 47)}:{rng.randint(0, 59):02d}:00|"
+        f"{rng.choice([1, 2, 4])}|{rng.choice([1, 8, 32, 128])}|{rng.choice([4, 16, 64, 256])}G||"
+        f"{rng.choice(['compute', 'gpu'])}|2024-05-01T12:00:00|alice|gpu:1|2024-05-01T12:10:00|sample_{i % 500}"
+        for i in range(count)
+    ]
+
+
+def parse_strings(lines):
+    jobs = []
+    for line in lines:
+        (job_id, state, time_limit, nodes, cpus, memory, dependency, partition, submit,
+         user, gres, start, name) = line.split("|", 12)
+        jobs.append(StringJobInfo(job_id, name, state, time_limit, nodes, cpus, memory, dependency=dependency,
+                                  partition=partition, submit_time=submit, user=user, gpus=gres,
+                                  start_time=start))
+    return jobs
+
+
+def retained(label: str, build):
+    """Build once under tracemalloc to see what the result keeps alive"""
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<36} {size / 2**20:8.1f} MiB")
+    return value
+
+
+def timed(label: str, func):
+    started = time.perf_counter()
+    func()
+    print(f"{label:<36} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--jobs", type=int, default=50_000)
+    args = arg_parser.parse_args(argv)
+    lines = make_squeue_lines(args.jobs)
+
+    print("parse squeue output")
+    timed("  string records", lambda: parse_strings(lines))
+    timed("  typed JobInfo", lambda: parser.parse_squeue(lines))
+
+    print("memory held by the parsed list")
+    strings = retained("  string records", lambda: parse_strings(lines))
+    typed = retained("  typed JobInfo", lambda: parser.parse_squeue(lines))
+    batch = retained("  JobBatch", lambda: JobBatch.from_jobs(typed))
+
+    # Rows are encoded through pydantic, as FastAPI does for /jobs
+    print("serialize to JSON")
+    string_rows = TypeAdapter(List[StringJobInfo])
+    typed_rows = TypeAdapter(List[JobInfo])
+    timed("  string records", lambda: string_rows.dump_json(strings))
+    timed("  typed JobInfo", lambda: typed_rows.dump_json(typed))
+    timed("  JobBatch columns", lambda: to_json(batch.to_dict()))
+
+    print("running jobs sorted by CPUs")
+    timed("  string records", lambda: sorted((j for j in strings if j.status == "RUNNING"),
+                                              key=lambda j: int(j.cpus)))
+    timed("  typed JobInfo", lambda: sorted((j for j in typed if j.status is JobState.RUNNING),
+                                            key=lambda j: j.cpus))
+
+    timed("  JobBatch", lambda: batch.argsort("cpus", batch.where_state(JobState.RUNNING)))
+
+    print("payload size")
+    print(f"  {'rows':<34} {len(typed_rows.dump_json(typed)) / 2**20:8.1f} MiB")
+    print(f"  {'columns':<34} {len(to_json(batch.to_dict())) / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
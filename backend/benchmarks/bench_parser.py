@@ -0,0 +1,74 @@
+"""Throughput and memory benchmark for the squeue/sacct parsers.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_parser --rows 100000
+"""
+import argparse
+import io
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+from backend.slurm import parser
+
+
+class BytesChannel:
+    """Stands in for a paramiko channel streaming a byte buffer"""
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    def recv(self, size: int) -> bytes:
+        return self._buffer.read(size)
+
+
+def make_sacct_output(jobs: int, seed: int = 0) -> bytes:
+    """sacct --parsable2 text with a .batch and .extern step per job"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(jobs):
+        job_id = str(1_000_000 + i)
+        state = rng.choice(["COMPLETED", "FAILED", "TIMEOUT", "CANCELLED by 42"])
+        elapsed = f"{rng.randint(0, 47):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        end = f"2024-05-{1 + i % 28:02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+        name = f"sample {i % 97} align"
+        lines.append(f"{job_id}|{state}|{elapsed}|1|{rng.choice([1, 4, 16])}|{rng.choice([4, 16, 64])}G|batch|{end}|{end}|{end}|alice|cpu=4,gres/gpu=1|{name}|sbatch run.sh")
+        lines.append(f"{job_id}.batch|{state}|{elapsed}|1|1||batch|{end}|{end}|{end}|alice||batch|")
+        lines.append(f"{job_id}.extern|COMPLETED|{elapsed}|1|1||batch|{end}|{end}|{end}|alice||extern|")
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def bench(label: str, func, rows: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    jobs = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {len(jobs):>9} jobs  {rows / elapsed:>12,.0f} rows/s  "
+          f"peak {peak / 2**20:8.1f} MiB (parse working set)")
+    return jobs
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=100_000, help="approximate number of sacct rows")
+    args = arg_parser.parse_args(argv)
+
+    data = make_sacct_output(max(1, args.rows // 3))
+    rows = data.count(b"\n")
+    print(f"sacct output: {rows:,} rows, {len(data) / 2**20:.1f} MiB")
+
+    bench("streamed from channel", lambda: parser.parse_sacct(parser.iter_channel_lines(BytesChannel(data))), rows)
+    bench("whole string, split", lambda: parser.parse_sacct(data.decode('utf-8').split("\n")), rows)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak_rss_mib = peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+    print(f"process peak RSS: {peak_rss_mib:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""SSH+CLI against slurmrestd: login, snapshot and node polls on the same cluster.
+
+Serves one synthetic cluster from both a FakeSlurmHost and a
+FakeSlurmRestd, with the same latency per request, and times the real
+SlurmClient and RestClient against them. Both see only the user's jobs.
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_transports --jobs 20000 --latency 0.05 --rounds 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from backend.benchmarks.synthetic import SyntheticCluster
+from backend.loadtest.fake_host import FakeSlurmHost
+from backend.loadtest.fake_rest import FakeSlurmRestd
+from backend.slurm.client import COMMAND_BYTES, SlurmClient
+from backend.slurm.connection import ConnectionPool
+from backend.slurm.rest import RestClient
+
+USER = "alice"
+
+# The requests behind one snapshot poll, per transport
+SNAPSHOT_COMMANDS = {"ssh": ("squeue", "sacct"), "rest": ("rest:slurm/jobs", "rest:slurmdb/jobs")}
+
+
+def _poll_bytes(transport: str) -> float:
+    return sum(COMMAND_BYTES.value(command=command) for command in SNAPSHOT_COMMANDS[transport])
+
+
+async def _time_polls(client, rounds: int, time_range: str) -> Dict[str, List[float]]:
+    times: Dict[str, List[float]] = {"snapshot": [], "nodes": []}
+    for _ in range(rounds):
+        started = time.perf_counter()
+        active, completed = await client.fetch_snapshot(time_range)
+        times["snapshot"].append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await client.fetch_nodes()
+        times["nodes"].append(time.perf_counter() - started)
+    times["jobs"] = [len(active) + len(completed)]
+    return times
+
+
+def measure(transport: str, client, rounds: int, time_range: str) -> Dict[str, float]:
+    """Login time, median snapshot and node poll times (seconds) and bytes per snapshot of one client"""
+    started = time.perf_counter()
+    if not client.connect():
+        raise RuntimeError(f"{transport} login failed")
+    login = time.perf_counter() - started
+    read = _poll_bytes(transport)
+    try:
+        times = asyncio.run(_time_polls(client, rounds, time_range))
+    finally:
+        client.disconnect()
+    return {
+        "login": login,
+        "snapshot": statistics.median(times["snapshot"]),
+        "nodes": statistics.median(times["nodes"]),
+        "bytes": (_poll_bytes(transport) - read) / rounds,
+        "jobs": times["jobs"][0],
+    }
+
+
+def compare(cluster: SyntheticCluster, rounds: int = 5, latency: float = 0.0,
+            time_range: str = "24h") -> Dict[str, Dict[str, float]]:
+    """``measure`` for both transports against fake servers of ``cluster``"""
+    results = {}
+    with FakeSlurmHost(cluster, password="secret", latency=latency) as host:
+        client = SlurmClient(host.address, USER, "secret", pool=ConnectionPool())
+        results["ssh"] = measure("ssh", client, rounds, time_range)
+    with FakeSlurmRestd(cluster, token="secret", latency=latency) as server:
+        results["rest"] = measure("rest", RestClient(server.url, USER, "secret"), rounds, time_range)
+    return results
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--jobs", type=int, default=20_000)
+    arg_parser.add_argument("--nodes", type=int, default=1000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="seconds each request or command waits")
+    arg_parser.add_argument("--rounds", type=int, default=10)
+    arg_parser.add_argument("--time-range", default="24h")
+    args = arg_parser.parse_args(argv)
+
+    # One user, so the fake SSH host (which ignores squeue -u and sacct's user) serves the same jobs
+    cluster = SyntheticCluster(jobs=args.jobs, seed=args.seed, now=time.time(), users=1, nodes=args.nodes)
+    cluster.users = [USER]
+    results = compare(cluster, args.rounds, args.latency, args.time_range)
+    print(f"{'':<6} {'login':>10} {'snapshot':>10} {'nodes':>10} {'KiB/poll':>10} {'jobs':>8}")
+    for transport, result in results.items():
+        print(f"{transport:<6} {result['login'] * 1000:8.1f}ms {result['snapshot'] * 1000:8.1f}ms "
+              f"{result['nodes'] * 1000:8.1f}ms {result['bytes'] / 1024:10.1f} {result['jobs']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
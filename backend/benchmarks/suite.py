@@ -0,0 +1,125 @@
+"""Micro-benchmark suite with regression thresholds.
+
+Times the hot paths on synthetic clusters and compares each against the
+per-job budget in thresholds.json. Run from the repository root:
+
+    python -m backend.benchmarks.suite --check
+    python -m backend.benchmarks.suite --jobs 1000000
+    python -m backend.benchmarks.suite --update   # after an intended change
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from backend.slurm import efficiency, parser
+from backend.slurm.graph import JobGraph
+from backend.slurm.models import JobBatch, JobInfo
+from backend.benchmarks.synthetic import SyntheticCluster
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+# Budgets written by --update leave this much room for slower machines
+UPDATE_HEADROOM = 3.0
+
+
+def measure(func: Callable, repeat: int) -> float:
+    """Median wall time of ``repeat`` runs, in seconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def run(jobs: int = 20_000, seed: int = 0, repeat: int = 3) -> Dict[str, float]:
+    """Microseconds per job of every benchmark"""
+    # A short window keeps most jobs in the queue, so squeue is as long as sacct
+    queue = SyntheticCluster(jobs=jobs, seed=seed, window=3600)
+    history = SyntheticCluster(jobs=jobs, seed=seed)
+    squeue_lines = list(queue.squeue_lines())
+    sacct_lines = list(history.sacct_lines())
+    usage_lines = list(history.sacct_lines(fields=parser.HISTORY_SACCT_FIELDS))
+    active = parser.parse_squeue(squeue_lines)
+    finished = parser.parse_sacct(sacct_lines)
+    _, usage = efficiency.parse_sacct_usage(usage_lines)
+    all_jobs = active + finished
+    # Text fields as parse_squeue hands them to JobInfo
+    fields = [line.split("|", 12) for line in squeue_lines]
+    rows = TypeAdapter(List[JobInfo])
+
+    def build_jobinfo():
+        return [JobInfo(job_id=f[0], name=f[12], status=f[1], time=f[2], nodes=f[3], cpus=f[4],
+                        memory=f[5], partition=f[7], user=f[9]) for f in fields]
+
+    def build_graph():
+        graph = JobGraph()
+        graph.update(all_jobs)
+        return graph.to_dict()
+
+    benchmarks = {
+        "parse_squeue": (lambda: parser.parse_squeue(squeue_lines), len(active)),
+        "parse_sacct": (lambda: parser.parse_sacct(sacct_lines), len(finished)),
+        "build_jobinfo": (build_jobinfo, len(fields)),
+        "serialize_jobs": (lambda: rows.dump_json(all_jobs), len(all_jobs)),
+        "serialize_columns": (lambda: to_json(JobBatch.from_jobs(all_jobs).to_dict()), len(all_jobs)),
+        "job_graph": (build_graph, len(all_jobs)),
+        "parse_sacct_usage": (lambda: efficiency.parse_sacct_usage(usage_lines), len(finished)),
+        "efficiency_report": (lambda: efficiency.report(usage.compute(), 0.0), len(usage)),
+    }
+    return {name: measure(func, repeat) / max(count, 1) * 1e6 for name, (func, count) in benchmarks.items()}
+
+
+def load_thresholds(path: str = THRESHOLDS_PATH) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(results: Dict[str, float], thresholds: Dict) -> List[str]:
+    """Benchmarks slower than their budget, as messages"""
+    budgets = thresholds["max_us_per_job"]
+    return [f"{name}: {value:.2f} us/job exceeds budget of {budgets[name]:.2f}"
+            for name, value in results.items() if name in budgets and value > budgets[name]]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--jobs", type=int, default=None, help="defaults to the size in thresholds.json")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--check", action="store_true", help="exit non-zero on a regression")
+    arg_parser.add_argument("--update", action="store_true", help="rewrite thresholds.json from this run")
+    args = arg_parser.parse_args(argv)
+
+    thresholds = load_thresholds()
+    jobs = args.jobs or thresholds["jobs"]
+    results = run(jobs=jobs, seed=args.seed, repeat=args.repeat)
+    budgets = thresholds["max_us_per_job"]
+    for name, value in results.items():
+        budget = budgets.get(name)
+        status = "" if budget is None else f"budget {budget:8.2f}  {'FAIL' if value > budget else 'ok'}"
+        print(f"{name:<20} {value:8.2f} us/job  {value * jobs / 1000:10.1f} ms  {status}")
+
+    if args.update:
+        thresholds = {"jobs": jobs,
+                      "max_us_per_job": {name: round(value * UPDATE_HEADROOM, 2) for name, value in results.items()}}
+        with open(THRESHOLDS_PATH, "w") as f:
+            json.dump(thresholds, f, indent=2)
+            f.write("\n")
+        print(f"Wrote {THRESHOLDS_PATH}")
+    elif args.check:
+        failed = regressions(results, thresholds)
+        for message in failed:
+            print(message, file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Seeded generator of realistic squeue and sacct output.
+
+Produces a consistent job population with arrays, job steps, dependency
+chains and long names, from a thousand to a million jobs, for the
+benchmarks and load tests. Write samples from the repository root:
+
+    python -m backend.benchmarks.synthetic --jobs 100000 --out /tmp/cluster
+"""
+import argparse
+import os
+import random
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from backend.slurm.parser import SACCT_FIELDS
+from backend.slurm.units import format_duration, format_timestamp, parse_memory
+
+TIME_LIMITS = [3600, 4 * 3600, 12 * 3600, 86400, 2 * 86400, None]
+PARTITIONS = [("compute", 0.6), ("gpu", 0.25), ("bigmem", 0.1), ("debug", 0.05)]
+FINISHED_STATES = [("COMPLETED", 0.85), ("FAILED", 0.08), ("CANCELLED", 0.04), ("OUT_OF_MEMORY", 0.02),
+                   ("NODE_FAIL", 0.01)]
+NODE_STATES = ["idle", "mixed", "allocated", "down", "drained"]
+STAGES = ["prep", "align", "train", "eval", "merge", "sim", "post", "plot"]
+
+ARRAY_FRACTION = 0.01
+DEPENDENCY_FRACTION = 0.1
+LONG_NAME_FRACTION = 0.02
+
+
+@dataclass(slots=True)
+class SyntheticJob:
+    """One generated job (or array task); times are Unix seconds, 0 when not reached"""
+    job_id: str
+    name: str
+    state: str
+    user: str
+    partition: str
+    submit: float
+    start: float
+    end: float
+    limit: Optional[int]
+    nodes: int
+    cpus: int
+    memory: str
+    gpus_per_node: int
+    dependency: str
+    steps: int
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("PENDING", "RUNNING")
+
+
+def task_ranges(tasks: List[int]) -> str:
+    """Array task ids the way squeue folds them, e.g. ``[3,5-9]``"""
+    if len(tasks) == 1:
+        return str(tasks[0])
+    parts = []
+    first = previous = tasks[0]
+    for task in tasks[1:] + [None]:
+        if task is not None and task == previous + 1:
+            previous = task
+            continue
+        parts.append(str(first) if first == previous else f"{first}-{previous}")
+        first = previous = task
+    return f"[{','.join(parts)}]"
+
+
+@dataclass(slots=True)
+class SyntheticNode:
+    """One generated compute node; memory is in MB, as sinfo reports it"""
+    name: str
+    partition: str
+    state: str
+    cpus: int
+    cpus_allocated: int
+    memory: int
+    gpus: int
+    load: float
+
+
+class SyntheticCluster:
+    """A reproducible cluster history ending at ``now``.
+
+    Jobs are submitted evenly over ``window`` seconds and each gets a queue
+    wait and a run time, so their states follow from the clock: the last
+    hour or so is mostly pending, the hours before that running, the rest finished.
+    The same seed always yields the same jobs, so squeue and sacct output
+    generated separately agree with each other.
+    """
+
+    def __init__(self, jobs: int = 1000, seed: int = 0, now: float = 1_717_200_000.0,
+                 window: float = 7 * 86400, users: int = 50, first_job_id: int = 1_000_000,
+                 mean_wait: float = 3600, mean_run: float = 6 * 3600, nodes: int = 100):
+        self.count = jobs
+        self.seed = seed
+        self.now = now
+        self.window = window
+        self.users = [f"user{i:03d}" for i in range(users)]
+        self.first_job_id = first_job_id
+        self.mean_wait = mean_wait
+        self.mean_run = mean_run
+        self.node_count = nodes
+
+    def jobs(self) -> Iterator[SyntheticJob]:
+        """Every job record, in submission order"""
+        rng = random.Random(self.seed)
+        spacing = self.window / max(self.count, 1)
+        # (job id, end time) of recent jobs, for dependency chains
+        recent: Deque[Tuple[str, float]] = deque(maxlen=32)
+        next_id = self.first_job_id
+        made = 0
+        while made < self.count:
+            submit = self.now - self.window + made * spacing
+            user = self.users[min(int(rng.paretovariate(1.2)) - 1, len(self.users) - 1)]
+            partition = rng.choices([p for p, _ in PARTITIONS], [w for _, w in PARTITIONS])[0]
+            name = self._name(rng, made)
+            limit = rng.choice(TIME_LIMITS)
+            nodes = rng.choice([1, 1, 1, 2, 4]) if partition != "debug" else 1
+            cpus = nodes * rng.choice([1, 4, 8, 16, 32])
+            memory = f"{rng.choice([2, 4, 16, 64, 256 if partition == 'bigmem' else 32])}G"
+            gpus = rng.choice([1, 2, 4]) if partition == "gpu" else 0
+
+            dependency, ready = "", submit
+            if recent and rng.random() < DEPENDENCY_FRACTION:
+                upstream, upstream_end = rng.choice(recent)
+                dependency = f"afterok:{upstream}"
+                ready = max(submit, upstream_end or float("inf"))
+
+            tasks = rng.randint(2, 100) if rng.random() < ARRAY_FRACTION else 0
+            if tasks >= self.count - made:
+                tasks = 0  # Leave room for the folded pending record
+            base = str(next_id)
+            next_id += 1
+            job_ids = [f"{base}_{task}" for task in range(tasks)] if tasks else [base]
+            pending_tasks: List[int] = []
+            last_end = 0.0
+            for task, job_id in enumerate(job_ids):
+                wait = rng.expovariate(1 / self.mean_wait)
+                # Most jobs end well inside their limit; a few run into it
+                run = limit * rng.betavariate(2, 3) * 1.3 if limit else rng.expovariate(1 / self.mean_run)
+                start = ready + wait
+                hit_limit = limit is not None and run >= limit
+                end = start + (limit if hit_limit else run)
+                if start > self.now:
+                    if tasks:
+                        pending_tasks.append(task)
+                        continue
+                    state, start, end = "PENDING", 0.0, 0.0
+                elif end > self.now:
+                    state, end = "RUNNING", 0.0
+                elif hit_limit:
+                    state = "TIMEOUT"
+                else:
+                    state = rng.choices([s for s, _ in FINISHED_STATES], [w for _, w in FINISHED_STATES])[0]
+                last_end = max(last_end, end) if end else float("inf")
+                yield SyntheticJob(job_id, name, state, user, partition, submit, start, end, limit,
+                                   nodes, cpus, memory, gpus, dependency,
+                                   rng.randint(1, 4) if rng.random() < 0.3 else 0)
+                made += 1
+            if pending_tasks:
+                # squeue folds the array's pending tasks into one record
+                job_id = f"{base}_{task_ranges(pending_tasks)}"
+                yield SyntheticJob(job_id, name, "PENDING", user, partition, submit, 0.0, 0.0, limit,
+                                   nodes, cpus, memory, gpus, dependency, 0)
+                made += 1
+                last_end = float("inf")
+            recent.append((base, 0.0 if last_end == float("inf") else last_end))
+
+    @staticmethod
+    def _name(rng: random.Random, index: int) -> str:
+        stage = STAGES[index % len(STAGES)]
+        if rng.random() < LONG_NAME_FRACTION:
+            words = [rng.choice(STAGES) for _ in range(rng.randint(15, 30))]
+            name = "_".join(words)
+            # Free text may even contain the output delimiter
+            return name.replace("_", "|", 1) if rng.random() < 0.25 else name
+        return f"{stage}_{rng.randint(0, 499)}"
+
+    def squeue_line(self, job: SyntheticJob) -> str:
+        """One ``squeue -o SQUEUE_FORMAT`` line"""
+        # Once a job starts squeue stops showing its dependency
+        dependency = "(null)"
+        if job.dependency and job.state == "PENDING":
+            dependency = f"{job.dependency}(unfulfilled)"
+        gres = f"gpu:{job.gpus_per_node}" if job.gpus_per_node else "N/A"
+        start = format_timestamp(job.start) if job.start else "N/A"
+        return (f"{job.job_id}|{job.state}|{format_duration(job.limit)}|{job.nodes}|{job.cpus}|"
+                f"{job.memory}|{dependency}|{job.partition}|{format_timestamp(job.submit)}|"
+                f"{job.user}|{gres}|{start}|{job.name}")
+
+    def usage(self, job: SyntheticJob) -> Tuple[int, int, str]:
+        """(TotalCPU seconds, peak RSS in bytes, ExitCode) of a started job.
+
+        Efficiencies are drawn from the job id, so they do not disturb the
+        seeded population. sacct only totals CPU time once a job has ended.
+        """
+        draw = zlib.crc32(job.job_id.encode())
+        cpu_efficiency = 0.05 + 0.9 * (draw % 1000) / 1000
+        memory_efficiency = 0.05 + 0.9 * (draw // 1000 % 1000) / 1000
+        total_cpu = int((job.end - job.start) * job.cpus * cpu_efficiency) if job.end else 0
+        peak = int(parse_memory(job.memory) * memory_efficiency) >> 10 << 10
+        return total_cpu, peak, "1:0" if job.state == "FAILED" else "0:0"
+
+    def sacct_job_rows(self, job: SyntheticJob) -> List[Dict[str, str]]:
+        """sacct's fields of a started job and its steps, one dict per line"""
+        elapsed = format_duration(int((job.end or self.now) - job.start))
+        state = "CANCELLED by 1000" if job.state == "CANCELLED" else job.state
+        gpus = job.gpus_per_node * job.nodes
+        tres = f"billing={job.cpus},cpu={job.cpus},mem={job.memory},node={job.nodes}"
+        if gpus:
+            tres += f",gres/gpu={gpus}"
+        submit_line = "sbatch run.sh"
+        if job.dependency:
+            submit_line = f"sbatch --dependency={job.dependency} run.sh"
+        total_cpu, peak, exit_code = self.usage(job)
+        common = {"Elapsed": elapsed, "NNodes": str(job.nodes), "NCPUS": str(job.cpus),
+                  "Partition": job.partition, "Submit": format_timestamp(job.submit),
+                  "Start": format_timestamp(job.start), "End": format_timestamp(job.end) if job.end else "Unknown",
+                  "User": job.user, "AllocTRES": tres}
+        rows = [dict(common, JobID=job.job_id, State=state, ReqMem=job.memory, JobName=job.name,
+                     SubmitLine=submit_line, TotalCPU=format_duration(total_cpu), MaxRSS="", ExitCode=exit_code)]
+        # Steps carry no submit line and no requested memory; the batch
+        # step does the work and has the largest tasks
+        steps = ["batch", "extern"] + [str(step) for step in range(job.steps)]
+        step_state = "COMPLETED" if job.state == "TIMEOUT" else state
+        for step in steps:
+            batch = step == "batch"
+            rows.append(dict(common, JobID=f"{job.job_id}.{step}", State=step_state, ReqMem="", JobName=step,
+                             SubmitLine="", TotalCPU=format_duration(total_cpu if batch else 0),
+                             MaxRSS=f"{peak >> 10 if batch else peak >> 12}K" if job.end else "",
+                             ExitCode=exit_code if batch else "0:0"))
+        return rows
+
+    def sacct_job_lines(self, job: SyntheticJob, fields: Sequence[str] = SACCT_FIELDS) -> List[str]:
+        """``sacct --parsable2 -o FIELDS`` lines of a started job and its steps"""
+        return ["|".join([row[field] for field in fields]) for row in self.sacct_job_rows(job)]
+
+    def squeue_lines(self) -> Iterator[str]:
+        """``squeue -o SQUEUE_FORMAT --noheader`` lines of the active jobs"""
+        for job in self.jobs():
+            if job.active:
+                yield self.squeue_line(job)
+
+    def sacct_lines(self, start: Optional[float] = None, fields: Sequence[str] = SACCT_FIELDS) -> Iterator[str]:
+        """``sacct --parsable2 --noheader -o FIELDS`` lines of jobs that have started"""
+        start = self.now - self.window if start is None else start
+        for job in self.jobs():
+            if job.start and not (job.end and job.end < start):
+                yield from self.sacct_job_lines(job, fields)
+
+    def nodes(self) -> Iterator[SyntheticNode]:
+        """The cluster's compute nodes, named per partition (``gpu007``)"""
+        rng = random.Random(self.seed)
+        for partition, weight in PARTITIONS:
+            for i in range(max(1, round(self.node_count * weight))):
+                cpus = 128 if partition == "bigmem" else 64
+                memory = (2048 if partition == "bigmem" else 256) * 1024
+                state = rng.choices(NODE_STATES, [0.2, 0.4, 0.33, 0.04, 0.03])[0]
+                used = {"idle": 0, "mixed": rng.randint(1, cpus - 1), "allocated": cpus}.get(state, 0)
+                yield SyntheticNode(f"{partition}{i + 1:03d}", partition, state, cpus, used, memory,
+                                    4 if partition == "gpu" else 0, round(used * rng.uniform(0.6, 1.0), 2))
+
+    def squeue_output(self) -> bytes:
+        return "".join(line + "\n" for line in self.squeue_lines()).encode('utf-8')
+
+    def sacct_output(self, start: Optional[float] = None, fields: Sequence[str] = SACCT_FIELDS) -> bytes:
+        return "".join(line + "\n" for line in self.sacct_lines(start, fields)).encode('utf-8')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--jobs", type=int, default=10_000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", default=".", help="directory for squeue.txt and sacct.txt")
+    args = arg_parser.parse_args(argv)
+
+    cluster = SyntheticCluster(jobs=args.jobs, seed=args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for name, data in (("squeue.txt", cluster.squeue_output()), ("sacct.txt", cluster.sacct_output())):
+        path = os.path.join(args.out, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        lines = data.count(b"\n")
+        print(f"{path}: {lines:,} lines, {len(data) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""A local SSH server that answers like a Slurm login node.
+
+Serves squeue, sacct, scontrol, sinfo and sdiag output from a synthetic
+cluster (or canned files), and the jobs' output files to stat and tail,
+with configurable latency, jitter and failures, so the real SlurmClient
+can be exercised without a cluster. Run from the repository root and log
+in to ``127.0.0.1:2222`` with any user:
+
+    python -m backend.loadtest.fake_host --jobs 50000 --latency 0.2 --failure-rate 0.01
+"""
+import argparse
+import os
+import random
+import shlex
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import paramiko
+
+from backend.benchmarks.synthetic import SyntheticCluster, SyntheticJob, SyntheticNode
+from backend.slurm.hostlist import compress
+from backend.slurm.parser import HISTORY_SACCT_FIELDS, SACCT_FIELDS
+from backend.slurm.units import format_duration, format_timestamp, parse_timestamp
+
+SEND_CHUNK = 32 * 1024
+
+# Seconds a finished command waits for the client to close its channel
+CLOSE_TIMEOUT = 5.0
+
+# What a flaky slurmctld answers
+FAILURE_MESSAGE = "slurm_load_jobs error: Socket timed out on send/recv operation"
+
+# slurmctld forgets finished jobs this long after they end; sacct still knows them
+MIN_JOB_AGE = 300
+
+# sinfo format specifiers the fake host understands
+SINFO_FIELDS: Dict[str, Callable[[SyntheticNode], object]] = {
+    "N": lambda node: node.name,
+    "n": lambda node: node.name,
+    "P": lambda node: node.partition,
+    "R": lambda node: node.partition,
+    "T": lambda node: node.state.upper(),
+    "t": lambda node: {"allocated": "alloc", "drained": "drain"}.get(node.state, node.state),
+    "c": lambda node: node.cpus,
+    "m": lambda node: node.memory,
+    "e": lambda node: node.memory * (node.cpus - node.cpus_allocated) // node.cpus,
+    "G": lambda node: f"gpu:{node.gpus}" if node.gpus else "(null)",
+    "O": lambda node: node.load,
+    "C": lambda node: f"{node.cpus_allocated}/{node.cpus - node.cpus_allocated}/0/{node.cpus}",
+}
+SINFO_DEFAULT_FORMAT = "%N|%P|%T|%c|%m|%G"
+
+# Specifiers sinfo fills in per group of nodes rather than per node
+SINFO_GROUP_FIELDS = {
+    "N": lambda nodes: compress(node.name for node in nodes),
+    "n": lambda nodes: compress(node.name for node in nodes),
+    "C": lambda nodes: "/".join(str(sum(counts)) for counts in zip(*(
+        (node.cpus_allocated, node.cpus - node.cpus_allocated, 0, node.cpus) for node in nodes))),
+}
+
+
+class FakeSlurmHost:
+    """An SSH server in a background thread, serving a synthetic cluster.
+
+    Every exec request waits ``latency`` plus up to ``jitter`` seconds, then
+    fails with probability ``failure_rate`` (Slurm's timeout message, exit
+    status 1) or drops the channel with probability ``drop_rate``. Files in
+    ``canned_dir`` (``squeue.txt``, ``sacct.txt``, ``sinfo.txt``) replace the
+    generated output of that command. ``commands`` counts requests by
+    command name; sdiag reports them as RPCs, along with ``server_threads``.
+    """
+
+    def __init__(self, cluster: Optional[SyntheticCluster] = None, host: str = "127.0.0.1", port: int = 0,
+                 password: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, drop_rate: float = 0.0, canned_dir: Optional[str] = None,
+                 seed: Optional[int] = None):
+        self.cluster = cluster or SyntheticCluster(now=time.time())
+        self.host = host
+        self.port = port
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.commands: Counter = Counter()
+        self.failures = 0
+        self.connections = 0
+        self.server_threads = 3
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._transports: List[paramiko.Transport] = []
+        self._canned = self._load_canned(canned_dir)
+        # Extra files for stat and tail, by path
+        self.files: Dict[str, bytes] = {}
+        self._build_outputs()
+
+    @staticmethod
+    def _load_canned(canned_dir: Optional[str]) -> Dict[str, bytes]:
+        canned = {}
+        if canned_dir:
+            for command in ("squeue", "sacct", "sinfo"):
+                path = os.path.join(canned_dir, f"{command}.txt")
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        canned[command] = f.read()
+        return canned
+
+    def _build_outputs(self):
+        """Render the cluster once; commands only filter what is rendered here"""
+        cluster = self.cluster
+        self.jobs: Dict[str, SyntheticJob] = {}
+        squeue = []
+        for job in cluster.jobs():
+            self.jobs[job.job_id] = job
+            if job.active:
+                squeue.append(cluster.squeue_line(job) + "\n")
+        self._squeue = "".join(squeue).encode('utf-8')
+        # Per sacct field list: (start, end or 0 while running, lines) of every started job
+        self._sacct: Dict[Tuple[str, ...], List[Tuple[float, float, bytes]]] = {}
+        self._sacct_rendered(tuple(HISTORY_SACCT_FIELDS))
+        self.nodes = {node.name: node for node in cluster.nodes()}
+
+    def _sacct_rendered(self, fields: Tuple[str, ...]) -> List[Tuple[float, float, bytes]]:
+        rendered = self._sacct.get(fields)
+        if rendered is None:
+            rendered = self._sacct[fields] = [
+                (job.start, job.end,
+                 "".join(line + "\n" for line in self.cluster.sacct_job_lines(job, fields)).encode('utf-8'))
+                for job in self.jobs.values() if job.start
+            ]
+        return rendered
+
+    @property
+    def address(self) -> str:
+        """The ``host:port`` to log in to"""
+        return f"{self.host}:{self.port}"
+
+    def start(self) -> "FakeSlurmHost":
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(128)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-slurm-host", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+
+    def __enter__(self) -> "FakeSlurmHost":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _accept_loop(self):
+        while self._socket is not None:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handshake, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock: socket.socket):
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(self._host_key)
+        try:
+            transport.start_server(server=_SlurmServer(self))
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            print(f"Fake host handshake failed: {e}")
+            return
+        with self._lock:
+            self.connections += 1
+            self._transports = [t for t in self._transports if t.is_active()] + [transport]
+
+    def serve(self, channel: paramiko.Channel, command: str):
+        """Answer one exec request (runs in its own thread)"""
+        name = command.split(None, 1)[0] if command.strip() else ""
+        with self._lock:
+            self.commands[name] += 1
+            roll = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        try:
+            time.sleep(delay)
+            if roll < self.drop_rate:
+                with self._lock:
+                    self.failures += 1
+                return
+            if roll < self.drop_rate + self.failure_rate:
+                with self._lock:
+                    self.failures += 1
+                output, error, status = b"", FAILURE_MESSAGE, 1
+            else:
+                output, error, status = self.run(command)
+            for offset in range(0, len(output), SEND_CHUNK):
+                channel.sendall(output[offset:offset + SEND_CHUNK])
+            if error:
+                channel.sendall_stderr((error + "\n").encode('utf-8'))
+            channel.send_exit_status(status)
+            channel.shutdown_write()
+            # Closing first could beat paramiko's reply to the exec request, which
+            # the client then sees as a dropped channel; sshd leaves it to the client
+            waited = 0.0
+            while not channel.closed and waited < CLOSE_TIMEOUT:
+                time.sleep(0.01)
+                waited += 0.01
+        except (OSError, EOFError, paramiko.SSHException):
+            pass  # The client hung up
+        finally:
+            channel.close()
+
+    def run(self, command: str) -> Tuple[bytes, str, int]:
+        """(stdout, stderr, exit status) of a command, or of ``;``-separated commands in turn"""
+        results = [self._run_args(args) for args in _split_commands(command)]
+        if not results:
+            return b"", "", 0
+        output = b"".join(result[0] for result in results)
+        error = "\n".join(result[1] for result in results if result[1])
+        return output, error, results[-1][2]
+
+    def _run_args(self, args: List[str]) -> Tuple[bytes, str, int]:
+        name = args[0]
+        if name in self._canned:
+            return self._canned[name], "", 0
+        if name == "hostname":
+            return b"fake-login01\n", "", 0
+        if name == "squeue":
+            return self._squeue, "", 0
+        if name == "sacct":
+            if "-j" in args:
+                return self._run_sacct_jobs(args), "", 0
+            return self._run_sacct(args), "", 0
+        if name == "sinfo":
+            return self._run_sinfo(args), "", 0
+        if name == "scontrol":
+            return self._run_scontrol(args)
+        if name in ("stat", "tail"):
+            return self._run_file_command(name, args)
+        if name == "sdiag":
+            return self._run_sdiag(), "", 0
+        return b"", f"bash: {name}: command not found", 127
+
+    def _run_sacct(self, args: List[str]) -> bytes:
+        """``sacct -S START -E END -o FIELDS``: the started jobs that ran during START..END"""
+        start = parse_timestamp(_option(args, "-S")) or self.cluster.now - 86400  # sacct's default is midnight
+        until = parse_timestamp(_option(args, "-E")) or float("inf")
+        fields = tuple(_option(args, "-o").split(",")) if "-o" in args else tuple(SACCT_FIELDS)
+        return b"".join(lines for started, end, lines in self._sacct_rendered(fields)
+                        if started <= until and (not end or end >= start))
+
+    def _run_sacct_jobs(self, args: List[str]) -> bytes:
+        """``sacct -X -j IDS -o FIELDS``: one line per known job, with the requested fields"""
+        job_ids = _option(args, "-j").split(",")
+        fields = _option(args, "-o").split(",")
+        lines = []
+        for job_id in job_ids:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                values = self._sacct_values(job)
+                lines.append("|".join(str(values.get(field, "")) for field in fields) + "\n")
+        return "".join(lines).encode('utf-8')
+
+    def _sacct_values(self, job: SyntheticJob) -> Dict[str, object]:
+        state = "CANCELLED by 1000" if job.state == "CANCELLED" else job.state
+        submit_line = "sbatch run.sh"
+        if job.dependency:
+            submit_line = f"sbatch --dependency={job.dependency} run.sh"
+        return {
+            "JobID": job.job_id, "State": state, "ExitCode": "1:0" if job.state == "FAILED" else "0:0",
+            "Elapsed": format_duration(int((job.end or self.cluster.now) - job.start)) if job.start else "00:00:00",
+            "Timelimit": format_duration(job.limit), "NNodes": job.nodes, "NCPUS": job.cpus,
+            "ReqMem": job.memory, "Partition": job.partition, "Account": "default", "QOS": "normal",
+            "NodeList": f"{job.partition}001" if job.start else "None assigned",
+            "Submit": format_timestamp(job.submit),
+            "Start": format_timestamp(job.start) if job.start else "Unknown",
+            "End": format_timestamp(job.end) if job.end else "Unknown",
+            "User": job.user, "AllocTRES": f"cpu={job.cpus},mem={job.memory},node={job.nodes}",
+            "WorkDir": _workdir(job), "JobName": job.name, "SubmitLine": submit_line,
+        }
+
+    def output_file(self, path: str) -> Optional[bytes]:
+        """Contents of a file: one set in ``files``, or the made-up output of a job that has started"""
+        if path in self.files:
+            return self.files[path]
+        directory, _, filename = path.rpartition("/")
+        if filename.startswith("slurm-") and filename.endswith(".out"):
+            job = self.jobs.get(filename[len("slurm-"):-len(".out")])
+            if job is not None and job.start and directory == _workdir(job):
+                return "".join(f"{job.name}: step {step} of {job.steps + 1}\n"
+                               for step in range(1, job.steps + 2)).encode('utf-8')
+        return None
+
+    def _run_file_command(self, name: str, args: List[str]) -> Tuple[bytes, str, int]:
+        """``stat -c %s -- PATH`` and ``tail -c +N [-F] -- PATH``; tail -F does not wait for more output"""
+        path = args[-1]
+        content = self.output_file(path)
+        if content is None:
+            return b"", f"{name}: cannot open '{path}' for reading: No such file or directory", 1
+        if name == "stat":
+            return f"{len(content)}\n".encode('utf-8'), "", 0
+        start = _option(args, "-c")
+        return content[max(0, int(start.lstrip("+")) - 1):], "", 0
+
+    def _run_sinfo(self, args: List[str]) -> bytes:
+        spec = SINFO_DEFAULT_FORMAT
+        for i, arg in enumerate(args):
+            if arg in ("-o", "--format") and i + 1 < len(args):
+                spec = args[i + 1]
+            elif arg.startswith("--format="):
+                spec = arg.split("=", 1)[1]
+        lines = []
+        if not ({"-h", "--noheader"} & set(args)):
+            lines.append(_expand_format(spec, lambda key: key.upper()))
+        if "-N" in args or "--Node" in args:
+            for node in self.nodes.values():
+                lines.append(_expand_format(spec, lambda key: SINFO_FIELDS[key](node) if key in SINFO_FIELDS else "N/A"))
+            return "".join(line + "\n" for line in lines).encode('utf-8')
+        # Like sinfo, one line per distinct set of the other fields, with the nodes as a hostlist
+        groups: Dict[str, List[SyntheticNode]] = {}
+        for node in self.nodes.values():
+            key = _expand_format(spec, lambda key: f"\0{key}" if key in SINFO_GROUP_FIELDS
+                                 else SINFO_FIELDS[key](node) if key in SINFO_FIELDS else "N/A")
+            groups.setdefault(key, []).append(node)
+        for key, members in groups.items():
+            for field, value in SINFO_GROUP_FIELDS.items():
+                if f"\0{field}" in key:
+                    key = key.replace(f"\0{field}", value(members))
+            lines.append(key)
+        return "".join(line + "\n" for line in lines).encode('utf-8')
+
+    def _run_sdiag(self) -> bytes:
+        rpcs = {"squeue": "REQUEST_JOB_INFO", "sinfo": "REQUEST_NODE_INFO", "scontrol": "REQUEST_JOB_INFO_SINGLE"}
+        lines = [
+            "*******************************************************",
+            f"sdiag output at {time.strftime('%a %b %d %H:%M:%S %Y')} ({int(time.time())})",
+            "*******************************************************",
+            f"Server thread count:  {self.server_threads}",
+            "Agent queue size:     0",
+            "Agent count:          0",
+            "Agent thread count:   0",
+            "DBD Agent queue size: 0",
+            "",
+            "Remote Procedure Call statistics by message type",
+        ]
+        for command, rpc in rpcs.items():
+            lines.append(f"\t{rpc:<40}( 2003) count:{self.commands[command]:<6} ave_time:1000   total_time:0")
+        lines += ["", "Remote Procedure Call statistics by user"]
+        lines.append(f"\talice           (    1000) count:{sum(self.commands[c] for c in rpcs)}")
+        return "".join(line + "\n" for line in lines).encode('utf-8')
+
+    def _run_scontrol(self, args: List[str]) -> Tuple[bytes, str, int]:
+        oneliner = "-o" in args or "--oneliner" in args
+        words = [arg for arg in args[1:] if not arg.startswith("-")]
+        if len(words) < 3 or words[0] != "show" or words[1] not in ("job", "node"):
+            return b"", "scontrol: error: only 'show job ID' and 'show node NAME' are faked", 1
+        if words[1] == "job":
+            job = self.jobs.get(words[2])
+            if job is None or (job.end and job.end < self.cluster.now - MIN_JOB_AGE):
+                return b"", "slurm_load_jobs error: Invalid job id specified", 1
+            fields = self._job_fields(job)
+        else:
+            node = self.nodes.get(words[2])
+            if node is None:
+                return b"", f"Node {words[2]} not found", 1
+            fields = _node_fields(node)
+        if oneliner:
+            text = " ".join(f"{key}={value}" for line in fields for key, value in line) + "\n"
+        else:
+            text = "".join("   " * (i > 0) + " ".join(f"{key}={value}" for key, value in line) + "\n"
+                           for i, line in enumerate(fields)) + "\n"
+        return text.encode('utf-8'), "", 0
+
+    def _job_fields(self, job: SyntheticJob) -> List[List[Tuple[str, object]]]:
+        """``scontrol show job`` fields, line by line"""
+        state = job.state
+        reason = "None"
+        if state == "PENDING":
+            reason = "Dependency" if job.dependency else "Priority"
+        run_time = format_duration(int((job.end or self.cluster.now) - job.start)) if job.start else "00:00:00"
+        workdir = _workdir(job)
+        base, _, task = job.job_id.partition("_")
+        array = [("ArrayJobId", base), ("ArrayTaskId", task)] if task else []
+        return [
+            [("JobId", base)] + array + [("JobName", job.name)],
+            [("UserId", f"{job.user}(1000)"), ("GroupId", "users(100)")],
+            [("JobState", state), ("Reason", reason), ("Dependency", job.dependency or "(null)")],
+            [("RunTime", run_time), ("TimeLimit", format_duration(job.limit))],
+            [("SubmitTime", format_timestamp(job.submit)),
+             ("StartTime", format_timestamp(job.start) if job.start else "Unknown"),
+             ("EndTime", format_timestamp(job.end) if job.end else "Unknown")],
+            [("Partition", job.partition), ("NodeList", f"{job.partition}001" if job.start else "(null)")],
+            [("NumNodes", job.nodes), ("NumCPUs", job.cpus), ("MinMemoryNode", job.memory)],
+            [("TRES", f"cpu={job.cpus},mem={job.memory},node={job.nodes}"
+                      + (f",gres/gpu={job.gpus_per_node * job.nodes}" if job.gpus_per_node else ""))],
+            [("Command", f"{workdir}/run.sh")],
+            [("WorkDir", workdir)],
+            [("StdErr", f"{workdir}/slurm-{job.job_id}.out")],
+            [("StdOut", f"{workdir}/slurm-{job.job_id}.out")],
+        ]
+
+
+def _workdir(job: SyntheticJob) -> str:
+    return f"/home/{job.user}/{job.name.split('|')[0][:32]}"
+
+
+def _option(args: List[str], flag: str) -> str:
+    """The value following ``flag`` in ``args``, or an empty string"""
+    if flag in args and args.index(flag) + 1 < len(args):
+        return args[args.index(flag) + 1]
+    return ""
+
+
+def _split_commands(command: str) -> List[List[str]]:
+    """Arguments of each command in a ``;``-separated list"""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=";")
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        tokens = command.split()
+    commands, current = [], []
+    for token in tokens:
+        if token == ";":
+            if current:
+                commands.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        commands.append(current)
+    return commands
+
+
+def _node_fields(node: SyntheticNode) -> List[List[Tuple[str, object]]]:
+    return [
+        [("NodeName", node.name), ("Arch", "x86_64")],
+        [("CPUAlloc", node.cpus_allocated), ("CPUTot", node.cpus), ("CPULoad", node.load)],
+        [("Gres", f"gpu:{node.gpus}" if node.gpus else "(null)")],
+        [("RealMemory", node.memory), ("AllocMem", node.memory * node.cpus_allocated // node.cpus)],
+        [("State", node.state.upper()), ("Partitions", node.partition)],
+    ]
+
+
+def _expand_format(spec: str, value: Callable[[str], object]) -> str:
+    """Fill a sinfo/squeue style format, e.g. ``%N|%10T``, ignoring widths"""
+    out = []
+    i = 0
+    while i < len(spec):
+        char = spec[i]
+        if char != "%" or i + 1 >= len(spec):
+            out.append(char)
+            i += 1
+            continue
+        j = i + 1
+        while j < len(spec) and (spec[j].isdigit() or spec[j] in ".-"):
+            j += 1
+        if j < len(spec):
+            out.append(str(value(spec[j])))
+        i = j + 1
+    return "".join(out)
+
+
+class _SlurmServer(paramiko.ServerInterface):
+    """Password logins and exec requests, nothing else"""
+
+    def __init__(self, host: FakeSlurmHost):
+        self.host = host
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if self.host.password is None or password == self.host.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel: paramiko.Channel, command: bytes) -> bool:
+        threading.Thread(target=self.host.serve, args=(channel, command.decode('utf-8', 'replace')),
+                         daemon=True).start()
+        return True
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--port", type=int, default=2222)
+    arg_parser.add_argument("--jobs", type=int, default=10_000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--password", default=None, help="accept only this password (default: any)")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds before each command answers")
+    arg_parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    arg_parser.add_argument("--drop-rate", type=float, default=0.0)
+    arg_parser.add_argument("--canned", default=None, help="directory with squeue.txt/sacct.txt/sinfo.txt")
+    args = arg_parser.parse_args(argv)
+
+    cluster = SyntheticCluster(jobs=args.jobs, seed=args.seed, now=time.time())
+    host = FakeSlurmHost(cluster, port=args.port, password=args.password, latency=args.latency,
+                         jitter=args.jitter, failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                         canned_dir=args.canned, seed=args.seed).start()
+    print(f"Fake Slurm host listening on {host.address} with {len(host.jobs):,} jobs")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"connections {host.connections}  failures {host.failures}  commands {dict(host.commands)}")
+    except KeyboardInterrupt:
+        host.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""A local HTTP server that answers like slurmrestd.
+
+Serves the jobs, job history, nodes, single jobs and diag statistics of a
+synthetic cluster as slurmrestd's JSON (OpenAPI v0.0.40), with token
+auth, keep-alive connections and configurable latency, jitter and
+failures, so the RestClient can be exercised and compared with the SSH
+path without a cluster. Run from the repository root and log in to
+``http://127.0.0.1:6820`` with any user and token:
+
+    python -m backend.loadtest.fake_rest --jobs 50000 --latency 0.2 --failure-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from backend.benchmarks.synthetic import SyntheticCluster, SyntheticJob, SyntheticNode
+from backend.loadtest.fake_host import FAILURE_MESSAGE, MIN_JOB_AGE
+from backend.slurm.rest import API_VERSION
+from backend.slurm.units import parse_memory
+
+# How each synthetic node state reads in slurmrestd: the state, then its flags
+NODE_STATES = {
+    "idle": ["IDLE"],
+    "mixed": ["MIXED"],
+    "allocated": ["ALLOCATED"],
+    "down": ["DOWN", "NOT_RESPONDING"],
+    "drained": ["IDLE", "DRAIN"],
+}
+
+
+def _number(value: int) -> Dict:
+    return {"set": True, "infinite": False, "number": value}
+
+
+_UNSET = {"set": False, "infinite": False, "number": 0}
+_INFINITE = {"set": False, "infinite": True, "number": 0}
+
+
+def _limit(seconds: Optional[int]) -> Dict:
+    # slurmrestd counts time limits in minutes
+    return _number(seconds // 60) if seconds is not None else _INFINITE
+
+
+def _seconds(timestamp: float) -> int:
+    """Unix time in whole seconds, rounded like the timestamps of the text output"""
+    return int(datetime.fromtimestamp(timestamp).timestamp()) if timestamp else 0
+
+
+def _workdir(job: SyntheticJob) -> str:
+    return f"/home/{job.user}/{job.name.split('|')[0][:32]}"
+
+
+class FakeSlurmRestd:
+    """An HTTP/1.1 server in background threads, serving a synthetic cluster as slurmrestd would.
+
+    Every request waits ``latency`` plus up to ``jitter`` seconds, then
+    fails with probability ``failure_rate`` (HTTP 500 with Slurm's timeout
+    message). With a ``token``, requests without it in
+    ``X-SLURM-USER-TOKEN`` get a 401. ``requests`` counts requests by
+    endpoint and ``connections`` the TCP connections accepted, so tests can
+    tell that connections are kept alive. The jobs never change, so every
+    job list request with an ``update_time`` is answered with no jobs and
+    counted in ``unchanged``.
+    """
+
+    def __init__(self, cluster: Optional[SyntheticCluster] = None, host: str = "127.0.0.1", port: int = 0,
+                 token: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.cluster = cluster or SyntheticCluster(now=time.time())
+        self.host = host
+        self.port = port
+        self.token = token
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests: Counter = Counter()
+        self.failures = 0
+        self.connections = 0
+        self.unchanged = 0
+        self.server_threads = 3
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._build_outputs()
+
+    def _build_outputs(self):
+        """Render the cluster once; requests only filter what is rendered here"""
+        self.jobs: Dict[str, SyntheticJob] = {}
+        # slurmctld's own job ids: array tasks get one each, like any other job
+        self._ids: Dict[str, int] = {}
+        next_id = self.cluster.first_job_id + 10 * self.cluster.count
+        active = []
+        # (start, end or 0 while running, user, encoded job) of every started job
+        self._history: List[Tuple[float, float, str, str]] = []
+        for job in self.cluster.jobs():
+            self.jobs[job.job_id] = job
+            base, _, task = job.job_id.partition("_")
+            if task.isdigit():
+                self._ids[job.job_id] = next_id
+                next_id += 1
+            else:
+                self._ids[job.job_id] = int(base)
+            if job.active:
+                active.append(json.dumps(self.job_json(job)))
+            if job.start:
+                self._history.append((job.start, job.end, job.user, json.dumps(self.slurmdb_job_json(job))))
+        # The job list's last_update, for requests with update_time
+        self.last_update = int(time.time())
+        self._active = (f'{{"last_update":{json.dumps(_number(self.last_update))},"jobs":['
+                        + ",".join(active) + "]}").encode('utf-8')
+        self.nodes = {node.name: node for node in self.cluster.nodes()}
+        self._nodes = json.dumps({"nodes": [self.node_json(node) for node in self.nodes.values()]}).encode('utf-8')
+
+    def job_json(self, job: SyntheticJob) -> Dict:
+        """A job as ``/slurm/v0.0.40/jobs`` lists it"""
+        base, _, task = job.job_id.partition("_")
+        workdir = _workdir(job)
+        reason = "None"
+        if job.state == "PENDING":
+            reason = "Dependency" if job.dependency else "Priority"
+        gres = f"gres/gpu:{job.gpus_per_node}" if job.gpus_per_node else ""
+        return {
+            "job_id": self._ids[job.job_id],
+            "array_job_id": _number(int(base) if task else 0),
+            "array_task_id": _number(int(task)) if task.isdigit() else _UNSET,
+            "array_task_string": task.strip("[]") if task and not task.isdigit() else "",
+            "name": job.name,
+            "user_name": job.user,
+            "user_id": 1000,
+            "account": "default",
+            "qos": "normal",
+            "partition": job.partition,
+            "job_state": [job.state],
+            "state_reason": reason,
+            # Once a job starts slurmctld stops showing its dependency
+            "dependency": f"{job.dependency}(unfulfilled)" if job.dependency and job.state == "PENDING" else "",
+            "time_limit": _limit(job.limit),
+            "node_count": _number(job.nodes),
+            "cpus": _number(job.cpus),
+            "memory_per_node": _number(parse_memory(job.memory) >> 20),
+            "memory_per_cpu": _UNSET,
+            "submit_time": _number(_seconds(job.submit)),
+            "start_time": _number(_seconds(job.start)),
+            "end_time": _number(_seconds(job.end)),
+            "tres_per_node": gres,
+            "tres_alloc_str": f"cpu={job.cpus},mem={job.memory},node={job.nodes}" if job.start else "",
+            "nodes": f"{job.partition}001" if job.start else "",
+            "command": f"{workdir}/run.sh",
+            "current_working_directory": workdir,
+            # sbatch's defaults, left for the client to expand
+            "standard_output": f"{workdir}/slurm-%A_%a.out" if task else f"{workdir}/slurm-%j.out",
+            "standard_error": f"{workdir}/slurm-%A_%a.out" if task else f"{workdir}/slurm-%j.out",
+        }
+
+    def slurmdb_job_json(self, job: SyntheticJob) -> Dict:
+        """A job as ``/slurmdb/v0.0.40/jobs`` lists it"""
+        base, _, task = job.job_id.partition("_")
+        tres = [{"type": "cpu", "name": "", "id": 1, "count": job.cpus},
+                {"type": "mem", "name": "", "id": 2, "count": parse_memory(job.memory) >> 20},
+                {"type": "node", "name": "", "id": 4, "count": job.nodes}]
+        if job.gpus_per_node:
+            tres.append({"type": "gres", "name": "gpu", "id": 1001, "count": job.gpus_per_node * job.nodes})
+        submit_line = "sbatch run.sh"
+        if job.dependency:
+            submit_line = f"sbatch --dependency={job.dependency} run.sh"
+        total_cpu, peak, _ = self.cluster.usage(job)
+        # Peak memory is per step, as with sacct's MaxRSS
+        steps = [{"step": {"id": f"{job.job_id}.{name}", "name": name},
+                  "tres": {"requested": {"max": [{"type": "mem", "name": "", "id": 2, "count": count}]}}}
+                 for name, count in (("batch", peak), ("extern", 0))] if job.end else []
+        return {
+            "job_id": self._ids[job.job_id],
+            "array": {"job_id": int(base) if task else 0,
+                      "task_id": _number(int(task)) if task.isdigit() else _UNSET, "task": ""},
+            "name": job.name,
+            "user": job.user,
+            "account": "default",
+            "qos": "normal",
+            "partition": job.partition,
+            "state": {"current": [job.state], "reason": "None"},
+            "time": {
+                "elapsed": int((job.end or self.cluster.now) - job.start) if job.start else 0,
+                "submission": _seconds(job.submit),
+                "start": _seconds(job.start),
+                "end": _seconds(job.end),
+                "limit": _limit(job.limit),
+                "total": {"seconds": total_cpu, "microseconds": 0},
+            },
+            "allocation_nodes": job.nodes,
+            "required": {"CPUs": job.cpus, "memory_per_node": _number(parse_memory(job.memory) >> 20),
+                         "memory_per_cpu": _UNSET},
+            "tres": {"allocated": tres, "requested": tres},
+            "nodes": f"{job.partition}001",
+            "working_directory": _workdir(job),
+            "submit_line": submit_line,
+            "steps": steps,
+            "exit_code": {"status": ["ERROR" if job.state == "FAILED" else "SUCCESS"],
+                          "return_code": _number(1 if job.state == "FAILED" else 0),
+                          "signal": {"id": _UNSET, "name": ""}},
+        }
+
+    @staticmethod
+    def node_json(node: SyntheticNode) -> Dict:
+        return {
+            "name": node.name,
+            "partitions": [node.partition],
+            "state": NODE_STATES.get(node.state, [node.state.upper()]),
+            "cpus": node.cpus,
+            "alloc_cpus": node.cpus_allocated,
+            "alloc_idle_cpus": node.cpus - node.cpus_allocated,
+            "real_memory": node.memory,
+            "gres": f"gpu:{node.gpus}" if node.gpus else "",
+            "cpu_load": int(node.load * 100),
+        }
+
+    @property
+    def url(self) -> str:
+        """The base URL to log in to"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "FakeSlurmRestd":
+        self._server = ThreadingHTTPServer((self.host, self.port), _RestHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-slurmrestd", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeSlurmRestd":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, path: str, query: Dict[str, List[str]], headers) -> Tuple[int, bytes]:
+        """(status, JSON body) of a GET request"""
+        if self.token is not None and (headers.get("X-SLURM-USER-TOKEN") != self.token
+                                       or not headers.get("X-SLURM-USER-NAME")):
+            return 401, _errors("Authentication failure")
+        plugin, _, rest = path.strip("/").partition("/")
+        version, _, endpoint = rest.partition("/")
+        if plugin not in ("slurm", "slurmdb") or version != API_VERSION:
+            return 404, _errors("Unable to find requested URL")
+        name, _, argument = endpoint.partition("/")
+        with self._lock:
+            self.requests[f"{plugin}/{name}"] += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if name != "ping" and self.failure_rate and self._random.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            return 500, _errors(FAILURE_MESSAGE)
+        if plugin == "slurm":
+            if name == "ping":
+                return 200, json.dumps({"pings": [{"hostname": "fake-ctl01", "pinged": "UP", "latency": 10,
+                                                   "mode": "primary"}]}).encode('utf-8')
+            if name == "jobs":
+                if int(query.get("update_time", ["0"])[0]) >= self.last_update:
+                    # What slurmctld answers when nothing changed since update_time
+                    with self._lock:
+                        self.unchanged += 1
+                    return 200, json.dumps({"jobs": [], "last_update": _number(self.last_update)}).encode('utf-8')
+                return 200, self._active
+            if name == "job":
+                return self._job(argument)
+            if name == "nodes":
+                return 200, self._nodes
+            if name == "diag":
+                return 200, self._diag()
+        elif name == "jobs":
+            return 200, self._slurmdb_jobs(query)
+        elif name == "job":
+            job = self.jobs.get(argument)
+            # slurmdbd has no record of a job that never started, and no error for it either
+            jobs = [self.slurmdb_job_json(job)] if job is not None and job.start else []
+            return 200, json.dumps({"jobs": jobs}).encode('utf-8')
+        return 404, _errors("Unable to find requested URL")
+
+    def _job(self, job_id: str) -> Tuple[int, bytes]:
+        job = self.jobs.get(job_id)
+        # slurmctld forgets finished jobs a while after they end
+        if job is None or (job.end and job.end < self.cluster.now - MIN_JOB_AGE):
+            return 404, _errors("Invalid job id specified")
+        return 200, json.dumps({"jobs": [self.job_json(job)]}).encode('utf-8')
+
+    def _slurmdb_jobs(self, query: Dict[str, List[str]]) -> bytes:
+        start = float(query.get("start_time", [self.cluster.now - 86400])[0])
+        end = float(query.get("end_time", [self.cluster.now])[0])
+        users = set(",".join(query.get("users", [])).split(",")) - {""}
+        jobs = [encoded for started, ended, user, encoded in self._history
+                if started <= end and (not ended or ended >= start) and (not users or user in users)]
+        return ('{"jobs":[' + ",".join(jobs) + "]}").encode('utf-8')
+
+    def _diag(self) -> bytes:
+        rpcs = {"slurm/jobs": "REQUEST_JOB_INFO", "slurm/nodes": "REQUEST_NODE_INFO",
+                "slurm/job": "REQUEST_JOB_INFO_SINGLE"}
+        statistics = {
+            "server_thread_count": self.server_threads,
+            "agent_queue_size": 0,
+            "dbd_agent_queue_size": 0,
+            "rpcs_by_message_type": [{"type_id": 2003, "message_type": rpc, "count": self.requests[endpoint],
+                                      "average_time": _number(1000), "total_time": 0}
+                                     for endpoint, rpc in rpcs.items()],
+        }
+        return json.dumps({"statistics": statistics}).encode('utf-8')
+
+
+def _errors(description: str) -> bytes:
+    return json.dumps({"errors": [{"description": description, "error_number": 1, "error": description}],
+                       "warnings": []}).encode('utf-8')
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so clients keep their connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        fake = self.server.fake
+        with fake._lock:
+            fake.connections += 1
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, body = self.server.fake.handle(url.path, parse_qs(url.query), self.headers)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--port", type=int, default=6820)
+    arg_parser.add_argument("--jobs", type=int, default=10_000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--token", default=None, help="accept only this token (default: any)")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds before each request answers")
+    arg_parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = arg_parser.parse_args(argv)
+
+    cluster = SyntheticCluster(jobs=args.jobs, seed=args.seed, now=time.time())
+    server = FakeSlurmRestd(cluster, port=args.port, token=args.token, latency=args.latency, jitter=args.jitter,
+                            failure_rate=args.failure_rate, seed=args.seed).start()
+    print(f"Fake slurmrestd listening on {server.url} with {len(server.jobs):,} jobs")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"connections {server.connections}  failures {server.failures}  requests {dict(server.requests)}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Load driver: many concurrent dashboard sessions against the backend.
+
+Starts a FakeSlurmHost and simulates sessions that log in, poll /jobs
+(revalidating with If-None-Match, like the app) and /job_graph, then log
+out. The API runs in-process unless --url points at a running server
+(which must be able to reach the fake host). Run from the repository root:
+
+    python -m backend.loadtest.load --sessions 200 --users 20 --duration 60 --latency 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from backend.benchmarks.synthetic import SyntheticCluster
+from backend.loadtest.fake_host import FakeSlurmHost
+
+OPERATIONS = ("login", "jobs", "job_graph", "logout")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for none)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+class LoadStats:
+    """Latencies and failures per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.not_modified = 0
+
+    async def timed(self, operation: str, request) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.errors[operation] += 1
+            print(f"{operation} failed: {type(e).__name__}: {e}")
+            return None
+        self.latencies[operation].append(time.perf_counter() - started)
+        if response.status_code == 304:
+            self.not_modified += 1
+        elif response.status_code >= 400:
+            self.errors[operation] += 1
+            return None
+        return response
+
+
+async def run_session(http: httpx.AsyncClient, index: int, address: str, stats: LoadStats, deadline: float,
+                      users: int, interval: float, graph_every: int, ramp: float, time_range: str):
+    rng = random.Random(index)
+    await asyncio.sleep(rng.uniform(0, ramp))
+    login = {"hostname": address, "username": f"user{index % users:03d}", "password": "load"}
+    response = await stats.timed("login", http.post("/login", json=login))
+    if response is None:
+        return
+    session_id = response.json()["session_id"]
+    params = {"session_id": session_id, "time_range": time_range}
+    etag = None
+    polls = 0
+    while time.monotonic() < deadline:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await stats.timed("jobs", http.get("/jobs", params=params, headers=headers))
+        if response is not None:
+            etag = response.headers.get("etag", etag)
+        if polls % graph_every == 0:
+            await stats.timed("job_graph", http.get("/job_graph", params=params))
+        polls += 1
+        await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+    await stats.timed("logout", http.post("/logout", params={"session_id": session_id}))
+
+
+async def drive(http: httpx.AsyncClient, address: str, sessions: int, duration: float, users: int,
+                interval: float, graph_every: int, ramp: float, time_range: str) -> Dict:
+    stats = LoadStats()
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        run_session(http, i, address, stats, deadline, users, interval, graph_every, ramp, time_range)
+        for i in range(sessions)
+    ))
+    elapsed = time.monotonic() - started
+    ssh = (await http.get("/ssh/stats")).json()
+    requests = sum(len(values) for values in stats.latencies.values())
+    return {
+        "elapsed": elapsed,
+        "requests": requests,
+        "throughput": requests / elapsed if elapsed else 0.0,
+        "not_modified": stats.not_modified,
+        "operations": {
+            op: {
+                "count": len(stats.latencies[op]),
+                "errors": stats.errors[op],
+                "p50_ms": percentile(stats.latencies[op], 50) * 1000,
+                "p99_ms": percentile(stats.latencies[op], 99) * 1000,
+                "max_ms": max(stats.latencies[op], default=0.0) * 1000,
+            }
+            for op in OPERATIONS
+        },
+        "ssh": ssh,
+    }
+
+
+async def run_load(host: FakeSlurmHost, url: Optional[str] = None, sessions: int = 100, duration: float = 30.0,
+                   users: int = 10, interval: float = 5.0, graph_every: int = 3, ramp: float = 5.0,
+                   time_range: str = "24h") -> Dict:
+    """Drive the API against ``host`` and return the report, with remote command counts"""
+    if url is None:
+        from backend.main import app
+        transport = httpx.ASGITransport(app=app)
+        http = httpx.AsyncClient(transport=transport, base_url="http://swatch", timeout=None)
+    else:
+        http = httpx.AsyncClient(base_url=url, timeout=None)
+    async with http:
+        report = await drive(http, host.address, sessions, duration, users, interval, graph_every, ramp,
+                             time_range)
+    report["remote_commands"] = dict(host.commands)
+    report["remote_failures"] = host.failures
+    report["ssh_connections"] = host.connections
+    return report
+
+
+def print_report(report: Dict):
+    print(f"{'operation':<12} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op, row in report["operations"].items():
+        print(f"{op:<12} {row['count']:>7} {row['errors']:>7} {row['p50_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}")
+    print(f"{report['requests']} requests in {report['elapsed']:.1f}s "
+          f"({report['throughput']:.1f}/s, {report['not_modified']} not modified)")
+    commands = "  ".join(f"{name}={count}" for name, count in sorted(report["remote_commands"].items()))
+    print(f"remote commands: {commands}  (failed: {report['remote_failures']})")
+    print(f"ssh connections: {report['ssh_connections']}  pool: {report['ssh']}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sessions", type=int, default=100)
+    arg_parser.add_argument("--users", type=int, default=10, help="distinct cluster users among the sessions")
+    arg_parser.add_argument("--duration", type=float, default=30.0, help="seconds each session keeps polling")
+    arg_parser.add_argument("--interval", type=float, default=5.0, help="mean seconds between polls")
+    arg_parser.add_argument("--graph-every", type=int, default=3, help="fetch /job_graph every N polls")
+    arg_parser.add_argument("--ramp", type=float, default=5.0, help="spread logins over this many seconds")
+    arg_parser.add_argument("--time-range", default="24h")
+    arg_parser.add_argument("--url", default=None, help="a running backend (default: in-process)")
+    arg_parser.add_argument("--jobs", type=int, default=10_000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--latency", type=float, default=0.1)
+    arg_parser.add_argument("--jitter", type=float, default=0.05)
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    arg_parser.add_argument("--drop-rate", type=float, default=0.0)
+    args = arg_parser.parse_args(argv)
+
+    # Keep load runs out of the real sacct history
+    os.environ.setdefault("SWATCH_HISTORY_DB", "")
+    # httpx logs every request at INFO, which would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    cluster = SyntheticCluster(jobs=args.jobs, seed=args.seed, now=time.time())
+    with FakeSlurmHost(cluster, latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                       drop_rate=args.drop_rate, seed=args.seed) as host:
+        print(f"Fake Slurm host on {host.address} with {len(host.jobs):,} jobs")
+        report = asyncio.run(run_load(host, args.url, args.sessions, args.duration, args.users, args.interval,
+                                      args.graph_every, args.ramp, args.time_range))
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
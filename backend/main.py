@@ -1,15 +1,84 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
-import uuid
+from pydantic_core import to_json
+from typing import List, Optional, Dict, Tuple
 import time
-from .slurm.client import SlurmClient, JobInfo, MockClient
-from datetime import datetime
+import os
+import logging
+from .slurm.broker import BrokerError, LocalPollers, RemotePollers
+from .slurm.client import JobInfo, MockClient
+from .slurm.connection import get_default_pool
+from .slurm.details import check_job_ids
+from .slurm.efficiency import MAX_REPORT_ROWS
+from .slurm.graph import JobGraph
+from .slurm.history import USAGE_RETENTION
+from .slurm.encoding import EncodedBody, negotiate_encoding
+from .slurm.fanout import FanOutPoller
+from .slurm.metrics import get_default_registry
+from .slurm.output import OutputUnavailable, TailLimit
+from .slurm.poller import SnapshotPoller
+from .slurm.profiler import SamplingProfiler
+from .slurm.query import InvalidQuery, JobQuery
+from .slurm.scheduler import DEFAULT_POLL_BUDGET
+from .slurm.sessions import get_default_session_store
+from .slurm.units import time_range_seconds
 import asyncio
+import codecs
+
+logging.basicConfig(
+    level=os.environ.get("SWATCH_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="SWATCH API", description="API for Slurm job monitoring")
 
+metrics = get_default_registry()
+REQUEST_SECONDS = metrics.histogram(
+    "swatch_http_request_seconds", "Time from request to response headers, by route and status",
+    ["method", "route", "status"])
+
+
+class RequestMetricsMiddleware:
+    """Observes every request's latency under its route template (e.g. /jobs/summary).
+
+    Latency runs until the response headers are sent, so streams count
+    their time to first byte rather than their whole lifetime.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status_code: int):
+            nonlocal recorded
+            recorded = True
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"],
+                                    route=route.path if route is not None else "unmatched",
+                                    status=str(status_code))
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start" and not recorded:
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not recorded:
+                record(500)
+
+
+app.add_middleware(RequestMetricsMiddleware)
+
 # Configure CORS for Flutter web client
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +88,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active sessions (in a real app, use a more robust solution)
-active_sessions = {}
+# In memory, or in SQLite (SWATCH_SESSION_DB) when several workers share them
+sessions = get_default_session_store()
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SWATCH_SESSION_IDLE_TIMEOUT", "3600"))
+SESSION_SWEEP_INTERVAL = 300
+
+# Job snapshots are shared by every session logged in as the same user on the
+# same cluster, so adding viewers does not add squeue/sacct calls.
+SNAPSHOT_TTL = float(os.environ.get("SWATCH_SNAPSHOT_TTL", "15"))
+# Refresh interval while someone is subscribed to /jobs/stream
+STREAM_INTERVAL = float(os.environ.get("SWATCH_STREAM_INTERVAL", "1"))
+# Polls of an unchanging queue back off up to this (default 4 x SNAPSHOT_TTL),
+# and each cluster gets at most POLL_BUDGET polls a minute (0 for no limit)
+POLL_MAX_INTERVAL = float(os.environ.get("SWATCH_POLL_MAX_INTERVAL", "0")) or None
+POLL_BUDGET = float(os.environ.get("SWATCH_POLL_BUDGET", str(DEFAULT_POLL_BUDGET))) or None
+HEARTBEAT_INTERVAL = float(os.environ.get("SWATCH_HEARTBEAT_INTERVAL", "15"))
+# How long multi-cluster requests wait for each cluster before answering without it
+CLUSTER_TIMEOUT = float(os.environ.get("SWATCH_CLUSTER_TIMEOUT", "10"))
+# With SWATCH_POLLER_ADDRESS set, SSH and polling happen in the poller service
+# (python -m backend.slurm.broker) and this process mirrors its snapshots
+POLLER_ADDRESS = os.environ.get("SWATCH_POLLER_ADDRESS", "")
+if POLLER_ADDRESS:
+    pollers = RemotePollers(POLLER_ADDRESS, ttl=SNAPSHOT_TTL, stream_interval=STREAM_INTERVAL,
+                            token=os.environ.get("SWATCH_POLLER_TOKEN", ""), cluster_timeout=CLUSTER_TIMEOUT)
+else:
+    pollers = LocalPollers(ttl=SNAPSHOT_TTL, stream_interval=STREAM_INTERVAL, cluster_timeout=CLUSTER_TIMEOUT,
+                           max_interval=POLL_MAX_INTERVAL, budget=POLL_BUDGET)
+test_poller = SnapshotPoller(MockClient(), ttl=SNAPSHOT_TTL, stream_interval=STREAM_INTERVAL)
+
+metrics.gauge("swatch_sessions", "Logged-in sessions", function=lambda: len(sessions))
+metrics.gauge("swatch_pollers", "Snapshot pollers, one per cluster and user", function=lambda: len(pollers))
+metrics.gauge("swatch_stream_subscribers", "Open /jobs/stream connections",
+              function=lambda: sum(poller.events.subscriber_count() for poller in pollers)
+              + test_poller.events.subscriber_count())
+# The SSH pool lives in the poller service when there is one; these then stay at zero
+metrics.gauge("swatch_ssh_open_transports", "Authenticated SSH transports in the pool",
+              function=lambda: get_default_pool().stats()["open_transports"])
+metrics.gauge("swatch_ssh_channels_in_use", "SSH channels running a command",
+              function=lambda: get_default_pool().stats()["channels_in_use"])
+metrics.counter("swatch_ssh_handshakes_total", "SSH handshakes performed",
+                function=lambda: get_default_pool().handshakes)
+metrics.counter("swatch_ssh_reconnects_total", "SSH transports re-established after dying",
+                function=lambda: get_default_pool().reconnects)
+
+# Opt-in, since the endpoints expose stack traces of the server
+PROFILER_ENABLED = os.environ.get("SWATCH_PROFILER", "") not in ("", "0", "false")
+profiler = SamplingProfiler()
+
+# How often a waiting request checks whether its HTTP client has gone away
+DISCONNECT_POLL_INTERVAL = 0.5
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """Await ``awaitable``, cancelling it if the HTTP client disconnects first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.debug("Client disconnected, cancelling request")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def get_session_poller(session_id: str, test_mode: bool) -> SnapshotPoller:
+    """Return the snapshot poller serving a session, marking the session active"""
+    if test_mode:
+        return test_poller
+    session = sessions.get(session_id)
+    poller = pollers.poller(session) if session is not None else None
+    if poller is None:
+        # A session opened by another worker is only usable through a poller service
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired session"
+        )
+    return poller
+
+def get_cluster_poller(session_id: str, test_mode: bool, cluster: Optional[str]) -> SnapshotPoller:
+    """The poller of one of the session's clusters, for endpoints that do not merge clusters"""
+    poller = get_session_poller(session_id, test_mode)
+    if not isinstance(poller, FanOutPoller):
+        return poller
+    if cluster is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This session spans several clusters; choose one with the cluster parameter"
+        )
+    if cluster not in poller.members:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cluster {cluster} is not part of this session"
+        )
+    return poller.members[cluster]
+
+@app.exception_handler(BrokerError)
+async def broker_error_handler(request: Request, exc: BrokerError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 class LoginRequest(BaseModel):
     hostname: str
@@ -36,11 +203,36 @@ class LoginResponse(BaseModel):
 class JobResponse(BaseModel):
     jobs: List[JobInfo]
     last_updated: str
+    version: int = 0
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class JobNode(BaseModel):
     job: JobInfo
     dependencies: List[str]
 
+def login_clusters(request_data: dict) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """The (hostname, username) pairs and passwords of a login.
+
+    ``clusters`` lists one object per cluster; a missing username or
+    password falls back to the top-level one. Without it the login is for
+    ``hostname`` alone.
+    """
+    username = request_data.get("username", "")
+    password = request_data.get("password", "")
+    entries = request_data.get("clusters") or [{"hostname": request_data.get("hostname", "")}]
+    clusters, passwords = [], []
+    for entry in entries:
+        hostname = entry.get("hostname", "")
+        if not hostname or hostname in (cluster for cluster, _ in clusters):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Each cluster needs a distinct hostname"
+            )
+        clusters.append((hostname, entry.get("username") or username))
+        passwords.append(entry.get("password") or password)
+    return clusters, passwords
+
 @app.post("/login")
 async def login(request_data: dict):
     # Test mode login
@@ -53,117 +245,548 @@ async def login(request_data: dict):
     else:
         # Real authentication
         try:
-            # Create client and test connection
-            hostname = request_data.get("hostname", "")
+            # Create clients and test the connections
             username = request_data.get("username", "")
-            password = request_data.get("password", "")
+            clusters, passwords = login_clusters(request_data)
             
-            print(f"Attempting real login to {hostname} as {username}")
+            logger.info("Login to %s as %s", ", ".join(cluster for cluster, _ in clusters), username)
             
-            client = SlurmClient(hostname, username, password)
-            if not client.connect():
+            session = sessions.create(*clusters[0], clusters=clusters[1:])
+            try:
+                failed = await pollers.open(session, passwords)
+            except Exception:
+                sessions.pop(session.session_id)
+                raise
+            if failed:
+                sessions.pop(session.session_id)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Authentication failed"
+                    detail=f"Authentication failed on {', '.join(failed)}"
                 )
-                
-            # Create session
-            session_id = str(uuid.uuid4())
-            active_sessions[session_id] = {
-                "client": client,
-                "username": username,
-                "hostname": hostname,
-                "created_at": time.time()
-            }
             
             return {
-                "session_id": session_id,
-                "username": username,
-                "hostname": hostname
+                "session_id": session.session_id,
+                "username": session.username,
+                "hostname": session.hostname,
+                "clusters": [cluster for cluster, _ in clusters],
             }
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"Login error: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Login to %s failed", request_data.get("hostname", ""))
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Login failed: {str(e)}"
             )
 
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def split_values(values: Optional[List[str]]) -> List[str]:
+    """Accept both repeated (?state=A&state=B) and comma-separated (?state=A,B) parameters"""
+    return [value for item in values or [] for value in item.split(",") if value]
+
 @app.get("/jobs", response_model=JobResponse)
-async def get_jobs(session_id: str, time_range: str = "24h", test_mode: bool = False):
-    print(f"Received request with time_range={time_range}")
+async def get_jobs(request: Request, session_id: str, time_range: str = "24h",
+                   test_mode: bool = False, since: Optional[int] = None, columns: bool = False,
+                   state: Optional[List[str]] = Query(None), partition: Optional[List[str]] = Query(None),
+                   cluster: Optional[List[str]] = Query(None), name: Optional[str] = None,
+                   submitted_after: Optional[float] = None, submitted_before: Optional[float] = None,
+                   ended_after: Optional[float] = None, ended_before: Optional[float] = None,
+                   sort: str = "job_id", limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Jobs of the selected time range.
+
+    With any of the filter, sort or paging parameters the result is one page
+    of matching jobs, answered from the snapshot's indexes; ``next_cursor``
+    fetches the page after it. Sessions on several clusters get the jobs of
+    every cluster that answered, and ``clusters`` reports each one's status.
+    """
+    logger.debug("Jobs request with time_range=%s", time_range)
+    poller = get_session_poller(session_id, test_mode)
+    try:
+        query = JobQuery(
+            states=split_values(state), partitions=split_values(partition), clusters=split_values(cluster),
+            name=name,
+            submitted_after=submitted_after, submitted_before=submitted_before,
+            ended_after=ended_after, ended_before=ended_before,
+            sort=sort, limit=limit, cursor=cursor,
+        )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    paged = query != JobQuery()
     
-    if test_mode:
-        client = MockClient()
-        active_jobs = client.get_jobs()
-        completed_jobs = client.get_completed_jobs(time_range)
-        print(f"Active jobs: {len(active_jobs)}, Completed jobs: {len(completed_jobs)}")
-        jobs = active_jobs + completed_jobs
+    try:
+        snapshot = await cancel_on_disconnect(request, poller.get_snapshot(time_range))
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+            detail=f"Failed to retrieve jobs: {str(e)}"
+        )
+    
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    last_updated = snapshot.last_updated
+    if since is not None:
+        # Only what changed since the client's version, if we still have it
+        delta = poller.delta(time_range, since)
+        body = {"version": snapshot.version, "since": since, "last_updated": last_updated}
+        if delta is None:
+            body.update(full=True, jobs=snapshot.jobs)
+        else:
+            body.update(full=False, **delta)
+        if snapshot.clusters is not None:
+            body["clusters"] = snapshot.clusters
+        return Response(content=to_json(body), media_type="application/json", headers=headers)
+    if paged:
+        try:
+            page = snapshot.index.query(query)
+        except InvalidQuery as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        body = {
+            "jobs": page.jobs,
+            "last_updated": last_updated,
+            "version": snapshot.version,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+        }
+        if snapshot.clusters is not None:
+            body["clusters"] = snapshot.clusters
+        return Response(content=to_json(body), media_type="application/json", headers=headers)
+
+    # The full list is the same bytes for every viewer of this snapshot.
+    # Columns are one array per field; much smaller and faster to encode.
+    layout = "columns" if columns else "rows"
+    if snapshot.has_body(layout):
+        body = snapshot.body(layout)
     else:
-        if session_id not in active_sessions:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired session"
-            )
-            
-        session = active_sessions[session_id]
-        client = session["client"]
-        
+        body = await asyncio.to_thread(snapshot.body, layout)
+    return await encoded_response(request, body, headers)
+
+async def encoded_response(request: Request, body: EncodedBody, headers: Dict[str, str]) -> Response:
+    """Send a cached body in the best coding the client accepts"""
+    coding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if body.has(coding):
+        content, coding = body.get(coding)
+    else:
+        # Compressing a large body the first time takes a while; keep the loop free
+        content, coding = await asyncio.to_thread(body.get, coding)
+    headers = dict(headers, Vary="Accept-Encoding")
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+@app.get("/jobs/summary")
+async def get_jobs_summary(request: Request, session_id: str, time_range: str = "24h", test_mode: bool = False):
+    """Counts by state, partition and user, allocated TRES and CPU-hours of the time range"""
+    poller = get_session_poller(session_id, test_mode)
+    try:
+        snapshot = await cancel_on_disconnect(request, poller.get_snapshot(time_range))
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve jobs: {str(e)}"
+        )
+    summary = poller.aggregates(time_range).to_dict()
+    summary["version"] = snapshot.version
+    summary["last_updated"] = snapshot.last_updated
+    if snapshot.clusters is not None:
+        summary["clusters"] = snapshot.clusters
+    return summary
+
+@app.get("/metrics/timeline")
+async def get_metrics_timeline(session_id: str, time_range: str = "24h", test_mode: bool = False,
+                               start: Optional[float] = None, end: Optional[float] = None,
+                               resolution: Optional[str] = None, metrics: Optional[List[str]] = Query(None),
+                               cluster: Optional[str] = None):
+    """Queue metrics over time, one aligned point per bucket of the chosen resolution"""
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    end = time.time() if end is None else end
+    start = end - time_range_seconds(time_range) if start is None else start
+    try:
+        return poller.timeline.query(start, end, resolution, split_values(metrics))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def sse_event(event: str, data: Dict, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Events frame"""
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {to_json(data).decode('utf-8')}\n\n"
+
+def snapshot_event(snapshot) -> str:
+    return sse_event("snapshot", {
+        "version": snapshot.version,
+        "jobs": snapshot.jobs,
+        "last_updated": snapshot.last_updated,
+    }, snapshot.version)
+
+def change_events(version: int, delta: Dict) -> List[str]:
+    """Turn a snapshot delta into add, update and remove events"""
+    frames = []
+    if delta["added"]:
+        frames.append(sse_event("add", {"version": version, "jobs": delta["added"]}, version))
+    if delta["changed"]:
+        frames.append(sse_event("update", {"version": version, "jobs": delta["changed"]}, version))
+    if delta["removed"]:
+        frames.append(sse_event("remove", {"version": version, "job_ids": delta["removed"]}, version))
+    return frames
+
+@app.get("/jobs/stream")
+async def stream_jobs(request: Request, session_id: str, time_range: str = "24h", test_mode: bool = False,
+                      cluster: Optional[str] = None):
+    """Push job add, update and remove events as Server-Sent Events.
+
+    The stream starts with a full snapshot, or with only the changes since
+    the version in Last-Event-ID when reconnecting. A client that falls too
+    far behind is sent a fresh snapshot instead of the events it missed.
+    Sessions on several clusters stream one ``cluster`` at a time.
+    """
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    # Subscribe before reading the snapshot so no change can slip in between
+    subscription = poller.subscribe(time_range)
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        snapshot = await cancel_on_disconnect(request, poller.get_snapshot(time_range))
+    except (HTTPException, BrokerError):
+        poller.events.unsubscribe(subscription)
+        raise
+    except Exception as e:
+        poller.events.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve jobs: {str(e)}"
+        )
+
+    async def events():
+        nonlocal snapshot
         try:
-            active_jobs = client.get_jobs()
-            completed_jobs = client.get_completed_jobs(time_range)
-            jobs = active_jobs + completed_jobs
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-                detail=f"Failed to retrieve jobs: {str(e)}"
-            )
-    
+            delta = None
+            if last_event_id and last_event_id.isdigit():
+                delta = poller.delta(time_range, int(last_event_id))
+            if delta is None:
+                yield snapshot_event(snapshot)
+            else:
+                for frame in change_events(snapshot.version, delta):
+                    yield frame
+            version = snapshot.version
+
+            while not await request.is_disconnected():
+                event = await subscription.next(HEARTBEAT_INTERVAL)
+                if event is None:
+                    if not test_mode:
+                        # An open stream counts as activity
+                        sessions.get(session_id)
+                    yield sse_event("heartbeat", {"version": version, "time": time.time()})
+                elif event["type"] == "closed":
+                    break
+                elif event["type"] == subscription.RESYNC:
+                    snapshot = poller.current(time_range) or await poller.get_snapshot(time_range)
+                    version = snapshot.version
+                    yield snapshot_event(snapshot)
+                elif event["version"] > version:
+                    version = event["version"]
+                    for frame in change_events(version, event):
+                        yield frame
+        finally:
+            poller.events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def load_job_details(request: Request, poller, job_ids: List[str]) -> Dict[str, Dict]:
+    try:
+        return await cancel_on_disconnect(request, poller.get_details(job_ids))
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve job details: {str(e)}"
+        )
+
+@app.get("/jobs/details")
+async def get_job_details(request: Request, session_id: str, ids: List[str] = Query(...), test_mode: bool = False,
+                          cluster: Optional[str] = None):
+    """Full records of several jobs, from scontrol or, once slurmctld has forgotten them, sacct.
+
+    Whatever is not cached is fetched in one batch. Records of finished
+    jobs never change and are cached for good; ``final`` says which ones
+    those are.
+    """
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    try:
+        job_ids = check_job_ids(split_values(ids))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    records = await load_job_details(request, poller, job_ids)
     return {
-        "jobs": jobs,
-        "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "jobs": [records[job_id] for job_id in job_ids if job_id in records],
+        "missing": [job_id for job_id in job_ids if job_id not in records],
     }
 
+def output_error(e: Exception) -> Tuple[int, str]:
+    if isinstance(e, BrokerError):
+        return e.status_code, e.detail
+    if isinstance(e, TailLimit):
+        return status.HTTP_429_TOO_MANY_REQUESTS, str(e)
+    if isinstance(e, OutputUnavailable):
+        return status.HTTP_404_NOT_FOUND, str(e)
+    return status.HTTP_502_BAD_GATEWAY, f"Failed to read job output: {str(e)}"
+
+@app.get("/jobs/{job_id}/output")
+async def stream_job_output(request: Request, job_id: str, session_id: str, stream: str = "stdout",
+                            offset: int = 0, follow: bool = True, test_mode: bool = False,
+                            cluster: Optional[str] = None):
+    """Stream a job's stdout or stderr file as Server-Sent Events.
+
+    Each ``output`` event has the byte offset its text ends at as its id,
+    so a reconnecting EventSource resumes from Last-Event-ID instead of
+    reading the file again from the start. ``offset`` is where to start
+    otherwise; a negative one counts back from the end of the file. With
+    ``follow`` the file is tailed over one SSH channel for as long as the
+    client stays; without, the stream ends with an ``eof`` event.
+    """
+    if stream not in ("stdout", "stderr"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="stream must be stdout or stderr")
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    try:
+        check_job_ids([job_id])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    record = (await load_job_details(request, poller, [job_id])).get(job_id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+    path = record[stream]
+    if not path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} has no {stream} file")
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    async def events():
+        chunks = poller.tail_job(job_id, stream, offset, follow, HEARTBEAT_INTERVAL)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        position = offset if offset >= 0 else None
+        try:
+            yield sse_event("open", {"job_id": job_id, "stream": stream, "path": path, "final": record["final"]})
+            async for end, data in chunks:
+                if not data:
+                    if not test_mode:
+                        # An open stream counts as activity
+                        sessions.get(session_id)
+                    yield sse_event("heartbeat", {"offset": position, "time": time.time()})
+                    continue
+                text = decoder.decode(data)
+                # Bytes of a character split across chunks wait for the next one
+                position = end - len(decoder.getstate()[0])
+                if text:
+                    yield sse_event("output", {"offset": position, "text": text}, position)
+            yield sse_event("eof", {"offset": position})
+        except Exception as e:
+            code, detail = output_error(e)
+            yield sse_event("error", {"status": code, "detail": detail})
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/nodes")
+async def get_nodes(request: Request, session_id: str, test_mode: bool = False, cluster: Optional[str] = None,
+                    partition: Optional[str] = None, state: Optional[List[str]] = Query(None),
+                    job_id: Optional[str] = None):
+    """Node counts by state for the cluster and each partition, with compressed hostlists.
+
+    With ``partition``, ``state`` or ``job_id``, ``selected`` describes the
+    nodes matching all of them, e.g. the idle nodes of a partition or the
+    nodes a job runs on.
+    """
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    try:
+        nodes = await cancel_on_disconnect(request, poller.get_nodes())
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve nodes: {str(e)}"
+        )
+    states = split_values(state)
+    job_nodes = None
+    if job_id is not None:
+        try:
+            job_ids = check_job_ids([job_id])
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        records = await load_job_details(request, poller, job_ids)
+        if job_id not in records:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+        job_nodes = nodes.index.bitmap(records[job_id]["fields"].get("NodeList"))
+    result = dict(nodes.summary(), version=nodes.version, fetched_at=nodes.fetched_at)
+    if partition is not None or states or job_nodes is not None:
+        result["selected"] = nodes.describe(nodes.select(partition, states, job_nodes))
+    return result
+
+@app.get("/efficiency")
+async def get_efficiency(request: Request, session_id: str, test_mode: bool = False, cluster: Optional[str] = None,
+                         days: int = 30, all_users: bool = False, limit: int = 20):
+    """seff-style CPU and memory efficiency of the jobs that ended in the last ``days``.
+
+    Totals, rollups per user and per job name (most wasted core-hours
+    first) and the most wasteful jobs. History not yet cached is fetched a
+    week at a time for a few seconds per request; until it reaches back far
+    enough, ``complete`` is false and ``covered_from`` says how far it
+    does. ``all_users`` covers every user's jobs the login may see.
+    """
+    if not 1 <= days <= USAGE_RETENTION // 86400:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"days must be between 1 and {USAGE_RETENTION // 86400}")
+    if not 1 <= limit <= MAX_REPORT_ROWS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"limit must be between 1 and {MAX_REPORT_ROWS}")
+    poller = get_cluster_poller(session_id, test_mode, cluster)
+    try:
+        return await cancel_on_disconnect(request, poller.get_efficiency(days, all_users, limit))
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve efficiency: {str(e)}"
+        )
+
+async def load_job_graph(request: Request, session_id: str, time_range: str, test_mode: bool):
+    """Return the session's incrementally maintained dependency graph"""
+    poller = get_session_poller(session_id, test_mode)
+    try:
+        return await cancel_on_disconnect(request, poller.get_graph(time_range))
+    except (HTTPException, BrokerError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve jobs: {str(e)}"
+        )
+
+def graph_job_ids(graph: JobGraph, root: Optional[str], direction: str) -> Optional[List[str]]:
+    """Pick the part of the graph a request asked for (None means all of it)"""
+    if root is None:
+        return None
+    if direction not in ("descendants", "ancestors"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="direction must be 'descendants' or 'ancestors'"
+        )
+    if root not in graph.jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {root} not found"
+        )
+    return graph.related(root, direction)
+
 @app.get("/job_graph")
-async def get_job_graph(session_id: str, time_range: str = "24h", test_mode: bool = False):
-    print(f"Graph request with time_range={time_range}")
-    
-    if test_mode:
-        client = MockClient()
-        active_jobs = client.get_jobs()
-        completed_jobs = client.get_completed_jobs(time_range)
-        jobs = active_jobs + completed_jobs
-        print(f"Graph: Found {len(jobs)} jobs ({len(active_jobs)} active, {len(completed_jobs)} completed)")
-    else:
-        if session_id not in active_sessions:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid session"
-            )
-        client = active_sessions[session_id]["client"]
-        jobs = client.get_jobs() + client.get_completed_jobs(time_range)
-    
-    job_graph = {}
-    for job in jobs:
-        dependencies = client.get_job_dependencies(job.job_id)
-        # Only include dependencies that exist in our current job list
-        valid_deps = [dep for dep in dependencies if any(j.job_id == dep for j in jobs)]
-        job_graph[job.job_id] = {"job": job, "dependencies": valid_deps}
-    
-    print(f"Returning job graph with {len(job_graph)} nodes")
-    return job_graph
+async def get_job_graph(request: Request, session_id: str, time_range: str = "24h", test_mode: bool = False,
+                        root: Optional[str] = None, direction: str = "descendants"):
+    logger.debug("Graph request with time_range=%s", time_range)
+    graph = await load_job_graph(request, session_id, time_range, test_mode)
+    job_graph = graph.to_dict(graph_job_ids(graph, root, direction))
+    logger.debug("Returning job graph with %d nodes", len(job_graph))
+    clusters = getattr(graph, "clusters", None)
+    if clusters is None:
+        return job_graph
+    # Node ids are cluster/job_id; which clusters answered goes in the headers
+    return Response(content=to_json(job_graph), media_type="application/json", headers={
+        "X-Clusters-Answered": ",".join(name for name, state in clusters.items() if state["ok"]),
+        "X-Clusters-Missing": ",".join(name for name, state in clusters.items() if not state["ok"]),
+    })
+
+@app.get("/job_graph/layout")
+async def get_job_graph_layout(request: Request, session_id: str, time_range: str = "24h", test_mode: bool = False,
+                               root: Optional[str] = None, direction: str = "descendants"):
+    """The graph plus its precomputed layout, critical path and latest change set"""
+    graph = await load_job_graph(request, session_id, time_range, test_mode)
+    nodes = graph.to_dict(graph_job_ids(graph, root, direction))
+    delta = graph.last_delta
+    layout = {
+        "version": graph.version,
+        "nodes": nodes,
+        "layers": max((node["layer"] for node in nodes.values()), default=-1) + 1,
+        "critical_path": graph.critical_path(),
+        "last_change": {
+            "added_nodes": delta.added_nodes,
+            "removed_nodes": delta.removed_nodes,
+            "changed_nodes": delta.changed_nodes,
+            "added_edges": delta.added_edges,
+            "removed_edges": delta.removed_edges,
+        },
+    }
+    if getattr(graph, "clusters", None) is not None:
+        layout["clusters"] = graph.clusters
+    return layout
+
+@app.get("/ssh/stats")
+async def get_ssh_stats():
+    """Connection pool statistics: open transports, channels in use, reconnects and handshake times"""
+    return await pollers.ssh_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def require_profiler():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiler is disabled (set SWATCH_PROFILER=1)")
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval: float = 0.005):
+    """Start sampling every thread's stack every ``interval`` seconds"""
+    require_profiler()
+    profiler.interval = max(interval, 0.001)
+    profiler.start()
+    return {"running": True, "interval": profiler.interval}
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler(limit: int = 20):
+    """Stop sampling and return the functions most samples were in"""
+    require_profiler()
+    profiler.stop()
+    return {
+        "running": False,
+        "samples": profiler.samples,
+        "seconds": round(time.time() - profiler.started_at, 3) if profiler.started_at else 0.0,
+        "top": profiler.top(limit),
+    }
+
+@app.get("/debug/profiler/collapsed", response_class=PlainTextResponse)
+async def get_profiler_stacks():
+    """Sampled stacks in collapsed format, for flame graph tools"""
+    require_profiler()
+    return PlainTextResponse(profiler.collapsed())
 
 @app.post("/logout")
 async def logout(session_id: str):
-    if session_id in active_sessions:
-        # Close client connection
-        client = active_sessions[session_id]["client"]
-        if hasattr(client, "disconnect"):
-            client.disconnect()
-        
-        # Remove session
-        del active_sessions[session_id]
+    session = sessions.pop(session_id)
+    if session is not None:
+        await pollers.close(session)
     
     return {"detail": "Logged out successfully"}
 
@@ -173,21 +796,17 @@ async def startup_event():
     asyncio.create_task(cleanup_sessions())
 
 async def cleanup_sessions():
-    """Periodically clean up expired sessions"""
+    """Periodically log out sessions that have not been used for a while"""
     while True:
-        await asyncio.sleep(300)  # Check every 5 minutes
-        current_time = time.time()
-        expired_sessions = []
-        
-        for session_id, session in active_sessions.items():
-            # Sessions expire after 1 hour of inactivity
-            if current_time - session["created_at"] > 3600:
-                expired_sessions.append(session_id)
-        
-        for session_id in expired_sessions:
-            session = active_sessions[session_id]
-            client = session.get("client")
-            if client:
-                client.disconnect()
-            del active_sessions[session_id]
-            print(f"Cleaned up expired session: {session_id}") 
\ No newline at end of file
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        await expire_sessions()
+
+async def expire_sessions():
+    for session in sessions.expire(SESSION_IDLE_TIMEOUT):
+        try:
+            await pollers.close(session)
+        except Exception as e:
+            logger.warning("Closing expired session %s failed: %s", session.session_id, e)
+        logger.info("Cleaned up expired session: %s", session.session_id)
+    # Mirrors of users whose sessions all ended, possibly on another worker
+    pollers.prune(sessions.sessions())
@@ -0,0 +1,116 @@
+import time
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from .models import JobInfo, JobState
+
+# States in which a job holds its allocation
+ALLOCATED_STATES = {JobState.RUNNING, JobState.COMPLETING, JobState.SUSPENDED}
+
+
+class JobAggregates:
+    """Queue and usage totals of a job list, kept up to date snapshot by snapshot.
+
+    ``update`` compares the new job list with the previous one and only
+    adds or subtracts the contributions of jobs that appeared, changed or
+    went away, so reading the totals never scans the jobs. CPU time of
+    running jobs grows with the clock; it is kept as the sums of CPUs and of
+    CPUs times start time, and evaluated at read time.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.total = 0
+        self.by_state: Counter = Counter()
+        self.by_tag: Counter = Counter()
+        self.by_partition: Counter = Counter()
+        self.by_user: Counter = Counter()
+        self.allocated: Counter = Counter()
+        self.pending: Counter = Counter()
+        self._jobs: Dict[str, JobInfo] = {}
+        self._finished_cpu_seconds = 0
+        self._running_cpus = 0
+        self._running_cpu_starts = 0.0
+
+    def update(self, jobs: Iterable[JobInfo]) -> int:
+        """Apply a new job list; returns how many jobs changed"""
+        new_jobs: Dict[str, JobInfo] = {}
+        for job in jobs:
+            # Running jobs are reported by both squeue and sacct; keep the first
+            new_jobs.setdefault(job.job_id, job)
+
+        changes = 0
+        for job_id, old in self._jobs.items():
+            new = new_jobs.get(job_id)
+            if new is None or (new is not old and new != old):
+                self._apply(old, -1)
+                changes += 1
+        for job_id, new in new_jobs.items():
+            old = self._jobs.get(job_id)
+            if old is None or (new is not old and new != old):
+                self._apply(new, 1)
+                changes += old is None
+        self._jobs = new_jobs
+        if changes:
+            self.version += 1
+        return changes
+
+    def _apply(self, job: JobInfo, sign: int):
+        self.total += sign
+        self.by_state[str(job.status)] += sign
+        self.by_tag[job.tag] += sign
+        self.by_partition[job.partition] += sign
+        self.by_user[job.user] += sign
+        if job.status in ALLOCATED_STATES:
+            self.allocated["jobs"] += sign
+            self.allocated["cpus"] += sign * job.cpus
+            self.allocated["gpus"] += sign * job.gpus
+            self.allocated["nodes"] += sign * job.nodes
+            self.allocated["memory"] += sign * job.memory
+            if job.start_time:
+                self._running_cpus += sign * job.cpus
+                self._running_cpu_starts += sign * job.cpus * job.start_time
+        elif job.status == JobState.PENDING:
+            self.pending["jobs"] += sign
+            self.pending["cpus"] += sign * job.cpus
+            self.pending["gpus"] += sign * job.gpus
+        elif job.time:
+            # For finished jobs sacct reports the elapsed time
+            self._finished_cpu_seconds += sign * job.cpus * job.time
+
+    def cpu_hours(self, now: Optional[float] = None) -> float:
+        """CPU-hours used by the jobs in the window, running jobs up to ``now``"""
+        now = time.time() if now is None else now
+        running = self._running_cpus * now - self._running_cpu_starts
+        return (self._finished_cpu_seconds + max(running, 0.0)) / 3600
+
+    def to_dict(self, now: Optional[float] = None) -> Dict:
+        def counts(counter: Counter) -> Dict[str, int]:
+            return {key: value for key, value in counter.items() if value}
+
+        return {
+            "total": self.total,
+            "by_state": counts(self.by_state),
+            "by_tag": counts(self.by_tag),
+            "by_partition": counts(self.by_partition),
+            "by_user": counts(self.by_user),
+            "allocated": {key: self.allocated[key] for key in ("jobs", "cpus", "gpus", "nodes", "memory")},
+            "pending": {key: self.pending[key] for key in ("jobs", "cpus", "gpus")},
+            "cpu_hours": round(self.cpu_hours(now), 2),
+        }
+
+
+def combine_summaries(summaries: Dict[str, Dict]) -> Dict:
+    """Add up the ``JobAggregates.to_dict`` of several clusters, keyed by cluster"""
+    combined = JobAggregates().to_dict()
+    for summary in summaries.values():
+        for key, value in summary.items():
+            if isinstance(value, dict):
+                totals = combined[key]
+                for name, count in value.items():
+                    totals[name] = totals.get(name, 0) + count
+            else:
+                combined[key] += value
+    combined["cpu_hours"] = round(combined["cpu_hours"], 2)
+    combined["by_cluster"] = {cluster: summary["total"] for cluster, summary in summaries.items()}
+    return combined
@@ -0,0 +1,582 @@
+"""Poller service: one process owns the SSH connections and the polling.
+
+Run several API workers (uvicorn --workers N, or servers on several hosts)
+with SWATCH_POLLER_ADDRESS pointing here and SWATCH_SESSION_DB at a shared
+session store. Logins are forwarded to this process, which opens the SSH
+client and polls the cluster once per (hostname, username); workers keep
+a mirror of each snapshot, asking only for jobs when its version changed,
+so every worker hands out the same versions and ETags. Job details and
+output tails are relayed here too, since this process holds the SSH
+connections, and node states are mirrored like snapshots. Every request
+about a cluster names the session it is made for, and only output files
+named in that user's job records are tailed. Listening on TCP requires
+SWATCH_POLLER_TOKEN. From the repository root:
+
+    python -m backend.slurm.broker --listen /run/swatch/poller.sock
+"""
+import argparse
+import asyncio
+import base64
+import hmac
+import inspect
+import json
+import logging
+import os
+import struct
+import time
+from operator import attrgetter
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from .client import SlurmClient
+from .connection import get_default_pool, split_host_port
+from .details import JOB_ID, check_job_ids
+from .executor import get_default_executor
+from .fanout import CLUSTER_TIMEOUT, SessionPollers
+from .history import get_default_history
+from .models import JOB_FIELDS, JobInfo
+from .nodes import NodeGroup
+from .output import OutputUnavailable, TailLimit
+from .poller import JobSnapshot, PollerRegistry, SnapshotPoller
+from .rest import RestClient, is_rest_url
+from .scheduler import DEFAULT_POLL_BUDGET, PollScheduler
+from .sessions import Session, SqliteSessionStore
+
+logger = logging.getLogger(__name__)
+
+# Messages are a 4-byte big-endian length followed by that much JSON
+_LENGTH = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+_row = attrgetter(*JOB_FIELDS)
+
+# Connections an API worker keeps open to the poller service between requests
+MAX_IDLE_CONNECTIONS = 4
+
+
+class BrokerError(Exception):
+    """An error answered by the poller service, with the HTTP status it maps to"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def write_message(writer: asyncio.StreamWriter, message: Dict):
+    payload = to_json(message)
+    writer.write(_LENGTH.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Dict:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {length} bytes is too large")
+    return json.loads(await reader.readexactly(length))
+
+
+def encode_jobs(jobs: List[JobInfo]) -> List[Tuple]:
+    """Jobs as rows of field values, in JOB_FIELDS order"""
+    return [_row(job) for job in jobs]
+
+
+def decode_jobs(rows: List[List]) -> List[JobInfo]:
+    return [JobInfo(*row) for row in rows]
+
+
+def default_client_factory(hostname: str, username: str, password: str):
+    """A client for one cluster: over slurmrestd when the hostname is its URL, over SSH otherwise"""
+    if is_rest_url(hostname):
+        return RestClient(hostname, username, password, history=get_default_history())
+    return SlurmClient(hostname, username, password, history=get_default_history())
+
+
+class LocalPollers(SessionPollers):
+    """Slurm clients (SSH or slurmrestd) and snapshot pollers of the sessions, in this process.
+
+    Used directly by a single API process, and by the poller service on
+    behalf of the workers.
+    """
+
+    def __init__(self, ttl: float = 15.0, stream_interval: float = 1.0,
+                 client_factory: Callable = default_client_factory, cluster_timeout: float = CLUSTER_TIMEOUT,
+                 max_interval: Optional[float] = None, budget: Optional[float] = DEFAULT_POLL_BUDGET):
+        super().__init__(cluster_timeout)
+        self.registry = PollerRegistry(ttl=ttl, stream_interval=stream_interval, max_interval=max_interval,
+                                       budget=budget)
+        self.client_factory = client_factory
+        self._clients: Dict[str, List[Tuple[str, str, object]]] = {}
+
+    async def open(self, session: Session, passwords: List[str]) -> List[str]:
+        """Connect to each of the session's clusters at once.
+
+        Returns the clusters where authentication failed; unless that is
+        none, no connection is kept.
+        """
+        clients = [self.client_factory(hostname, username, password)
+                   for (hostname, username), password in zip(session.clusters, passwords)]
+        executor = get_default_executor()
+        connected = await asyncio.gather(*(executor.run(client.connect) for client in clients))
+        failed = [hostname for (hostname, _), ok in zip(session.clusters, connected) if not ok]
+        if failed:
+            for client, ok in zip(clients, connected):
+                if ok and hasattr(client, "disconnect"):
+                    client.disconnect()
+            return failed
+        for (hostname, username), client in zip(session.clusters, clients):
+            self.attach(session, client, hostname, username)
+        return []
+
+    def attach(self, session: Session, client, hostname: Optional[str] = None,
+               username: Optional[str] = None) -> SnapshotPoller:
+        """Serve ``session`` on one of its clusters (by default the first) through a connected client"""
+        hostname = hostname or session.hostname
+        username = username or session.username
+        self._clients.setdefault(session.session_id, []).append((hostname, username, client))
+        return self.registry.acquire(hostname, username, client)
+
+    def member(self, session: Session, hostname: str, username: str) -> Optional[SnapshotPoller]:
+        # None if the session was opened by another process
+        if session.session_id not in self._clients:
+            return None
+        return self.registry.get(hostname, username)
+
+    async def close(self, session: Session):
+        for hostname, username, client in self._clients.pop(session.session_id, []):
+            self.registry.release(hostname, username, client)
+            if hasattr(client, "disconnect"):
+                client.disconnect()
+
+    async def ssh_stats(self) -> Dict:
+        return get_default_pool().stats()
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+    def __iter__(self):
+        return iter(self.registry)
+
+
+class BrokerSource:
+    """Stands in for a Slurm client, fetching snapshots from the poller service.
+
+    Requests are made for ``session_id``, the latest session of this user
+    that asked for the cluster; the service checks it is still logged in.
+    """
+
+    def __init__(self, broker: "RemotePollers", hostname: str, username: str, session_id: str = ""):
+        self.broker = broker
+        self.hostname = hostname
+        self.username = username
+        self.session_id = session_id
+        self._last: Dict[str, JobSnapshot] = {}
+        self._nodes: Tuple[Optional[str], List[NodeGroup]] = (None, [])
+
+    async def fetch_snapshot(self, time_range: str) -> JobSnapshot:
+        known = self._last.get(time_range)
+        reply = await self.broker.call(
+            "snapshot", session_id=self.session_id, hostname=self.hostname, time_range=time_range,
+            version=known.version if known is not None else None,
+        )
+        if "active_jobs" in reply:
+            active_jobs, completed_jobs = decode_jobs(reply["active_jobs"]), decode_jobs(reply["completed_jobs"])
+        else:
+            # Same version as the mirror already holds
+            active_jobs, completed_jobs = known.active_jobs, known.completed_jobs
+        snapshot = JobSnapshot(
+            time_range=time_range,
+            active_jobs=active_jobs,
+            completed_jobs=completed_jobs,
+            fetched_at=reply["fetched_at"],
+            version=reply["version"],
+            digest=reply["digest"],
+            checked_at=reply["checked_at"],
+        )
+        self._last[time_range] = snapshot
+        return snapshot
+
+    async def fetch_job_details(self, job_ids: List[str]) -> Dict[str, Dict]:
+        reply = await self.broker.call("details", session_id=self.session_id, hostname=self.hostname,
+                                       job_ids=job_ids)
+        return reply["records"]
+
+    async def fetch_efficiency(self, days: int, all_users: bool = False, limit: int = 20) -> Dict:
+        reply = await self.broker.call("efficiency", session_id=self.session_id, hostname=self.hostname,
+                                       days=days, all_users=all_users, limit=limit)
+        return reply["report"]
+
+    async def fetch_nodes(self) -> List[NodeGroup]:
+        digest, groups = self._nodes
+        reply = await self.broker.call("nodes", session_id=self.session_id, hostname=self.hostname, digest=digest)
+        if "groups" in reply:
+            groups = [NodeGroup(*row) for row in reply["groups"]]
+            self._nodes = (reply["digest"], groups)
+        return groups
+
+    async def tail_job(self, job_id: str, stream: str = "stdout", offset: int = 0, follow: bool = False,
+                       idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+        messages = self.broker.stream("tail", session_id=self.session_id, hostname=self.hostname, job_id=job_id,
+                                      stream=stream, offset=offset, follow=follow, idle=idle)
+        try:
+            async for message in messages:
+                yield message["offset"], base64.b64decode(message["data"])
+        finally:
+            await messages.aclose()
+
+
+class RemotePollers(SessionPollers):
+    """Snapshot pollers of an API worker, mirroring those of the poller service.
+
+    The mirrors refresh every ``ttl`` or ``stream_interval`` seconds, as
+    local pollers would without adapting, but each refresh is a round trip
+    to the service rather than to the cluster. The service's own pollers
+    adapt to the cluster and keep to its budget.
+    """
+
+    def __init__(self, address: str, ttl: float = 15.0, stream_interval: float = 1.0, token: str = "",
+                 cluster_timeout: float = CLUSTER_TIMEOUT):
+        super().__init__(cluster_timeout)
+        self.address = address
+        self.ttl = ttl
+        self.stream_interval = stream_interval
+        self.token = token
+        self._pollers: Dict[Tuple[str, str], SnapshotPoller] = {}
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _connect(self):
+        if self.address.startswith("/"):
+            return await asyncio.open_unix_connection(self.address)
+        host, port = split_host_port(self.address, default_port=0)
+        return await asyncio.open_connection(host, port)
+
+    async def call(self, op: str, **args) -> Dict:
+        """Send one request to the poller service and return its reply.
+
+        Requests go over an idle connection left by an earlier call when
+        there is one. If the service closed it, e.g. on a restart, the
+        request is sent again over a new connection.
+        """
+        request = {"op": op, "token": self.token, **args}
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                await write_message(writer, request)
+                reply = await read_message(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # Cancelled or failed mid-request: the reply could still arrive
+                writer.close()
+                raise
+            break
+        if len(self._idle) < MAX_IDLE_CONNECTIONS:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        if "error" in reply:
+            raise BrokerError(reply.get("status", 502), reply["error"])
+        return reply
+
+    async def stream(self, op: str, **args) -> AsyncIterator[Dict]:
+        """Send one request whose reply is a series of messages, and yield them as they come"""
+        reader, writer = await self._connect()
+        try:
+            await write_message(writer, {"op": op, "token": self.token, **args})
+            while True:
+                message = await read_message(reader)
+                if "error" in message:
+                    raise BrokerError(message.get("status", 502), message["error"])
+                if message.get("end"):
+                    return
+                yield message
+        finally:
+            writer.close()
+
+    async def open(self, session: Session, passwords: List[str]) -> List[str]:
+        reply = await self.call("login", session_id=session.session_id, clusters=session.clusters,
+                                passwords=passwords)
+        return reply["failed"]
+
+    def member(self, session: Session, hostname: str, username: str) -> SnapshotPoller:
+        key = (hostname, username)
+        poller = self._pollers.get(key)
+        if poller is None:
+            scheduler = PollScheduler(hostname, ttl=self.ttl, stream_interval=self.stream_interval, budget=None,
+                                      sdiag_interval=None, idle_backoff=False)
+            poller = SnapshotPoller(BrokerSource(self, hostname, username),
+                                    ttl=self.ttl, stream_interval=self.stream_interval, scheduler=scheduler)
+            self._pollers[key] = poller
+        poller.client.session_id = session.session_id
+        return poller
+
+    async def close(self, session: Session):
+        await self.call("logout", session_id=session.session_id)
+
+    def prune(self, sessions: Iterable[Session]):
+        """Stop the mirrors no remaining session uses"""
+        sessions = list(sessions)
+        super().prune(sessions)
+        live = {cluster for session in sessions for cluster in session.clusters}
+        for key in list(self._pollers):
+            if key not in live:
+                self._pollers.pop(key).stop()
+        if not self._pollers:
+            self.close_connections()
+
+    def close_connections(self):
+        """Close the idle connections to the poller service"""
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    async def ssh_stats(self) -> Dict:
+        return (await self.call("ssh_stats"))["stats"]
+
+    def __len__(self) -> int:
+        return len(self._pollers)
+
+    def __iter__(self):
+        return iter(list(self._pollers.values()))
+
+
+class BrokerServer:
+    """Serves logins and snapshots of ``pollers`` to API workers over a socket.
+
+    Requests about a cluster are only answered for sessions that logged in
+    here and, with a shared session ``store``, are still in it.
+    """
+
+    def __init__(self, pollers: LocalPollers, token: str = "", store=None):
+        self.pollers = pollers
+        self.token = token
+        self.store = store
+        self.sessions: Dict[str, Session] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self, address: str):
+        if address.startswith("/"):
+            if os.path.exists(address):
+                # Left behind by a previous run
+                os.unlink(address)
+            self._server = await asyncio.start_unix_server(self._handle, path=address)
+        else:
+            if not self.token:
+                # Logins carry passwords and any session's jobs could be read
+                raise ValueError("The poller service only listens on TCP with a token (SWATCH_POLLER_TOKEN)")
+            host, port = split_host_port(address, default_port=0)
+            self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("Poller service listening on %s", address)
+
+    @property
+    def address(self) -> str:
+        name = self._server.sockets[0].getsockname()
+        return name if isinstance(name, str) else f"{name[0]}:{name[1]}"
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Idle connections end their handlers by reading EOF
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        for session in list(self.sessions.values()):
+            await self.pollers.close(session)
+        self.sessions.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                reply = await self.dispatch(request)
+                try:
+                    if isinstance(reply, dict):
+                        await write_message(writer, reply)
+                    else:
+                        await self._stream(writer, reply)
+                except ConnectionError:
+                    # The worker went away, e.g. its HTTP client stopped following a tail
+                    break
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _stream(self, writer: asyncio.StreamWriter, messages: AsyncIterator[Dict]):
+        """Write each message of a streamed reply, then an end marker or the error that cut it short"""
+        try:
+            async for message in messages:
+                await write_message(writer, message)
+            await write_message(writer, {"end": True})
+        except ConnectionError:
+            raise
+        except Exception as e:
+            await write_message(writer, self._error(e))
+        finally:
+            await messages.aclose()
+
+    @staticmethod
+    def _error(e: Exception) -> Dict:
+        if isinstance(e, BrokerError):
+            return {"error": e.detail, "status": e.status_code}
+        if isinstance(e, TailLimit):
+            return {"error": str(e), "status": 429}
+        if isinstance(e, OutputUnavailable):
+            return {"error": str(e), "status": 404}
+        logger.warning("Poller service request failed: %s", e)
+        return {"error": str(e), "status": 502}
+
+    async def dispatch(self, request: Dict):
+        """The reply to a request: a message, or for streaming operations an async iterator of them"""
+        token = str(request.pop("token", None) or "")
+        if self.token and not hmac.compare_digest(token, self.token):
+            return {"error": "Invalid poller service token", "status": 403}
+        handler = getattr(self, f"op_{request.pop('op', '')}", None)
+        if handler is None:
+            return {"error": "Unknown operation", "status": 400}
+        try:
+            if inspect.isasyncgenfunction(handler):
+                return handler(**request)
+            return await handler(**request)
+        except Exception as e:
+            return self._error(e)
+
+    async def op_login(self, session_id: str, clusters: List[List[str]], passwords: List[str]) -> Dict:
+        if self.store is not None and self.store.get(session_id, touch=False) is None:
+            raise BrokerError(401, "Invalid or expired session")
+        now = time.time()
+        (hostname, username), *_ = clusters
+        session = Session(session_id, hostname, username, created_at=now, last_seen=now, clusters=clusters)
+        failed = await self.pollers.open(session, passwords)
+        if not failed:
+            self.sessions[session_id] = session
+        return {"failed": failed}
+
+    async def op_logout(self, session_id: str) -> Dict:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            await self.pollers.close(session)
+        return {"ok": True}
+
+    async def _poller(self, session_id: str, hostname: str) -> SnapshotPoller:
+        """The poller of one of a live session's clusters"""
+        session = self.sessions.get(session_id)
+        if session is not None and self.store is not None and self.store.get(session_id, touch=False) is None:
+            # Logged out or expired by a worker that could not tell this service
+            await self.op_logout(session_id)
+            session = None
+        username = dict(session.clusters).get(hostname) if session is not None else None
+        poller = self.pollers.registry.get(hostname, username) if username is not None else None
+        if poller is None:
+            # Unknown session or cluster, or this service restarted since the login
+            raise BrokerError(401, "Invalid or expired session")
+        return poller
+
+    @staticmethod
+    def _job_ids(job_ids: List[str]) -> List[str]:
+        try:
+            return check_job_ids(job_ids)
+        except ValueError as e:
+            raise BrokerError(400, str(e))
+
+    async def op_snapshot(self, session_id: str, hostname: str, time_range: str,
+                          version: Optional[int] = None) -> Dict:
+        poller = await self._poller(session_id, hostname)
+        snapshot = await poller.get_snapshot(time_range)
+        reply = {"version": snapshot.version, "digest": snapshot.digest,
+                 "fetched_at": snapshot.fetched_at, "checked_at": snapshot.checked_at}
+        if snapshot.version != version:
+            reply["active_jobs"] = encode_jobs(snapshot.active_jobs)
+            reply["completed_jobs"] = encode_jobs(snapshot.completed_jobs)
+        return reply
+
+    async def op_details(self, session_id: str, hostname: str, job_ids: List[str]) -> Dict:
+        poller = await self._poller(session_id, hostname)
+        return {"records": await poller.get_details(self._job_ids(job_ids))}
+
+    async def op_efficiency(self, session_id: str, hostname: str, days: int, all_users: bool = False,
+                            limit: int = 20) -> Dict:
+        poller = await self._poller(session_id, hostname)
+        return {"report": await poller.get_efficiency(days, all_users, limit)}
+
+    async def op_nodes(self, session_id: str, hostname: str, digest: Optional[str] = None) -> Dict:
+        nodes = await (await self._poller(session_id, hostname)).get_nodes()
+        reply = {"digest": nodes.digest, "fetched_at": nodes.fetched_at}
+        if nodes.digest != digest:
+            reply["groups"] = [group.row() for group in nodes.groups]
+        return reply
+
+    async def op_tail(self, session_id: str, hostname: str, job_id: str, stream: str = "stdout", offset: int = 0,
+                      follow: bool = False, idle: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Streamed: one message per chunk of the job's output, base64-encoded"""
+        poller = await self._poller(session_id, hostname)
+        if not JOB_ID.match(job_id):
+            raise BrokerError(400, f"Invalid job id: {job_id}")
+        chunks = poller.tail_job(job_id, stream, offset, follow, idle)
+        try:
+            async for end, data in chunks:
+                yield {"offset": end, "data": base64.b64encode(data).decode('ascii')}
+        finally:
+            await chunks.aclose()
+
+    async def op_ssh_stats(self) -> Dict:
+        return {"stats": await self.pollers.ssh_stats()}
+
+
+async def serve(address: str, ttl: float, stream_interval: float, token: str,
+                max_interval: Optional[float] = None, budget: Optional[float] = DEFAULT_POLL_BUDGET):
+    pollers = LocalPollers(ttl=ttl, stream_interval=stream_interval, max_interval=max_interval, budget=budget)
+    # With a shared session store, sessions the workers ended are refused at once
+    session_db = os.environ.get("SWATCH_SESSION_DB", "")
+    server = BrokerServer(pollers, token=token, store=SqliteSessionStore(session_db) if session_db else None)
+    await server.start(address)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--listen", default=os.environ.get("SWATCH_POLLER_ADDRESS", ""),
+                            help="Unix socket path or host:port (default: SWATCH_POLLER_ADDRESS)")
+    arg_parser.add_argument("--ttl", type=float, default=float(os.environ.get("SWATCH_SNAPSHOT_TTL", "15")))
+    arg_parser.add_argument("--stream-interval", type=float,
+                            default=float(os.environ.get("SWATCH_STREAM_INTERVAL", "1")))
+    arg_parser.add_argument("--max-interval", type=float,
+                            default=float(os.environ.get("SWATCH_POLL_MAX_INTERVAL", "0")) or None,
+                            help="longest interval between polls of an idle queue (default: 4 x ttl)")
+    arg_parser.add_argument("--budget", type=float,
+                            default=float(os.environ.get("SWATCH_POLL_BUDGET", str(DEFAULT_POLL_BUDGET))),
+                            help="polls per minute per cluster, 0 for no limit")
+    args = arg_parser.parse_args(argv)
+    if not args.listen:
+        arg_parser.error("--listen or SWATCH_POLLER_ADDRESS is required")
+    token = os.environ.get("SWATCH_POLLER_TOKEN", "")
+    if not args.listen.startswith("/") and not token:
+        arg_parser.error("SWATCH_POLLER_TOKEN is required to listen on TCP")
+
+    logging.basicConfig(
+        level=os.environ.get("SWATCH_LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    try:
+        asyncio.run(serve(args.listen, args.ttl, args.stream_interval, token, args.max_interval,
+                          args.budget or None))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
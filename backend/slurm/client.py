@@ -1,229 +1,419 @@
+import asyncio
+import logging
 import paramiko
 import re
 import random
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+from contextlib import ExitStack
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Dict, Tuple
 from datetime import datetime, timedelta
 import time
 
-@dataclass
-class JobInfo:
-    job_id: str
-    name: str
-    status: str
-    time: str
-    nodes: str
-    cpus: str
-    memory: str
-    hours_ago: float = 0.0  # Add this field with a default value
-    
-    @property
-    def tag(self) -> str:
-        """Return the appropriate tag for the job's status"""
-        if self.status == "RUNNING":
-            return 'running'
-        elif self.status == "PENDING":
-            return 'pending'
-        elif self.status in ["COMPLETED", "COMPLETING"]:
-            return 'completed'
-        elif self.status in ["FAILED", "TIMEOUT", "CANCELLED"]:
-            return 'failed'
-        return 'pending'  # Default case
-    
-    @staticmethod
-    def format_memory(memory: str) -> str:
-        # Format memory to appropriate units
-        pass
-        # ... existing code ...
+from .connection import ConnectionPool, get_default_pool
+from .executor import CommandExecutor, CommandHandle, get_default_executor
+from .history import JobHistoryStore
+from .metrics import get_default_registry
+from .models import JobInfo, UsageBatch
+from .units import format_timestamp, time_range_seconds
+from .nodes import NodeGroup
+from . import details, efficiency, history, nodes, output, parser, scheduler
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_default_registry()
+COMMAND_SECONDS = _metrics.histogram(
+    "swatch_remote_command_seconds",
+    "Time spent on remote commands: exec (channel open to exec reply), read (waiting for output), parse",
+    ["command", "phase"])
+COMMANDS = _metrics.counter("swatch_remote_commands_total", "Remote commands run, by outcome",
+                            ["command", "outcome"])
+COMMAND_BYTES = _metrics.counter("swatch_remote_command_bytes_total", "Bytes of output read from remote commands",
+                                 ["command"])
+
+
+class TimedChannel:
+    """Wraps a channel to account the time spent waiting in ``recv``"""
+
+    def __init__(self, chan):
+        self.chan = chan
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def recv(self, size: int) -> bytes:
+        started = time.perf_counter()
+        data = self.chan.recv(size)
+        self.seconds += time.perf_counter() - started
+        self.bytes += len(data)
+        return data
+
+    def read_all(self) -> bytes:
+        return b"".join(iter(lambda: self.recv(parser.READ_CHUNK), b""))
+
 
 class SlurmClient:
-    def __init__(self, hostname: str, username: str, password: str):
+    # Format: JobID|State|TimeLimit|Nodes|CPUs|Memory|Dependency|Partition|SubmitTime|User|GRES|StartTime|Name
+    SQUEUE_COMMAND = f'squeue -u $USER -o "{parser.SQUEUE_FORMAT}" --noheader'
+
+    def __init__(self, hostname: str, username: str, password: str,
+                 command_timeout: float = 60.0,
+                 executor: Optional[CommandExecutor] = None,
+                 pool: Optional[ConnectionPool] = None,
+                 history: Optional[JobHistoryStore] = None):
         self.hostname = hostname
         self.username = username
         self.password = password
-        self.ssh_client = None
+        self.command_timeout = command_timeout
+        self.executor = executor or get_default_executor()
+        self.pool = pool or get_default_pool()
+        # With a history store, sacct is only asked for what changed since
+        # the last refresh and time ranges are served from the store
+        self.history = history
+        self.connected = False
+        # Cleared if sacct is too old to know the SubmitLine field
+        self.sacct_submit_line = True
+        self._tails = 0
+        # Commands that failed, so the poll scheduler can back off
+        self.command_errors = 0
         
     def connect(self) -> bool:
         """Establish SSH connection to Slurm cluster"""
         try:
-            print(f"Attempting to connect to {self.hostname} as {self.username}")
-            
-            # Create SSH client
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            logger.info("Connecting to %s as %s", self.hostname, self.username)
             
-            # Connect with timeout
-            self.ssh_client.connect(
-                hostname=self.hostname,
-                username=self.username,
-                password=self.password,
-                timeout=10
-            )
+            # Reuses the pooled transport if one is already authenticated
+            # with these credentials, otherwise performs the handshake
+            if not self.connected:
+                self.pool.acquire(self.hostname, self.username, self.password)
+                self.connected = True
             
             # Test connection by running a simple command
-            _, stdout, _ = self.ssh_client.exec_command('hostname')
-            result = stdout.read().decode('utf-8').strip()
-            print(f"Connected to {result}")
+            result, _ = self.run_command('hostname', timeout=10)
+            logger.info("Connected to %s", result.strip())
             
             return True
         except Exception as e:
-            print(f"Connection error: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            if self.ssh_client:
-                self.ssh_client.close()
-                self.ssh_client = None
+            logger.warning("Connection to %s failed: %s: %s", self.hostname, type(e).__name__, e,
+                           exc_info=logger.isEnabledFor(logging.DEBUG))
+            self.disconnect()
             return False
         
-    def get_jobs(self) -> List[JobInfo]:
-        """Get job information from Slurm using squeue command"""
-        if not self.ssh_client:
+    def run_command(self, cmd: str, timeout: Optional[float] = None,
+                    handle: Optional[CommandHandle] = None,
+                    parse: Optional[Callable[[Iterator[str]], Any]] = None) -> Tuple[Any, str]:
+        """Run a command on the cluster and return its (stdout, stderr).
+        
+        With ``parse``, stdout is not collected into a string: its lines are
+        handed to ``parse`` as they arrive and its result is returned instead.
+        """
+        if not self.connected:
             if not self.connect():
                 raise Exception("Not connected to SSH server")
         
+        command = cmd.split(None, 1)[0] if cmd.strip() else ""
+        started = time.perf_counter()
+        outcome = "failed"
         try:
-            # Run squeue command to get job information
-            # Format: JobID, Name, State, TimeLimit, Nodes, CPUs, Memory
-            cmd = 'squeue -u $USER -o "%.18i %.30j %.8T %.10l %.5D %.5C %.8m" --noheader'
-            _, stdout, stderr = self.ssh_client.exec_command(cmd)
-            
-            error = stderr.read().decode('utf-8').strip()
-            if error:
-                print(f"Error running squeue: {error}")
-                return []
-                
-            output = stdout.read().decode('utf-8').strip()
-            
-            # Parse squeue output
-            jobs = []
-            for line in output.split('\n'):
-                if not line.strip():
-                    continue
-                    
-                parts = line.split()
-                if len(parts) >= 7:
-                    job_id = parts[0]
-                    name = parts[1]
-                    status = parts[2]
-                    time = parts[3]
-                    nodes = parts[4]
-                    cpus = parts[5]
-                    memory = parts[6]
-                    
-                    jobs.append(JobInfo(
-                        job_id=job_id,
-                        name=name,
-                        status=status,
-                        time=time,
-                        nodes=nodes,
-                        cpus=cpus,
-                        memory=memory
-                    ))
-            
-            return jobs
-        except Exception as e:
-            print(f"Error getting jobs: {str(e)}")
-            # Try to reconnect once if the connection was lost
-            if "SSH session not active" in str(e):
-                self.ssh_client = None
-                if self.connect():
-                    return self.get_jobs()  # Try again
+            with self.pool.channel(self.hostname, self.username, self.password, timeout=timeout) as chan:
+                if handle is not None:
+                    handle.attach(chan)
+                chan.exec_command(cmd)
+                executed = time.perf_counter()
+                stream = TimedChannel(chan)
+                if parse is not None:
+                    output = parse(parser.iter_channel_lines(stream))
+                else:
+                    output = stream.read_all().decode('utf-8')
+                read_stderr = time.perf_counter()
+                error = chan.makefile_stderr('rb').read().decode('utf-8').strip()
+                finished = time.perf_counter()
+            outcome = "error" if error else "ok"
+        finally:
+            COMMANDS.inc(command=command, outcome=outcome)
+        exec_seconds = executed - started
+        read_seconds = stream.seconds + (finished - read_stderr)
+        parse_seconds = max(0.0, (read_stderr - executed) - stream.seconds)
+        COMMAND_SECONDS.observe(exec_seconds, command=command, phase="exec")
+        COMMAND_SECONDS.observe(read_seconds, command=command, phase="read")
+        if parse is not None:
+            COMMAND_SECONDS.observe(parse_seconds, command=command, phase="parse")
+        COMMAND_BYTES.inc(stream.bytes, command=command)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("remote command=%s outcome=%s exec_ms=%.1f read_ms=%.1f parse_ms=%.1f bytes=%d",
+                         command, outcome, exec_seconds * 1000, read_seconds * 1000, parse_seconds * 1000,
+                         stream.bytes)
+        if handle is not None and handle.cancelled:
+            raise asyncio.CancelledError()
+        return output, error
+    
+    async def run_command_async(self, cmd: str, timeout: Optional[float] = None,
+                                parse: Optional[Callable[[Iterator[str]], Any]] = None) -> Tuple[Any, str]:
+        """Run a command on the executor pool without blocking the event loop.
+        
+        On timeout or cancellation the command's channel is closed, so the
+        remote process is hung up on and the worker thread is released.
+        """
+        if timeout is None:
+            timeout = self.command_timeout
+        handle = CommandHandle(cmd)
+        try:
+            return await self.executor.run(self.run_command, cmd, timeout, handle, parse, timeout=timeout)
+        except BaseException:
+            handle.cancel()
             raise
+    
+    def _checked(self, command: str, jobs: List[JobInfo], error: str) -> List[JobInfo]:
+        if error:
+            self.command_errors += 1
+            logger.warning("Error running %s: %s", command, error)
+            return []
+        return jobs
+    
+    def get_jobs(self) -> List[JobInfo]:
+        """Get job information from Slurm using squeue command"""
+        jobs, error = self.run_command(self.SQUEUE_COMMAND, timeout=self.command_timeout,
+                                       parse=parser.parse_squeue)
+        return self._checked("squeue", jobs, error)
+    
+    async def fetch_jobs(self) -> List[JobInfo]:
+        """Async version of get_jobs"""
+        jobs, error = await self.run_command_async(self.SQUEUE_COMMAND, parse=parser.parse_squeue)
+        return self._checked("squeue", jobs, error)
+    
+    async def fetch_snapshot(self, time_range: str) -> Tuple[List[JobInfo], List[JobInfo]]:
+        """Fetch active and completed jobs, running squeue and sacct concurrently"""
+        active_jobs, completed_jobs = await asyncio.gather(
+            self.fetch_jobs(),
+            self.fetch_completed_jobs(time_range),
+        )
+        return active_jobs, completed_jobs
         
     def disconnect(self):
         """Close SSH connection"""
-        if self.ssh_client:
-            self.ssh_client.close()
-            self.ssh_client = None
-
-    def get_job_dependencies(self, job_id: str) -> List[str]:
-        """Return mock dependency data with a logical dependency graph"""
-        # Fix the dependency logic to make sense:
-        # 1. Failed jobs can depend on completed jobs
-        # 2. Running jobs must depend on completed or running jobs
-        # 3. Pending jobs can depend on anything
-        # 4. Completed jobs should only depend on other completed jobs
-        
-        # First determine job status
-        job_status = {}
-        for job in self.get_jobs() + self.get_completed_jobs("156h"):  # All jobs
-            job_status[job.job_id] = job.status
-        
-        # Define logical dependencies
-        dependencies = {
-            # Main workflow (logical flow)
-            "1004": ["1002"],          # final_analysis (PENDING) depends on data_processing (RUNNING)
-            "1003": ["1002"],          # visualization_prep (PENDING) depends on data_processing (RUNNING)
-            "1002": ["1001", "1000"],  # data_processing (RUNNING) depends on main_simulation (RUNNING) and data_preparation (COMPLETED)
-            "1001": ["1000"],          # main_simulation (RUNNING) depends on data_preparation (COMPLETED)
-            
-            # Completed chain
-            "1000": ["995"],           # data_preparation (COMPLETED) depends on model_training_small (COMPLETED)
-            "995": ["990"],            # model_training_small (COMPLETED) depends on preprocessing_batch1 (COMPLETED)
-            "990": [],                 # preprocessing_batch1 (COMPLETED) has no dependencies
-            
-            # Failed chain
-            "985": ["990"],            # model_validation (FAILED) depends on preprocessing_batch1 (COMPLETED)
-            
-            # Older completed chain
-            "980": ["975"],            # large_simulation (COMPLETED) depends on data_collection (COMPLETED)
-            "975": ["970"],            # data_collection (COMPLETED) depends on initial_setup (COMPLETED)
-            "970": [],                 # initial_setup (COMPLETED) has no dependencies
-        }
-        
-        return dependencies.get(job_id, [])
+        if self.connected:
+            self.pool.release(self.hostname, self.username, self.password)
+            self.connected = False
+
+    def _sacct_command(self, start: float, end: Optional[float] = None, all_users: bool = False) -> str:
+        start_time = format_timestamp(start)
+        end_time = format_timestamp(end) if end is not None else "now"
+        command = f"sacct -S {start_time} -E {end_time} --parsable2 --noheader -o {','.join(self._sacct_fields())}"
+        return command + " --allusers" if all_users else command
+    
+    def _sacct_fields(self) -> List[str]:
+        # Dependencies of finished jobs are only recorded in the sbatch
+        # command line (SubmitLine, Slurm 23.02+)
+        if self.sacct_submit_line:
+            return parser.HISTORY_SACCT_FIELDS
+        return [field for field in parser.HISTORY_SACCT_FIELDS if field != "SubmitLine"]
+    
+    def _parse_sacct(self, lines: Iterator[str]) -> Tuple[List[JobInfo], UsageBatch]:
+        return efficiency.parse_sacct_usage(lines, self._sacct_fields())
+    
+    def _sacct_lacks_submit_line(self, error: str) -> bool:
+        if self.sacct_submit_line and "SubmitLine" in error:
+            logger.warning("sacct does not support SubmitLine, dependencies of finished jobs will be missing")
+            self.sacct_submit_line = False
+            return True
+        return False
 
+    def _run_sacct(self, start: float) -> Tuple[Tuple[List[JobInfo], UsageBatch], str]:
+        result, error = self.run_command(self._sacct_command(start), timeout=self.command_timeout,
+                                         parse=self._parse_sacct)
+        if self._sacct_lacks_submit_line(error):
+            result, error = self.run_command(self._sacct_command(start), timeout=self.command_timeout,
+                                             parse=self._parse_sacct)
+        return result, error
+    
+    async def _run_sacct_async(self, start: float, end: Optional[float] = None,
+                               all_users: bool = False) -> Tuple[Tuple[List[JobInfo], UsageBatch], str]:
+        result, error = await self.run_command_async(self._sacct_command(start, end, all_users),
+                                                     parse=self._parse_sacct)
+        if self._sacct_lacks_submit_line(error):
+            result, error = await self.run_command_async(self._sacct_command(start, end, all_users),
+                                                         parse=self._parse_sacct)
+        return result, error
+    
     def get_completed_jobs(self, time_range: str) -> List[JobInfo]:
         """Fetch completed jobs using sacct for a given time range."""
-        if not self.ssh_client:
-            if not self.connect():
-                raise Exception("Not connected to SSH server")
-        
-        # Map time_range to sacct-compatible start time
-        time_map = {
-            "1h": "now-1hour",
-            "6h": "now-6hours",
-            "12h": "now-12hours",
-            "24h": "now-1day",
-            "156h": "now-6.5days"  # 156 hours ≈ 6.5 days
-        }
-        start_time = time_map.get(time_range, "now-1day")  # Default to 24h
-        
-        cmd = f"sacct -S {start_time} -E now -o JobID,JobName,State,Time,Nodes,CPUs,Memory --noheader"
-        _, stdout, stderr = self.ssh_client.exec_command(cmd)
-        
-        error = stderr.read().decode('utf-8').strip()
+        synced_at = time.time()
+        window_start = synced_at - time_range_seconds(time_range)
+        if self.history is None:
+            (jobs, _), error = self._run_sacct(window_start)
+            return self._checked("sacct", jobs, error)
+        fetched_from = self.history.sync_start(self.hostname, self.username, window_start)
+        (jobs, usage), error = self._run_sacct(fetched_from)
+        return history.merge_history(self, "sacct", jobs, usage, error, fetched_from, synced_at, window_start)
+
+    async def _fetch_history_span(self, start: float, end: float) -> Tuple[Tuple[List[JobInfo], UsageBatch], str]:
+        # Up to "now", as the regular sync has always asked
+        return await self._run_sacct_async(start)
+
+    async def fetch_completed_jobs(self, time_range: str) -> List[JobInfo]:
+        """Async version of get_completed_jobs"""
+        return await history.fetch_completed_jobs(self, self._fetch_history_span, time_range, "sacct")
+
+    async def _fetch_usage_span(self, start: float, end: float, all_users: bool) -> Tuple[UsageBatch, str]:
+        (_, usage), error = await self._run_sacct_async(start, end, all_users)
+        return usage, error
+
+    async def fetch_usage(self, since: float, all_users: bool = False,
+                          deadline: Optional[float] = None) -> UsageBatch:
+        """Usage and efficiency of the jobs that ended since ``since``, see ``efficiency.fetch_usage``.
+
+        ``all_users`` asks sacct for every user's jobs the login may see.
+        """
+        return await efficiency.fetch_usage(self, self._fetch_usage_span, since, all_users, deadline)
+
+    def _detail_sacct_fields(self) -> List[str]:
+        if self.sacct_submit_line:
+            return details.DETAIL_SACCT_FIELDS
+        return [field for field in details.DETAIL_SACCT_FIELDS if field != "SubmitLine"]
+
+    def _detail_sacct_command(self, job_ids: List[str]) -> str:
+        return details.sacct_command(job_ids, self._detail_sacct_fields())
+
+    def _parse_sacct_details(self, lines: Iterator[str]) -> List[Dict]:
+        return details.parse_sacct_details(lines, self._detail_sacct_fields())
+
+    async def fetch_job_details(self, job_ids: List[str]) -> Dict[str, Dict]:
+        """Detail records of the given jobs, by job id, in at most two remote commands.
+
+        One scontrol round trip covers every job slurmctld still holds; one
+        sacct covers the rest. Jobs neither knows are left out.
+        """
+        records, error = await self.run_command_async(details.scontrol_command(job_ids),
+                                                      parse=details.parse_scontrol)
+        # Jobs slurmctld has purged are expected to fail here
+        errors = [line for line in error.splitlines() if "Invalid job id" not in line]
+        if errors:
+            logger.warning("Error running scontrol: %s", "; ".join(errors))
+        found = details.match_scontrol(job_ids, records)
+        missing = [job_id for job_id in job_ids if job_id not in found]
+        if not missing:
+            return found
+        rows, error = await self.run_command_async(self._detail_sacct_command(missing),
+                                                   parse=self._parse_sacct_details)
+        if self._sacct_lacks_submit_line(error):
+            rows, error = await self.run_command_async(self._detail_sacct_command(missing),
+                                                       parse=self._parse_sacct_details)
         if error:
-            print(f"Error running sacct: {error}")
-            return []
-        
-        output = stdout.read().decode('utf-8')
-        jobs = []
-        for line in output.split("\n"):
-            if not line.strip():
-                continue
-            parts = line.split()
-            if len(parts) >= 7:
-                jobs.append(JobInfo(
-                    job_id=parts[0],
-                    name=parts[1],
-                    status=parts[2],
-                    time=parts[3],
-                    nodes=parts[4],
-                    cpus=parts[5],
-                    memory=parts[6]
-                ))
-        return jobs
+            logger.warning("Error running sacct: %s", error)
+        wanted = set(missing)
+        found.update((record["job_id"], record) for record in rows if record["job_id"] in wanted)
+        return found
+
+    async def fetch_nodes(self) -> List[NodeGroup]:
+        """Node states from sinfo, one group per partition and state.
+
+        Raises on error rather than reporting no nodes, so the caller keeps
+        what it had.
+        """
+        groups, error = await self.run_command_async(nodes.SINFO_COMMAND, parse=nodes.parse_sinfo)
+        if error and not groups:
+            self.command_errors += 1
+            raise RuntimeError(f"Error running sinfo: {error}")
+        if error:
+            logger.warning("Error running sinfo: %s", error)
+        return groups
+
+    async def fetch_sdiag(self) -> Dict[str, int]:
+        """slurmctld's load figures from sdiag, see ``scheduler.parse_sdiag``"""
+        stats, error = await self.run_command_async("sdiag", parse=scheduler.parse_sdiag)
+        if error:
+            raise RuntimeError(error)
+        return stats
+
+    def _open_channel(self, stack: ExitStack, cmd: str):
+        if not self.connected and not self.connect():
+            raise Exception("Not connected to SSH server")
+        chan = stack.enter_context(self.pool.channel(self.hostname, self.username, self.password,
+                                                     timeout=self.command_timeout))
+        chan.exec_command(cmd)
+        return chan
+
+    async def tail_output(self, path: str, offset: int = 0, follow: bool = False,
+                          idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+        """Yield (offset after the chunk, chunk) of a file on the cluster, from byte ``offset`` on.
+
+        A negative ``offset`` counts from the end of the file. With
+        ``follow`` the channel stays open and appended output keeps coming
+        until the caller stops iterating. See ``output.read_channel`` for
+        ``idle``.
+        """
+        if offset < 0:
+            size, error = await self.run_command_async(output.size_command(path))
+            offset = max(0, int(size) + offset) if size.strip().isdigit() else 0
+        if self._tails >= output.MAX_TAILS:
+            raise output.TailLimit(f"At most {output.MAX_TAILS} job outputs can be followed at once")
+        self._tails += 1
+        stack = ExitStack()
+        outcome = "failed"
+        received = offset
+        try:
+            chan = await self.executor.run(self._open_channel, stack, output.tail_command(path, offset, follow),
+                                           timeout=self.command_timeout)
+            async for received, data in output.read_channel(chan, offset, idle):
+                yield received, data
+            outcome = "ok"
+        finally:
+            self._tails -= 1
+            stack.close()
+            COMMANDS.inc(command="tail", outcome=outcome)
+            COMMAND_BYTES.inc(received - offset, command="tail")
 
 class MockClient:
     """A client that returns mock data for testing with enhanced test data"""
+    # Dependencies that make sense with our time-based jobs
+    DEPENDENCIES = {
+        # Active jobs
+        "1004": ["1002"],          # final_analysis (PENDING) depends on data_processing (RUNNING)
+        "1003": ["1002"],          # visualization_prep (PENDING) depends on data_processing (RUNNING)
+        "1002": ["1001", "1000"],  # data_processing (RUNNING) depends on main_simulation (RUNNING) and data_preparation (COMPLETED)
+        "1001": ["1000"],          # main_simulation (RUNNING) depends on data_preparation (COMPLETED)
+        
+        # Completed jobs with timestamps
+        "1000": ["995"],           # data_preparation (0.5h ago) depends on model_training_small (3h ago)
+        "995": ["990"],            # model_training_small (3h ago) depends on preprocessing_batch1 (7h ago)
+        "990": [],                 # preprocessing_batch1 (7h ago) has no dependencies
+        
+        # Failed job
+        "985": ["990"],            # model_validation (16h ago) depends on preprocessing_batch1 (7h ago)
+        
+        # Older completed jobs
+        "980": ["975"],            # large_simulation (40h ago) depends on data_collection (85h ago)
+        "975": ["970"],            # data_collection (85h ago) depends on initial_setup (140h ago)
+        "970": [],                 # initial_setup (140h ago) has no dependencies
+    }
+    
+    # Where the running jobs run
+    NODE_LISTS = {
+        "1001": "gpu[01-04]",
+        "1002": "compute[01-02]",
+    }
+
+    # (CPU, memory) efficiency of the finished mock jobs
+    EFFICIENCY = {
+        "data_preparation": (0.92, 0.45),
+        "model_training_small": (0.31, 0.88),
+        "preprocessing_batch1": (0.85, 0.12),
+        "model_validation": (0.05, 0.30),
+        "large_simulation": (0.22, 0.95),
+        "data_collection": (0.64, 0.50),
+        "initial_setup": (0.97, 0.08),
+    }
+
     def __init__(self):
         # Store current time for relative time calculations
         self.now = datetime.now()
         
+    @classmethod
+    def _dependency(cls, job_id: str) -> str:
+        """Return a job's dependencies the way squeue's %E prints them"""
+        deps = cls.DEPENDENCIES.get(job_id, [])
+        return "afterok:" + ":".join(deps) if deps else ""
+    
     def get_jobs(self) -> List[JobInfo]:
         """Return mock data for active jobs - these are always shown"""
-        return [
+        jobs = [
             # Currently running jobs
             JobInfo(
                 job_id="1001",
@@ -263,10 +453,19 @@ class MockClient:
                 memory="24G"
             ),
         ]
+        for hours_ago, job in enumerate(jobs, start=1):
+            job.dependency = self._dependency(job.job_id)
+            job.partition = "gpu" if job.name == "main_simulation" else "compute"
+            job.submit_time = self.now.timestamp() - hours_ago * 3600
+            job.user = "test_user"
+            if job.status == "RUNNING":
+                job.start_time = job.submit_time + 600
+                job.gpus = 4 if job.partition == "gpu" else 0
+        return jobs
     
     def get_completed_jobs(self, time_range: str) -> List[JobInfo]:
         """Return mock data for completed jobs based on time range"""
-        print(f"MockClient.get_completed_jobs called with time_range={time_range}")
+        logger.debug("MockClient.get_completed_jobs called with time_range=%s", time_range)
         
         # Map time_range to hours
         hours_map = {
@@ -278,7 +477,7 @@ class MockClient:
         }
         
         hours = hours_map.get(time_range, 24)  # Default to 24h
-        print(f"Filtering for {hours} hours")
+        logger.debug("Filtering for %d hours", hours)
         
         # Create all jobs with their relative timestamps
         all_completed_jobs = [
@@ -307,7 +506,7 @@ class MockClient:
         # Filter based on time range
         filtered_jobs = [job for job in all_completed_jobs if job.hours_ago <= hours]
         
-        print(f"Returning {len(filtered_jobs)} completed jobs for time range {time_range}")
+        logger.debug("Returning %d completed jobs for time range %s", len(filtered_jobs), time_range)
         return filtered_jobs
         
     def _create_job_with_timestamp(self, job_id, name, status, hours_ago):
@@ -323,32 +522,70 @@ class MockClient:
         )
         # Add hours_ago as an attribute for filtering
         job.hours_ago = hours_ago
+        job.end_time = self.now.timestamp() - hours_ago * 3600
+        job.start_time = job.end_time - job.time
+        job.submit_time = job.start_time - 600
+        job.partition = "compute"
+        job.user = "test_user"
+        job.dependency = self._dependency(job_id)
         return job
-    
-    def get_job_dependencies(self, job_id: str) -> List[str]:
-        """Return mock dependency data with a logical dependency graph that respects time ranges"""
-        # Define dependencies that make sense with our time-based jobs
-        dependencies = {
-            # Active jobs
-            "1004": ["1002"],          # final_analysis (PENDING) depends on data_processing (RUNNING)
-            "1003": ["1002"],          # visualization_prep (PENDING) depends on data_processing (RUNNING)
-            "1002": ["1001", "1000"],  # data_processing (RUNNING) depends on main_simulation (RUNNING) and data_preparation (COMPLETED)
-            "1001": ["1000"],          # main_simulation (RUNNING) depends on data_preparation (COMPLETED)
-            
-            # Completed jobs with timestamps
-            "1000": ["995"],           # data_preparation (0.5h ago) depends on model_training_small (3h ago)
-            "995": ["990"],            # model_training_small (3h ago) depends on preprocessing_batch1 (7h ago)
-            "990": [],                 # preprocessing_batch1 (7h ago) has no dependencies
-            
-            # Failed job
-            "985": ["990"],            # model_validation (16h ago) depends on preprocessing_batch1 (7h ago)
-            
-            # Older completed jobs
-            "980": ["975"],            # large_simulation (40h ago) depends on data_collection (85h ago)
-            "975": ["970"],            # data_collection (85h ago) depends on initial_setup (140h ago)
-            "970": [],                 # initial_setup (140h ago) has no dependencies
-        }
-        
-        # Return only dependencies that exist (this allows time filtering to work)
-        deps = dependencies.get(job_id, [])
-        return deps 
\ No newline at end of file
+
+    def get_job_details(self, job_ids: List[str]) -> Dict[str, Dict]:
+        """Detail records of the mock jobs, as scontrol would describe them"""
+        jobs = {job.job_id: job for job in self.get_jobs() + self.get_completed_jobs("156h")}
+        found = {}
+        for job_id in job_ids:
+            job = jobs.get(job_id)
+            if job is None:
+                continue
+            workdir = f"/home/{job.user}/{job.name}"
+            found[job_id] = details.scontrol_record(job_id, {
+                "JobId": job.job_id,
+                "JobName": job.name,
+                "UserId": f"{job.user}(1000)",
+                "JobState": str(job.status),
+                "Dependency": job.dependency or "(null)",
+                "Partition": job.partition,
+                "NumNodes": str(job.nodes),
+                "NodeList": self.NODE_LISTS.get(job.job_id, "(null)"),
+                "NumCPUs": str(job.cpus),
+                "SubmitTime": format_timestamp(job.submit_time),
+                "StartTime": format_timestamp(job.start_time) if job.start_time else "Unknown",
+                "EndTime": format_timestamp(job.end_time) if job.end_time else "Unknown",
+                "WorkDir": workdir,
+                "StdErr": f"{workdir}/slurm-%j.out",
+                "StdOut": f"{workdir}/slurm-%j.out",
+            })
+        return found
+
+    def get_usage(self, since: float, all_users: bool = False) -> UsageBatch:
+        """Usage of the finished mock jobs that ended since ``since``"""
+        usage = UsageBatch(covered_from=since)
+        for job in self.get_completed_jobs("156h"):
+            if job.end_time < since:
+                continue
+            cpu_efficiency, memory_efficiency = self.EFFICIENCY.get(job.name, (0.5, 0.5))
+            allocated = job.memory * job.nodes
+            usage.append(job.job_id, job.user, job.name, job.status.value,
+                         "1:0" if job.status == "FAILED" else "0:0", job.end_time, job.nodes, job.cpus, job.time,
+                         job.time * job.cpus * cpu_efficiency, allocated, int(allocated * memory_efficiency))
+        return usage.compute()
+
+    def get_nodes(self) -> List[NodeGroup]:
+        """A small cluster, busy where the running mock jobs are"""
+        return [
+            NodeGroup("compute", "mixed", "compute[01-02]", 16, 48, 0, 64, 128000),
+            NodeGroup("compute", "idle", "compute[03-16]", 0, 448, 0, 448, 128000),
+            NodeGroup("gpu", "allocated", "gpu[01-04]", 128, 0, 0, 128, 512000, 4),
+            NodeGroup("gpu", "idle", "gpu[05-07]", 0, 96, 0, 96, 512000, 4),
+            NodeGroup("gpu", "down", "gpu08", 0, 0, 32, 32, 512000, 4),
+        ]
+
+    async def tail_output(self, path: str, offset: int = 0, follow: bool = False,
+                          idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+        """A few lines of made-up output; nothing is ever appended"""
+        text = "".join(f"{path}: step {step} done\n" for step in range(1, 11)).encode('utf-8')
+        if offset < 0:
+            offset = max(0, len(text) + offset)
+        if offset < len(text):
+            yield len(text), text[offset:]
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import paramiko
+
+
+def split_host_port(hostname: str, default_port: int = 22) -> Tuple[str, int]:
+    """Split ``host:port`` (or ``[v6addr]:port``) into its parts"""
+    host, sep, port = hostname.rpartition(":")
+    if sep and port.isdigit() and (":" not in host or host.startswith("[")):
+        return host.strip("[]"), int(port)
+    return hostname, default_port
+
+
+def open_ssh_transport(hostname: str, username: str, password: str, timeout: float) -> paramiko.Transport:
+    """Perform a full SSH handshake and return the authenticated transport"""
+    host, port = split_host_port(hostname)
+    ssh_client = paramiko.SSHClient()
+    ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh_client.connect(
+        hostname=host,
+        port=port,
+        username=username,
+        password=password,
+        timeout=timeout,
+        look_for_keys=False,
+        allow_agent=False,
+    )
+    return ssh_client.get_transport()
+
+
+class PooledConnection:
+    """One SSH transport shared by every client with the same credentials"""
+
+    def __init__(self, hostname: str, username: str, max_channels: int):
+        self.hostname = hostname
+        self.username = username
+        self.transport = None
+        self.clients = 0
+        self.channels_in_use = 0
+        self.retired = False
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[Exception] = None
+        self.lock = threading.Lock()
+        self.channel_slots = threading.BoundedSemaphore(max_channels)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def is_alive(self) -> bool:
+        transport = self.transport
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+
+class ConnectionPool:
+    """Reuses one SSH transport per host and user, multiplexing commands as channels.
+
+    Clients that log in with the same credentials share a transport. Each
+    remote command opens its own channel on it, bounded by ``max_channels``
+    to stay below the server's MaxSessions. Transports send keepalives and
+    are checked before every use. Dead ones are re-established with jittered
+    exponential backoff. Only one thread handshakes per key at a time, so a
+    network blip does not turn into a storm of handshakes.
+    """
+
+    def __init__(self, keepalive_interval: int = 30, max_channels: int = 8,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 connect_timeout: float = 10.0,
+                 transport_factory: Callable = open_ssh_transport):
+        self.keepalive_interval = keepalive_interval
+        self.max_channels = max_channels
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.transport_factory = transport_factory
+        self._connections: Dict[Tuple[str, str, str], PooledConnection] = {}
+        self._lock = threading.Lock()
+        self.handshakes = 0
+        self.reconnects = 0
+        self.handshake_time_total = 0.0
+        self.last_handshake_time = 0.0
+
+    @staticmethod
+    def _key(hostname: str, username: str, password: str) -> Tuple[str, str, str]:
+        # The credential digest keeps a wrong password from riding on a
+        # transport somebody else authenticated
+        digest = hashlib.sha256(f"{hostname}\0{username}\0{password}".encode('utf-8')).hexdigest()
+        return hostname, username, digest
+
+    def _entry(self, hostname: str, username: str, password: str) -> PooledConnection:
+        key = self._key(hostname, username, password)
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is None:
+                entry = PooledConnection(hostname, username, self.max_channels)
+                self._connections[key] = entry
+            return entry
+
+    def _registered(self, hostname: str, username: str, password: str) -> PooledConnection:
+        """The entry of a client that is still registered; raises once the last one released it"""
+        with self._lock:
+            entry = self._connections.get(self._key(hostname, username, password))
+        if entry is None or entry.retired:
+            raise ConnectionError(f"Not connected to {hostname} as {username}")
+        return entry
+
+    def acquire(self, hostname: str, username: str, password: str):
+        """Register a client and make sure its transport is up"""
+        entry = self._entry(hostname, username, password)
+        with entry.lock:
+            entry.clients += 1
+        try:
+            self._ensure_transport(entry, password)
+        except Exception:
+            self.release(hostname, username, password)
+            raise
+
+    def release(self, hostname: str, username: str, password: str):
+        """Unregister a client, closing the transport when nobody uses it"""
+        key = self._key(hostname, username, password)
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is None:
+                return
+            with entry.lock:
+                entry.clients = max(0, entry.clients - 1)
+                if entry.clients:
+                    return
+                del self._connections[key]
+                entry.retired = True
+                if not entry.channels_in_use:
+                    entry.close()
+
+    def _ensure_transport(self, entry: PooledConnection, password: str):
+        if entry.is_alive():
+            return entry.transport
+        with entry.lock:
+            # Another thread may have reconnected while we waited for the lock
+            if entry.is_alive():
+                return entry.transport
+            if entry.retired:
+                # Every client logged out; nobody would close a new transport
+                raise ConnectionError(f"Not connected to {entry.hostname} as {entry.username}")
+            now = time.monotonic()
+            if now < entry.retry_at:
+                raise ConnectionError(
+                    f"Reconnect to {entry.hostname} backing off for "
+                    f"{entry.retry_at - now:.1f}s after: {entry.last_error}"
+                )
+            reconnecting = entry.transport is not None
+            if reconnecting:
+                entry.transport.close()
+                entry.transport = None
+
+            started = time.monotonic()
+            try:
+                transport = self.transport_factory(entry.hostname, entry.username, password, self.connect_timeout)
+            except Exception as e:
+                entry.failures += 1
+                entry.last_error = e
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (entry.failures - 1)))
+                entry.retry_at = time.monotonic() + random.uniform(delay / 2, delay)
+                raise
+            elapsed = time.monotonic() - started
+
+            transport.set_keepalive(self.keepalive_interval)
+            entry.transport = transport
+            entry.failures = 0
+            entry.retry_at = 0.0
+            entry.last_error = None
+        # Outside the entry's lock: release() takes the pool's lock first
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_time_total += elapsed
+            self.last_handshake_time = elapsed
+            if reconnecting:
+                self.reconnects += 1
+        return transport
+
+    @contextmanager
+    def channel(self, hostname: str, username: str, password: str, timeout: Optional[float] = None):
+        """Open a session channel on the shared transport, reconnecting if it died.
+
+        Raises ConnectionError once every client with these credentials has
+        been released, e.g. for a command still running after a logout.
+        """
+        entry = self._registered(hostname, username, password)
+        if not entry.channel_slots.acquire(timeout=timeout):
+            raise ConnectionError(f"No free SSH channel to {hostname} after {timeout}s")
+        try:
+            transport = self._ensure_transport(entry, password)
+            try:
+                chan = transport.open_session(timeout=timeout)
+            except (paramiko.SSHException, EOFError, OSError):
+                # The transport died between the liveness check and the open
+                transport.close()
+                transport = self._ensure_transport(entry, password)
+                chan = transport.open_session(timeout=timeout)
+            with entry.lock:
+                entry.channels_in_use += 1
+            try:
+                chan.settimeout(timeout)
+                yield chan
+            finally:
+                chan.close()
+                with entry.lock:
+                    entry.channels_in_use -= 1
+                    if entry.retired and not entry.channels_in_use:
+                        # Last command of a client that has since logged out
+                        entry.close()
+        finally:
+            entry.channel_slots.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = list(self._connections.values())
+            return {
+                "open_transports": sum(1 for e in entries if e.is_alive()),
+                "channels_in_use": sum(e.channels_in_use for e in entries),
+                "clients": sum(e.clients for e in entries),
+                "handshakes": self.handshakes,
+                "reconnects": self.reconnects,
+                "last_handshake_seconds": round(self.last_handshake_time, 4),
+                "avg_handshake_seconds": round(self.handshake_time_total / self.handshakes, 4) if self.handshakes else 0.0,
+            }
+
+
+_default_pool: Optional[ConnectionPool] = None
+
+
+def get_default_pool() -> ConnectionPool:
+    """Return the process-wide pool, with keepalives every SWATCH_SSH_KEEPALIVE seconds"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ConnectionPool(keepalive_interval=int(os.environ.get("SWATCH_SSH_KEEPALIVE", "30")))
+    return _default_pool
@@ -0,0 +1,112 @@
+import re
+import shlex
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .client import JobInfo
+
+# Dependency types that name upstream jobs; "singleton" names none
+JOB_DEPENDENCY_TYPES = {"after", "afterany", "afterburstbuffer", "aftercorr", "afternotok", "afterok"}
+
+# squeue annotates each dependency with its state, e.g. "afterok:12(unfulfilled)"
+_STATE_SUFFIX = re.compile(r"\([^)]*\)")
+
+
+@dataclass
+class DependencyEdge:
+    """One upstream requirement of a job"""
+    job_id: str
+    type: str
+
+
+def parse_dependency(expression: Optional[str]) -> List[DependencyEdge]:
+    """Parse a Slurm dependency expression such as ``afterok:12:13,singleton``.
+
+    Both ``,`` (all of) and ``?`` (any of) separators are accepted; for
+    drawing the graph every listed job is an edge either way. Time offsets
+    (``after:12+30``) and squeue state annotations are dropped.
+    """
+    if not expression or expression in ("(null)", "None"):
+        return []
+    edges = []
+    for clause in re.split(r"[,?]", _STATE_SUFFIX.sub("", expression)):
+        clause = clause.strip()
+        if not clause:
+            continue
+        if clause == "singleton":
+            edges.append(DependencyEdge(job_id="", type="singleton"))
+            continue
+        dep_type, _, ids = clause.partition(":")
+        if dep_type not in JOB_DEPENDENCY_TYPES:
+            continue
+        for job_id in ids.split(":"):
+            job_id = job_id.split("+", 1)[0].strip()
+            if job_id:
+                edges.append(DependencyEdge(job_id=job_id, type=dep_type))
+    return edges
+
+
+def dependency_from_submit_line(submit_line: Optional[str]) -> str:
+    """Extract the ``--dependency``/``-d`` value from an sbatch command line"""
+    if not submit_line or "-d" not in submit_line:
+        # Both --dependency and -d contain "-d"; skip shlex for the common case
+        return ""
+    try:
+        args = shlex.split(submit_line)
+    except ValueError:
+        args = submit_line.split()
+    for i, arg in enumerate(args):
+        if arg.startswith("--dependency="):
+            return arg.split("=", 1)[1]
+        if arg in ("--dependency", "-d") and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith("-d") and not arg.startswith("--") and len(arg) > 2:
+            return arg[2:]
+    return ""
+
+
+def array_base(job_id: str) -> str:
+    """Return the array job id of an array task id (``12_3`` -> ``12``)"""
+    return job_id.split("_", 1)[0]
+
+
+def resolve_edges(job: "JobInfo", index: Mapping[str, "JobInfo"],
+                  by_array: Mapping[str, Iterable[str]],
+                  previous_same_name: Callable[[str], Optional[str]]) -> Tuple[List[str], List[Dict]]:
+    """Resolve a job's dependency expression against the jobs in the window.
+
+    Returns the upstream job ids found in ``index`` and the typed edge list,
+    where dependencies on jobs outside the window are kept with
+    ``in_window`` set to false.
+    """
+    job_id = job.job_id
+    dependencies: List[str] = []
+    seen = {job_id}
+    edges: List[Dict] = []
+    for edge in parse_dependency(job.dependency):
+        if edge.type == "singleton":
+            previous = previous_same_name(job_id)
+            targets = [previous] if previous else []
+        elif edge.job_id in index:
+            targets = [edge.job_id]
+        else:
+            # "12" matches all tasks of array 12 and "12_3" matches array
+            # 12 while it is still pending as a single "12_[1-9]" record
+            targets = by_array.get(edge.job_id) or by_array.get(array_base(edge.job_id)) or []
+        if not targets and edge.type != "singleton":
+            edges.append({"job_id": edge.job_id, "type": edge.type, "in_window": False})
+        for target in targets:
+            if target in seen:
+                continue
+            seen.add(target)
+            dependencies.append(target)
+            edges.append({"job_id": target, "type": edge.type, "in_window": True})
+    return dependencies, edges
+
+
+def job_order(job_id: str):
+    """Sort key putting job ids in submission order"""
+    base, _, task = job_id.partition("_")
+    return (int(base) if base.isdigit() else 0, task)
+
@@ -0,0 +1,203 @@
+import re
+import shlex
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models import JobState
+from . import parser
+
+# Job ids as squeue and sacct print them: plain, array task or het job component
+JOB_ID = re.compile(r"^\d+(?:_\d+)?(?:\+\d+)?$")
+
+# Most ids one detail request may ask for
+MAX_DETAIL_IDS = 100
+
+# Records of jobs that may still change are reused for this long
+DETAIL_TTL = 10.0
+
+# A job in one of these states is done; its record will not change again
+FINAL_STATES = frozenset({
+    JobState.COMPLETED, JobState.CANCELLED, JobState.FAILED, JobState.TIMEOUT, JobState.BOOT_FAIL,
+    JobState.DEADLINE, JobState.OUT_OF_MEMORY, JobState.REVOKED,
+})
+
+# sacct fields of a detail record, for jobs slurmctld has already forgotten.
+# The free-text fields go last, as in SACCT_FIELDS.
+DETAIL_SACCT_FIELDS = ["JobID", "State", "ExitCode", "Elapsed", "Timelimit", "NNodes", "NCPUS", "ReqMem",
+                       "Partition", "Account", "QOS", "NodeList", "Submit", "Start", "End", "User",
+                       "AllocTRES", "WorkDir", "JobName", "SubmitLine"]
+
+# Start of a "Key=" in ``scontrol -o`` output; values may contain spaces
+_KEY = re.compile(r"(?:^|(?<=\s))([A-Za-z][A-Za-z0-9:/_]*)=")
+
+# Filename patterns sbatch expands in --output and --error
+_PATTERNS = re.compile(r"%(%|[AajxuN])")
+
+
+def check_job_ids(job_ids: Iterable[str]) -> List[str]:
+    """The ids without duplicates, in order; ValueError if one is not a job id or there are too many"""
+    unique = list(dict.fromkeys(job_id.strip() for job_id in job_ids if job_id.strip()))
+    for job_id in unique:
+        if not JOB_ID.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+    if len(unique) > MAX_DETAIL_IDS:
+        raise ValueError(f"At most {MAX_DETAIL_IDS} job ids per request")
+    return unique
+
+
+def scontrol_command(job_ids: Sequence[str]) -> str:
+    """One remote command showing every job, so the batch costs a single round trip.
+
+    ``scontrol show job`` takes one id at a time; ids slurmctld no longer
+    knows only print an error to stderr.
+    """
+    return "; ".join(f"scontrol -o show job {shlex.quote(job_id)}" for job_id in job_ids)
+
+
+def sacct_command(job_ids: Sequence[str], fields: Sequence[str] = DETAIL_SACCT_FIELDS) -> str:
+    return f"sacct -X -j {','.join(job_ids)} --parsable2 --noheader -o {','.join(fields)}"
+
+
+def parse_scontrol_line(line: str) -> Dict[str, str]:
+    """Split one ``scontrol -o show job`` line into its fields"""
+    line = line.rstrip("\r\n")
+    keys = list(_KEY.finditer(line))
+    fields = {}
+    for match, following in zip(keys, keys[1:] + [None]):
+        end = following.start() if following is not None else len(line)
+        fields[match.group(1)] = line[match.end():end].strip()
+    return fields
+
+
+def parse_scontrol(lines: Iterable[str]) -> List[Dict[str, str]]:
+    return [fields for fields in map(parse_scontrol_line, lines) if "JobId" in fields]
+
+
+def scontrol_ids(fields: Dict[str, str]) -> Tuple[str, ...]:
+    """The ids a record answers to: its own, plus ``array_task`` or ``hetjob+offset`` for array tasks and het job components"""
+    ids = (fields["JobId"],)
+    task = fields.get("ArrayTaskId", "")
+    if fields.get("ArrayJobId") and task.isdigit():
+        ids += (f"{fields['ArrayJobId']}_{task}",)
+    if fields.get("HetJobId") and fields.get("HetJobOffset", "").isdigit():
+        ids += (f"{fields['HetJobId']}+{fields['HetJobOffset']}",)
+    return ids
+
+
+def expand_output_path(path: str, values: Dict[str, str]) -> str:
+    """Fill in the ``%j``-style patterns of an --output/--error path.
+
+    ``values`` maps pattern letters to their values; unknown ones expand
+    to nothing.
+    """
+    return _PATTERNS.sub(lambda match: "%" if match.group(1) == "%" else values.get(match.group(1), ""), path)
+
+
+def _record(job_id: str, source: str, state: str, fields: Dict[str, str],
+            stdout: Optional[str], stderr: Optional[str]) -> Dict:
+    state = JobState.parse(state)
+    return {
+        "job_id": job_id,
+        "state": state.value,
+        "final": state in FINAL_STATES,
+        "source": source,
+        "stdout": stdout,
+        "stderr": stderr,
+        "fields": fields,
+    }
+
+
+def scontrol_record(job_id: str, fields: Dict[str, str]) -> Dict:
+    values = {
+        "j": fields["JobId"],
+        "A": fields.get("ArrayJobId") or fields["JobId"],
+        "a": fields.get("ArrayTaskId", ""),
+        "x": fields.get("JobName", ""),
+        "u": fields.get("UserId", "").split("(", 1)[0],
+    }
+    paths = []
+    for key in ("StdOut", "StdErr"):
+        path = fields.get(key, "")
+        paths.append(expand_output_path(path, values) if path and path != "(null)" else None)
+    return _record(job_id, "scontrol", fields.get("JobState", ""), fields, *paths)
+
+
+def sacct_record(fields: Dict[str, str]) -> Dict:
+    """A record from sacct, which does not know the output files.
+
+    They are assumed to be sbatch's default, ``slurm-%j.out`` (``slurm-%A_%a.out``
+    for array tasks) in the working directory.
+    """
+    job_id = fields["JobID"]
+    stdout = f"{fields['WorkDir'].rstrip('/')}/slurm-{job_id}.out" if fields.get("WorkDir") else None
+    return _record(job_id, "sacct", fields.get("State", ""), fields, stdout, stdout)
+
+
+def parse_sacct_details(lines: Iterable[str], fields: Sequence[str] = DETAIL_SACCT_FIELDS) -> List[Dict]:
+    return [sacct_record(row) for row in parser.iter_sacct_jobs(lines, fields)]
+
+
+def match_scontrol(job_ids: Sequence[str], records: Iterable[Dict[str, str]]) -> Dict[str, Dict]:
+    """Detail records of the requested ids among what scontrol printed"""
+    wanted = set(job_ids)
+    found = {}
+    for fields in records:
+        for job_id in scontrol_ids(fields):
+            if job_id in wanted and job_id not in found:
+                found[job_id] = scontrol_record(job_id, fields)
+    return found
+
+
+class JobDetailCache:
+    """Job detail records of one cluster and user.
+
+    Records of finished jobs never change, so they are kept for good, in
+    ``store`` (the history store) when there is one so they survive a
+    restart. Records of other jobs are reused for ``ttl`` seconds.
+    """
+
+    def __init__(self, store=None, cluster: str = "", user: str = "", ttl: float = DETAIL_TTL):
+        self.store = store
+        self.cluster = cluster
+        self.user = user
+        self.ttl = ttl
+        self._final: Dict[str, Dict] = {}
+        self._recent: Dict[str, Tuple[float, Dict]] = {}
+
+    def lookup(self, job_ids: Sequence[str], now: Optional[float] = None) -> Tuple[Dict[str, Dict], List[str]]:
+        """The cached records among ``job_ids``, and the ids that have to be fetched"""
+        now = time.time() if now is None else now
+        found = {}
+        for job_id in job_ids:
+            record = self._final.get(job_id)
+            if record is None:
+                cached = self._recent.get(job_id)
+                if cached is not None and now - cached[0] <= self.ttl:
+                    record = cached[1]
+            if record is not None:
+                found[job_id] = record
+        missing = [job_id for job_id in job_ids if job_id not in found]
+        if missing and self.store is not None:
+            stored = self.store.details(self.cluster, self.user, missing)
+            self._final.update(stored)
+            found.update(stored)
+            missing = [job_id for job_id in missing if job_id not in stored]
+        return found, missing
+
+    def add(self, records: Iterable[Dict], now: Optional[float] = None):
+        now = time.time() if now is None else now
+        final = []
+        for record in records:
+            if record["final"]:
+                self._final[record["job_id"]] = record
+                self._recent.pop(record["job_id"], None)
+                final.append(record)
+            else:
+                self._recent[record["job_id"]] = (now, record)
+        for job_id in [job_id for job_id, (added, _) in self._recent.items() if now - added > self.ttl]:
+            del self._recent[job_id]
+        if final and self.store is not None:
+            self.store.add_details(self.cluster, self.user, final)
+
+    def __len__(self) -> int:
+        return len(self._final) + len(self._recent)
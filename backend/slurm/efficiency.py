@@ -0,0 +1,228 @@
+"""seff-style efficiency of finished jobs, for whole job sets at once.
+
+From sacct's TotalCPU, MaxRSS and ExitCode next to the elapsed time and
+the allocation, each finished job gets a CPU efficiency, a memory
+efficiency (the largest task's peak RSS over the job's allocated memory,
+as seff reports it), wasted core-hours and how many times over it asked
+for cores and memory. ``UsageBatch`` holds these as columns, the history
+store caches them per finished job, and ``report`` rolls them up per
+user and per job name so the most wasteful pipelines stand out.
+"""
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .details import FINAL_STATES
+from .history import SYNC_OVERLAP
+from .models import JobInfo, JobState, UsageBatch
+from .units import parse_duration, parse_memory
+from . import parser
+
+logger = logging.getLogger(__name__)
+
+# sacct is asked for at most this much history per command when filling in
+# older usage, so no single command runs into the command timeout
+USAGE_CHUNK = 7 * 86400
+
+# Longest a request spends filling in history; it answers from whatever is
+# covered by then and the next request carries on from there
+USAGE_DEADLINE = 10.0
+
+# Most groups and jobs a report lists
+MAX_REPORT_ROWS = 200
+
+# States a job's usage is final in. A requeued job may run again under the
+# same id; its row is then simply replaced.
+ENDED_STATES = FINAL_STATES | {JobState.NODE_FAIL, JobState.PREEMPTED}
+
+# What fetches usage for a span: (start, end, all_users) -> (batch, error)
+UsageFetch = Callable[[float, float, bool], Awaitable[Tuple[UsageBatch, str]]]
+
+
+def tres_memory(tres: Optional[str]) -> int:
+    """Memory in an AllocTRES string (``cpu=4,mem=16G``) in bytes, 0 if absent"""
+    for item in (tres or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == "mem":
+            return parse_memory(value)
+    return 0
+
+
+def merge_step(job: Dict, step: Dict):
+    """Fold a step's usage into its job row, for ``parser.iter_sacct_jobs``.
+
+    Keeps the largest MaxRSS (only steps report it) and adds up the steps'
+    CPU time, for sacct versions that leave the job line's TotalCPU empty.
+    """
+    rss = step.get("MaxRSS")
+    if rss and rss != "0":
+        job["_max_rss"] = max(job.get("_max_rss", 0), parse_memory(rss))
+    cpu = step.get("TotalCPU")
+    if cpu and cpu != "00:00:00":
+        job["_step_cpu"] = job.get("_step_cpu", 0) + (parse_duration(cpu) or 0)
+
+
+def add_sacct_row(usage: UsageBatch, job: JobInfo, row: Dict):
+    """Append a finished job's figures from its sacct row.
+
+    ``_max_rss`` and ``_step_cpu`` in the row are what ``merge_step``
+    gathered from the job's steps.
+    """
+    # seff's allocation: the job's memory TRES, else the request per node
+    alloc_mem = tres_memory(row.get("AllocTRES")) or job.memory * max(job.nodes, 1)
+    total_cpu = max(parse_duration(row.get("TotalCPU")) or 0, row.get("_step_cpu", 0))
+    max_rss = max(parse_memory(row.get("MaxRSS")), row.get("_max_rss", 0))
+    usage.append(job.job_id, job.user, job.name, job.status.value, row.get("ExitCode", ""), job.end_time,
+                 job.nodes, job.cpus, job.time or 0, float(total_cpu), alloc_mem, max_rss)
+
+
+def parse_sacct_usage(lines: Iterable[str], fields: Sequence[str] = parser.HISTORY_SACCT_FIELDS
+                      ) -> Tuple[List[JobInfo], UsageBatch]:
+    """Jobs from sacct output, and the usage of those that have ended, in one pass"""
+    jobs = []
+    usage = UsageBatch()
+    for row in parser.iter_sacct_jobs(lines, fields, merge_step):
+        job = parser.sacct_row_to_job(row)
+        jobs.append(job)
+        if job.end_time and job.status in ENDED_STATES:
+            add_sacct_row(usage, job, row)
+    return jobs, usage.compute()
+
+
+def usage_gaps(coverage: Optional[Tuple[float, float]], since: float, now: float,
+               chunk: float = USAGE_CHUNK) -> List[Tuple[float, float]]:
+    """The spans a store with ``coverage`` (covered_from, high_water) lacks for since..now.
+
+    Newest first and at most ``chunk`` long each, so an interrupted fill
+    leaves the store covering an unbroken span back from now.
+    """
+    if coverage is None:
+        spans = [(since, now)]
+    else:
+        covered_from, high_water = coverage
+        spans = []
+        if high_water < now - SYNC_OVERLAP:
+            spans.append((max(since, high_water - SYNC_OVERLAP), now))
+        if covered_from > since:
+            spans.append((since, covered_from))
+    gaps = []
+    for start, end in spans:
+        while end > start:
+            gaps.append((max(start, end - chunk), end))
+            end -= chunk
+    return gaps
+
+
+async def fetch_usage(client, fetch: UsageFetch, since: float, all_users: bool = False,
+                      deadline: Optional[float] = None) -> UsageBatch:
+    """Usage of the jobs that ended since ``since``, for SlurmClient and RestClient.
+
+    With a history store, ``fetch`` is only asked for the spans the store
+    lacks, one chunk at a time until ``deadline`` (``time.monotonic()``),
+    and the batch comes from the store; its ``covered_from`` tells how far
+    back it is complete. Without one, the whole span is fetched at once.
+    Raises if that fails, rather than reporting no usage.
+    """
+    now = time.time()
+    if client.history is None:
+        usage, error = await fetch(since, now, all_users)
+        if error:
+            client.command_errors += 1
+            raise RuntimeError(f"Error fetching usage: {error}")
+        usage.covered_from = since
+        return usage
+    store, cluster, user = client.history, client.hostname, client.username
+    coverage = await client.executor.run(store.usage_coverage, cluster, user, all_users)
+    for start, end in usage_gaps(coverage, since, now):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        usage, error = await fetch(start, end, all_users)
+        if error:
+            client.command_errors += 1
+            logger.warning("Error fetching usage of %s: %s", cluster, error)
+            break
+        await client.executor.run(store.add_usage, cluster, user, usage, start, end, all_users)
+    return await client.executor.run(store.usage, cluster, user, since, all_users)
+
+
+def _accumulate(batch: UsageBatch, keys: Iterable[str]) -> Dict[str, List[float]]:
+    """Per key: jobs, failed jobs, core-seconds, CPU seconds, wasted core-hours,
+    and allocated and peak memory of the jobs whose peak is known"""
+    columns = batch.columns
+    sums: Dict[str, List[float]] = {}
+    for key, cpus, elapsed, used, wasted, allocated, peak, exit_code in zip(
+            keys, columns["cpus"], columns["elapsed"], columns["total_cpu"], columns["wasted_core_hours"],
+            columns["alloc_mem"], columns["max_rss"], columns["exit_code"]):
+        group = sums.get(key)
+        if group is None:
+            group = sums[key] = [0, 0, 0, 0.0, 0.0, 0, 0]
+        group[0] += 1
+        if exit_code not in ("0:0", ""):
+            group[1] += 1
+        group[2] += cpus * elapsed
+        group[3] += used
+        group[4] += wasted
+        if allocated and peak:
+            group[5] += allocated
+            group[6] += peak
+    return sums
+
+
+def _figures(sums: List[float]) -> Dict:
+    jobs, failed, core_seconds, used, wasted, allocated, peak = sums
+    return {
+        "jobs": jobs,
+        "failed": failed,
+        "core_hours": round(core_seconds / 3600, 2),
+        "used_core_hours": round(used / 3600, 2),
+        "wasted_core_hours": round(wasted, 2),
+        "cpu_efficiency": round(used / core_seconds, 4) if core_seconds else None,
+        "memory_efficiency": round(peak / allocated, 4) if allocated else None,
+        "cpu_over_request": round(core_seconds / used, 2) if used else None,
+        "memory_over_request": round(allocated / peak, 2) if peak else None,
+    }
+
+
+def rollup(batch: UsageBatch, by: str, limit: int = 20) -> List[Dict]:
+    """Totals per user (``by="user"``) or job name, most wasted core-hours first"""
+    sums = _accumulate(batch, batch.columns[by])
+    top = heapq.nlargest(limit, sums.items(), key=lambda item: item[1][4])
+    return [{by: key, **_figures(group)} for key, group in top]
+
+
+def top_jobs(batch: UsageBatch, limit: int = 20) -> List[Dict]:
+    """The jobs that wasted the most core-hours, with their own figures"""
+    columns = batch.columns
+    wasted = columns["wasted_core_hours"]
+    jobs = []
+    for i in heapq.nlargest(limit, range(len(batch)), key=wasted.__getitem__):
+        peak, allocated = columns["max_rss"][i], columns["alloc_mem"][i]
+        jobs.append({
+            "job_id": columns["job_id"][i], "user": columns["user"][i], "name": columns["name"][i],
+            "state": columns["state"][i], "exit_code": columns["exit_code"][i],
+            "end_time": columns["end_time"][i], "cpus": columns["cpus"][i], "elapsed": columns["elapsed"][i],
+            "cpu_efficiency": round(columns["cpu_efficiency"][i], 4),
+            "memory_efficiency": round(columns["memory_efficiency"][i], 4) if peak else None,
+            "wasted_core_hours": round(wasted[i], 2),
+            "memory_over_request": round(allocated / peak, 2) if peak else None,
+        })
+    return jobs
+
+
+def report(batch: UsageBatch, since: float, limit: int = 20) -> Dict:
+    """Totals, per-user and per-job-name rollups and the most wasteful jobs of a batch.
+
+    ``complete`` is false while the batch does not yet reach back to
+    ``since``; ``covered_from`` says how far it does.
+    """
+    totals = _accumulate(batch, [""] * len(batch)).get("", [0, 0, 0, 0.0, 0.0, 0, 0])
+    return {
+        "since": since,
+        "covered_from": max(since, batch.covered_from),
+        "complete": batch.covered_from <= since,
+        "totals": _figures(totals),
+        "by_user": rollup(batch, "user", limit),
+        "by_name": rollup(batch, "name", limit),
+        "jobs": top_jobs(batch, limit),
+    }
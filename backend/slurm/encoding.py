@@ -0,0 +1,96 @@
+import gzip
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it only gzip is offered
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the headers would eat the gain
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings() -> List[str]:
+    """Content codings we can produce, in order of preference"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred coding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in supported_encodings():
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data: bytes, coding: str) -> bytes:
+    if coding == "gzip":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if coding == "br" and brotli is not None:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported content coding '{coding}'")
+
+
+class EncodedBody:
+    """A response body encoded to JSON once, with each compressed variant made once.
+
+    Every request for the same snapshot is then answered with the same
+    bytes, whatever the number of viewers. Variants are made on first use,
+    or ahead of it with ``prepare``.
+    """
+
+    def __init__(self, content: Any):
+        self.identity = to_json(content)
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.identity)
+
+    def has(self, coding: Optional[str]) -> bool:
+        """Whether ``get(coding)`` is answered without compressing"""
+        return coding is None or len(self.identity) < MIN_COMPRESS_SIZE or coding in self._variants
+
+    def codings(self) -> List[str]:
+        """The compressed variants made so far"""
+        return list(self._variants)
+
+    def prepare(self, codings: List[str]):
+        for coding in codings:
+            self.get(coding)
+
+    def get(self, coding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """The body in ``coding`` (None for identity), and the coding actually used"""
+        if coding is None or len(self.identity) < MIN_COMPRESS_SIZE:
+            return self.identity, None
+        variant = self._variants.get(coding)
+        if variant is None:
+            with self._lock:
+                # Concurrent first requests compress once
+                variant = self._variants.get(coding)
+                if variant is None:
+                    variant = self._variants[coding] = compress(self.identity, coding)
+        return variant, coding
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+
+class Subscription:
+    """One client's queue of job change events for a time range.
+
+    The queue is bounded. A subscriber that falls behind loses its queued
+    events and gets a single ``resync`` marker instead, after which it is
+    sent a full snapshot rather than the changes it missed.
+    """
+
+    RESYNC = "resync"
+
+    def __init__(self, time_range: str, max_queue: int):
+        self.time_range = time_range
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, event: Dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": self.RESYNC})
+
+    async def next(self, timeout: float) -> Optional[Dict]:
+        """Wait for the next event, or return None after ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    """Fans job change events from one poller out to all its subscribers"""
+
+    def __init__(self, max_queue: int = 32):
+        self.max_queue = max_queue
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, time_range: str) -> Subscription:
+        subscription = Subscription(time_range, self.max_queue)
+        self._subscribers.setdefault(time_range, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.time_range)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.time_range]
+
+    def has_subscribers(self, time_range: str) -> bool:
+        return bool(self._subscribers.get(time_range))
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, time_range: str, version: int, delta: Dict):
+        """Queue a snapshot change for everyone watching ``time_range``"""
+        event = {"type": "changes", "version": version, **delta}
+        for subscription in list(self._subscribers.get(time_range, ())):
+            subscription.offer(event)
+
+    def close(self):
+        """Tell every subscriber the stream is over"""
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait({"type": "closed"})
+        self._subscribers.clear()
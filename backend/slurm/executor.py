@@ -0,0 +1,71 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class CommandTimeout(Exception):
+    """Raised when a remote command does not finish within its timeout"""
+
+
+class CommandHandle:
+    """Tracks the SSH channel of one running command so it can be aborted.
+
+    The blocking side attaches the channel once the command has started; the
+    async side calls ``cancel()`` on timeout or cancellation, which closes the
+    channel and unblocks the worker thread reading from it.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.cancelled = False
+        self._channel = None
+        self._lock = threading.Lock()
+
+    def attach(self, channel):
+        with self._lock:
+            self._channel = channel
+            if self.cancelled:
+                channel.close()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._channel is not None:
+                self._channel.close()
+
+
+class CommandExecutor:
+    """Runs blocking SSH work on a bounded thread pool.
+
+    Keeps paramiko's blocking calls off the event loop. The pool is shared by
+    every client, so a burst of slow commands cannot spawn unbounded threads.
+    """
+
+    def __init__(self, max_workers: int = 16):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="slurm-ssh")
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None):
+        """Run ``func(*args)`` on the pool, waiting at most ``timeout`` seconds"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, func, *args)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise CommandTimeout(f"Timed out after {timeout}s")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+_default_executor: Optional[CommandExecutor] = None
+
+
+def get_default_executor() -> CommandExecutor:
+    """Return the process-wide executor, sized by SWATCH_SSH_WORKERS"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = CommandExecutor(int(os.environ.get("SWATCH_SSH_WORKERS", "16")))
+    return _default_executor
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from .aggregates import combine_summaries
+from .graph import ClusterGraphs
+from .metrics import get_default_registry
+from .poller import JobSnapshot, SnapshotPoller
+
+# How long a request waits for each cluster before answering without it
+CLUSTER_TIMEOUT = 10.0
+
+CLUSTER_ANSWERS = get_default_registry().counter(
+    "swatch_cluster_answers_total", "Per-cluster results of multi-cluster requests: ok, timeout or error",
+    ["cluster", "result"])
+
+
+def _consume(task: asyncio.Future):
+    # A late answer only warms the cluster's cache; its error was already reported
+    if not task.cancelled():
+        task.exception()
+
+
+class FanOutPoller:
+    """Presents the SnapshotPollers of several clusters as one.
+
+    Every read asks all clusters at once and waits at most ``timeout`` for
+    each, so a request takes as long as the slowest cluster, not the sum.
+    Clusters that fail or time out are left out of the result and reported
+    in the merged snapshot's ``clusters``; a fetch that timed out keeps
+    running, so the next request can include that cluster again. Jobs keep
+    their own ids and carry their ``cluster``.
+    """
+
+    def __init__(self, members: Dict[str, SnapshotPoller], timeout: float = CLUSTER_TIMEOUT):
+        self.members = members
+        self.timeout = timeout
+        self._version = 0
+        self._snapshots: Dict[str, Tuple[Tuple, JobSnapshot]] = {}
+        self._graphs: Dict[str, Tuple[Tuple, ClusterGraphs]] = {}
+
+    async def _ask(self, call: Callable[[SnapshotPoller], Awaitable]) -> Tuple[Dict, Dict[str, Dict]]:
+        """``call`` on every cluster: the results of those that answered in time, and each one's status"""
+        tasks = OrderedDict((cluster, asyncio.ensure_future(call(poller)))
+                            for cluster, poller in self.members.items())
+
+        async def wait(task):
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+
+        try:
+            outcomes = await asyncio.gather(*(wait(task) for task in tasks.values()), return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        results, status = {}, {}
+        for (cluster, task), outcome in zip(tasks.items(), outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                task.add_done_callback(_consume)
+                status[cluster] = {"ok": False, "error": f"No answer within {self.timeout:g}s"}
+                CLUSTER_ANSWERS.inc(cluster=cluster, result="timeout")
+            elif isinstance(outcome, BaseException):
+                status[cluster] = {"ok": False, "error": str(outcome) or type(outcome).__name__}
+                CLUSTER_ANSWERS.inc(cluster=cluster, result="error")
+            else:
+                results[cluster] = outcome
+                status[cluster] = {"ok": True}
+                CLUSTER_ANSWERS.inc(cluster=cluster, result="ok")
+        if not results:
+            reasons = "; ".join(f"{cluster}: {state['error']}" for cluster, state in status.items())
+            raise RuntimeError(f"No cluster answered ({reasons})")
+        return results, status
+
+    def _next_version(self) -> int:
+        self._version = max(self._version + 1, int(time.time() * 1000))
+        return self._version
+
+    async def get_snapshot(self, time_range: str) -> JobSnapshot:
+        """The jobs of every cluster that answered, merged into one snapshot.
+
+        The merged snapshot is reused, and keeps its version, for as long as
+        the same clusters answer with the same versions.
+        """
+        snapshots, status = await self._ask(lambda poller: poller.get_snapshot(time_range))
+        key = tuple((cluster, snapshot.version) for cluster, snapshot in snapshots.items())
+        cached = self._snapshots.get(time_range)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        for cluster, snapshot in snapshots.items():
+            status[cluster].update(version=snapshot.version, last_updated=snapshot.last_updated)
+        digest = hashlib.sha1(" ".join(f"{cluster}={snapshot.digest}" for cluster, snapshot
+                                       in snapshots.items()).encode('utf-8')).hexdigest()
+        merged = JobSnapshot(
+            time_range=time_range,
+            active_jobs=[job for snapshot in snapshots.values() for job in snapshot.active_jobs],
+            completed_jobs=[job for snapshot in snapshots.values() for job in snapshot.completed_jobs],
+            fetched_at=min(snapshot.fetched_at for snapshot in snapshots.values()),
+            version=self._next_version(),
+            digest=digest,
+            clusters=status,
+        )
+        self._snapshots[time_range] = (key, merged)
+        return merged
+
+    def delta(self, time_range: str, since: int) -> Optional[Dict]:
+        """Only "nothing changed"; ids repeat across clusters, so any other delta is sent in full"""
+        cached = self._snapshots.get(time_range)
+        if cached is not None and cached[1].version == since:
+            return {"added": [], "changed": [], "removed": []}
+        return None
+
+    async def get_graph(self, time_range: str) -> ClusterGraphs:
+        """Each answering cluster's dependency graph, combined with ids qualified as ``cluster/job_id``"""
+        graphs, status = await self._ask(lambda poller: poller.get_graph(time_range))
+        key = tuple((cluster, id(graph), graph.version) for cluster, graph in graphs.items())
+        cached = self._graphs.get(time_range)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        combined = ClusterGraphs(graphs, version=self._next_version(), clusters=status)
+        self._graphs[time_range] = (key, combined)
+        return combined
+
+    def aggregates(self, time_range: str) -> Optional["ClusterAggregates"]:
+        """Totals of the clusters in the latest merged snapshot"""
+        cached = self._snapshots.get(time_range)
+        if cached is None:
+            return None
+        members = {}
+        for cluster, state in cached[1].clusters.items():
+            aggregates = self.members[cluster].aggregates(time_range) if state["ok"] else None
+            if aggregates is not None:
+                members[cluster] = aggregates
+        return ClusterAggregates(members)
+
+
+class ClusterAggregates:
+    """JobAggregates of several clusters, added up when read"""
+
+    def __init__(self, members: Dict):
+        self.members = members
+
+    def to_dict(self, now: Optional[float] = None) -> Dict:
+        return combine_summaries({cluster: aggregates.to_dict(now) for cluster, aggregates in self.members.items()})
+
+
+class SessionPollers:
+    """Finds the poller serving a session, fanning out when it spans several clusters.
+
+    Subclasses say where each cluster's poller comes from.
+    """
+
+    def __init__(self, cluster_timeout: float = CLUSTER_TIMEOUT):
+        self.cluster_timeout = cluster_timeout
+        self._fanouts: Dict[Tuple, FanOutPoller] = {}
+
+    def member(self, session, hostname: str, username: str) -> Optional[SnapshotPoller]:
+        raise NotImplementedError
+
+    def poller(self, session):
+        """A SnapshotPoller, a FanOutPoller over several, or None if the session cannot be served here"""
+        members = {}
+        for hostname, username in session.clusters:
+            member = self.member(session, hostname, username)
+            if member is None:
+                return None
+            members[hostname] = member
+        if len(members) == 1:
+            return next(iter(members.values()))
+        fanout = self._fanouts.get(session.clusters)
+        if fanout is None or fanout.members != members:
+            fanout = self._fanouts[session.clusters] = FanOutPoller(members, self.cluster_timeout)
+        return fanout
+
+    def prune(self, sessions: Iterable):
+        """Drop the fan-outs no remaining session uses"""
+        live = {session.clusters for session in sessions}
+        for key in list(self._fanouts):
+            if key not in live:
+                del self._fanouts[key]
@@ -0,0 +1,402 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .client import JobInfo
+from .dependencies import array_base, job_order, parse_dependency, resolve_edges
+
+# Spacing of the layout grid, in the logical pixels the Flutter graph uses
+LAYER_SPACING = 250
+ROW_SPACING = 200
+
+
+@dataclass
+class GraphDelta:
+    """What changed in the graph in one update"""
+    version: int
+    added_nodes: List[str] = field(default_factory=list)
+    removed_nodes: List[str] = field(default_factory=list)
+    changed_nodes: List[str] = field(default_factory=list)
+    added_edges: List[Tuple[str, str]] = field(default_factory=list)
+    removed_edges: List[Tuple[str, str]] = field(default_factory=list)
+    relaid_nodes: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added_nodes or self.removed_nodes or self.changed_nodes
+                    or self.added_edges or self.removed_edges)
+
+
+class JobGraph:
+    """Dependency DAG of a job list, kept up to date from one snapshot to the next.
+
+    ``update`` diffs the new job list against the current one. Edges are only
+    re-resolved for jobs that were added or changed, or whose upstream jobs
+    appeared or disappeared. Layers, critical-path lengths and coordinates
+    are then recomputed for the affected jobs and their descendants only.
+    The layout is layered: ``x`` is the topological layer (the longest
+    chain of in-window dependencies above the job) and ``y`` its row
+    within that layer.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.jobs: Dict[str, JobInfo] = {}
+        self.parents: Dict[str, List[str]] = {}
+        self.children: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self.edges: Dict[str, List[Dict]] = {}
+        self.layer: Dict[str, int] = {}
+        self.path_seconds: Dict[str, int] = {}
+        self.best_parent: Dict[str, Optional[str]] = {}
+        self.last_delta = GraphDelta(version=0)
+        # Dicts used as ordered sets so output follows submission order
+        self._by_array: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self._by_name: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # Unresolved dependency id -> jobs that would link to it once it appears
+        self._waiting: Dict[str, Set[str]] = defaultdict(set)
+        self._waiting_keys: Dict[str, Set[str]] = {}
+        self._layer_members: Dict[int, Dict[str, None]] = defaultdict(dict)
+        self._rows: Dict[int, Dict[str, int]] = {}
+        self._critical_path: Optional[Dict] = None
+
+    def update(self, jobs: Iterable[JobInfo]) -> GraphDelta:
+        """Apply a new job list and return what changed"""
+        new_jobs: Dict[str, JobInfo] = {}
+        for job in jobs:
+            new_jobs.setdefault(job.job_id, job)
+
+        delta = GraphDelta(version=self.version)
+        delta.removed_nodes = [job_id for job_id in self.jobs if job_id not in new_jobs]
+        for job_id, job in new_jobs.items():
+            old = self.jobs.get(job_id)
+            if old is None:
+                delta.added_nodes.append(job_id)
+            elif old != job:
+                delta.changed_nodes.append(job_id)
+
+        relink: Dict[str, None] = {}
+        relayout: Dict[str, None] = dict.fromkeys(delta.added_nodes)
+        names: Set[str] = set()
+
+        for job_id in delta.removed_nodes:
+            job = self.jobs.pop(job_id)
+            names.add(job.name)
+            self._unindex(job)
+            for child in self.children.get(job_id, ()):
+                relink[child] = None
+                relayout[child] = None
+            self._drop_edges(job_id, delta)
+            self._forget_waiting(job_id)
+            self._set_layer(job_id, None)
+            for table in (self.parents, self.edges, self.path_seconds, self.best_parent):
+                table.pop(job_id, None)
+            self.children.pop(job_id, None)
+
+        for job_id in delta.changed_nodes:
+            old, new = self.jobs[job_id], new_jobs[job_id]
+            self.jobs[job_id] = new
+            if old.name != new.name:
+                names.update((old.name, new.name))
+                self._unindex(old)
+                self._index(new)
+            if old.dependency != new.dependency:
+                relink[job_id] = None
+            if old.time != new.time:
+                # Durations feed the critical path
+                relayout[job_id] = None
+
+        for job_id in delta.added_nodes:
+            job = new_jobs[job_id]
+            self.jobs[job_id] = job
+            self._index(job)
+            names.add(job.name)
+            relink[job_id] = None
+            # Jobs whose dependency on this id was outside the window until now
+            for key in (job_id, array_base(job_id)):
+                for waiting in self._waiting.get(key, ()):
+                    relink[waiting] = None
+
+        # A job entering or leaving a name group can change who its singleton
+        # jobs wait for
+        for name in names:
+            for job_id in self._by_name.get(name, ()):
+                if any(e.type == "singleton" for e in parse_dependency(self.jobs[job_id].dependency)):
+                    relink[job_id] = None
+
+        name_order: Dict[str, List[str]] = {}
+
+        def previous_same_name(job_id: str) -> Optional[str]:
+            name = self.jobs[job_id].name
+            if name not in name_order:
+                name_order[name] = sorted(self._by_name[name], key=job_order)
+            ordered = name_order[name]
+            position = ordered.index(job_id)
+            return ordered[position - 1] if position else None
+
+        for job_id in relink:
+            if job_id not in self.jobs:
+                continue
+            dependencies, edges = resolve_edges(self.jobs[job_id], self.jobs, self._by_array, previous_same_name)
+            self.edges[job_id] = edges
+            if dependencies != self.parents.get(job_id):
+                self._set_parents(job_id, dependencies, delta)
+                relayout[job_id] = None
+            self._forget_waiting(job_id)
+            keys = set()
+            for edge in edges:
+                if not edge["in_window"]:
+                    keys.update((edge["job_id"], array_base(edge["job_id"])))
+            for key in keys:
+                self._waiting[key].add(job_id)
+            self._waiting_keys[job_id] = keys
+
+        delta.relaid_nodes = self._relayout(relayout)
+
+        if not delta.empty:
+            self.version += 1
+            self._critical_path = None
+        delta.version = self.version
+        self.last_delta = delta
+        return delta
+
+    def _index(self, job: JobInfo):
+        self._by_array[array_base(job.job_id)][job.job_id] = None
+        self._by_name[job.name][job.job_id] = None
+
+    def _unindex(self, job: JobInfo):
+        for table, key in ((self._by_array, array_base(job.job_id)), (self._by_name, job.name)):
+            members = table.get(key)
+            if members is not None:
+                members.pop(job.job_id, None)
+                if not members:
+                    del table[key]
+
+    def _forget_waiting(self, job_id: str):
+        for key in self._waiting_keys.pop(job_id, ()):
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.discard(job_id)
+                if not waiting:
+                    del self._waiting[key]
+
+    def _set_parents(self, job_id: str, parents: List[str], delta: GraphDelta):
+        old = self.parents.get(job_id, [])
+        old_set, new_set = set(old), set(parents)
+        for parent in old:
+            if parent not in new_set:
+                self.children[parent].pop(job_id, None)
+                delta.removed_edges.append((parent, job_id))
+        for parent in parents:
+            if parent not in old_set:
+                self.children[parent][job_id] = None
+                delta.added_edges.append((parent, job_id))
+        self.parents[job_id] = parents
+
+    def _drop_edges(self, job_id: str, delta: GraphDelta):
+        for parent in self.parents.get(job_id, []):
+            if parent in self.children:
+                self.children[parent].pop(job_id, None)
+            delta.removed_edges.append((parent, job_id))
+        for child in self.children.get(job_id, ()):
+            if child in self.parents:
+                self.parents[child] = [p for p in self.parents[child] if p != job_id]
+            delta.removed_edges.append((job_id, child))
+
+    def _relayout(self, dirty: Iterable[str]) -> int:
+        """Recompute layer and critical path for dirty jobs and everything below them"""
+        affected: Set[str] = set()
+        queue = deque(job_id for job_id in dirty if job_id in self.jobs)
+        while queue:
+            job_id = queue.popleft()
+            if job_id in affected:
+                continue
+            affected.add(job_id)
+            queue.extend(self.children.get(job_id, ()))
+
+        # Kahn's algorithm restricted to the affected jobs; parents outside
+        # that set already have final values
+        pending = {job_id: sum(1 for p in self.parents.get(job_id, []) if p in affected) for job_id in affected}
+        ready = deque(sorted((job_id for job_id, n in pending.items() if n == 0), key=job_order))
+        done = 0
+        while ready:
+            job_id = ready.popleft()
+            self._layout_node(job_id)
+            done += 1
+            for child in self.children.get(job_id, ()):
+                if child in pending:
+                    pending[child] -= 1
+                    if pending[child] == 0:
+                        ready.append(child)
+        if done < len(affected):
+            # Dependency cycle (e.g. a hand-edited dependency); place the
+            # remaining jobs from whatever their parents already have
+            for job_id in sorted(affected, key=job_order):
+                if pending.get(job_id):
+                    self._layout_node(job_id)
+        return len(affected)
+
+    def _layout_node(self, job_id: str):
+        layer, path, best = 0, 0, None
+        for parent in self.parents.get(job_id, []):
+            if parent not in self.layer:
+                continue
+            layer = max(layer, self.layer[parent] + 1)
+            if best is None or self.path_seconds[parent] > path:
+                path, best = self.path_seconds[parent], parent
+        self._set_layer(job_id, layer)
+        self.path_seconds[job_id] = path + (self.jobs[job_id].time or 0)
+        self.best_parent[job_id] = best
+
+    def _set_layer(self, job_id: str, layer: Optional[int]):
+        old = self.layer.get(job_id)
+        if old == layer:
+            return
+        if old is not None:
+            self._layer_members[old].pop(job_id, None)
+            self._rows.pop(old, None)
+            if not self._layer_members[old]:
+                del self._layer_members[old]
+        if layer is None:
+            self.layer.pop(job_id, None)
+        else:
+            self.layer[job_id] = layer
+            self._layer_members[layer][job_id] = None
+            self._rows.pop(layer, None)
+
+    def position(self, job_id: str) -> Tuple[int, int]:
+        """Return the (x, y) layout coordinates of a job"""
+        layer = self.layer[job_id]
+        rows = self._rows.get(layer)
+        if rows is None:
+            rows = {member: row for row, member in enumerate(self._layer_members[layer])}
+            self._rows[layer] = rows
+        return layer * LAYER_SPACING, rows[job_id] * ROW_SPACING
+
+    def rows(self) -> int:
+        """Number of jobs in the fullest layer"""
+        return max((len(members) for members in self._layer_members.values()), default=0)
+
+    def critical_path(self) -> Dict:
+        """Longest chain of jobs by summed run/limit time, ending anywhere"""
+        if self._critical_path is None:
+            end = max(self.path_seconds, key=lambda job_id: (self.path_seconds[job_id], job_id), default=None)
+            path = []
+            while end is not None:
+                path.append(end)
+                end = self.best_parent.get(end)
+            path.reverse()
+            self._critical_path = {
+                "jobs": path,
+                "seconds": self.path_seconds[path[-1]] if path else 0,
+                "length": len(path),
+            }
+        return self._critical_path
+
+    def related(self, root: str, direction: str = "descendants") -> List[str]:
+        """Return ``root`` and its descendants or ancestors, in breadth-first order"""
+        if root not in self.jobs:
+            return []
+        links = self.children if direction == "descendants" else self.parents
+        seen = {root: None}
+        queue = deque([root])
+        while queue:
+            job_id = queue.popleft()
+            for other in links.get(job_id, ()):
+                if other not in seen:
+                    seen[other] = None
+                    queue.append(other)
+        return list(seen)
+
+    def node(self, job_id: str) -> Dict:
+        x, y = self.position(job_id)
+        return {
+            "job": self.jobs[job_id],
+            "dependencies": self.parents.get(job_id, []),
+            "edges": self.edges.get(job_id, []),
+            "layer": self.layer[job_id],
+            "x": x,
+            "y": y,
+            "critical_seconds": self.path_seconds[job_id],
+        }
+
+    def to_dict(self, job_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """Serialize the graph, or the given part of it, in the /job_graph format"""
+        ids = self.jobs if job_ids is None else job_ids
+        return {job_id: self.node(job_id) for job_id in ids}
+
+
+def qualify(cluster: str, job_id: str) -> str:
+    return f"{cluster}/{job_id}"
+
+
+class ClusterGraphs:
+    """The dependency graphs of several clusters, presented as one JobGraph.
+
+    Job ids repeat across clusters, so nodes are keyed ``cluster/job_id``.
+    Each cluster keeps its own layout; they are stacked one below the other.
+    """
+
+    def __init__(self, graphs: Dict[str, JobGraph], version: int = 0, clusters: Optional[Dict[str, Dict]] = None):
+        self.graphs = graphs
+        self.version = version
+        # Which clusters answered, as in JobSnapshot.clusters
+        self.clusters = clusters
+        self._offsets: Dict[str, int] = {}
+        offset = 0
+        for cluster, graph in graphs.items():
+            self._offsets[cluster] = offset
+            offset += graph.rows() * ROW_SPACING
+        self._jobs: Optional[Dict[str, JobInfo]] = None
+
+    @staticmethod
+    def split(job_id: str) -> Tuple[str, str]:
+        cluster, _, local_id = job_id.partition("/")
+        return cluster, local_id
+
+    @property
+    def jobs(self) -> Dict[str, JobInfo]:
+        if self._jobs is None:
+            self._jobs = {qualify(cluster, job_id): job
+                          for cluster, graph in self.graphs.items() for job_id, job in graph.jobs.items()}
+        return self._jobs
+
+    @property
+    def last_delta(self) -> GraphDelta:
+        merged = GraphDelta(version=self.version)
+        for cluster, graph in self.graphs.items():
+            delta = graph.last_delta
+            for name in ("added_nodes", "removed_nodes", "changed_nodes"):
+                getattr(merged, name).extend(qualify(cluster, job_id) for job_id in getattr(delta, name))
+            for name in ("added_edges", "removed_edges"):
+                getattr(merged, name).extend((qualify(cluster, parent), qualify(cluster, child))
+                                             for parent, child in getattr(delta, name))
+            merged.relaid_nodes += delta.relaid_nodes
+        return merged
+
+    def critical_path(self) -> Dict:
+        """The longest of the clusters' critical paths"""
+        best = {"jobs": [], "seconds": 0, "length": 0}
+        for cluster, graph in self.graphs.items():
+            path = graph.critical_path()
+            if path["length"] and (not best["length"] or path["seconds"] > best["seconds"]):
+                best = dict(path, jobs=[qualify(cluster, job_id) for job_id in path["jobs"]], cluster=cluster)
+        return best
+
+    def related(self, root: str, direction: str = "descendants") -> List[str]:
+        cluster, job_id = self.split(root)
+        graph = self.graphs.get(cluster)
+        if graph is None:
+            return []
+        return [qualify(cluster, other) for other in graph.related(job_id, direction)]
+
+    def node(self, job_id: str) -> Dict:
+        cluster, local_id = self.split(job_id)
+        node = dict(self.graphs[cluster].node(local_id))
+        node["dependencies"] = [qualify(cluster, parent) for parent in node["dependencies"]]
+        node["edges"] = [dict(edge, job_id=qualify(cluster, edge["job_id"])) for edge in node["edges"]]
+        node["y"] += self._offsets[cluster]
+        return node
+
+    def to_dict(self, job_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        ids = self.jobs if job_ids is None else job_ids
+        return {job_id: self.node(job_id) for job_id in ids}
@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .models import JobInfo, UsageBatch
+from .units import time_range_seconds
+
+logger = logging.getLogger(__name__)
+
+# sacct windows overlap the previous high-water mark by this many seconds,
+# so records written late by slurmdbd or a slightly skewed clock are not missed
+SYNC_OVERLAP = 120.0
+
+# Finished jobs older than this are dropped; it covers the widest time range
+HISTORY_RETENTION = 7 * 24 * 3600
+
+# Usage of finished jobs is kept much longer, for efficiency over months
+USAGE_RETENTION = 400 * 24 * 3600
+
+# Coverage scope of usage fetched for every user the login may see
+ALL_USERS = "*"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    cluster TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    time INTEGER,
+    nodes INTEGER NOT NULL,
+    cpus INTEGER NOT NULL,
+    memory INTEGER NOT NULL,
+    dependency TEXT NOT NULL,
+    end_time REAL NOT NULL,
+    partition TEXT NOT NULL,
+    submit_time REAL NOT NULL,
+    gpus INTEGER NOT NULL,
+    start_time REAL NOT NULL,
+    PRIMARY KEY (cluster, job_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_end ON jobs (cluster, user, end_time);
+CREATE TABLE IF NOT EXISTS sync (
+    cluster TEXT NOT NULL,
+    user TEXT NOT NULL,
+    covered_from REAL NOT NULL,
+    high_water REAL NOT NULL,
+    PRIMARY KEY (cluster, user)
+);
+CREATE TABLE IF NOT EXISTS details (
+    cluster TEXT NOT NULL,
+    user TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (cluster, user, job_id)
+);
+CREATE TABLE IF NOT EXISTS usage (
+    cluster TEXT NOT NULL,
+    viewer TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    exit_code TEXT NOT NULL,
+    end_time REAL NOT NULL,
+    nodes INTEGER NOT NULL,
+    cpus INTEGER NOT NULL,
+    elapsed INTEGER NOT NULL,
+    total_cpu REAL NOT NULL,
+    alloc_mem INTEGER NOT NULL,
+    max_rss INTEGER NOT NULL,
+    cpu_efficiency REAL NOT NULL,
+    memory_efficiency REAL NOT NULL,
+    wasted_core_hours REAL NOT NULL,
+    PRIMARY KEY (cluster, viewer, job_id)
+);
+CREATE INDEX IF NOT EXISTS usage_by_end ON usage (cluster, viewer, end_time);
+CREATE TABLE IF NOT EXISTS usage_sync (
+    cluster TEXT NOT NULL,
+    viewer TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    covered_from REAL NOT NULL,
+    high_water REAL NOT NULL,
+    PRIMARY KEY (cluster, viewer, scope)
+);
+"""
+
+# Bumped whenever the tables change; the store is a cache of sacct, so an
+# older file is simply dropped and filled again
+SCHEMA_VERSION = 6
+
+# Ids per detail lookup, below SQLite's limit on bound parameters
+_DETAIL_BATCH = 500
+
+_COLUMNS = ("job_id", "name", "status", "time", "nodes", "cpus", "memory", "dependency", "end_time",
+            "partition", "submit_time", "gpus", "start_time")
+
+
+class JobHistoryStore:
+    """On-disk store of finished and running jobs from sacct.
+
+    Records are keyed by cluster and job id. For every cluster and user the
+    store remembers how far back it holds complete history
+    (``covered_from``) and when it last synced (``high_water``), so each
+    refresh only has to ask sacct for what changed since then. Time-range
+    queries are answered from the ``end_time`` index. Detail records of
+    finished jobs (see ``details.JobDetailCache``) are kept alongside.
+
+    The usage and efficiency figures of finished jobs (see ``efficiency``)
+    are kept per login (``viewer``) for much longer, with their own
+    coverage: one span for the login's own jobs and one for every user's
+    (``ALL_USERS``), since a login may see other users' jobs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript(
+                "DROP TABLE IF EXISTS jobs; DROP TABLE IF EXISTS sync; DROP TABLE IF EXISTS details; "
+                "DROP TABLE IF EXISTS usage; DROP TABLE IF EXISTS usage_sync;"
+            )
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(_SCHEMA)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+
+    def sync_start(self, cluster: str, user: str, window_start: float) -> float:
+        """Where the next sacct query has to start to cover ``window_start``..now.
+
+        That is just before the high-water mark when the store already
+        holds the whole window, otherwise the start of the window itself.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT covered_from, high_water FROM sync WHERE cluster = ? AND user = ?",
+                (cluster, user),
+            ).fetchone()
+        if row is None or row[0] > window_start:
+            return window_start
+        return max(window_start, row[1] - SYNC_OVERLAP)
+
+    def merge(self, cluster: str, user: str, jobs: List[JobInfo], fetched_from: float, synced_at: float):
+        """Upsert the jobs sacct returned for ``fetched_from``..``synced_at``"""
+        rows = [(cluster, user) + tuple(getattr(job, column) for column in _COLUMNS) for job in jobs]
+        with self._lock, self._db:
+            # Every job that has not ended overlaps the queried window, so
+            # sacct just returned it again; rows it did not return are stale
+            self._db.execute(
+                "DELETE FROM jobs WHERE cluster = ? AND user = ? AND end_time = 0", (cluster, user)
+            )
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO jobs (cluster, user, {', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(_COLUMNS) + 2))})",
+                rows,
+            )
+            previous = self._db.execute(
+                "SELECT covered_from, high_water FROM sync WHERE cluster = ? AND user = ?",
+                (cluster, user),
+            ).fetchone()
+            covered_from = fetched_from
+            if previous is not None and fetched_from <= previous[1]:
+                # No gap between the stored history and this query
+                covered_from = min(previous[0], fetched_from)
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync (cluster, user, covered_from, high_water) VALUES (?, ?, ?, ?)",
+                (cluster, user, covered_from, synced_at),
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE cluster = ? AND user = ? AND end_time > 0 AND end_time < ?",
+                (cluster, user, synced_at - HISTORY_RETENTION),
+            )
+
+    def query(self, cluster: str, user: str, window_start: float) -> List[JobInfo]:
+        """Jobs that ended after ``window_start`` or have not ended yet, in job id order"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs "
+                "WHERE cluster = ? AND user = ? AND (end_time >= ? OR end_time = 0) "
+                "ORDER BY CAST(job_id AS INTEGER), job_id",
+                (cluster, user, window_start),
+            ).fetchall()
+        # sacct only lists the user's own jobs, so the owner is the user column
+        return [JobInfo(user=user, **dict(zip(_COLUMNS, row))) for row in rows]
+
+    def details(self, cluster: str, user: str, job_ids: List[str]) -> Dict[str, Dict]:
+        """Stored detail records of the given jobs, by job id"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(job_ids), _DETAIL_BATCH):
+                batch = job_ids[start:start + _DETAIL_BATCH]
+                rows = self._db.execute(
+                    f"SELECT job_id, record FROM details WHERE cluster = ? AND user = ? "
+                    f"AND job_id IN ({', '.join('?' * len(batch))})",
+                    (cluster, user, *batch),
+                ).fetchall()
+                found.update((job_id, json.loads(record)) for job_id, record in rows)
+        return found
+
+    def add_details(self, cluster: str, user: str, records: List[Dict]):
+        """Keep the detail records of finished jobs; unlike job rows, they are never dropped"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO details (cluster, user, job_id, record) VALUES (?, ?, ?, ?)",
+                [(cluster, user, record["job_id"], json.dumps(record)) for record in records],
+            )
+
+    def usage_coverage(self, cluster: str, viewer: str, all_users: bool = False) -> Optional[Tuple[float, float]]:
+        """(covered_from, high_water) of the stored usage, or None if there is none"""
+        scope = ALL_USERS if all_users else viewer
+        with self._lock:
+            row = self._db.execute(
+                "SELECT covered_from, high_water FROM usage_sync WHERE cluster = ? AND viewer = ? AND scope = ?",
+                (cluster, viewer, scope),
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def add_usage(self, cluster: str, viewer: str, usage: UsageBatch, fetched_from: float, synced_at: float,
+                  all_users: bool = False):
+        """Upsert the usage fetched for ``fetched_from``..``synced_at``.
+
+        Spans are filled newest first; one that adjoins the stored span
+        extends it, a newer one past a gap replaces it and an older one
+        past a gap is stored without counting as covered.
+        """
+        scope = ALL_USERS if all_users else viewer
+        rows = [(cluster, viewer) + row for row in usage.rows()]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO usage (cluster, viewer, {', '.join(UsageBatch.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(UsageBatch.COLUMNS) + 2))})",
+                rows,
+            )
+            previous = self._db.execute(
+                "SELECT covered_from, high_water FROM usage_sync WHERE cluster = ? AND viewer = ? AND scope = ?",
+                (cluster, viewer, scope),
+            ).fetchone()
+            covered_from, high_water = fetched_from, synced_at
+            if previous is not None:
+                if fetched_from <= previous[1] and synced_at >= previous[0]:
+                    covered_from, high_water = min(previous[0], fetched_from), max(previous[1], synced_at)
+                elif synced_at < previous[0]:
+                    covered_from, high_water = previous
+            self._db.execute(
+                "INSERT OR REPLACE INTO usage_sync (cluster, viewer, scope, covered_from, high_water) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cluster, viewer, scope, covered_from, high_water),
+            )
+            self._db.execute(
+                "DELETE FROM usage WHERE cluster = ? AND viewer = ? AND end_time < ?",
+                (cluster, viewer, high_water - USAGE_RETENTION),
+            )
+
+    def usage(self, cluster: str, viewer: str, since: float, all_users: bool = False) -> UsageBatch:
+        """Stored usage of the jobs that ended after ``since``: the login's own, or every user's"""
+        query = (f"SELECT {', '.join(UsageBatch.COLUMNS)} FROM usage "
+                 "WHERE cluster = ? AND viewer = ? AND end_time >= ?")
+        params = [cluster, viewer, since]
+        if not all_users:
+            query += " AND user = ?"
+            params.append(viewer)
+        coverage = self.usage_coverage(cluster, viewer, all_users)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY end_time", params).fetchall()
+        # Nothing is known to be complete until a span has been stored
+        covered_from = coverage[0] if coverage is not None else time.time()
+        return UsageBatch.from_rows(rows, covered_from)
+
+    def count(self, cluster: str, user: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE cluster = ? AND user = ?", (cluster, user)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# What fetches finished jobs for a span: (start, end) -> ((jobs, usage), error)
+HistoryFetch = Callable[[float, float], Awaitable[Tuple[Tuple[List[JobInfo], UsageBatch], str]]]
+
+
+def merge_history(client, source: str, jobs: List[JobInfo], usage: UsageBatch, error: str, fetched_from: float,
+                  synced_at: float, window_start: float) -> List[JobInfo]:
+    """Store a span fetched by SlurmClient or RestClient and answer the time range from the store"""
+    store = client.history
+    if error:
+        # Keep serving what the store already has, but let the poll scheduler back off
+        client.command_errors += 1
+        logger.warning("Error from %s: %s", source, error)
+    else:
+        store.merge(client.hostname, client.username, jobs, fetched_from, synced_at)
+        store.add_usage(client.hostname, client.username, usage, fetched_from, synced_at)
+    return store.query(client.hostname, client.username, window_start)
+
+
+async def fetch_completed_jobs(client, fetch: HistoryFetch, time_range: str, source: str) -> List[JobInfo]:
+    """Jobs that ran in the time range, for SlurmClient and RestClient.
+
+    With a history store, ``fetch`` is only asked for what changed since
+    the last sync and the answer comes from the store; without one, the
+    whole range is fetched and an error yields no jobs.
+    """
+    synced_at = time.time()
+    window_start = synced_at - time_range_seconds(time_range)
+    if client.history is None:
+        (jobs, _), error = await fetch(window_start, synced_at)
+        if error:
+            client.command_errors += 1
+            logger.warning("Error from %s: %s", source, error)
+            return []
+        return jobs
+    fetched_from = client.history.sync_start(client.hostname, client.username, window_start)
+    (jobs, usage), error = await fetch(fetched_from, synced_at)
+    # Merging a large first sync is real work, keep it off the event loop
+    return await client.executor.run(merge_history, client, source, jobs, usage, error, fetched_from, synced_at,
+                                     window_start)
+
+
+_default_history: Optional[JobHistoryStore] = None
+
+
+def get_default_history() -> Optional[JobHistoryStore]:
+    """The process-wide history store, or None if SWATCH_HISTORY_DB is empty"""
+    global _default_history
+    if _default_history is None:
+        path = os.environ.get("SWATCH_HISTORY_DB", os.path.join(os.path.expanduser("~"), ".swatch", "history.db"))
+        if not path:
+            return None
+        _default_history = JobHistoryStore(path)
+    return _default_history
@@ -0,0 +1,229 @@
+import re
+from itertools import product
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# A name split around its last run of digits: node007-ib -> ("node", "007", "-ib")
+_NUMBERED = re.compile(r"^(.*?)(\d+)(\D*)$")
+_BRACKETS = re.compile(r"\[([^\]]*)\]")
+
+# (prefix, suffix, digits) of a node name; digits is "" for names without a number
+NodeName = Tuple[str, str, str]
+
+# prefix, first and last number, zero-padded width, suffix
+HostRange = Tuple[str, int, int, int, str]
+
+
+def split_name(name: str) -> NodeName:
+    match = _NUMBERED.match(name)
+    if match is None:
+        return name, "", ""
+    return match.group(1), match.group(3), match.group(2)
+
+
+def split_top_level(hostlist: str) -> List[str]:
+    """Split at the commas outside brackets: ``a[1,2],b`` -> ``a[1,2]``, ``b``"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(hostlist):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(hostlist[start:i])
+            start = i + 1
+    parts.append(hostlist[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _ranges(spec: str) -> Iterator[Tuple[int, int, int]]:
+    """(first, last, width) of each item of a bracket, e.g. ``001-128,200``"""
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition("-")
+        if not first.isdigit() or (last and not last.isdigit()):
+            raise ValueError(f"Invalid hostlist range: {item}")
+        lo, hi = int(first), int(last or first)
+        if hi < lo:
+            raise ValueError(f"Invalid hostlist range: {item}")
+        yield lo, hi, len(first)
+
+
+def iter_ranges(hostlist: str) -> Iterator[HostRange]:
+    """The numeric ranges a hostlist covers, without expanding them into names.
+
+    Every bracket but the last of an expression (``rack[1-2]-n[01-64]``)
+    is expanded, so each range varies a single number. Names without a
+    number come out as a range with an empty prefix and their name as the
+    suffix.
+    """
+    for expression in split_top_level(hostlist):
+        brackets = list(_BRACKETS.finditer(expression))
+        if not brackets:
+            prefix, suffix, digits = split_name(expression)
+            if digits:
+                yield prefix, int(digits), int(digits), len(digits), suffix
+            else:
+                yield "", -1, -1, 0, expression
+            continue
+        *outer, last = brackets
+        texts, start = [], 0
+        for match in outer:
+            texts.append(expression[start:match.start()])
+            start = match.end()
+        head = expression[start:last.start()]
+        tail = expression[last.end():]
+        choices = [[f"{n:0{width}d}" for lo, hi, width in _ranges(match.group(1)) for n in range(lo, hi + 1)]
+                   for match in outer]
+        for picked in product(*choices):
+            prefix = "".join(text + value for text, value in zip(texts, picked)) + head
+            for lo, hi, width in _ranges(last.group(1)):
+                yield prefix, lo, hi, width, tail
+
+
+def expand(hostlist: str) -> Iterator[str]:
+    """Every name in a hostlist, in order: ``node[01-03]`` -> node01, node02, node03"""
+    for prefix, lo, hi, width, suffix in iter_ranges(hostlist):
+        if lo < 0:
+            yield suffix
+            continue
+        for n in range(lo, hi + 1):
+            yield f"{prefix}{n:0{width}d}{suffix}"
+
+
+def compress_split(names: Iterable[NodeName]) -> str:
+    """The shortest hostlist of already split names; see ``compress``"""
+    families: Dict[Tuple[str, str], List[Tuple[int, str]]] = {}
+    plain = set()
+    for prefix, suffix, digits in names:
+        if digits:
+            families.setdefault((prefix, suffix), []).append((int(digits), digits))
+        else:
+            plain.add(prefix + suffix)
+    parts = sorted(plain)
+    for (prefix, suffix), numbers in sorted(families.items()):
+        numbers = sorted(set(numbers))
+        if len(numbers) == 1:
+            parts.append(f"{prefix}{numbers[0][1]}{suffix}")
+            continue
+        ranges = []
+        first = last = None
+        width = 0
+        for n, digits in numbers:
+            if last is not None and n == last[0] + 1 and f"{n:0{width}d}" == digits:
+                last = (n, digits)
+                continue
+            if first is not None:
+                ranges.append(first[1] if first == last else f"{first[1]}-{last[1]}")
+            first = last = (n, digits)
+            width = len(digits)
+        ranges.append(first[1] if first == last else f"{first[1]}-{last[1]}")
+        parts.append(f"{prefix}[{','.join(ranges)}]{suffix}")
+    return ",".join(parts)
+
+
+def compress(names: Iterable[str]) -> str:
+    """The shortest hostlist for some names: node01, node02, node03, node07 -> ``node[01-03,07]``.
+
+    Names sharing a prefix and suffix go in one bracket; consecutive
+    numbers of the same width become a range. Duplicates are dropped and
+    the result is sorted, as sinfo prints it.
+    """
+    return compress_split(split_name(name) for name in names)
+
+
+class NodeIndex:
+    """Gives every node of a cluster a bit, so node sets are plain integers.
+
+    A set of 10k nodes is a 1.25 KB integer; intersections, unions and
+    counts are single integer operations, and hostlists are turned into
+    sets range by range, without building the names.
+    """
+
+    def __init__(self):
+        self.names: List[NodeName] = []
+        self._bits: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self._plain: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def all(self) -> int:
+        return (1 << len(self.names)) - 1
+
+    def add(self, hostlist: str) -> int:
+        """The set of nodes in ``hostlist``, giving bits to nodes not seen before"""
+        return self._bitmap(hostlist, add=True)
+
+    def bitmap(self, hostlist: Optional[str]) -> int:
+        """The set of known nodes in ``hostlist``; unknown names are left out"""
+        if not hostlist:
+            return 0
+        return self._bitmap(hostlist, add=False)
+
+    def _bitmap(self, hostlist: str, add: bool) -> int:
+        bitmap = 0
+        for prefix, lo, hi, width, suffix in iter_ranges(hostlist):
+            if lo < 0:
+                bit = self._plain.get(suffix)
+                if bit is None and add:
+                    bit = self._plain[suffix] = self._new((suffix, "", ""))
+                if bit is not None:
+                    bitmap |= 1 << bit
+                continue
+            family = self._bits.get((prefix, suffix))
+            if family is None:
+                if not add:
+                    continue
+                family = self._bits[(prefix, suffix)] = {}
+            bits = []
+            for n in range(lo, hi + 1):
+                bit = family.get(n)
+                if bit is None and add:
+                    bit = family[n] = self._new((prefix, suffix, f"{n:0{width}d}"))
+                if bit is not None:
+                    bits.append(bit)
+            bitmap |= bits_to_int(bits)
+        return bitmap
+
+    def _new(self, name: NodeName) -> int:
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def members(self, bitmap: int) -> Iterator[NodeName]:
+        names = self.names
+        for bit in iter_bits(bitmap):
+            yield names[bit]
+
+    def hostlist(self, bitmap: int) -> str:
+        """The nodes of a set as a compressed hostlist"""
+        return compress_split(self.members(bitmap))
+
+    def expand(self, bitmap: int) -> List[str]:
+        return [prefix + digits + suffix for prefix, suffix, digits in self.members(bitmap)]
+
+
+def bits_to_int(bits: List[int]) -> int:
+    """A set of bit positions as an integer, built in linear time"""
+    if not bits:
+        return 0
+    lo, hi = min(bits), max(bits)
+    if hi - lo + 1 == len(bits):
+        # Consecutive, the usual case for a range of a fresh index
+        return ((1 << len(bits)) - 1) << lo
+    buffer = bytearray(hi // 8 + 1)
+    for bit in bits:
+        buffer[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    """Positions of the set bits, lowest first"""
+    # Shifting a 10k-bit integer once per member would be quadratic
+    digits = bin(bitmap)[:1:-1]
+    bit = digits.find("1")
+    while bit >= 0:
+        yield bit
+        bit = digits.find("1", bit + 1)
@@ -0,0 +1,307 @@
+import sys
+from array import array
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .units import format_memory, parse_duration, parse_memory
+
+
+class JobState(str, Enum):
+    """Slurm job states. Members are strings, so they compare and serialize as the state name"""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUSPENDED = "SUSPENDED"
+    COMPLETING = "COMPLETING"
+    COMPLETED = "COMPLETED"
+    CONFIGURING = "CONFIGURING"
+    CANCELLED = "CANCELLED"
+    FAILED = "FAILED"
+    TIMEOUT = "TIMEOUT"
+    PREEMPTED = "PREEMPTED"
+    NODE_FAIL = "NODE_FAIL"
+    BOOT_FAIL = "BOOT_FAIL"
+    DEADLINE = "DEADLINE"
+    OUT_OF_MEMORY = "OUT_OF_MEMORY"
+    REQUEUED = "REQUEUED"
+    REQUEUE_FED = "REQUEUE_FED"
+    REQUEUE_HOLD = "REQUEUE_HOLD"
+    RESIZING = "RESIZING"
+    RESV_DEL_HOLD = "RESV_DEL_HOLD"
+    REVOKED = "REVOKED"
+    SIGNALING = "SIGNALING"
+    SPECIAL_EXIT = "SPECIAL_EXIT"
+    STAGE_OUT = "STAGE_OUT"
+    STOPPED = "STOPPED"
+    UNKNOWN = "UNKNOWN"
+
+    @classmethod
+    def parse(cls, value) -> "JobState":
+        """Map squeue/sacct state text (e.g. ``CANCELLED by 1234``) to a member"""
+        member = cls._value2member_map_.get(value)
+        if member is not None:
+            return member
+        name = str(value).split(" ", 1)[0].rstrip("+").upper()
+        return cls._value2member_map_.get(name, cls.UNKNOWN)
+
+    def __str__(self) -> str:
+        return self.value
+
+
+# Position of each state in JobState, for storing states as small integers
+STATES: List[JobState] = list(JobState)
+STATE_CODES: Dict[JobState, int] = {state: code for code, state in enumerate(STATES)}
+
+
+@dataclass(slots=True)
+class JobInfo:
+    """One job, with typed values.
+
+    ``time`` is in seconds (the time limit for queued jobs, the elapsed time
+    for finished ones; None means unlimited), ``memory`` is in bytes. Slurm's
+    text forms are accepted too and converted on construction.
+    """
+    job_id: str
+    name: str
+    status: JobState
+    time: Optional[int]
+    nodes: int
+    cpus: int
+    memory: int
+    hours_ago: float = 0.0  # Add this field with a default value
+    dependency: str = ""  # Slurm dependency expression, e.g. "afterok:1001"
+    end_time: float = 0.0  # Unix time the job ended, 0 while it has not
+    partition: str = ""
+    submit_time: float = 0.0  # Unix time the job was submitted, 0 if unknown
+    user: str = ""
+    gpus: int = 0
+    start_time: float = 0.0  # Unix time the job started, 0 if it has not
+    cluster: str = ""  # Host name of the cluster it was polled from
+
+    def __post_init__(self):
+        # Names repeat across array tasks and resubmissions
+        self.name = sys.intern(self.name)
+        self.partition = sys.intern(self.partition)
+        self.user = sys.intern(self.user)
+        self.cluster = sys.intern(self.cluster)
+        self.status = JobState.parse(self.status)
+        if isinstance(self.time, str):
+            self.time = parse_duration(self.time)
+        if isinstance(self.nodes, str):
+            self.nodes = _count(self.nodes)
+        if isinstance(self.cpus, str):
+            self.cpus = _count(self.cpus)
+        if isinstance(self.memory, str):
+            self.memory = parse_memory(self.memory)
+
+    @property
+    def tag(self) -> str:
+        """Return the appropriate tag for the job's status"""
+        if self.status == "RUNNING":
+            return 'running'
+        elif self.status == "PENDING":
+            return 'pending'
+        elif self.status in ["COMPLETED", "COMPLETING"]:
+            return 'completed'
+        elif self.status in ["FAILED", "TIMEOUT", "CANCELLED"]:
+            return 'failed'
+        return 'pending'  # Default case
+
+    @staticmethod
+    def format_memory(memory: int) -> str:
+        """Format a memory size in bytes with Slurm's units, e.g. ``64G``"""
+        return format_memory(memory)
+
+
+def _count(value: str) -> int:
+    # squeue prints node counts of pending jobs as ranges, e.g. "2-4"
+    value = value.strip().split("-", 1)[0]
+    return int(value) if value.isdigit() else 0
+
+
+JOB_FIELDS = [f.name for f in fields(JobInfo)]
+
+
+class JobBatch:
+    """A job list stored column by column.
+
+    Numbers live in typed arrays and states as one byte each, so large
+    cluster-wide lists take a fraction of the memory of JobInfo objects and
+    can be filtered and sorted by scanning a single column. ``time`` uses
+    -1 for unlimited.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        self.columns = columns
+
+    @classmethod
+    def from_jobs(cls, jobs: Iterable[JobInfo]) -> "JobBatch":
+        batch = cls.empty()
+        columns = batch.columns
+        for job in jobs:
+            columns["job_id"].append(job.job_id)
+            columns["name"].append(job.name)
+            columns["status"].append(STATE_CODES[job.status])
+            columns["time"].append(-1 if job.time is None else job.time)
+            columns["nodes"].append(job.nodes)
+            columns["cpus"].append(job.cpus)
+            columns["memory"].append(job.memory)
+            columns["hours_ago"].append(job.hours_ago)
+            columns["dependency"].append(job.dependency)
+            columns["end_time"].append(job.end_time)
+            columns["partition"].append(job.partition)
+            columns["submit_time"].append(job.submit_time)
+            columns["user"].append(job.user)
+            columns["gpus"].append(job.gpus)
+            columns["start_time"].append(job.start_time)
+            columns["cluster"].append(job.cluster)
+        return batch
+
+    @classmethod
+    def empty(cls) -> "JobBatch":
+        return cls({
+            "job_id": [],
+            "name": [],
+            "status": array("B"),
+            "time": array("q"),
+            "nodes": array("l"),
+            "cpus": array("l"),
+            "memory": array("q"),
+            "hours_ago": array("d"),
+            "dependency": [],
+            "end_time": array("d"),
+            "partition": [],
+            "submit_time": array("d"),
+            "user": [],
+            "gpus": array("l"),
+            "start_time": array("d"),
+            "cluster": [],
+        })
+
+    def __len__(self) -> int:
+        return len(self.columns["job_id"])
+
+    def column(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def states(self) -> List[JobState]:
+        return [STATES[code] for code in self.columns["status"]]
+
+    def where_state(self, *states: JobState) -> List[int]:
+        """Indices of the rows in any of the given states"""
+        codes = {STATE_CODES[JobState.parse(state)] for state in states}
+        return [i for i, code in enumerate(self.columns["status"]) if code in codes]
+
+    def select(self, indices: Iterable[int]) -> "JobBatch":
+        """A new batch holding the given rows, in the given order"""
+        indices = list(indices)
+        columns = {}
+        for name, values in self.columns.items():
+            picked = [values[i] for i in indices]
+            columns[name] = array(values.typecode, picked) if isinstance(values, array) else picked
+        return JobBatch(columns)
+
+    def argsort(self, name: str, indices: Optional[Iterable[int]] = None, reverse: bool = False) -> List[int]:
+        """Row indices (all, or the given ones) ordered by one column"""
+        values = self.columns[name]
+        if indices is None:
+            indices = range(len(values))
+        return sorted(indices, key=values.__getitem__, reverse=reverse)
+
+    def job(self, index: int) -> JobInfo:
+        values = {name: column[index] for name, column in self.columns.items()}
+        values["status"] = STATES[values["status"]]
+        if values["time"] < 0:
+            values["time"] = None
+        return JobInfo(**values)
+
+    def __iter__(self) -> Iterator[JobInfo]:
+        return (self.job(i) for i in range(len(self)))
+
+    def to_dict(self) -> Dict[str, list]:
+        """JSON-ready columns, with states as names and unlimited time as null"""
+        out = {name: list(values) for name, values in self.columns.items()}
+        out["status"] = [STATES[code].value for code in self.columns["status"]]
+        out["time"] = [None if t < 0 else t for t in self.columns["time"]]
+        return out
+
+
+class UsageBatch:
+    """Resource use of finished jobs, stored column by column like JobBatch.
+
+    ``append`` takes a job's raw figures (seconds, bytes); ``compute`` then
+    derives the efficiency columns for every row at once:
+    ``cpu_efficiency`` (CPU time over cores x elapsed), ``memory_efficiency``
+    (peak RSS over allocated memory) and ``wasted_core_hours``.
+    ``covered_from`` is how far back the batch holds every finished job.
+    """
+
+    RAW = ("job_id", "user", "name", "state", "exit_code", "end_time", "nodes", "cpus", "elapsed",
+           "total_cpu", "alloc_mem", "max_rss")
+    COMPUTED = ("cpu_efficiency", "memory_efficiency", "wasted_core_hours")
+    COLUMNS = RAW + COMPUTED
+
+    def __init__(self, columns: Optional[Dict[str, Sequence]] = None, covered_from: float = 0.0):
+        self.columns = columns if columns is not None else self._empty()
+        self.covered_from = covered_from
+
+    @staticmethod
+    def _empty() -> Dict[str, Sequence]:
+        return {
+            "job_id": [],
+            "user": [],
+            "name": [],
+            "state": [],
+            "exit_code": [],
+            "end_time": array("d"),
+            "nodes": array("l"),
+            "cpus": array("l"),
+            "elapsed": array("q"),
+            "total_cpu": array("d"),
+            "alloc_mem": array("q"),
+            "max_rss": array("q"),
+            "cpu_efficiency": array("d"),
+            "memory_efficiency": array("d"),
+            "wasted_core_hours": array("d"),
+        }
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence], covered_from: float = 0.0) -> "UsageBatch":
+        """A batch of stored rows, each holding the values of COLUMNS in order"""
+        batch = cls(covered_from=covered_from)
+        for name, values in zip(cls.COLUMNS, zip(*rows)):
+            column = batch.columns[name]
+            batch.columns[name] = array(column.typecode, values) if isinstance(column, array) else list(values)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.columns["job_id"])
+
+    def column(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def append(self, job_id: str, user: str, name: str, state: str, exit_code: str, end_time: float,
+               nodes: int, cpus: int, elapsed: int, total_cpu: float, alloc_mem: int, max_rss: int):
+        """Add one job's raw figures; call ``compute`` once all are in"""
+        values = (job_id, user, name, state, exit_code, end_time, nodes, cpus, elapsed, total_cpu, alloc_mem,
+                  max_rss)
+        for column, value in zip(self.RAW, values):
+            self.columns[column].append(value)
+
+    def compute(self) -> "UsageBatch":
+        """Fill the efficiency columns from the raw ones, a whole column at a time"""
+        columns = self.columns
+        core_seconds = [elapsed * cpus for elapsed, cpus in zip(columns["elapsed"], columns["cpus"])]
+        used = columns["total_cpu"]
+        columns["cpu_efficiency"] = array("d", [
+            cpu / cores if cores else 0.0 for cpu, cores in zip(used, core_seconds)])
+        columns["memory_efficiency"] = array("d", [
+            peak / allocated if allocated else 0.0
+            for peak, allocated in zip(columns["max_rss"], columns["alloc_mem"])])
+        columns["wasted_core_hours"] = array("d", [
+            max(cores - cpu, 0.0) / 3600 for cpu, cores in zip(used, core_seconds)])
+        return self
+
+    def rows(self) -> Iterator[tuple]:
+        """The values of COLUMNS, one tuple per job"""
+        return zip(*(self.columns[name] for name in self.COLUMNS))
@@ -0,0 +1,156 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .hostlist import NodeIndex
+from .units import parse_gpus
+
+# Grouped by sinfo into one line per partition and node state with a
+# compressed hostlist, so the output grows with the number of distinct
+# states, not the number of nodes. The hostlist goes last.
+SINFO_FORMAT = "%R|%T|%C|%m|%G|%N"
+SINFO_COMMAND = f'sinfo -h -o "{SINFO_FORMAT}"'
+
+# Flags sinfo appends to a state: not responding, powered down, rebooting...
+_STATE_FLAGS = "*~#!%$@^-+"
+
+
+@dataclass
+class NodeGroup:
+    """One sinfo line: nodes of a partition in the same state.
+
+    The CPU counts add up the whole group; ``memory`` (MB) and ``gpus`` are
+    per node.
+    """
+    partition: str
+    state: str
+    nodes: str
+    cpus_allocated: int = 0
+    cpus_idle: int = 0
+    cpus_other: int = 0
+    cpus_total: int = 0
+    memory: int = 0
+    gpus: int = 0
+
+    def row(self) -> List:
+        return [self.partition, self.state, self.nodes, self.cpus_allocated, self.cpus_idle, self.cpus_other,
+                self.cpus_total, self.memory, self.gpus]
+
+
+def node_state(state: str) -> str:
+    """sinfo's state without its flags, in lower case: ``DOWN*`` -> ``down``"""
+    return state.strip().rstrip(_STATE_FLAGS).lower() or "unknown"
+
+
+def _int(value: str) -> int:
+    value = value.strip().rstrip("+")
+    return int(value) if value.isdigit() else 0
+
+
+def parse_sinfo_line(line: str) -> Optional[NodeGroup]:
+    parts = line.rstrip("\r").split("|", 5)
+    if len(parts) < 6 or not parts[5].strip():
+        return None
+    partition, state, cpus, memory, gres, nodes = parts
+    counts = [_int(count) for count in cpus.split("/")]
+    counts += [0] * (4 - len(counts))
+    return NodeGroup(partition.strip().rstrip("*"), node_state(state), nodes.strip(), *counts[:4],
+                     memory=_int(memory), gpus=parse_gpus(gres))
+
+
+def parse_sinfo(lines: Iterable[str]) -> List[NodeGroup]:
+    groups = []
+    for line in lines:
+        if line.strip():
+            group = parse_sinfo_line(line)
+            if group is not None:
+                groups.append(group)
+    return groups
+
+
+class NodeState:
+    """Node states of a cluster as bitmaps over a NodeIndex.
+
+    ``partitions`` and ``states`` map each name to the set of its nodes,
+    so "idle nodes of partition gpu" is one integer AND and counting it is
+    a popcount, however many nodes the cluster has. Nodes that belong to
+    several partitions are one node everywhere but the per-partition CPU
+    totals.
+    """
+
+    def __init__(self, groups: Sequence[NodeGroup], index: Optional[NodeIndex] = None,
+                 fetched_at: Optional[float] = None):
+        self.groups = list(groups)
+        # Kept across refreshes, so known nodes keep their bits
+        self.index = index if index is not None else NodeIndex()
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.version = 0
+        self.digest = hashlib.sha1(repr([group.row() for group in self.groups]).encode('utf-8')).hexdigest()
+        self.partitions: Dict[str, int] = {}
+        self.states: Dict[str, int] = {}
+        self.cpus: Dict[str, List[int]] = {}
+        self.gpus: Dict[str, int] = {}
+        self.nodes = 0
+        self._summary: Optional[Dict] = None
+        for group in self.groups:
+            bitmap = self.index.add(group.nodes)
+            self.nodes |= bitmap
+            self.partitions[group.partition] = self.partitions.get(group.partition, 0) | bitmap
+            self.states[group.state] = self.states.get(group.state, 0) | bitmap
+            cpus = self.cpus.setdefault(group.partition, [0, 0, 0, 0])
+            for i, count in enumerate((group.cpus_allocated, group.cpus_idle, group.cpus_other, group.cpus_total)):
+                cpus[i] += count
+            self.gpus[group.partition] = self.gpus.get(group.partition, 0) + group.gpus * bitmap.bit_count()
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def select(self, partition: Optional[str] = None, states: Sequence[str] = (),
+               nodes: Optional[int] = None) -> int:
+        """The nodes in ``partition``, in any of ``states`` and among ``nodes``; each is optional"""
+        selected = self.nodes
+        if partition is not None:
+            selected &= self.partitions.get(partition, 0)
+        if states:
+            wanted = 0
+            for state in states:
+                wanted |= self.states.get(node_state(state), 0)
+            selected &= wanted
+        if nodes is not None:
+            selected &= nodes
+        return selected
+
+    def count_states(self, bitmap: int) -> Dict[str, int]:
+        counts = {state: (nodes & bitmap).bit_count() for state, nodes in self.states.items()}
+        return {state: count for state, count in sorted(counts.items()) if count}
+
+    def summary(self) -> Dict:
+        """Node counts by state for the cluster and each partition, with CPU and GPU totals"""
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    def _summarize(self) -> Dict:
+        return {
+            "nodes": self.nodes.bit_count(),
+            "states": self.count_states(self.nodes),
+            "partitions": {
+                partition: {
+                    "nodes": nodes.bit_count(),
+                    "states": self.count_states(nodes),
+                    "cpus": dict(zip(("allocated", "idle", "other", "total"), self.cpus[partition])),
+                    "gpus": self.gpus[partition],
+                    "hostlist": self.index.hostlist(nodes),
+                }
+                for partition, nodes in sorted(self.partitions.items())
+            },
+        }
+
+    def describe(self, bitmap: int) -> Dict:
+        """A node set as its size, states and compressed hostlist"""
+        return {
+            "nodes": bitmap.bit_count(),
+            "states": self.count_states(bitmap),
+            "hostlist": self.index.hostlist(bitmap),
+        }
@@ -0,0 +1,69 @@
+import asyncio
+import shlex
+from typing import AsyncIterator, Optional, Tuple
+
+# Most bytes of job output handed on at once
+TAIL_CHUNK = 64 * 1024
+
+# Tails a client may have open at once; each holds one of the pool's SSH
+# channels for as long as it runs, and those are shared with polling
+MAX_TAILS = 2
+
+
+class TailLimit(Exception):
+    """Raised when a client already has MAX_TAILS tails open"""
+
+
+class OutputUnavailable(Exception):
+    """Raised when a job's output file cannot be read"""
+
+
+def tail_command(path: str, offset: int, follow: bool) -> str:
+    """``tail`` printing a file from byte ``offset`` on, and with ``follow`` whatever is appended later"""
+    return f"tail -c +{offset + 1}{' -F' if follow else ''} -- {shlex.quote(path)}"
+
+
+def size_command(path: str) -> str:
+    return f"stat -c %s -- {shlex.quote(path)}"
+
+
+async def read_channel(chan, offset: int = 0, idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (offset after the chunk, chunk) as a command's output arrives on ``chan``.
+
+    Waits on the channel's file descriptor from the event loop rather than
+    in a worker thread, so a tail that sits idle for hours costs nothing
+    but its channel. With ``idle``, yields an empty chunk after that many
+    seconds without output, which lets the caller check on its own client.
+    Raises OutputUnavailable if the command fails without any output.
+    """
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    fd = chan.fileno()
+    loop.add_reader(fd, ready.set)
+    errors = []
+    started = offset
+    try:
+        while True:
+            data = b""
+            while chan.recv_ready() and len(data) < TAIL_CHUNK:
+                data += chan.recv(TAIL_CHUNK - len(data))
+            while chan.recv_stderr_ready():
+                errors.append(chan.recv_stderr(TAIL_CHUNK))
+            if data:
+                offset += len(data)
+                yield offset, data
+                continue
+            if chan.closed or chan.exit_status_ready():
+                break
+            # paramiko keeps the descriptor readable until its buffers are drained
+            ready.clear()
+            try:
+                await asyncio.wait_for(ready.wait(), idle)
+            except asyncio.TimeoutError:
+                yield offset, b""
+    finally:
+        loop.remove_reader(fd)
+    status = chan.recv_exit_status() if chan.exit_status_ready() else 0
+    if status and offset == started:
+        error = b"".join(errors).decode('utf-8', errors='replace').strip()
+        raise OutputUnavailable(error or f"tail exited with status {status}")
@@ -0,0 +1,173 @@
+import codecs
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .models import JobInfo
+from .dependencies import dependency_from_submit_line
+from .units import parse_gpus, parse_timestamp
+
+# squeue: the job name is the only free-text field, so it goes last and may
+# itself contain the delimiter
+SQUEUE_FIELDS = ["%i", "%T", "%l", "%D", "%C", "%m", "%E", "%P", "%V", "%u", "%b", "%S", "%j"]
+SQUEUE_FORMAT = "|".join(SQUEUE_FIELDS)
+
+# sacct --parsable2: JobName and SubmitLine are both free text. SubmitLine
+# goes last and is found by the command it starts with, so a "|" in either
+# field does not shift the others.
+SACCT_FIELDS = ["JobID", "State", "Elapsed", "NNodes", "NCPUS", "ReqMem", "Partition", "Submit", "Start",
+                "End", "User", "AllocTRES", "JobName", "SubmitLine"]
+SUBMIT_COMMANDS = ("sbatch", "srun", "salloc")
+
+# Resource use the history path collects for efficiency figures. MaxRSS is
+# only printed for steps, so jobs are parsed with their steps folded in.
+USAGE_FIELDS = ["TotalCPU", "MaxRSS", "ExitCode"]
+HISTORY_SACCT_FIELDS = SACCT_FIELDS[:-2] + USAGE_FIELDS + SACCT_FIELDS[-2:]
+
+READ_CHUNK = 64 * 1024
+
+
+def iter_channel_lines(chan, chunk_size: int = READ_CHUNK) -> Iterator[str]:
+    """Yield decoded lines from an SSH channel as they arrive.
+
+    Only one chunk and one partial line are held at a time, so memory stays
+    bounded however long the output is.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ""
+    while True:
+        data = chan.recv(chunk_size)
+        if not data:
+            break
+        pending += decoder.decode(data)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_squeue_line(line: str) -> Optional[JobInfo]:
+    """Parse one line of ``squeue -o SQUEUE_FORMAT`` output"""
+    parts = line.rstrip("\r").split("|", len(SQUEUE_FIELDS) - 1)
+    if len(parts) < len(SQUEUE_FIELDS):
+        return None
+    (job_id, state, time_limit, nodes, cpus, memory, dependency, partition, submit,
+     user, gres, start, name) = parts
+    job = JobInfo(
+        job_id=job_id.strip(),
+        name=name,
+        status=state,
+        time=time_limit,
+        nodes=nodes,
+        cpus=cpus,
+        memory=memory,
+        dependency="" if dependency == "(null)" else dependency,
+        partition=partition,
+        submit_time=parse_timestamp(submit),
+        user=user,
+        start_time=parse_timestamp(start),
+    )
+    # squeue reports GRES per node
+    job.gpus = parse_gpus(gres) * max(job.nodes, 1)
+    return job
+
+
+def parse_squeue(lines: Iterable[str]) -> List[JobInfo]:
+    jobs = []
+    for line in lines:
+        if line.strip():
+            job = parse_squeue_line(line)
+            if job is not None:
+                jobs.append(job)
+    return jobs
+
+
+def split_sacct_line(line: str, fields: Sequence[str] = SACCT_FIELDS) -> Optional[Dict[str, str]]:
+    """Split one ``sacct --parsable2`` line into a field dict.
+
+    Handles the delimiter appearing inside JobName or SubmitLine, which are
+    the last two fields (or just JobName when SubmitLine is not requested).
+    """
+    parts = line.rstrip("\r").split("|")
+    if len(parts) < len(fields):
+        return None
+    fixed = len(fields) - 2 if fields[-1] == "SubmitLine" else len(fields) - 1
+    row = dict(zip(fields[:fixed], parts[:fixed]))
+    rest = parts[fixed:]
+    if fields[-1] == "SubmitLine":
+        # SubmitLine starts with the submitting command; anything before it
+        # belongs to the job name
+        split_at = 1
+        for i in range(1, len(rest)):
+            if rest[i].lstrip().startswith(SUBMIT_COMMANDS):
+                split_at = i
+                break
+        row[fields[-2]] = "|".join(rest[:split_at])
+        row[fields[-1]] = "|".join(rest[split_at:])
+    else:
+        row[fields[-1]] = "|".join(rest)
+    return row
+
+
+def step_parent(job_id: str) -> Optional[str]:
+    """Parent job id of a step row (``12.batch`` -> ``12``), or None for jobs"""
+    if "." in job_id:
+        return job_id.split(".", 1)[0]
+    return None
+
+
+def iter_sacct_jobs(lines: Iterable[str], fields: Sequence[str] = SACCT_FIELDS,
+                    merge_step: Optional[Callable[[Dict[str, str], Dict[str, str]], None]] = None
+                    ) -> Iterator[Dict[str, str]]:
+    """Yield one row per job from sacct output, folding steps into their job.
+
+    sacct prints a job's steps (``.batch``, ``.extern``, ``.0`` ...) right
+    after the job itself, so each job can be yielded as soon as the next one
+    starts. ``merge_step(job_row, step_row)`` may fold step data (such as
+    peak memory) into the job; by default steps are simply dropped.
+    """
+    current: Optional[Dict[str, str]] = None
+    # Steps carry no name or submit line worth reading, so only the fields
+    # before the free text are split off
+    fixed = fields[:len(fields) - 2 if fields[-1] == "SubmitLine" else len(fields) - 1]
+    for line in lines:
+        if not line.strip():
+            continue
+        job_id = line.partition("|")[0]
+        if "." in job_id:
+            # A step nobody wants to look at is skipped without splitting it
+            if merge_step is not None and current is not None and step_parent(job_id) == current["JobID"]:
+                merge_step(current, dict(zip(fixed, line.rstrip("\r").split("|", len(fixed)))))
+            continue
+        row = split_sacct_line(line, fields)
+        if row is None:
+            continue
+        if current is not None:
+            yield current
+        current = row
+    if current is not None:
+        yield current
+
+
+def sacct_row_to_job(row: Dict[str, str]) -> JobInfo:
+    return JobInfo(
+        job_id=row["JobID"],
+        name=row.get("JobName", ""),
+        status=row.get("State", ""),
+        time=row.get("Elapsed", ""),
+        nodes=row.get("NNodes", ""),
+        cpus=row.get("NCPUS", ""),
+        memory=row.get("ReqMem", ""),
+        dependency=dependency_from_submit_line(row.get("SubmitLine", "")),
+        end_time=parse_timestamp(row.get("End")),
+        partition=row.get("Partition", ""),
+        submit_time=parse_timestamp(row.get("Submit")),
+        user=row.get("User", ""),
+        gpus=parse_gpus(row.get("AllocTRES")),
+        start_time=parse_timestamp(row.get("Start")),
+    )
+
+
+def parse_sacct(lines: Iterable[str], fields: Sequence[str] = SACCT_FIELDS) -> List[JobInfo]:
+    return [sacct_row_to_job(row) for row in iter_sacct_jobs(lines, fields)]
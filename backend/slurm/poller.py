@@ -0,0 +1,627 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from operator import attrgetter
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from .aggregates import JobAggregates
+from .encoding import EncodedBody
+from .client import JobInfo
+from .details import JobDetailCache
+from .models import JOB_FIELDS, JobBatch
+from .query import JobIndex
+from .events import EventHub
+from .graph import JobGraph
+from .hostlist import NodeIndex
+from .metrics import get_default_registry
+from .nodes import NodeState
+from .output import OutputUnavailable
+from .scheduler import DEFAULT_POLL_BUDGET, PollScheduler
+from .timeline import Timeline
+from . import efficiency
+
+
+# How many past versions per time range are kept to answer ?since= requests
+SNAPSHOT_HISTORY = 16
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_default_registry()
+SNAPSHOT_LOOKUPS = _metrics.counter(
+    "swatch_snapshot_lookups_total",
+    "Snapshot reads by result: hit (fresh), stale (served while refreshing) or miss (waited on the cluster)",
+    ["result"])
+SNAPSHOT_REFRESHES = _metrics.counter(
+    "swatch_snapshot_refreshes_total", "Snapshot refreshes by result: changed, unchanged or failed", ["result"])
+
+
+def jobs_digest(jobs: List[JobInfo]) -> str:
+    """Content hash of a job list, used as the snapshot's strong ETag"""
+    row = attrgetter(*JOB_FIELDS)
+    encoded = json.dumps([row(job) for job in jobs], separators=(",", ":"))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class JobSnapshot:
+    """Jobs fetched from a cluster in one refresh.
+
+    ``version`` only changes when the job list does. A refresh that finds
+    the same jobs keeps the existing snapshot and just bumps ``checked_at``,
+    so a version's content (and ``fetched_at``) is stable and ``etag`` can
+    be a strong validator.
+    """
+    time_range: str
+    active_jobs: List[JobInfo]
+    completed_jobs: List[JobInfo]
+    fetched_at: float = field(default_factory=time.time)
+    version: int = 0
+    digest: str = ""
+    checked_at: float = 0.0
+    # Per-cluster status when the jobs were merged from several clusters
+    clusters: Optional[Dict[str, Dict]] = None
+    _batch: Optional[JobBatch] = field(default=None, init=False, repr=False, compare=False)
+    _index: Optional[JobIndex] = field(default=None, init=False, repr=False, compare=False)
+    _bodies: Dict[str, EncodedBody] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.digest:
+            self.digest = jobs_digest(self.jobs)
+        if not self.checked_at:
+            self.checked_at = self.fetched_at
+
+    @property
+    def jobs(self) -> List[JobInfo]:
+        return self.active_jobs + self.completed_jobs
+
+    @property
+    def batch(self) -> JobBatch:
+        """The jobs in columnar form, built on first use"""
+        if self._batch is None:
+            self._batch = JobBatch.from_jobs(self.jobs)
+        return self._batch
+
+    @property
+    def index(self) -> JobIndex:
+        """Filter and sort indexes over the jobs, built on first use"""
+        if self._index is None:
+            self._index = JobIndex(self.jobs, self.batch)
+        return self._index
+
+    @property
+    def last_updated(self) -> str:
+        return datetime.fromtimestamp(self.fetched_at).strftime("%Y-%m-%d %H:%M:%S")
+
+    def has_body(self, layout: str) -> bool:
+        return layout in self._bodies
+
+    def body(self, layout: str = "rows") -> EncodedBody:
+        """The full /jobs response, encoded once per snapshot.
+
+        ``rows`` is the list of job objects, ``columns`` one array per field.
+        """
+        encoded = self._bodies.get(layout)
+        if encoded is None:
+            if layout == "columns":
+                content = {"columns": self.batch.to_dict(), "last_updated": self.last_updated,
+                           "version": self.version}
+            else:
+                content = {"jobs": self.jobs, "last_updated": self.last_updated, "version": self.version,
+                           "total": None, "next_cursor": None}
+            if self.clusters is not None:
+                content["clusters"] = self.clusters
+            encoded = self._bodies[layout] = EncodedBody(content)
+        return encoded
+
+    def encodings(self) -> Dict[str, List[str]]:
+        """The layouts whose body was built, with the codings each was sent in"""
+        return {layout: body.codings() for layout, body in self._bodies.items()}
+
+    def prepare(self, encodings: Dict[str, List[str]]):
+        """Build and compress the bodies in ``encodings`` ahead of the first request for them"""
+        for layout, codings in encodings.items():
+            self.body(layout).prepare(codings)
+
+    def drop_caches(self):
+        """Forget the columns, indexes and encoded bodies, which can be rebuilt.
+
+        Superseded snapshots stay in the history only to answer ``since=``
+        deltas, which need nothing but their jobs.
+        """
+        self._batch = None
+        self._index = None
+        self._bodies = {}
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version:x}-{self.digest}"'
+
+    def age(self) -> float:
+        return time.time() - self.checked_at
+
+
+def diff_snapshots(old: JobSnapshot, new: JobSnapshot) -> Dict:
+    """Jobs added, changed and removed between two snapshots"""
+    old_jobs = {job.job_id: job for job in old.jobs}
+    added, changed = [], []
+    seen = set()
+    for job in new.jobs:
+        seen.add(job.job_id)
+        previous = old_jobs.get(job.job_id)
+        if previous is None:
+            added.append(job)
+        elif previous != job:
+            changed.append(job)
+    removed = [job_id for job_id in old_jobs if job_id not in seen]
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+class SnapshotPoller:
+    """Keeps the latest job snapshot for one (hostname, username) pair.
+
+    Every time range that has been asked for recently is refreshed in the
+    background as often as ``scheduler`` allows: about once per ``ttl``
+    seconds, or once per ``stream_interval`` while a push subscriber is
+    watching it, less often while nothing changes or the cluster is busy.
+    Requests are answered from memory; only the very first request for a
+    time range waits on the cluster. Concurrent refreshes of the same time
+    range share one in-flight fetch, and every new version is published to
+    ``events``. Each poll also adds a sample to ``timeline``, and tags the
+    jobs with ``cluster``. Job detail records are cached in ``details``,
+    and node states are refreshed like snapshots. Efficiency reports are
+    computed on request, one at a time per set of parameters.
+    """
+
+    def __init__(self, client, ttl: float = 15.0, idle_timeout: float = 300.0,
+                 stream_interval: float = 1.0, cluster: str = "", details: Optional[JobDetailCache] = None,
+                 scheduler: Optional[PollScheduler] = None):
+        self.client = client
+        self.cluster = cluster
+        if scheduler is None:
+            scheduler = PollScheduler(cluster, ttl=ttl, stream_interval=stream_interval)
+        self.scheduler = scheduler
+        self.details = details if details is not None else JobDetailCache(cluster=cluster)
+        self._nodes: Optional[NodeState] = None
+        self._nodes_task: Optional[asyncio.Future] = None
+        # Kept across node refreshes, so every node keeps its bit
+        self._node_index = NodeIndex()
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.stream_interval = stream_interval
+        self.events = EventHub()
+        self.fetch_count = 0
+        # Polls in a row that failed
+        self.errors = 0
+        self._version = 0
+        self._snapshots: Dict[str, JobSnapshot] = {}
+        self._history: Dict[str, Deque[JobSnapshot]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self._on_demand: Set[asyncio.Future] = set()
+        self._last_requested: Dict[str, float] = {}
+        # Refreshes in a row that found nothing changed, per time range
+        self._unchanged: Dict[str, int] = {}
+        self._sdiag_task: Optional[asyncio.Future] = None
+        self._efficiency: Dict[Tuple[int, bool, int], Dict] = {}
+        self._efficiency_tasks: Dict[Tuple[int, bool, int], asyncio.Future] = {}
+        self._graphs: Dict[str, JobGraph] = {}
+        self._graph_sources: Dict[str, JobSnapshot] = {}
+        self._aggregates: Dict[str, JobAggregates] = {}
+        self.timeline = Timeline()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_snapshot(self, time_range: str) -> JobSnapshot:
+        """Return the cached snapshot, fetching it only if none exists yet"""
+        self._ensure_started()
+        self._last_requested[time_range] = time.time()
+
+        snapshot = self._snapshots.get(time_range)
+        if snapshot is None:
+            SNAPSHOT_LOOKUPS.inc(result="miss")
+            return await self.refresh(time_range)
+
+        interval = self._interval(time_range)
+        if snapshot.age() > interval:
+            SNAPSHOT_LOOKUPS.inc(result="stale")
+            if time_range not in self._inflight and self.scheduler.acquire():
+                # Serve the stale copy now and revalidate behind it
+                self.scheduler.observe(interval)
+                self._start_fetch(time_range)
+        else:
+            SNAPSHOT_LOOKUPS.inc(result="hit")
+        return snapshot
+
+    def delta(self, time_range: str, since: int) -> Optional[Dict]:
+        """Changes from version ``since`` to the current snapshot.
+
+        Returns None when that version is no longer (or never was) in the
+        history, in which case the caller has to send the full list.
+        """
+        current = self._snapshots.get(time_range)
+        if current is None:
+            return None
+        if since == current.version:
+            return {"added": [], "changed": [], "removed": []}
+        for old in self._history.get(time_range, ()):
+            if old.version == since:
+                return diff_snapshots(old, current)
+        return None
+
+    async def get_graph(self, time_range: str) -> JobGraph:
+        """Return the dependency graph of the cached snapshot.
+
+        The graph is kept between snapshots and only updated with what
+        changed since the last snapshot it saw.
+        """
+        snapshot = await self.get_snapshot(time_range)
+        graph = self._graphs.get(time_range)
+        if graph is None:
+            graph = self._graphs[time_range] = JobGraph()
+        if self._graph_sources.get(time_range) is not snapshot:
+            graph.update(snapshot.jobs)
+            self._graph_sources[time_range] = snapshot
+        return graph
+
+    def aggregates(self, time_range: str) -> Optional[JobAggregates]:
+        """Totals of the cached snapshot, updated as each new version comes in"""
+        return self._aggregates.get(time_range)
+
+    async def get_details(self, job_ids: List[str]) -> Dict[str, Dict]:
+        """Detail records of the given jobs, by job id, asking the cluster only for those not cached"""
+        found, missing = self.details.lookup(job_ids)
+        if missing:
+            if hasattr(self.client, "fetch_job_details"):
+                fetched = await self.client.fetch_job_details(missing)
+            else:
+                loop = asyncio.get_running_loop()
+                fetched = await loop.run_in_executor(None, self.client.get_job_details, missing)
+            for record in fetched.values():
+                record.setdefault("cluster", self.cluster)
+            self.details.add(fetched.values())
+            found.update(fetched)
+        return found
+
+    async def get_efficiency(self, days: int, all_users: bool = False, limit: int = 20) -> Dict:
+        """Efficiency report (see ``efficiency.report``) of the jobs that ended in the last ``days``.
+
+        Filling in history stops at ``USAGE_DEADLINE``, so a long span may
+        come back incomplete; the next request carries on. Complete reports
+        are reused for the TTL, and concurrent requests share one.
+        """
+        if hasattr(self.client, "fetch_efficiency"):
+            return await self.client.fetch_efficiency(days, all_users, limit)
+        key = (days, all_users, limit)
+        report = self._efficiency.get(key)
+        if report is not None and report["complete"] and time.time() - report["computed_at"] < self.ttl:
+            return report
+        task = self._efficiency_tasks.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._efficiency_tasks[key] = asyncio.ensure_future(self._compute_efficiency(key))
+        return await asyncio.shield(task)
+
+    async def _compute_efficiency(self, key: Tuple[int, bool, int]) -> Dict:
+        days, all_users, limit = key
+        since = time.time() - days * 86400
+        loop = asyncio.get_running_loop()
+        if hasattr(self.client, "fetch_usage"):
+            usage = await self.client.fetch_usage(since, all_users, time.monotonic() + efficiency.USAGE_DEADLINE)
+        else:
+            usage = await loop.run_in_executor(None, self.client.get_usage, since, all_users)
+        # Months of jobs take a while to roll up; keep it off the event loop
+        report = await loop.run_in_executor(None, efficiency.report, usage, since, limit)
+        report.update(cluster=self.cluster, computed_at=time.time())
+        self._efficiency[key] = report
+        return report
+
+    async def get_nodes(self) -> NodeState:
+        """Node states of the cluster; a stale copy is served while it is refreshed"""
+        nodes = self._nodes
+        if nodes is None:
+            self.scheduler.acquire(force=True)
+            return await asyncio.shield(self._start_nodes_fetch())
+        if nodes.age() > self.scheduler.interval(errors=self.errors) and self._nodes_task_idle() and self.scheduler.acquire():
+            self._start_nodes_fetch()
+        return nodes
+
+    def _nodes_task_idle(self) -> bool:
+        task = self._nodes_task
+        return task is None or task.done() or task.get_loop() is not asyncio.get_running_loop()
+
+    def _start_nodes_fetch(self) -> asyncio.Future:
+        task = self._nodes_task
+        if self._nodes_task_idle():
+            task = self._nodes_task = asyncio.ensure_future(self._fetch_nodes())
+
+            def _done(finished):
+                if not finished.cancelled() and finished.exception() is not None:
+                    logger.warning("Node refresh failed: %s", finished.exception())
+
+            task.add_done_callback(_done)
+        return task
+
+    async def _fetch_nodes(self) -> NodeState:
+        if hasattr(self.client, "fetch_nodes"):
+            groups = await self.client.fetch_nodes()
+        else:
+            loop = asyncio.get_running_loop()
+            groups = await loop.run_in_executor(None, self.client.get_nodes)
+        nodes = NodeState(groups, self._node_index)
+        previous = self._nodes
+        if previous is not None and previous.digest == nodes.digest:
+            previous.fetched_at = nodes.fetched_at
+            return previous
+        nodes.version = max(previous.version + 1 if previous is not None else 0, int(nodes.fetched_at * 1000))
+        self._nodes = nodes
+        return nodes
+
+    async def tail_job(self, job_id: str, stream: str = "stdout", offset: int = 0, follow: bool = False,
+                       idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+        """Chunks of a job's stdout or stderr file, see ``SlurmClient.tail_output``.
+
+        The path comes from the job's detail record, never from the caller,
+        so only output of jobs this user can see is read.
+        """
+        if hasattr(self.client, "tail_job"):
+            chunks = self.client.tail_job(job_id, stream, offset, follow, idle)
+        else:
+            record = (await self.get_details([job_id])).get(job_id)
+            path = record.get(stream) if record is not None and stream in ("stdout", "stderr") else None
+            if not path:
+                raise OutputUnavailable(f"Job {job_id} has no {stream} file")
+            chunks = self.client.tail_output(path, offset, follow, idle)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def refresh(self, time_range: str) -> JobSnapshot:
+        """Fetch a new snapshot, joining any fetch already in progress.
+
+        If every request waiting on a fetch it started goes away (e.g. the
+        HTTP clients disconnected), that fetch is cancelled. Fetches started
+        by the background loop keep running regardless.
+        """
+        self._ensure_started()
+        task = self._inflight.get(time_range)
+        if task is None:
+            # Someone is waiting, so this one goes ahead even over budget
+            self.scheduler.acquire(force=True)
+            task = self._start_fetch(time_range)
+            self._on_demand.add(task)
+            task.add_done_callback(self._on_demand.discard)
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if task in self._on_demand and not task.done():
+                    task.cancel()
+
+    def subscribe(self, time_range: str):
+        """Subscribe to change events, starting the background loop if needed"""
+        self._ensure_started()
+        self._last_requested[time_range] = time.time()
+        return self.events.subscribe(time_range)
+
+    def current(self, time_range: str) -> Optional[JobSnapshot]:
+        """The cached snapshot, without triggering any fetch"""
+        return self._snapshots.get(time_range)
+
+    def stop(self):
+        """Cancel the background refresh loop and any in-flight fetches"""
+        self.events.close()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._inflight.values():
+            task.cancel()
+        self._inflight.clear()
+        for task in (self._nodes_task, self._sdiag_task, *self._efficiency_tasks.values()):
+            if task is not None:
+                task.cancel()
+        self._nodes_task = self._sdiag_task = None
+        self._efficiency_tasks.clear()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures are bound to the loop that created them, so anything left
+            # over from a previous loop (e.g. a test client portal) is dropped.
+            self._loop = loop
+            self._inflight = {}
+            self._waiters = {}
+            self._on_demand = set()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def _start_fetch(self, time_range: str) -> asyncio.Future:
+        task = asyncio.ensure_future(self._fetch(time_range))
+        self._inflight[time_range] = task
+
+        def _done(finished):
+            if self._inflight.get(time_range) is finished:
+                del self._inflight[time_range]
+            if not finished.cancelled() and finished.exception() is not None:
+                SNAPSHOT_REFRESHES.inc(result="failed")
+                self.errors += 1
+                logger.warning("Snapshot refresh failed for %s: %s", time_range, finished.exception())
+
+        task.add_done_callback(_done)
+        return task
+
+    async def _fetch(self, time_range: str) -> JobSnapshot:
+        # SlurmClient logs failed commands and carries on with what it got
+        errors = getattr(self.client, "command_errors", 0)
+        if hasattr(self.client, "fetch_snapshot"):
+            result = await self.client.fetch_snapshot(time_range)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                None, self._fetch_blocking, time_range
+            )
+        self.fetch_count += 1
+        # Failures back this poller off until one succeeds
+        self.errors = 0 if getattr(self.client, "command_errors", 0) == errors else self.errors + 1
+        if isinstance(result, JobSnapshot):
+            # Mirrored from a poller service, which already assigned the version
+            snapshot = result
+        else:
+            active_jobs, completed_jobs = result
+            if self.cluster:
+                for job in active_jobs + completed_jobs:
+                    job.cluster = self.cluster
+            snapshot = JobSnapshot(
+                time_range=time_range,
+                active_jobs=active_jobs,
+                completed_jobs=completed_jobs,
+            )
+        previous = self._snapshots.get(time_range)
+        if previous is not None and previous.digest == snapshot.digest:
+            previous.checked_at = snapshot.checked_at
+            self._unchanged[time_range] = self._unchanged.get(time_range, 0) + 1
+            SNAPSHOT_REFRESHES.inc(result="unchanged")
+            self.timeline.record(self._aggregates[time_range], now=snapshot.fetched_at)
+            return previous
+
+        if not snapshot.version:
+            # Versions start from the clock so they keep increasing across restarts
+            self._version = max(self._version + 1, int(snapshot.fetched_at * 1000))
+            snapshot.version = self._version
+        if previous is not None and previous.encodings():
+            # Viewers will ask for this version as they did for the last one; encode and
+            # compress it now rather than on the first of their requests
+            await asyncio.get_running_loop().run_in_executor(None, snapshot.prepare, previous.encodings())
+        self._unchanged[time_range] = 0
+        SNAPSHOT_REFRESHES.inc(result="changed")
+        self._snapshots[time_range] = snapshot
+        if previous is not None:
+            previous.drop_caches()
+        history = self._history.setdefault(time_range, deque(maxlen=SNAPSHOT_HISTORY))
+        history.append(snapshot)
+        aggregates = self._aggregates.setdefault(time_range, JobAggregates())
+        aggregates.update(snapshot.jobs)
+        self.timeline.record(aggregates, snapshot.completed_jobs, now=snapshot.fetched_at)
+        if previous is not None and self.events.has_subscribers(time_range):
+            self.events.publish(time_range, snapshot.version, diff_snapshots(previous, snapshot))
+        return snapshot
+
+    def _fetch_blocking(self, time_range: str) -> Tuple[List[JobInfo], List[JobInfo]]:
+        client = self.client
+        return client.get_jobs(), client.get_completed_jobs(time_range)
+
+    def _interval(self, time_range: str) -> float:
+        return self.scheduler.interval(self.events.has_subscribers(time_range), self._unchanged.get(time_range, 0),
+                                       self.errors)
+
+    async def _fetch_sdiag(self):
+        try:
+            stats = await self.client.fetch_sdiag()
+        except Exception as e:
+            self.scheduler.sdiag_failed(e)
+        else:
+            self.scheduler.update_load(stats)
+
+    async def _run(self):
+        """Background loop refreshing every time range still being watched"""
+        while True:
+            await asyncio.sleep(min(self.ttl, self.stream_interval))
+            now = time.time()
+            for time_range, last_requested in list(self._last_requested.items()):
+                streaming = self.events.has_subscribers(time_range)
+                if streaming:
+                    self._last_requested[time_range] = now
+                elif now - last_requested > self.idle_timeout:
+                    # Nobody has looked at this range for a while
+                    del self._last_requested[time_range]
+                    self._snapshots.pop(time_range, None)
+                    self._history.pop(time_range, None)
+                    self._graphs.pop(time_range, None)
+                    self._graph_sources.pop(time_range, None)
+                    self._aggregates.pop(time_range, None)
+                    self._unchanged.pop(time_range, None)
+                    continue
+                snapshot = self._snapshots.get(time_range)
+                interval = self._interval(time_range)
+                due = snapshot is None or snapshot.age() >= interval
+                if due and time_range not in self._inflight and self.scheduler.acquire():
+                    self.scheduler.observe(interval)
+                    self._start_fetch(time_range)
+            if self._last_requested and hasattr(self.client, "fetch_sdiag") and self.scheduler.sdiag_due():
+                self._sdiag_task = asyncio.ensure_future(self._fetch_sdiag())
+
+
+class PollerRegistry:
+    """Hands out one shared SnapshotPoller per (hostname, username).
+
+    Each session that uses a poller registers its client, so the poller can
+    switch to another session's connection when the one it polls through is
+    logged out, and is stopped once the last session is gone. Pollers of
+    the same cluster share one PollScheduler, and so its poll budget.
+    """
+
+    def __init__(self, ttl: float = 15.0, idle_timeout: float = 300.0, stream_interval: float = 1.0,
+                 max_interval: Optional[float] = None, budget: Optional[float] = DEFAULT_POLL_BUDGET):
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.stream_interval = stream_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self._pollers: Dict[Tuple[str, str], SnapshotPoller] = {}
+        self._clients: Dict[Tuple[str, str], List] = {}
+        self._schedulers: Dict[str, PollScheduler] = {}
+
+    def acquire(self, hostname: str, username: str, client) -> SnapshotPoller:
+        key = (hostname, username)
+        poller = self._pollers.get(key)
+        if poller is None:
+            details = JobDetailCache(getattr(client, "history", None), hostname, username)
+            scheduler = self._schedulers.get(hostname)
+            if scheduler is None:
+                scheduler = self._schedulers[hostname] = PollScheduler(
+                    hostname, ttl=self.ttl, stream_interval=self.stream_interval,
+                    max_interval=self.max_interval, budget=self.budget)
+            poller = SnapshotPoller(client, ttl=self.ttl, idle_timeout=self.idle_timeout,
+                                    stream_interval=self.stream_interval, cluster=hostname, details=details,
+                                    scheduler=scheduler)
+            self._pollers[key] = poller
+            self._clients[key] = []
+        if client not in self._clients[key]:
+            self._clients[key].append(client)
+        return poller
+
+    def get(self, hostname: str, username: str) -> Optional[SnapshotPoller]:
+        return self._pollers.get((hostname, username))
+
+    def __len__(self) -> int:
+        return len(self._pollers)
+
+    def __iter__(self):
+        return iter(list(self._pollers.values()))
+
+    def release(self, hostname: str, username: str, client):
+        key = (hostname, username)
+        poller = self._pollers.get(key)
+        if poller is None:
+            return
+        clients = self._clients[key]
+        if client in clients:
+            clients.remove(client)
+        if not clients:
+            poller.stop()
+            del self._pollers[key]
+            del self._clients[key]
+            if not any(other == hostname for other, _ in self._pollers):
+                del self._schedulers[hostname]
+        elif poller.client is client:
+            poller.client = clients[0]
@@ -0,0 +1,229 @@
+import base64
+import json
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .dependencies import job_order
+from .models import STATE_CODES, JobBatch, JobInfo, JobState
+
+# Columns /jobs can be sorted by
+SORT_KEYS = ("job_id", "name", "status", "partition", "time", "nodes", "cpus", "memory",
+             "submit_time", "end_time", "cluster")
+
+MAX_PAGE_SIZE = 5000
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+class InvalidQuery(ValueError):
+    """A filter, sort key or cursor that cannot be applied"""
+
+
+@dataclass
+class JobQuery:
+    """Filters, sort order and page of a /jobs request.
+
+    ``name`` is a prefix, or a glob when it contains ``*``, ``?`` or ``[``.
+    Times are Unix seconds. ``sort`` is a column name, prefixed with ``-``
+    for descending order.
+    """
+    states: List[str] = field(default_factory=list)
+    partitions: List[str] = field(default_factory=list)
+    clusters: List[str] = field(default_factory=list)
+    name: Optional[str] = None
+    submitted_after: Optional[float] = None
+    submitted_before: Optional[float] = None
+    ended_after: Optional[float] = None
+    ended_before: Optional[float] = None
+    sort: str = "job_id"
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+
+    def __post_init__(self):
+        key = self.sort.lstrip("-")
+        if key not in SORT_KEYS:
+            raise InvalidQuery(f"Unknown sort key '{key}', expected one of {', '.join(SORT_KEYS)}")
+        if self.limit is not None and not 0 < self.limit <= MAX_PAGE_SIZE:
+            raise InvalidQuery(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    @property
+    def sort_key(self) -> str:
+        return self.sort.lstrip("-")
+
+    @property
+    def descending(self) -> bool:
+        return self.sort.startswith("-")
+
+
+@dataclass
+class JobPage:
+    jobs: List[JobInfo]
+    total: int
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort: str, key: Tuple) -> str:
+    payload = json.dumps([sort, list(key)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, order = key
+        if not isinstance(order, list):
+            raise TypeError(order)
+        # JSON turns the job_order tuple into a list
+        key = value, tuple(order)
+    except (ValueError, TypeError, IndexError):
+        raise InvalidQuery("Malformed cursor")
+    if cursor_sort != sort:
+        raise InvalidQuery("Cursor was issued for a different sort order")
+    return key
+
+
+class JobIndex:
+    """Lookup structures over one snapshot's jobs, for answering JobQuery.
+
+    States and partitions map to row sets. Names, submit and end times and
+    every sort key have a sorted order that is built the first time it is
+    needed, so filters are bisects and set intersections rather than
+    scans, and a page is read straight off the sort order. Cursors hold the
+    sort key of the last job returned, so paging keeps its place when the
+    snapshot changes between requests.
+    """
+
+    def __init__(self, jobs: Sequence[JobInfo], batch: Optional[JobBatch] = None):
+        self.jobs = list(jobs)
+        self.batch = batch if batch is not None else JobBatch.from_jobs(self.jobs)
+        # Ids repeat across clusters, so the cluster breaks ties
+        self._order_keys = [job_order(job_id) + (cluster,) for job_id, cluster
+                            in zip(self.batch.column("job_id"), self.batch.column("cluster"))]
+        self._by_state: Dict[int, List[int]] = {}
+        for row, code in enumerate(self.batch.column("status")):
+            self._by_state.setdefault(code, []).append(row)
+        self._by_partition: Dict[str, List[int]] = {}
+        for row, partition in enumerate(self.batch.column("partition")):
+            self._by_partition.setdefault(partition, []).append(row)
+        self._by_cluster: Dict[str, List[int]] = {}
+        for row, cluster in enumerate(self.batch.column("cluster")):
+            self._by_cluster.setdefault(cluster, []).append(row)
+        self._sorted: Dict[str, Tuple[List[int], List[Tuple]]] = {}
+        self._row_keys: Dict[str, List[Tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def _sort_key(self, name: str, row: int) -> Tuple:
+        if name == "job_id":
+            return (0, self._order_keys[row])
+        return (self.batch.column(name)[row], self._order_keys[row])
+
+    def sorted_rows(self, name: str) -> Tuple[List[int], List[Tuple]]:
+        """Rows in ascending order of a column (ties by job id) and their keys"""
+        if name not in self._sorted:
+            keys = [self._sort_key(name, row) for row in range(len(self.jobs))]
+            rows = sorted(range(len(self.jobs)), key=keys.__getitem__)
+            self._row_keys[name] = keys
+            self._sorted[name] = (rows, [keys[row] for row in rows])
+        return self._sorted[name]
+
+    def _range(self, name: str, low: Optional[float], high: Optional[float]) -> Set[int]:
+        rows, keys = self.sorted_rows(name)
+        # Slurm reports times that have not happened yet (or are unknown) as
+        # 0; those jobs match no time filter
+        start = bisect_right(keys, (0, (float("inf"),)))
+        if low is not None:
+            start = max(start, bisect_left(keys, (low,)))
+        end = len(rows) if high is None else bisect_right(keys, (high, (float("inf"),)))
+        return set(rows[start:end])
+
+    def _names(self, pattern: str) -> Set[int]:
+        # Bisect on the literal prefix, then match the glob (if any) within it
+        prefix = _GLOB_CHARS.split(pattern, 1)[0]
+        rows, keys = self.sorted_rows("name")
+        start = bisect_left(keys, (prefix,))
+        names = self.batch.column("name")
+        matched = set()
+        glob = _GLOB_CHARS.search(pattern) is not None
+        for row in rows[start:]:
+            name = names[row]
+            if not name.startswith(prefix):
+                break
+            if not glob or fnmatchcase(name, pattern):
+                matched.add(row)
+        return matched
+
+    def _candidates(self, query: JobQuery) -> Optional[Set[int]]:
+        """Rows passing every filter, or None when nothing is filtered"""
+        selections: List[Set[int]] = []
+        if query.states:
+            codes = {STATE_CODES[JobState.parse(state)] for state in query.states}
+            selections.append({row for code in codes for row in self._by_state.get(code, ())})
+        if query.partitions:
+            selections.append({row for partition in query.partitions
+                               for row in self._by_partition.get(partition, ())})
+        if query.clusters:
+            selections.append({row for cluster in query.clusters for row in self._by_cluster.get(cluster, ())})
+        if query.name:
+            selections.append(self._names(query.name))
+        if query.submitted_after is not None or query.submitted_before is not None:
+            selections.append(self._range("submit_time", query.submitted_after, query.submitted_before))
+        if query.ended_after is not None or query.ended_before is not None:
+            selections.append(self._range("end_time", query.ended_after, query.ended_before))
+        if not selections:
+            return None
+        selections.sort(key=len)
+        matched = selections[0]
+        for other in selections[1:]:
+            matched = matched & other
+        return matched
+
+    @staticmethod
+    def _cursor_position(bisect, keys: List[Tuple], query: JobQuery) -> int:
+        key = decode_cursor(query.cursor, query.sort)
+        try:
+            return bisect(keys, key)
+        except TypeError:
+            # A crafted key whose values do not compare with the column's
+            raise InvalidQuery("Malformed cursor")
+
+    def query(self, query: JobQuery) -> JobPage:
+        candidates = self._candidates(query)
+        total = len(self.jobs) if candidates is None else len(candidates)
+        rows, keys = self.sorted_rows(query.sort_key)
+        if candidates is not None and len(candidates) * 8 < len(rows):
+            # Few matches: ordering just those beats walking the whole order
+            row_keys = self._row_keys[query.sort_key]
+            rows = sorted(candidates, key=row_keys.__getitem__)
+            keys = [row_keys[row] for row in rows]
+            candidates = None
+
+        if query.descending:
+            end = len(rows)
+            if query.cursor:
+                end = self._cursor_position(bisect_left, keys, query)
+            positions = range(end - 1, -1, -1)
+        else:
+            start = 0
+            if query.cursor:
+                start = self._cursor_position(bisect_right, keys, query)
+            positions = range(start, len(rows))
+
+        limit = query.limit if query.limit is not None else len(rows)
+        page: List[int] = []
+        next_cursor = None
+        for position in positions:
+            row = rows[position]
+            if candidates is not None and row not in candidates:
+                continue
+            if len(page) == limit:
+                next_cursor = encode_cursor(query.sort, keys[page_position])
+                break
+            page.append(row)
+            page_position = position
+        return JobPage(jobs=[self.jobs[row] for row in page], total=total, next_cursor=next_cursor)
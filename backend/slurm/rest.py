@@ -0,0 +1,527 @@
+"""A Slurm client talking to slurmrestd instead of running commands over SSH.
+
+Clusters whose hostname is a URL (``https://slurmctl.example.org:6820``)
+get a RestClient; the password is then a Slurm JWT, as printed by
+``scontrol token``. Jobs, history, nodes, details and sdiag figures come
+as JSON from the REST API over one pool of keep-alive HTTP connections,
+so there is no SSH handshake and no text output to scrape. slurmrestd
+cannot read files, so job output is not available this way.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .client import COMMAND_BYTES, COMMAND_SECONDS, COMMANDS
+from .dependencies import dependency_from_submit_line
+from .details import match_scontrol, sacct_record
+from .executor import CommandExecutor, get_default_executor
+from .history import JobHistoryStore
+from .hostlist import compress
+from .models import JobInfo, UsageBatch
+from .nodes import NodeGroup, node_state
+from .output import OutputUnavailable
+from .units import format_duration, format_timestamp, parse_gpus
+from . import efficiency, history
+
+logger = logging.getLogger(__name__)
+
+# OpenAPI version of the slurmrestd endpoints (Slurm 23.11 to 24.11)
+API_VERSION = "v0.0.40"
+
+# Keep-alive connections per client; jobs, history and nodes are fetched at once
+MAX_CONNECTIONS = 8
+
+# What ``scontrol token`` prints before the token itself
+TOKEN_PREFIX = "SLURM_JWT="
+
+# Node state flags that make sinfo report a drained node
+_DRAIN_FLAGS = ("DRAIN", "DRAINED", "DRAINING")
+
+# Slurm's "not set" and "unlimited" for 16 and 32 bit counters in older API versions
+_NO_VAL = (0xfffe, 0xfffffffe, 0xffffffff)
+
+
+def is_rest_url(hostname: str) -> bool:
+    """Whether a login hostname names a slurmrestd endpoint rather than an SSH host"""
+    return hostname.startswith(("http://", "https://"))
+
+
+def number(value: Any, default: Optional[int] = 0) -> Optional[int]:
+    """An integer field, plain or wrapped as ``{"set", "infinite", "number"}``.
+
+    Unset values give ``default``, infinite ones None.
+    """
+    if isinstance(value, dict):
+        if value.get("infinite"):
+            return None
+        if not value.get("set", True):
+            return default
+        value = value.get("number")
+    if value is None or value in _NO_VAL:
+        return default
+    return int(value)
+
+
+def _state(value: Any) -> str:
+    """A job state, given as a list of state and flags, a ``{"current": ...}`` or a string"""
+    if isinstance(value, dict):
+        value = value.get("current")
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    return value or ""
+
+
+def _timestamp(value: Any) -> float:
+    return float(number(value) or 0)
+
+
+def job_id_of(job: Dict) -> str:
+    """The id squeue and sacct would print: ``123``, ``123_4``, or ``123_[5-9]`` for pending array tasks"""
+    array = job.get("array")
+    if isinstance(array, dict):
+        # slurmdbd nests the array fields
+        base, task, tasks = number(array.get("job_id")), number(array.get("task_id"), None), array.get("task", "")
+    else:
+        base = number(job.get("array_job_id"))
+        task = number(job.get("array_task_id"), None)
+        tasks = job.get("array_task_string", "")
+    if not base:
+        return str(job["job_id"])
+    if task is not None:
+        return f"{base}_{task}"
+    tasks = (tasks or "").split("%", 1)[0]
+    if not tasks:
+        return str(job["job_id"])
+    return f"{base}_[{tasks}]" if "," in tasks or "-" in tasks else f"{base}_{tasks}"
+
+
+def tres_string(tres: Iterable[Dict]) -> str:
+    """A TRES list as sacct prints it, ``cpu=4,mem=16G,gres/gpu=2``"""
+    items = []
+    for item in tres or ():
+        name = f"{item['type']}/{item['name']}" if item.get("name") else item["type"]
+        items.append(f"{name}={item.get('count', 0)}")
+    return ",".join(items)
+
+
+def _memory(job: Dict) -> int:
+    """Requested memory per node in bytes; slurmrestd reports MB"""
+    required = job.get("required", job)
+    per_node = number(required.get("memory_per_node"))
+    if per_node:
+        return per_node << 20
+    return (number(required.get("memory_per_cpu")) or 0) << 20
+
+
+def rest_job_to_job(job: Dict) -> JobInfo:
+    """A job from ``/slurm/.../jobs``, as squeue would have shown it"""
+    limit = number(job.get("time_limit"))
+    nodes = number(job.get("node_count")) or 0
+    info = JobInfo(
+        job_id=job_id_of(job),
+        name=job.get("name", ""),
+        status=_state(job.get("job_state")),
+        time=limit * 60 if limit is not None else None,
+        nodes=nodes,
+        cpus=number(job.get("cpus")) or 0,
+        memory=_memory(job),
+        dependency=job.get("dependency") or "",
+        end_time=0.0,
+        partition=job.get("partition", ""),
+        submit_time=_timestamp(job.get("submit_time")),
+        user=job.get("user_name", ""),
+        start_time=_timestamp(job.get("start_time")),
+    )
+    # GRES per node, like squeue's
+    info.gpus = parse_gpus(job.get("tres_per_node")) * max(nodes, 1)
+    return info
+
+
+def slurmdb_job_to_job(job: Dict) -> JobInfo:
+    """A job from ``/slurmdb/.../jobs``, as sacct would have shown it"""
+    times = job.get("time", {})
+    tres = job.get("tres", {}).get("allocated", [])
+    cpus = sum(item.get("count", 0) for item in tres if item.get("type") == "cpu")
+    return JobInfo(
+        job_id=job_id_of(job),
+        name=job.get("name", ""),
+        status=_state(job.get("state")),
+        time=number(times.get("elapsed")),
+        nodes=number(job.get("allocation_nodes")) or 0,
+        cpus=cpus or number(job.get("required", {}).get("CPUs")) or 0,
+        memory=_memory(job),
+        dependency=dependency_from_submit_line(job.get("submit_line", "")),
+        end_time=_timestamp(times.get("end")),
+        partition=job.get("partition", ""),
+        submit_time=_timestamp(times.get("submission")),
+        user=job.get("user", ""),
+        gpus=parse_gpus(tres_string(tres)),
+        start_time=_timestamp(times.get("start")),
+    )
+
+
+def _time(value: Any) -> str:
+    timestamp = _timestamp(value)
+    return format_timestamp(timestamp) if timestamp else "Unknown"
+
+
+def scontrol_fields(job: Dict) -> Dict[str, str]:
+    """The ``scontrol show job`` fields of a job from slurmrestd"""
+    fields = {"JobId": str(job["job_id"])}
+    base, task = number(job.get("array_job_id")), number(job.get("array_task_id"), None)
+    if base:
+        fields["ArrayJobId"] = str(base)
+        fields["ArrayTaskId"] = str(task) if task is not None else job.get("array_task_string", "")
+    limit = number(job.get("time_limit"))
+    fields.update({
+        "JobName": job.get("name", ""),
+        "UserId": f"{job.get('user_name', '')}({job.get('user_id', '')})",
+        "Account": job.get("account", ""),
+        "QOS": job.get("qos", ""),
+        "JobState": _state(job.get("job_state")),
+        "Reason": job.get("state_reason", ""),
+        "Dependency": job.get("dependency") or "(null)",
+        "TimeLimit": format_duration(limit * 60 if limit is not None else None),
+        "SubmitTime": _time(job.get("submit_time")),
+        "StartTime": _time(job.get("start_time")),
+        "EndTime": _time(job.get("end_time")),
+        "Partition": job.get("partition", ""),
+        "NodeList": job.get("nodes") or "(null)",
+        "NumNodes": str(number(job.get("node_count"))),
+        "NumCPUs": str(number(job.get("cpus"))),
+        "TRES": job.get("tres_alloc_str") or job.get("tres_req_str", ""),
+        "Command": job.get("command", ""),
+        "WorkDir": job.get("current_working_directory", ""),
+        "StdOut": job.get("standard_output") or "(null)",
+        "StdErr": job.get("standard_error") or "(null)",
+    })
+    return fields
+
+
+def _exit_code(job: Dict) -> str:
+    exit_code = job.get("exit_code", {})
+    return f"{number(exit_code.get('return_code'))}:{number(exit_code.get('signal', {}).get('id'))}"
+
+
+def sacct_fields(job: Dict) -> Dict[str, str]:
+    """The ``sacct`` detail fields (``DETAIL_SACCT_FIELDS``) of a job from slurmdbd"""
+    info = slurmdb_job_to_job(job)
+    times = job.get("time", {})
+    limit = number(times.get("limit"))
+    return {
+        "JobID": info.job_id, "State": info.status.value, "ExitCode": _exit_code(job),
+        "Elapsed": format_duration(info.time), "Timelimit": format_duration(limit * 60 if limit is not None else None),
+        "NNodes": str(info.nodes), "NCPUS": str(info.cpus), "ReqMem": f"{info.memory >> 20}M",
+        "Partition": info.partition, "Account": job.get("account", ""), "QOS": job.get("qos", ""),
+        "NodeList": job.get("nodes", ""), "Submit": _time(times.get("submission")),
+        "Start": _time(times.get("start")), "End": _time(times.get("end")), "User": info.user,
+        "AllocTRES": tres_string(job.get("tres", {}).get("allocated", [])),
+        "WorkDir": job.get("working_directory", ""), "JobName": info.name, "SubmitLine": job.get("submit_line", ""),
+    }
+
+
+def usage_fields(job: Dict) -> Dict[str, Any]:
+    """A slurmdbd job's usage as ``efficiency.add_sacct_row`` takes it, its steps already merged"""
+    total = job.get("time", {}).get("total", {})
+    peak = 0
+    for step in job.get("steps", []):
+        for item in step.get("tres", {}).get("requested", {}).get("max", []):
+            if item.get("type") == "mem":
+                peak = max(peak, number(item.get("count")) or 0)
+    return {
+        "_step_cpu": (number(total.get("seconds")) or 0) + (number(total.get("microseconds")) or 0) / 1e6,
+        "_max_rss": peak,
+        "ExitCode": _exit_code(job),
+        "AllocTRES": tres_string(job.get("tres", {}).get("allocated", [])),
+    }
+
+
+def parse_slurmdb_jobs(jobs: Iterable[Dict]) -> Tuple[List[JobInfo], UsageBatch]:
+    """Jobs from ``/slurmdb/.../jobs``, and the usage of those that have ended"""
+    infos = []
+    usage = UsageBatch()
+    for job in jobs:
+        info = slurmdb_job_to_job(job)
+        infos.append(info)
+        if info.end_time and info.status in efficiency.ENDED_STATES:
+            efficiency.add_sacct_row(usage, info, usage_fields(job))
+    return infos, usage.compute()
+
+
+def rest_node_state(node: Dict) -> str:
+    """A node's state as sinfo names it: ``["IDLE", "DRAIN"]`` is ``drained``"""
+    states = node.get("state") or ["UNKNOWN"]
+    if isinstance(states, str):
+        states = states.split("+")
+    base, flags = states[0].upper(), {flag.upper() for flag in states[1:]}
+    if flags & set(_DRAIN_FLAGS):
+        return "drained" if base == "IDLE" or "DRAINED" in flags else "draining"
+    return node_state(base)
+
+
+def parse_rest_nodes(nodes: Iterable[Dict]) -> List[NodeGroup]:
+    """Group nodes from ``/slurm/.../nodes`` the way sinfo does: by partition, state, memory and GRES"""
+    groups: Dict[Tuple[str, str, int, int], List[Dict]] = defaultdict(list)
+    for node in nodes:
+        key = (rest_node_state(node), number(node.get("real_memory")) or 0, parse_gpus(node.get("gres")))
+        for partition in node.get("partitions") or [""]:
+            groups[(partition,) + key].append(node)
+    result = []
+    for (partition, state, memory, gpus), members in groups.items():
+        allocated = idle = total = 0
+        for node in members:
+            cpus, used = number(node.get("cpus")) or 0, number(node.get("alloc_cpus")) or 0
+            allocated += used
+            total += cpus
+            idle += number(node["alloc_idle_cpus"]) if "alloc_idle_cpus" in node else cpus - used
+        result.append(NodeGroup(partition, state, compress(node["name"] for node in members), allocated, idle,
+                                total - allocated - idle, total, memory=memory, gpus=gpus))
+    return result
+
+
+def diag_stats(statistics: Dict) -> Dict[str, int]:
+    """``/slurm/.../diag`` statistics under the names ``scheduler.parse_sdiag`` uses"""
+    return {
+        "rpc_count": sum(number(rpc.get("count")) or 0 for rpc in statistics.get("rpcs_by_message_type", [])),
+        "server_threads": number(statistics.get("server_thread_count")) or 0,
+        "agent_queue": number(statistics.get("agent_queue_size")) or 0,
+        "dbd_agent_queue": number(statistics.get("dbd_agent_queue_size")) or 0,
+    }
+
+
+def decode(response: httpx.Response) -> Tuple[Any, str]:
+    """A slurmrestd response's JSON and the error it reports, or an empty string"""
+    try:
+        data = response.json() if response.content else {}
+    except ValueError:
+        # Not slurmrestd answering, e.g. a proxy's error page
+        return {}, f"HTTP {response.status_code}: not a JSON response"
+    errors = data.get("errors") if isinstance(data, dict) else None
+    if errors:
+        return data, "; ".join(error.get("description") or error.get("error") or str(error) for error in errors)
+    if response.status_code >= 400:
+        return data, f"HTTP {response.status_code} {response.reason_phrase}"
+    return data, ""
+
+
+class RestClient:
+    """Implements the SlurmClient interface over slurmrestd's REST API.
+
+    ``hostname`` is the base URL of slurmrestd and ``password`` a JWT for
+    ``username``; both go with every request as slurmrestd's
+    ``X-SLURM-USER-*`` headers. Requests share a pool of keep-alive
+    connections, so a poll costs no handshake, and the requests of a
+    snapshot go out at once. With a history store, slurmdbd is only asked
+    for what changed since the last refresh, as with SlurmClient.
+    """
+
+    def __init__(self, hostname: str, username: str, password: str,
+                 command_timeout: float = 60.0,
+                 executor: Optional[CommandExecutor] = None,
+                 history: Optional[JobHistoryStore] = None,
+                 api_version: str = API_VERSION,
+                 max_connections: int = MAX_CONNECTIONS):
+        self.hostname = hostname
+        self.username = username
+        token = password.strip()
+        self.password = token[len(TOKEN_PREFIX):] if token.startswith(TOKEN_PREFIX) else token
+        self.command_timeout = command_timeout
+        self.executor = executor or get_default_executor()
+        self.history = history
+        self.api_version = api_version
+        self.connected = False
+        self.command_errors = 0
+        self._base_url = hostname.rstrip("/")
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        # slurmctld's last_update of the job list, and the user's jobs in it
+        self._jobs: Tuple[int, List[JobInfo]] = (0, [])
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"X-SLURM-USER-NAME": self.username, "X-SLURM-USER-TOKEN": self.password,
+                "Accept": "application/json"}
+
+    def _path(self, plugin: str, endpoint: str) -> str:
+        return f"/{plugin}/{self.api_version}/{endpoint}"
+
+    def connect(self) -> bool:
+        """Check that slurmrestd answers and accepts the token"""
+        try:
+            logger.info("Connecting to %s as %s", self.hostname, self.username)
+            with httpx.Client(base_url=self._base_url, headers=self.headers, timeout=10) as http:
+                response = http.get(self._path("slurm", "ping"))
+            data, error = decode(response)
+            if error:
+                raise RuntimeError(error)
+            self.connected = True
+            pings = [ping.get("hostname", "") for ping in data.get("pings", [])]
+            logger.info("Connected to %s", ", ".join(pings) or self.hostname)
+            return True
+        except Exception as e:
+            logger.warning("Connection to %s failed: %s: %s", self.hostname, type(e).__name__, e,
+                           exc_info=logger.isEnabledFor(logging.DEBUG))
+            self.disconnect()
+            return False
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http_loop is not loop:
+            # Pooled connections belong to the loop that opened them
+            self._http = httpx.AsyncClient(base_url=self._base_url, headers=self.headers, limits=self._limits,
+                                           timeout=self.command_timeout)
+            self._http_loop = loop
+        return self._http
+
+    async def request(self, plugin: str, endpoint: str, params: Optional[Dict] = None) -> Tuple[Any, str]:
+        """GET an endpoint and return its (decoded JSON, error).
+
+        Slurm's own errors come back as the error; failing to reach
+        slurmrestd raises, as a dropped SSH connection does.
+        """
+        command = f"rest:{plugin}/{endpoint.split('/', 1)[0]}"
+        started = time.perf_counter()
+        outcome = "failed"
+        try:
+            response = await self._client().get(self._path(plugin, endpoint), params=params)
+            received = time.perf_counter()
+            data, error = decode(response)
+            outcome = "error" if error else "ok"
+        finally:
+            COMMANDS.inc(command=command, outcome=outcome)
+        COMMAND_SECONDS.observe(received - started, command=command, phase="read")
+        COMMAND_SECONDS.observe(time.perf_counter() - received, command=command, phase="parse")
+        COMMAND_BYTES.inc(len(response.content), command=command)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("rest request=%s outcome=%s read_ms=%.1f bytes=%d", command, outcome,
+                         (received - started) * 1000, len(response.content))
+        return data, error
+
+    def _checked(self, command: str, jobs: List[JobInfo], error: str) -> List[JobInfo]:
+        if error:
+            self.command_errors += 1
+            logger.warning("Error from %s: %s", command, error)
+            return []
+        return jobs
+
+    async def fetch_jobs(self) -> List[JobInfo]:
+        """The user's jobs slurmctld holds, like ``squeue -u $USER``.
+
+        The job list endpoint takes no user, only ``update_time``: slurmctld
+        then sends no jobs at all unless one changed since the last poll,
+        so a quiet cluster costs an empty reply. A changed list comes whole
+        and is filtered to the user's jobs here.
+        """
+        last_update, known = self._jobs
+        data, error = await self.request("slurm", "jobs", {"update_time": last_update} if last_update else None)
+        if error:
+            return self._checked("slurmrestd", [], error)
+        updated = number(data.get("last_update")) or 0
+        if last_update and not data.get("jobs") and updated <= last_update:
+            return list(known)
+        jobs = [rest_job_to_job(job) for job in data.get("jobs", []) if job.get("user_name") == self.username]
+        self._jobs = (updated, jobs)
+        return list(jobs)
+
+    async def fetch_snapshot(self, time_range: str) -> Tuple[List[JobInfo], List[JobInfo]]:
+        """Fetch active and completed jobs with concurrent requests"""
+        active_jobs, completed_jobs = await asyncio.gather(
+            self.fetch_jobs(),
+            self.fetch_completed_jobs(time_range),
+        )
+        return active_jobs, completed_jobs
+
+    def disconnect(self):
+        self.connected = False
+        http, self._http = self._http, None
+        if http is not None:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            # Connections of a loop that is gone are dropped with the client
+            if running is not None and running is self._http_loop:
+                running.create_task(http.aclose())
+        self._http_loop = None
+
+    async def _fetch_history(self, start: float, end: float,
+                             all_users: bool = False) -> Tuple[Tuple[List[JobInfo], UsageBatch], str]:
+        params = {"start_time": int(start), "end_time": int(end)}
+        if not all_users:
+            params["users"] = self.username
+        data, error = await self.request("slurmdb", "jobs", params)
+        return parse_slurmdb_jobs(data.get("jobs", [])), error
+
+    async def fetch_completed_jobs(self, time_range: str) -> List[JobInfo]:
+        """Jobs slurmdbd has seen run in the time range, like sacct"""
+        return await history.fetch_completed_jobs(self, self._fetch_history, time_range, "slurmdbd")
+
+    async def _fetch_usage_span(self, start: float, end: float, all_users: bool) -> Tuple[UsageBatch, str]:
+        (_, usage), error = await self._fetch_history(start, end, all_users)
+        return usage, error
+
+    async def fetch_usage(self, since: float, all_users: bool = False,
+                          deadline: Optional[float] = None) -> UsageBatch:
+        """Usage and efficiency of the jobs that ended since ``since``, see ``efficiency.fetch_usage``"""
+        return await efficiency.fetch_usage(self, self._fetch_usage_span, since, all_users, deadline)
+
+    async def _fetch_detail(self, plugin: str, job_id: str) -> List[Dict]:
+        data, error = await self.request(plugin, f"job/{job_id}")
+        # Jobs slurmctld has purged are expected to fail here
+        if error and "Invalid job id" not in error:
+            logger.warning("Error from %s for job %s: %s", plugin, job_id, error)
+        return data.get("jobs", []) if not error else []
+
+    async def fetch_job_details(self, job_ids: List[str]) -> Dict[str, Dict]:
+        """Detail records of the given jobs, by job id, asking for them all at once.
+
+        slurmctld answers for the jobs it still holds, slurmdbd for the
+        rest. Jobs neither knows are left out.
+        """
+        replies = await asyncio.gather(*(self._fetch_detail("slurm", job_id) for job_id in job_ids))
+        found = {}
+        for job_id, jobs in zip(job_ids, replies):
+            found.update(match_scontrol([job_id], (scontrol_fields(job) for job in jobs)))
+        for job_id, record in found.items():
+            record["source"] = "slurmrestd"
+        missing = [job_id for job_id in job_ids if job_id not in found]
+        if not missing:
+            return found
+        replies = await asyncio.gather(*(self._fetch_detail("slurmdb", job_id) for job_id in missing))
+        for job_id, jobs in zip(missing, replies):
+            for job in jobs:
+                fields = sacct_fields(job)
+                if fields["JobID"] == job_id:
+                    found[job_id] = dict(sacct_record(fields), source="slurmdbd")
+                    break
+        return found
+
+    async def fetch_nodes(self) -> List[NodeGroup]:
+        """Node states, grouped per partition and state as sinfo would.
+
+        Raises on error rather than reporting no nodes, so the caller keeps
+        what it had.
+        """
+        data, error = await self.request("slurm", "nodes")
+        if error:
+            self.command_errors += 1
+            raise RuntimeError(f"Error from slurmrestd: {error}")
+        return parse_rest_nodes(data.get("nodes", []))
+
+    async def fetch_sdiag(self) -> Dict[str, int]:
+        """slurmctld's load figures from ``/diag``, see ``scheduler.parse_sdiag``"""
+        data, error = await self.request("slurm", "diag")
+        if error:
+            raise RuntimeError(error)
+        return diag_stats(data.get("statistics", {}))
+
+    async def tail_output(self, path: str, offset: int = 0, follow: bool = False,
+                          idle: Optional[float] = None) -> AsyncIterator[Tuple[int, bytes]]:
+        raise OutputUnavailable(f"{self.hostname} is reached through slurmrestd, which cannot read job output")
+        # Unreachable, but makes this an async generator like SlurmClient.tail_output
+        yield offset, b""
@@ -0,0 +1,172 @@
+import logging
+import re
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from .metrics import get_default_registry
+
+logger = logging.getLogger(__name__)
+
+# Polls (one squeue/sacct round, or one sinfo) per minute a cluster gets by default
+DEFAULT_POLL_BUDGET = 60.0
+
+# Seconds between sdiag runs per cluster
+SDIAG_INTERVAL = 60.0
+
+# sdiag readings at which slurmctld counts as busy; polling slows down in
+# proportion to the worst of them, up to MAX_LOAD_FACTOR times
+BUSY_SERVER_THREADS = 32
+BUSY_AGENT_QUEUE = 256
+BUSY_DBD_AGENT_QUEUE = 1000
+BUSY_RPC_RATE = 200.0
+MAX_LOAD_FACTOR = 8.0
+
+# Longest wait after failed polls
+MAX_ERROR_INTERVAL = 300.0
+
+_SDIAG_STATS = {
+    "Server thread count": "server_threads",
+    "Agent queue size": "agent_queue",
+    "DBD Agent queue size": "dbd_agent_queue",
+}
+_RPC_COUNT = re.compile(r"\bcount:\s*(\d+)")
+
+_metrics = get_default_registry()
+POLL_INTERVAL = _metrics.histogram(
+    "swatch_poll_interval_seconds", "Interval the scheduler chose for each background poll", ["cluster"],
+    buckets=(1.0, 2.0, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+POLLS_DEFERRED = _metrics.counter(
+    "swatch_polls_deferred_total", "Polls put off because the cluster's poll budget was spent", ["cluster"])
+LOAD_FACTOR = _metrics.gauge(
+    "swatch_poll_load_factor", "How many times slower than normal a cluster is polled because of slurmctld load",
+    ["cluster"])
+
+
+def parse_sdiag(lines: Iterable[str]) -> Dict[str, int]:
+    """The load figures of sdiag's output, plus ``rpc_count``, the RPCs served since its counters were reset"""
+    stats = {"rpc_count": 0}
+    by_type = False
+    for line in lines:
+        if line.startswith("Remote Procedure Call statistics by message type"):
+            by_type = True
+        elif line.startswith("Remote Procedure Call statistics by user"):
+            # The same RPCs again, counted per user
+            by_type = False
+        elif by_type:
+            match = _RPC_COUNT.search(line)
+            if match:
+                stats["rpc_count"] += int(match.group(1))
+        else:
+            key, _, value = line.partition(":")
+            name = _SDIAG_STATS.get(key.strip())
+            if name is not None and value.strip().isdigit():
+                stats[name] = int(value.strip())
+    return stats
+
+
+class PollScheduler:
+    """Decides how often the pollers of one cluster poll it.
+
+    A time range is polled every ``stream_interval`` seconds while someone
+    is subscribed to it and every ``ttl`` seconds otherwise. Each poll that
+    finds nothing changed doubles that, up to ``ttl`` for streams and
+    ``max_interval`` otherwise, and the first change goes back to the base
+    interval. The result is stretched by slurmctld's load as sdiag reports
+    it, and after a poller's failed polls by an exponential backoff.
+
+    All pollers of the cluster share a budget of ``budget`` polls per
+    minute (None for no limit), so adding users or time ranges cannot push
+    the cluster past it, and the load factor. Failures are counted by each
+    poller: one user's expired key or broken sacct says nothing about the
+    cluster, so it only slows that user's polls.
+    """
+
+    def __init__(self, cluster: str = "", ttl: float = 15.0, stream_interval: float = 1.0,
+                 max_interval: Optional[float] = None, budget: Optional[float] = DEFAULT_POLL_BUDGET,
+                 sdiag_interval: Optional[float] = SDIAG_INTERVAL, idle_backoff: bool = True):
+        self.cluster = cluster
+        self.ttl = ttl
+        self.stream_interval = stream_interval
+        self.max_interval = max(ttl, max_interval if max_interval is not None else 4 * ttl)
+        self.budget = budget
+        self.sdiag_interval = sdiag_interval
+        self.idle_backoff = idle_backoff
+        self.load_factor = 1.0
+        self.sdiag: Dict[str, int] = {}
+        # Enough for ten seconds' worth of polls at once
+        self._capacity = max(2.0, budget / 6) if budget is not None else 0.0
+        self._tokens = self._capacity
+        self._refilled = time.monotonic()
+        self._sdiag_at: Optional[float] = None
+        self._rpcs: Optional[Tuple[float, int]] = None
+
+    def interval(self, streaming: bool = False, unchanged: int = 0, errors: int = 0) -> float:
+        """Seconds to wait between polls of a time range that came back unchanged ``unchanged`` times in a row,
+        for a poller whose last ``errors`` polls failed"""
+        if streaming:
+            base, ceiling = self.stream_interval, self.ttl
+        else:
+            base, ceiling = self.ttl, self.max_interval
+        interval = base
+        if self.idle_backoff and unchanged:
+            interval = min(base * 2 ** min(unchanged, 16), ceiling)
+        interval *= self.load_factor
+        if errors:
+            interval = max(interval, min(self.ttl * 2 ** min(errors - 1, 16), MAX_ERROR_INTERVAL))
+        return interval
+
+    def acquire(self, force: bool = False) -> bool:
+        """Take one poll from the budget.
+
+        Returns False, and the poll should be skipped, when the budget is
+        spent. With ``force`` (someone is waiting on the result) the poll
+        is always allowed but still paid for, delaying the next ones.
+        """
+        if self.budget is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled) * self.budget / 60)
+        self._refilled = now
+        if self._tokens < 1 and not force:
+            POLLS_DEFERRED.inc(cluster=self.cluster)
+            return False
+        self._tokens -= 1
+        return True
+
+    def observe(self, interval: float):
+        POLL_INTERVAL.observe(interval, cluster=self.cluster)
+
+    def sdiag_due(self, now: Optional[float] = None) -> bool:
+        """Whether to run sdiag now; answering True claims the run, so one poller of the cluster does it"""
+        if self.sdiag_interval is None:
+            return False
+        now = time.time() if now is None else now
+        if self._sdiag_at is not None and now - self._sdiag_at < self.sdiag_interval:
+            return False
+        self._sdiag_at = now
+        return True
+
+    def sdiag_failed(self, error: Exception):
+        # Usually sdiag being restricted to operators; polling goes on without it
+        logger.info("sdiag unavailable on %s, not adapting to its load: %s", self.cluster, error)
+        self.sdiag_interval = None
+
+    def update_load(self, stats: Dict[str, int], now: Optional[float] = None):
+        """Set the load factor from an sdiag reading"""
+        now = time.time() if now is None else now
+        rate = 0.0
+        if self._rpcs is not None:
+            elapsed, served = now - self._rpcs[0], stats["rpc_count"] - self._rpcs[1]
+            # A drop means the counters were reset
+            if elapsed > 0 and served >= 0:
+                rate = served / elapsed
+        self._rpcs = (now, stats["rpc_count"])
+        pressure = max(
+            stats.get("server_threads", 0) / BUSY_SERVER_THREADS,
+            stats.get("agent_queue", 0) / BUSY_AGENT_QUEUE,
+            stats.get("dbd_agent_queue", 0) / BUSY_DBD_AGENT_QUEUE,
+            rate / BUSY_RPC_RATE,
+        )
+        self.sdiag = dict(stats, rpc_rate=round(rate, 1))
+        self.load_factor = min(max(1.0, pressure), MAX_LOAD_FACTOR)
+        LOAD_FACTOR.set(self.load_factor, cluster=self.cluster)
@@ -0,0 +1,210 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# The shared store records activity at most this often per session, so a
+# busy dashboard does not turn every request into a write
+TOUCH_INTERVAL = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    clusters TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_last_seen ON sessions (last_seen);
+"""
+
+# Bumped whenever the table changes; sessions in an older file are dropped
+SCHEMA_VERSION = 2
+
+_COLUMNS = "session_id, hostname, username, created_at, last_seen, clusters"
+
+Cluster = Tuple[str, str]
+
+
+@dataclass
+class Session:
+    """A logged-in user on one or more clusters.
+
+    ``clusters`` holds every (hostname, username) the session spans; the
+    first one is also in ``hostname`` and ``username``.
+    """
+    session_id: str
+    hostname: str
+    username: str
+    created_at: float
+    last_seen: float
+    clusters: Tuple[Cluster, ...] = ()
+
+    def __post_init__(self):
+        self.clusters = tuple(tuple(cluster) for cluster in self.clusters) or ((self.hostname, self.username),)
+
+    @classmethod
+    def new(cls, hostname: str, username: str, clusters: Sequence[Cluster] = ()) -> "Session":
+        """A session on ``hostname`` and on each further (hostname, username) in ``clusters``"""
+        now = time.time()
+        return cls(str(uuid.uuid4()), hostname, username, created_at=now, last_seen=now,
+                   clusters=((hostname, username),) + tuple(clusters))
+
+    def idle(self, now: Optional[float] = None) -> float:
+        return (time.time() if now is None else now) - self.last_seen
+
+
+class MemorySessionStore:
+    """Sessions of a single API process"""
+
+    def __init__(self):
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def create(self, hostname: str, username: str, clusters: Sequence[Cluster] = ()) -> Session:
+        session = Session.new(hostname, username, clusters)
+        with self._lock:
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str, touch: bool = True) -> Optional[Session]:
+        """The session, marked as active now unless not ``touch``; None if unknown or logged out"""
+        session = self._sessions.get(session_id)
+        if session is not None and touch:
+            session.last_seen = time.time()
+        return session
+
+    def pop(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def expire(self, idle_timeout: float, now: Optional[float] = None) -> List[Session]:
+        """Remove and return the sessions idle for more than ``idle_timeout`` seconds"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [session for session in self._sessions.values() if session.idle(now) > idle_timeout]
+            for session in expired:
+                del self._sessions[session.session_id]
+        return expired
+
+    def sessions(self) -> List[Session]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """Sessions in an SQLite file shared by every API worker on the host.
+
+    Any worker can serve a session another one created. Expiry deletes
+    each session row on its own, so when several workers sweep at the
+    same time exactly one of them gets (and closes) each expired session.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript("DROP TABLE IF EXISTS sessions;")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(_SCHEMA)
+
+    def create(self, hostname: str, username: str, clusters: Sequence[Cluster] = ()) -> Session:
+        session = Session.new(hostname, username, clusters)
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                (session.session_id, hostname, username, session.created_at, session.last_seen,
+                 json.dumps(session.clusters)),
+            )
+        return session
+
+    @staticmethod
+    def _session(row) -> Session:
+        return Session(*row[:5], clusters=json.loads(row[5]))
+
+    def get(self, session_id: str, touch: bool = True) -> Optional[Session]:
+        """The session, marked as active now unless not ``touch``; None if unknown or logged out"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        session = self._session(row)
+        now = time.time()
+        if touch and session.idle(now) >= TOUCH_INTERVAL:
+            with self._lock, self._db:
+                self._db.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (now, session_id))
+            session.last_seen = now
+        return session
+
+    def pop(self, session_id: str) -> Optional[Session]:
+        with self._lock, self._db:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            deleted = self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+        return self._session(row) if deleted else None
+
+    def expire(self, idle_timeout: float, now: Optional[float] = None) -> List[Session]:
+        """Remove and return the sessions idle for more than ``idle_timeout`` seconds"""
+        cutoff = (time.time() if now is None else now) - idle_timeout
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM sessions WHERE last_seen < ?",
+                (cutoff,),
+            ).fetchall()
+        expired = []
+        for row in rows:
+            with self._lock, self._db:
+                # Another worker may have swept it, or it may just have been used
+                deleted = self._db.execute(
+                    "DELETE FROM sessions WHERE session_id = ? AND last_seen < ?", (row[0], cutoff)
+                ).rowcount
+            if deleted:
+                expired.append(self._session(row))
+        return expired
+
+    def sessions(self) -> List[Session]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM sessions"
+            ).fetchall()
+        return [self._session(row) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_store = None
+
+
+def get_default_session_store():
+    """The process-wide session store: shared SQLite if SWATCH_SESSION_DB is set, else in memory"""
+    global _default_store
+    if _default_store is None:
+        path = os.environ.get("SWATCH_SESSION_DB", "")
+        _default_store = SqliteSessionStore(path) if path else MemorySessionStore()
+    return _default_store
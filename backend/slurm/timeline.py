@@ -0,0 +1,177 @@
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .aggregates import JobAggregates
+from .models import JobInfo
+
+# Queue levels sampled on every poll; a bucket holds their mean
+GAUGES = ("pending_jobs", "pending_cpus", "running_jobs", "running_cpus", "running_gpus", "running_nodes")
+# Jobs finishing, counted in the bucket of their end time
+COUNTERS = ("completed_jobs", "failed_jobs")
+# Worked out per bucket from the counters when read
+DERIVED = ("failure_rate",)
+METRICS = GAUGES + COUNTERS + DERIVED
+
+# (resolution, buckets kept): a day of minutes, a week of quarter hours, a month of hours
+TIERS: Tuple[Tuple[int, int], ...] = ((60, 1440), (900, 672), (3600, 720))
+RESOLUTIONS = {"1m": 60, "15m": 900, "1h": 3600}
+
+# Most points a timeline query picks a resolution for
+MAX_POINTS = 1500
+
+
+class RingSeries:
+    """Fixed-size per-bucket sums of every metric at one resolution.
+
+    Bucket ``n`` covers ``[n * resolution, (n + 1) * resolution)`` and lives
+    in slot ``n % capacity``. A slot is reset when a newer bucket wraps onto
+    it, so memory never grows and old buckets simply drop off.
+    """
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.newest = -1
+        self._buckets = array("q", [-1]) * capacity
+        self._samples = array("l", [0]) * capacity
+        self._sums = {name: array("d", [0.0]) * capacity for name in GAUGES + COUNTERS}
+
+    def _slot(self, timestamp: float) -> Optional[int]:
+        bucket = int(timestamp // self.resolution)
+        if bucket <= self.newest - self.capacity:
+            return None  # Older than anything kept
+        if bucket > self.newest:
+            self.newest = bucket
+        slot = bucket % self.capacity
+        if self._buckets[slot] != bucket:
+            self._buckets[slot] = bucket
+            self._samples[slot] = 0
+            for sums in self._sums.values():
+                sums[slot] = 0.0
+        return slot
+
+    def add_sample(self, timestamp: float, values: Dict[str, float]):
+        slot = self._slot(timestamp)
+        if slot is None:
+            return
+        self._samples[slot] += 1
+        for name in GAUGES:
+            self._sums[name][slot] += values.get(name, 0)
+
+    def add_count(self, timestamp: float, name: str, count: int = 1):
+        slot = self._slot(timestamp)
+        if slot is not None:
+            self._sums[name][slot] += count
+
+    def oldest(self) -> float:
+        """Start of the oldest bucket still kept"""
+        return max(self.newest - self.capacity + 1, 0) * self.resolution
+
+    def read(self, start: float, end: float, metrics: Sequence[str]) -> Dict:
+        """Aligned series for the buckets from ``start`` to ``end``; gaps are null"""
+        first = int(start // self.resolution)
+        last = int(end // self.resolution)
+        kept_from = self.newest - self.capacity + 1
+        timestamps: List[int] = []
+        series: Dict[str, List] = {name: [] for name in metrics}
+        for bucket in range(first, last + 1):
+            timestamps.append(bucket * self.resolution)
+            slot = bucket % self.capacity
+            stored = self._buckets[slot] == bucket
+            samples = self._samples[slot] if stored else 0
+            for name in metrics:
+                if name in GAUGES:
+                    value = self._sums[name][slot] / samples if samples else None
+                elif name in COUNTERS:
+                    # Buckets nothing finished in are zero, not unknown
+                    value = self._count(name, slot, stored, bucket >= kept_from and bucket <= self.newest)
+                else:
+                    completed = self._count("completed_jobs", slot, stored, True)
+                    failed = self._count("failed_jobs", slot, stored, True)
+                    value = failed / (completed + failed) if completed + failed else None
+                series[name].append(value)
+        return {"resolution": self.resolution, "timestamps": timestamps, "series": series}
+
+    def _count(self, name: str, slot: int, stored: bool, in_range: bool) -> Optional[int]:
+        if stored:
+            return int(self._sums[name][slot])
+        return 0 if in_range else None
+
+
+class Timeline:
+    """Rolling history of one cluster's queue metrics.
+
+    Each poll adds one sample of the queue levels to every tier, and each
+    job seen finishing for the first time is counted in the bucket of its
+    end time, so the first poll also backfills the failure history from
+    sacct. Memory is fixed by ``TIERS``; reading a range costs one step per
+    point returned, whatever the number of jobs.
+    """
+
+    def __init__(self, tiers: Iterable[Tuple[int, int]] = TIERS):
+        self.tiers = [RingSeries(resolution, capacity) for resolution, capacity in tiers]
+        self._ended_until = 0.0
+        self._ended_at_mark: set = set()
+
+    def record(self, aggregates: JobAggregates, finished: Iterable[JobInfo] = (),
+               now: Optional[float] = None):
+        now = time.time() if now is None else now
+        values = {
+            "pending_jobs": aggregates.pending["jobs"],
+            "pending_cpus": aggregates.pending["cpus"],
+            "running_jobs": aggregates.allocated["jobs"],
+            "running_cpus": aggregates.allocated["cpus"],
+            "running_gpus": aggregates.allocated["gpus"],
+            "running_nodes": aggregates.allocated["nodes"],
+        }
+        for tier in self.tiers:
+            tier.add_sample(now, values)
+        self.record_finished(finished)
+
+    def record_finished(self, jobs: Iterable[JobInfo]):
+        """Count jobs that finished after the last one already counted"""
+        mark = self._ended_until
+        newest, at_newest = mark, set(self._ended_at_mark)
+        for job in jobs:
+            end = job.end_time
+            if not end or end < mark or (end == mark and job.job_id in self._ended_at_mark):
+                continue
+            tag = job.tag
+            if tag not in ("completed", "failed"):
+                continue
+            name = f"{tag}_jobs"
+            for tier in self.tiers:
+                tier.add_count(end, name)
+            if end > newest:
+                newest, at_newest = end, set()
+            if end == newest:
+                at_newest.add(job.job_id)
+        self._ended_until, self._ended_at_mark = newest, at_newest
+
+    def pick_tier(self, start: float, end: float, resolution: Optional[str] = None) -> RingSeries:
+        """The requested tier, or the finest one covering ``start`` in few enough points"""
+        if resolution is not None:
+            seconds = RESOLUTIONS.get(resolution)
+            for tier in self.tiers:
+                if tier.resolution == seconds:
+                    return tier
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}")
+        for tier in self.tiers:
+            if tier.oldest() <= start and (end - start) / tier.resolution <= MAX_POINTS:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, start: float, end: float, resolution: Optional[str] = None,
+              metrics: Optional[Sequence[str]] = None) -> Dict:
+        metrics = list(metrics) if metrics else list(METRICS)
+        unknown = [name for name in metrics if name not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metric '{unknown[0]}', expected one of {', '.join(METRICS)}")
+        if end < start:
+            raise ValueError("end must not be before start")
+        tier = self.pick_tier(start, end, resolution)
+        if (end - start) / tier.resolution > MAX_POINTS:
+            # Keep the latest points of a range too long for the resolution
+            start = end - MAX_POINTS * tier.resolution
+        return tier.read(start, end, metrics)
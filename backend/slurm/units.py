@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Optional
+
+# The time ranges the app offers, in seconds
+TIME_RANGES = {
+    "1h": 3600,
+    "6h": 6 * 3600,
+    "12h": 12 * 3600,
+    "24h": 24 * 3600,
+    "156h": 156 * 3600,  # 156 hours ≈ 6.5 days
+}
+
+
+def time_range_seconds(time_range: str) -> int:
+    """Length of a time range, defaulting to 24h for unknown values"""
+    return TIME_RANGES.get(time_range, TIME_RANGES["24h"])
+
+
+def parse_duration(value: Optional[str]) -> Optional[int]:
+    """Convert a Slurm time string to seconds.
+
+    Understands the forms squeue and sacct print: ``MM:SS``, ``HH:MM:SS``,
+    ``D-HH``, ``D-HH:MM`` and ``D-HH:MM:SS`` (fractional seconds are
+    dropped). Returns None for ``UNLIMITED``, ``INVALID``, ``NOT_SET``,
+    empty and malformed values.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    days = 0
+    if "-" in value:
+        day_part, _, value = value.partition("-")
+        if not day_part.isdigit():
+            return None
+        days = int(day_part)
+    try:
+        parts = [int(float(p)) for p in value.split(":")]
+    except ValueError:
+        return None
+
+    if days:
+        # After "D-" the first field is hours: D-HH, D-HH:MM, D-HH:MM:SS
+        parts = parts + [0] * (3 - len(parts))
+    elif len(parts) == 2:
+        parts = [0] + parts
+    elif len(parts) == 1:
+        # A bare number is minutes, as in Slurm's time limit syntax
+        parts = [0, parts[0], 0]
+    if len(parts) != 3:
+        return None
+    hours, minutes, seconds = parts
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_duration(seconds: Optional[int]) -> str:
+    """Format seconds the way Slurm prints times (``D-HH:MM:SS``)"""
+    if seconds is None:
+        return "UNLIMITED"
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    clock = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days}-{clock}" if days else clock
+
+
+# Slurm memory suffixes; a bare number is megabytes
+_MEMORY_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40, "P": 1 << 50}
+
+
+def parse_memory(value: Optional[str]) -> int:
+    """Convert a Slurm memory size (``64G``, ``4000M``, ``512``) to bytes, 0 if unknown"""
+    if not value:
+        return 0
+    value = value.strip().upper()
+    if value[-1:] in ("N", "C"):
+        # Per node/per CPU suffix of older sacct ReqMem values
+        value = value[:-1]
+    unit = _MEMORY_UNITS.get(value[-1:])
+    number = value[:-1] if unit else value
+    try:
+        return int(float(number) * (unit or _MEMORY_UNITS["M"]))
+    except ValueError:
+        return 0
+
+
+def format_memory(size: int) -> str:
+    """Format bytes with the largest Slurm unit that keeps it readable (``64G``)"""
+    for suffix in ("P", "T", "G", "M", "K"):
+        unit = _MEMORY_UNITS[suffix]
+        if size >= unit:
+            amount = size / unit
+            return f"{amount:.0f}{suffix}" if amount == int(amount) else f"{amount:.1f}{suffix}"
+    return str(size)
+
+
+def parse_gpus(value: Optional[str]) -> int:
+    """Count the GPUs in a TRES or GRES string.
+
+    Understands sacct's AllocTRES (``cpu=4,gres/gpu=2``) and squeue's
+    per-node GRES (``gpu:2``, ``gpu:a100:2``, ``gres/gpu:2``, ``N/A``).
+    Typed entries such as ``gres/gpu:a100=2`` are skipped when the untyped
+    total is also listed, so GPUs are not counted twice.
+    """
+    if not value:
+        return 0
+    total, typed = 0, 0
+    for item in value.split(","):
+        item = item.strip()
+        if item.startswith("gres/"):
+            item = item[len("gres/"):]
+        elif item.startswith("gres:"):
+            item = item[len("gres:"):]
+        if not item.startswith("gpu"):
+            continue
+        # Drop index annotations such as "(IDX:0)"
+        name, _, count = item.split("(", 1)[0].replace("=", ":").rpartition(":")
+        if not name:
+            # A bare "gpu" means one
+            name, count = count, "1"
+        if not count.isdigit():
+            continue
+        if name == "gpu":
+            total += int(count)
+        else:
+            typed += int(count)
+    return total or typed
+
+
+def parse_timestamp(value: Optional[str]) -> float:
+    """Convert a sacct timestamp (``2024-05-01T12:00:00``) to Unix time.
+
+    Returns 0.0 for ``Unknown``, ``None`` and other non-dates, which sacct
+    prints for jobs that have not ended yet.
+    """
+    if not value or not value[:1].isdigit():
+        return 0.0
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def format_timestamp(timestamp: float) -> str:
+    """Format Unix time the way sacct's -S/-E options expect it"""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S")
@@ -0,0 +1,48 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.aggregates import JobAggregates
+from backend.slurm.models import JobInfo
+from backend.slurm.units import parse_gpus
+
+
+def job(job_id, status, cpus=4, gpus=0, elapsed="1:00:00", start=0.0, partition="compute", user="alice"):
+    return JobInfo(job_id=job_id, name="j", status=status, time=elapsed, nodes="1", cpus=str(cpus),
+                   memory="1G", partition=partition, user=user, gpus=gpus, start_time=start)
+
+
+def test_totals_follow_each_snapshot():
+    """Counts, allocations and CPU-hours are adjusted for what changed"""
+    aggregates = JobAggregates()
+    running = job("1", "RUNNING", cpus=8, gpus=2, start=1000.0, partition="gpu")
+    aggregates.update([running, job("2", "PENDING", cpus=2), job("3", "COMPLETED", cpus=4, elapsed="2:00:00"),
+                       running])
+    summary = aggregates.to_dict(now=1000.0 + 1800)
+    assert summary["total"] == 3
+    assert summary["by_state"] == {"RUNNING": 1, "PENDING": 1, "COMPLETED": 1}
+    assert summary["by_partition"] == {"gpu": 1, "compute": 2}
+    assert summary["allocated"]["cpus"] == 8 and summary["allocated"]["gpus"] == 2
+    assert summary["pending"] == {"jobs": 1, "cpus": 2, "gpus": 0}
+    # 4 CPUs for 2h finished plus 8 CPUs for half an hour so far
+    assert summary["cpu_hours"] == 12.0
+
+    # Job 1 finishes after an hour, job 2 starts, job 3 leaves the window
+    assert aggregates.update([job("1", "COMPLETED", cpus=8, gpus=2, start=1000.0, partition="gpu"),
+                              job("2", "RUNNING", cpus=2, start=4600.0)]) == 3
+    summary = aggregates.to_dict(now=4600.0 + 3600)
+    assert summary["by_state"] == {"RUNNING": 1, "COMPLETED": 1}
+    assert summary["by_tag"] == {"running": 1, "completed": 1}
+    assert summary["allocated"]["cpus"] == 2 and summary["allocated"]["gpus"] == 0
+    assert summary["cpu_hours"] == 10.0
+
+
+def test_parse_gpus():
+    assert parse_gpus("cpu=4,mem=16G,node=1,gres/gpu=2") == 2
+    assert parse_gpus("cpu=4,gres/gpu=2,gres/gpu:a100=2") == 2
+    assert parse_gpus("gpu:a100:4") == 4
+    assert parse_gpus("gres/gpu:2") == 2
+    assert parse_gpus("gres:gpu:1(IDX:0)") == 1
+    assert parse_gpus("N/A") == 0
@@ -1,3 +1,4 @@
+import json
 import sys
 import os
 
@@ -15,4 +16,232 @@ def test_jobs_endpoint_with_test_mode():
     assert response.status_code == 200
     data = response.json()
     assert "jobs" in data
-    assert "last_updated" in data 
\ No newline at end of file
+    assert "last_updated" in data 
+def test_slow_command_does_not_delay_other_requests():
+    """A slow sacct for one session must not stall another session's request"""
+    import asyncio
+    import time
+    import httpx
+    from backend import main
+    from backend.tests.test_client import ScriptedClient
+
+    slow = ScriptedClient({"squeue": 0.0, "sacct": 1.0})
+    fast = ScriptedClient({"squeue": 0.0, "sacct": 0.0})
+    opened = {}
+    for name, hostname, slurm_client in [("slow", "slow-host", slow), ("fast", "fast-host", fast)]:
+        opened[name] = main.sessions.create(hostname, "user")
+        main.pollers.attach(opened[name], slurm_client)
+
+    async def timed_get(http, url):
+        started = time.perf_counter()
+        response = await http.get(url)
+        return response, time.perf_counter() - started
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            slow_request = asyncio.ensure_future(
+                timed_get(http, f"/jobs?session_id={opened['slow'].session_id}"))
+            await asyncio.sleep(0.1)
+            fast_response, fast_elapsed = await timed_get(http, f"/jobs?session_id={opened['fast'].session_id}")
+            slow_response, slow_elapsed = await slow_request
+            return fast_response, fast_elapsed, slow_response, slow_elapsed
+
+    try:
+        fast_response, fast_elapsed, slow_response, slow_elapsed = asyncio.run(scenario())
+    finally:
+        for session in opened.values():
+            main.sessions.pop(session.session_id)
+            asyncio.run(main.pollers.close(session))
+
+    assert fast_response.status_code == 200
+    assert slow_response.status_code == 200
+    assert slow_elapsed >= 1.0
+    assert fast_elapsed < 0.5
+
+def test_job_graph_endpoint_with_test_mode():
+    """The /job_graph endpoint builds edges from the snapshot's dependency fields"""
+    response = client.get("/job_graph?session_id=test&test_mode=True&time_range=156h")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["1002"]["dependencies"] == ["1001", "1000"]
+    assert data["970"]["dependencies"] == []
+
+def test_job_graph_subtree_and_layout():
+    """A graph can be requested for the descendants of a job, with its layout"""
+    response = client.get("/job_graph?session_id=test&test_mode=True&time_range=156h&root=1001")
+    assert response.status_code == 200
+    assert sorted(response.json()) == ["1001", "1002", "1003", "1004"]
+
+    response = client.get("/job_graph/layout?session_id=test&test_mode=True&time_range=156h")
+    assert response.status_code == 200
+    layout = response.json()
+    assert layout["critical_path"]["jobs"] == ["970", "975", "980"]
+    assert layout["nodes"]["990"]["layer"] == 0
+
+def test_jobs_etag_and_delta():
+    """A matching If-None-Match gets 304, and since= returns only changes"""
+    response = client.get("/jobs?session_id=test&test_mode=True")
+    etag = response.headers["etag"]
+    version = response.json()["version"]
+
+    response = client.get("/jobs?session_id=test&test_mode=True", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(f"/jobs?session_id=test&test_mode=True&since={version}")
+    data = response.json()
+    assert data["full"] is False
+    assert data["added"] == [] and data["changed"] == [] and data["removed"] == []
+
+    response = client.get("/jobs?session_id=test&test_mode=True&since=1")
+    data = response.json()
+    assert data["full"] is True
+    assert len(data["jobs"]) > 0
+
+def test_jobs_columnar():
+    """columns=true returns one typed array per field"""
+    rows = client.get("/jobs?session_id=test&test_mode=True").json()["jobs"]
+    columns = client.get("/jobs?session_id=test&test_mode=True&columns=true").json()["columns"]
+    assert columns["job_id"] == [job["job_id"] for job in rows]
+    assert columns["memory"][0] == 64 << 30
+    assert columns["status"][0] == "RUNNING"
+
+def test_jobs_filter_sort_and_page():
+    """Filters and cursors on /jobs return one page at a time"""
+    url = "/jobs?session_id=test&test_mode=True&time_range=156h&state=COMPLETED,FAILED&sort=-end_time&limit=4"
+    first = client.get(url).json()
+    assert first["total"] == 7
+    assert [job["job_id"] for job in first["jobs"]] == ["1000", "995", "990", "985"]
+    second = client.get(url + f"&cursor={first['next_cursor']}").json()
+    assert [job["job_id"] for job in second["jobs"]] == ["980", "975", "970"]
+    assert second["next_cursor"] is None
+    assert client.get("/jobs?session_id=test&test_mode=True&sort=bogus").status_code == 400
+
+def test_jobs_summary():
+    """The summary endpoint returns counts without the job list"""
+    summary = client.get("/jobs/summary?session_id=test&test_mode=True&time_range=156h").json()
+    assert summary["total"] == 11
+    assert summary["by_tag"] == {"running": 2, "pending": 2, "completed": 6, "failed": 1}
+    assert summary["allocated"]["gpus"] == 4
+    assert summary["cpu_hours"] > 0
+
+
+def test_metrics_timeline():
+    """The timeline returns aligned series recorded from the polls"""
+    client.get("/jobs?session_id=test&test_mode=True&time_range=156h")
+    timeline = client.get("/metrics/timeline?session_id=test&test_mode=True&time_range=1h"
+                          "&metrics=running_jobs,failed_jobs").json()
+    assert timeline["resolution"] == 60
+    assert set(timeline["series"]) == {"running_jobs", "failed_jobs"}
+    assert len(timeline["timestamps"]) == len(timeline["series"]["running_jobs"])
+    assert timeline["series"]["running_jobs"][-1] == 2
+    bad = client.get("/metrics/timeline?session_id=test&test_mode=True&resolution=5s")
+    assert bad.status_code == 400
+
+
+def test_jobs_served_from_cached_compressed_body():
+    """Full job lists are encoded once per snapshot and sent compressed when accepted"""
+    url = "/jobs?session_id=test&test_mode=True&time_range=156h"
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert compressed.json() == plain.json()
+    brotli = client.get(url, headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    assert brotli.headers["content-encoding"] == "br" and brotli.json() == plain.json()
+    assert plain.json()["total"] is None and len(plain.json()["jobs"]) == 11
+
+def test_session_on_several_clusters():
+    """One session fans out over its clusters and reports which ones answered"""
+    import asyncio
+    from backend import main
+    from backend.slurm.client import MockClient
+
+    session = main.sessions.create("alpha", "user", clusters=[("beta", "user")])
+    main.pollers.attach(session, MockClient(), "alpha", "user")
+    main.pollers.attach(session, MockClient(), "beta", "user")
+    try:
+        response = client.get(f"/jobs?session_id={session.session_id}&time_range=156h")
+        assert response.status_code == 200
+        data = response.json()
+        assert {job["cluster"] for job in data["jobs"]} == {"alpha", "beta"}
+        assert data["clusters"]["alpha"]["ok"] and data["clusters"]["beta"]["ok"]
+
+        beta = client.get(f"/jobs?session_id={session.session_id}&time_range=156h&cluster=beta&sort=-job_id")
+        assert {job["cluster"] for job in beta.json()["jobs"]} == {"beta"}
+
+        summary = client.get(f"/jobs/summary?session_id={session.session_id}&time_range=156h").json()
+        assert summary["by_cluster"]["alpha"] == summary["by_cluster"]["beta"] == summary["total"] // 2
+
+        graph = client.get(f"/job_graph?session_id={session.session_id}&time_range=156h")
+        assert graph.headers["x-clusters-answered"] == "alpha,beta"
+        assert graph.json()["beta/1002"]["dependencies"] == ["beta/1001", "beta/1000"]
+
+        timeline = client.get(f"/metrics/timeline?session_id={session.session_id}")
+        assert timeline.status_code == 400
+        timeline = client.get(f"/metrics/timeline?session_id={session.session_id}&cluster=alpha")
+        assert timeline.status_code == 200
+    finally:
+        main.sessions.pop(session.session_id)
+        asyncio.run(main.pollers.close(session))
+
+def sse_frames(text):
+    """(event, id, data) of each frame of a Server-Sent Events body"""
+    frames = []
+    for frame in text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        if fields:
+            frames.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return frames
+
+def test_job_details_and_output():
+    """Details come in one batch; the output stream resumes from the byte offset in Last-Event-ID"""
+    details = client.get("/jobs/details?session_id=test&test_mode=True&ids=1001,985&ids=42").json()
+    assert [record["job_id"] for record in details["jobs"]] == ["1001", "985"]
+    assert details["missing"] == ["42"]
+    running, failed = details["jobs"]
+    assert not running["final"] and failed["final"] and failed["state"] == "FAILED"
+    assert running["stdout"] == "/home/test_user/main_simulation/slurm-1001.out"
+    assert client.get("/jobs/details?session_id=test&test_mode=True&ids=1;rm").status_code == 400
+
+    url = "/jobs/985/output?session_id=test&test_mode=True"
+    frames = sse_frames(client.get(url).text)
+    assert [event for event, _, _ in frames] == ["open", "output", "eof"]
+    _, event_id, output = frames[1]
+    assert output["text"].startswith("/home/test_user/model_validation/slurm-985.out: step 1")
+    assert event_id == str(output["offset"]) == str(frames[2][2]["offset"])
+
+    resumed = sse_frames(client.get(url, headers={"Last-Event-ID": str(output["offset"] - 10)}).text)
+    assert resumed[1][2]["text"] == output["text"][-10:]
+    assert client.get("/jobs/42/output?session_id=test&test_mode=True").status_code == 404
+
+
+def test_nodes():
+    """Node states per partition; filters select e.g. the idle nodes of a partition or a job's nodes"""
+    nodes = client.get("/nodes?session_id=test&test_mode=True").json()
+    assert nodes["nodes"] == 24 and nodes["states"] == {"allocated": 4, "down": 1, "idle": 17, "mixed": 2}
+    assert nodes["partitions"]["gpu"]["hostlist"] == "gpu[01-08]" and nodes["partitions"]["gpu"]["gpus"] == 32
+    assert "selected" not in nodes
+
+    idle = client.get("/nodes?session_id=test&test_mode=True&partition=gpu&state=idle,down").json()["selected"]
+    assert idle == {"nodes": 4, "states": {"down": 1, "idle": 3}, "hostlist": "gpu[05-08]"}
+    job = client.get("/nodes?session_id=test&test_mode=True&job_id=1002").json()["selected"]
+    assert job == {"nodes": 2, "states": {"mixed": 2}, "hostlist": "compute[01-02]"}
+    assert client.get("/nodes?session_id=test&test_mode=True&job_id=1003").json()["selected"]["nodes"] == 0
+    assert client.get("/nodes?session_id=test&test_mode=True&job_id=42").status_code == 404
+    assert client.get("/nodes?session_id=test&test_mode=True&job_id=1;id").status_code == 400
+
+def test_efficiency():
+    """Efficiency totals and rollups, most wasted core-hours first"""
+    report = client.get("/efficiency?session_id=test&test_mode=True&days=30&limit=3").json()
+    assert report["complete"] and report["totals"]["jobs"] == 7 and report["totals"]["failed"] == 1
+    assert [group["name"] for group in report["by_name"]] == ["large_simulation", "data_collection",
+                                                              "model_validation"]
+    assert report["by_user"] == [dict(report["totals"], user="test_user")]
+    worst = report["jobs"][0]
+    assert worst["job_id"] == "980" and worst["wasted_core_hours"] == 124.8 and worst["cpu_efficiency"] == 0.22
+    assert client.get("/efficiency?session_id=test&test_mode=True&days=1").json()["totals"]["jobs"] == 4
+    assert client.get("/efficiency?session_id=test&test_mode=True&days=0").status_code == 400
+    assert client.get("/efficiency?session_id=test&test_mode=True&limit=1000").status_code == 400
@@ -0,0 +1,205 @@
+import asyncio
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.broker import BrokerError, BrokerServer, LocalPollers, RemotePollers
+from backend.slurm.client import MockClient
+from backend.slurm.nodes import NodeState
+from backend.slurm.sessions import MemorySessionStore
+
+
+class CountingClient(MockClient):
+    def __init__(self, password):
+        super().__init__()
+        self.password = password
+        self.squeue_calls = 0
+
+    def connect(self):
+        return self.password == "secret"
+
+    def get_jobs(self):
+        self.squeue_calls += 1
+        return super().get_jobs()
+
+
+def test_workers_share_the_poller_service(tmp_path):
+    """Two workers serve one login from a single poll, with the same versions"""
+    clients = []
+
+    def factory(hostname, username, password):
+        clients.append(CountingClient(password))
+        return clients[-1]
+
+    async def scenario():
+        server = BrokerServer(LocalPollers(client_factory=factory), token="t0ken")
+        await server.start(str(tmp_path / "poller.sock"))
+        sessions = MemorySessionStore()
+        worker_a = RemotePollers(server.address, token="t0ken")
+        worker_b = RemotePollers(server.address, token="t0ken")
+        try:
+            session = sessions.create("cluster", "alice")
+            assert await worker_a.open(sessions.create("cluster", "alice"), ["wrong"]) == ["cluster"]
+            assert await worker_a.open(session, ["secret"]) == []
+
+            first = await worker_a.poller(session).get_snapshot("24h")
+            second = await worker_b.poller(session).get_snapshot("24h")
+            assert first.etag == second.etag
+            assert [job.job_id for job in first.jobs] == [job.job_id for job in second.jobs]
+            assert clients[-1].squeue_calls == 1
+
+            # Unchanged jobs are revalidated without sending them again
+            again = await worker_a.poller(session).refresh("24h")
+            assert again is first
+
+            await worker_b.close(session)
+            try:
+                await worker_a.poller(session).refresh("24h")
+                raise AssertionError("logged out session still served")
+            except BrokerError as e:
+                assert e.status_code == 401
+
+            wrong_token = RemotePollers(server.address, token="nope")
+            try:
+                await wrong_token.ssh_stats()
+                raise AssertionError("wrong token accepted")
+            except BrokerError as e:
+                assert e.status_code == 403
+            wrong_token.close_connections()
+        finally:
+            for worker in (worker_a, worker_b):
+                worker.prune([])
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_workers_reuse_connections_to_the_poller_service(tmp_path):
+    """Requests share an idle connection, and one closed by a restart is replaced"""
+    async def scenario():
+        address = str(tmp_path / "poller.sock")
+        server = BrokerServer(LocalPollers(client_factory=lambda *args: CountingClient("secret")))
+        await server.start(address)
+        worker = RemotePollers(address)
+        try:
+            for _ in range(3):
+                await worker.ssh_stats()
+            assert len(server._connections) == 1
+
+            await server.stop()
+            server = BrokerServer(LocalPollers(client_factory=lambda *args: CountingClient("secret")))
+            await server.start(address)
+            await worker.ssh_stats()
+            assert len(server._connections) == 1
+        finally:
+            worker.prune([])
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_details_and_output_relayed_by_the_poller_service(tmp_path):
+    """Workers get job details, node states and output tails through the process holding the SSH client"""
+    async def scenario():
+        pollers = LocalPollers(client_factory=lambda hostname, username, password: CountingClient(password))
+        server = BrokerServer(pollers)
+        await server.start(str(tmp_path / "poller.sock"))
+        sessions = MemorySessionStore()
+        worker = RemotePollers(server.address)
+        try:
+            session = sessions.create("cluster", "alice")
+            assert await worker.open(session, ["secret"]) == []
+            records = await worker.poller(session).get_details(["985", "1001", "42"])
+            assert set(records) == {"985", "1001"} and records["985"]["final"]
+            assert records["985"]["cluster"] == "cluster"
+
+            path = records["985"]["stdout"]
+            chunks = [chunk async for chunk in worker.poller(session).tail_job("985", offset=-12)]
+            expected = [chunk async for chunk in MockClient().tail_output(path, offset=-12)]
+            assert chunks == expected and len(chunks[0][1]) == 12
+
+            nodes = await worker.poller(session).get_nodes()
+            assert nodes.summary() == NodeState(MockClient().get_nodes()).summary()
+            worker.poller(session)._nodes.fetched_at = 0
+            await worker.poller(session).get_nodes()
+            await asyncio.sleep(0.1)
+            # Unchanged, so the poller service sent no groups and the state was kept
+            assert worker.poller(session)._nodes is nodes and nodes.fetched_at > 0
+
+            report = await worker.poller(session).get_efficiency(7, limit=2)
+            assert report["cluster"] == "cluster" and report["totals"]["jobs"] == 7
+            assert [group["name"] for group in report["by_name"]] == ["large_simulation", "data_collection"]
+
+            await worker.close(session)
+            try:
+                async for _ in worker.poller(session).tail_job("985"):
+                    pass
+                raise AssertionError("logged out session still served")
+            except BrokerError as e:
+                assert e.status_code == 401
+        finally:
+            worker.prune([])
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_poller_service_only_serves_live_sessions(tmp_path):
+    """Requests name a logged-in session, tails follow the job record, and TCP needs a token"""
+    async def scenario():
+        sessions = MemorySessionStore()
+        server = BrokerServer(LocalPollers(client_factory=lambda hostname, username, password: CountingClient(password)),
+                              store=sessions)
+        try:
+            await server.start("127.0.0.1:0")
+            raise AssertionError("listening on TCP without a token")
+        except ValueError:
+            pass
+        await server.start(str(tmp_path / "poller.sock"))
+        worker = RemotePollers(server.address)
+        try:
+            try:
+                await worker.call("login", session_id="forged", clusters=[["cluster", "alice"]], passwords=["secret"])
+                raise AssertionError("logged in a session the store does not know")
+            except BrokerError as e:
+                assert e.status_code == 401
+            session = sessions.create("cluster", "alice")
+            assert await worker.open(session, ["secret"]) == []
+            for op, args in [("snapshot", {"time_range": "24h"}), ("details", {"job_ids": ["985"]})]:
+                for session_id, hostname in [("forged", "cluster"), (session.session_id, "elsewhere")]:
+                    try:
+                        await worker.call(op, session_id=session_id, hostname=hostname, **args)
+                        raise AssertionError(f"{op} answered for {session_id} on {hostname}")
+                    except BrokerError as e:
+                        assert e.status_code == 401
+
+            # A path is not something a caller can ask to tail
+            try:
+                async for _ in worker.stream("tail", session_id=session.session_id, hostname="cluster",
+                                             job_id="985", path="/etc/shadow"):
+                    pass
+                raise AssertionError("tail accepted a path")
+            except BrokerError:
+                pass
+            try:
+                async for _ in worker.poller(session).tail_job("985", stream="../../etc/shadow"):
+                    pass
+                raise AssertionError("tailed something other than stdout or stderr")
+            except BrokerError as e:
+                assert e.status_code == 404
+
+            # Ended by a worker without telling the service
+            sessions.pop(session.session_id)
+            try:
+                await worker.poller(session).get_details(["985"])
+                raise AssertionError("ended session still served")
+            except BrokerError as e:
+                assert e.status_code == 401
+            assert server.sessions == {}
+        finally:
+            worker.prune([])
+            await server.stop()
+
+    asyncio.run(scenario())
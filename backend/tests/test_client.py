@@ -1,11 +1,42 @@
+import asyncio
 import pytest
 import sys
 import os
+import time
 
 # Add the project root to the path to resolve imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from backend.slurm.client import JobInfo, MockClient, SlurmClient
+from backend.slurm import parser
+from backend.slurm.executor import CommandTimeout
+
+
+class FakeChannel:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ScriptedClient(SlurmClient):
+    """SlurmClient whose remote commands just sleep for a scripted time"""
+    def __init__(self, delays, command_timeout=5.0):
+        super().__init__("host", "user", "password", command_timeout=command_timeout)
+        self.delays = delays
+        self.channels = []
+
+    def run_command(self, cmd, timeout=None, handle=None, parse=None):
+        channel = FakeChannel()
+        self.channels.append(channel)
+        if handle is not None:
+            handle.attach(channel)
+        delay = self.delays[cmd.split()[0]]
+        deadline = time.monotonic() + delay
+        while time.monotonic() < deadline and not channel.closed:
+            time.sleep(0.01)
+        return (parse(iter([])) if parse else ""), ""
 
 def test_job_info_tag():
     """Test that JobInfo.tag returns the correct status tag"""
@@ -36,6 +67,44 @@ def test_mock_client():
     assert jobs[1].status == "PENDING"
     assert jobs[2].status == "COMPLETED"
 
+def test_squeue_and_sacct_run_concurrently():
+    """fetch_snapshot runs both remote commands at the same time"""
+    client = ScriptedClient({"squeue": 0.3, "sacct": 0.3})
+    started = time.perf_counter()
+    active, completed = asyncio.run(client.fetch_snapshot("24h"))
+    assert time.perf_counter() - started < 0.55
+    assert active == [] and completed == []
+
+def test_command_timeout_closes_channel():
+    """A command that overruns its timeout is aborted on the remote side"""
+    client = ScriptedClient({"squeue": 5.0}, command_timeout=0.2)
+    with pytest.raises(CommandTimeout):
+        asyncio.run(client.fetch_jobs())
+    assert client.channels[0].closed
+
+def test_cancelled_command_closes_channel():
+    """Cancelling the awaiting task closes the command's channel"""
+    client = ScriptedClient({"squeue": 5.0})
+
+    async def scenario():
+        task = asyncio.ensure_future(client.fetch_jobs())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert client.channels[0].closed
+
+def test_parse_dependency_fields():
+    """squeue %E and sacct SubmitLine fill in JobInfo.dependency"""
+    active = parser.parse_squeue(["12|RUNNING|1:00:00|1|4|4G|afterok:10(unfulfilled)|compute|2024-05-01T11:00:00|alice|gpu:1|2024-05-01T11:30:00|sim",
+                                  "13|PENDING|1:00:00|1|4|4G|(null)|compute|2024-05-01T11:00:00|alice|gpu:1|2024-05-01T11:30:00|post"])
+    assert active[0].dependency == "afterok:10(unfulfilled)"
+    assert active[1].dependency == ""
+    completed = parser.parse_sacct(["10|COMPLETED|00:10:00|1|4|4G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|2024-05-01T12:10:00|alice|cpu=4,gres/gpu=1|prep|sbatch --dependency=afterany:9 prep.sh"])
+    assert completed[0].dependency == "afterany:9"
+
 # Uncomment and modify this to test with real credentials
 # def test_real_client():
 #     """Test real client with actual credentials (only run manually)"""
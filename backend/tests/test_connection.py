@@ -0,0 +1,158 @@
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.connection import ConnectionPool, split_host_port
+
+
+class FakeChannel:
+    def __init__(self):
+        self.closed = False
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+        self.channels_opened = 0
+
+    def is_active(self):
+        return self.active
+
+    def is_authenticated(self):
+        return True
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+    def open_session(self, timeout=None):
+        if not self.active:
+            raise EOFError()
+        self.channels_opened += 1
+        return FakeChannel()
+
+    def close(self):
+        self.active = False
+
+
+class FakeFactory:
+    """Transport factory that counts handshakes and can be told to fail"""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.handshakes = 0
+        self.fail = False
+        self.transports = []
+
+    def __call__(self, hostname, username, password, timeout):
+        time.sleep(self.delay)
+        self.handshakes += 1
+        if self.fail:
+            raise OSError("network unreachable")
+        transport = FakeTransport()
+        self.transports.append(transport)
+        return transport
+
+
+def test_clients_share_one_transport():
+    """Several clients and channels reuse one handshake"""
+    factory = FakeFactory()
+    pool = ConnectionPool(keepalive_interval=15, transport_factory=factory)
+    pool.acquire("cluster", "alice", "secret")
+    pool.acquire("cluster", "alice", "secret")
+    for _ in range(3):
+        with pool.channel("cluster", "alice", "secret") as chan:
+            assert not chan.closed
+    assert factory.handshakes == 1
+    assert factory.transports[0].channels_opened == 3
+    assert factory.transports[0].keepalive == 15
+
+    stats = pool.stats()
+    assert stats["open_transports"] == 1
+    assert stats["clients"] == 2
+    assert stats["channels_in_use"] == 0
+
+
+def test_different_password_does_not_reuse_transport():
+    """A login with other credentials must authenticate on its own"""
+    factory = FakeFactory()
+    pool = ConnectionPool(transport_factory=factory)
+    pool.acquire("cluster", "alice", "secret")
+    pool.acquire("cluster", "alice", "guess")
+    assert factory.handshakes == 2
+
+
+def test_dead_transport_is_reconnected_once_for_concurrent_users():
+    """After a blip, concurrent commands trigger a single reconnect"""
+    factory = FakeFactory(delay=0.05)
+    pool = ConnectionPool(transport_factory=factory)
+    pool.acquire("cluster", "alice", "secret")
+    factory.transports[0].active = False
+
+    def use_channel():
+        with pool.channel("cluster", "alice", "secret"):
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=use_channel) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert factory.handshakes == 2
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_failed_reconnect_backs_off():
+    """Failed handshakes are not retried until the backoff delay passes"""
+    factory = FakeFactory()
+    pool = ConnectionPool(backoff_base=10, transport_factory=factory)
+    pool.acquire("cluster", "alice", "secret")
+    factory.transports[0].active = False
+    factory.fail = True
+
+    with pytest.raises(OSError):
+        with pool.channel("cluster", "alice", "secret"):
+            pass
+    with pytest.raises(ConnectionError):
+        with pool.channel("cluster", "alice", "secret"):
+            pass
+    assert factory.handshakes == 2
+
+
+def test_release_closes_transport_after_last_client():
+    """The transport is closed once every client has logged out"""
+    factory = FakeFactory()
+    pool = ConnectionPool(transport_factory=factory)
+    pool.acquire("cluster", "alice", "secret")
+    pool.acquire("cluster", "alice", "secret")
+    pool.release("cluster", "alice", "secret")
+    assert factory.transports[0].active
+    pool.release("cluster", "alice", "secret")
+    assert not factory.transports[0].active
+    assert pool.stats()["open_transports"] == 0
+
+    # A command still running after the logout does not open a transport nobody owns
+    with pytest.raises(ConnectionError):
+        with pool.channel("cluster", "alice", "secret"):
+            pass
+    assert factory.handshakes == 1 and pool.stats()["clients"] == 0
+
+
+def test_split_host_port():
+    """Login hostnames may carry a port"""
+    assert split_host_port("cluster.example.org") == ("cluster.example.org", 22)
+    assert split_host_port("127.0.0.1:2222") == ("127.0.0.1", 2222)
+    assert split_host_port("[::1]:2222") == ("::1", 2222)
+    assert split_host_port("fe80::1") == ("fe80::1", 22)
@@ -0,0 +1,83 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import JobInfo, MockClient
+from backend.slurm.dependencies import dependency_from_submit_line, parse_dependency
+from backend.slurm.graph import JobGraph
+
+
+def make_job(job_id, dependency="", name=None, status="PENDING"):
+    return JobInfo(job_id=job_id, name=name or f"job{job_id}", status=status, time="1:00",
+                   nodes="1", cpus="1", memory="1G", dependency=dependency)
+
+
+def build_graph(jobs):
+    graph = JobGraph()
+    graph.update(jobs)
+    return graph.to_dict()
+
+
+def test_parse_dependency_expression():
+    """Types, multiple ids, squeue state annotations and time offsets are handled"""
+    edges = parse_dependency("afterok:10(unfulfilled):11,afterany:12+30?singleton")
+    assert [(e.type, e.job_id) for e in edges] == [
+        ("afterok", "10"), ("afterok", "11"), ("afterany", "12"), ("singleton", ""),
+    ]
+    assert parse_dependency("(null)") == []
+    assert parse_dependency("") == []
+
+
+def test_dependency_from_submit_line():
+    """The dependency is recovered from sbatch command lines in sacct"""
+    assert dependency_from_submit_line("sbatch --dependency=afterok:5 run.sh") == "afterok:5"
+    assert dependency_from_submit_line("sbatch -d afterany:6 --job-name 'my job' run.sh") == "afterany:6"
+    assert dependency_from_submit_line("sbatch run.sh") == ""
+
+
+def test_graph_resolves_edges_and_external_dependencies():
+    """Edges into the window are resolved; the rest are kept as external"""
+    graph = build_graph([
+        make_job("1", status="COMPLETED"),
+        make_job("2", "afterok:1:99"),
+    ])
+    assert graph["2"]["dependencies"] == ["1"]
+    assert graph["2"]["edges"] == [
+        {"job_id": "1", "type": "afterok", "in_window": True},
+        {"job_id": "99", "type": "afterok", "in_window": False},
+    ]
+
+
+def test_graph_handles_array_jobs():
+    """A dependency on an array job links to each of its tasks"""
+    graph = build_graph([
+        make_job("7_1", status="RUNNING"),
+        make_job("7_2", status="RUNNING"),
+        make_job("8_[1-4]", "afterany:7"),
+        make_job("9", "afterok:8_3"),
+    ])
+    assert graph["8_[1-4]"]["dependencies"] == ["7_1", "7_2"]
+    assert graph["9"]["dependencies"] == ["8_[1-4]"]
+
+
+def test_graph_singleton_follows_previous_job_with_same_name():
+    """singleton jobs depend on the earlier job with the same name"""
+    graph = build_graph([
+        make_job("21", "singleton", name="nightly"),
+        make_job("20", name="nightly", status="RUNNING"),
+        make_job("22", "singleton", name="other"),
+    ])
+    assert graph["21"]["dependencies"] == ["20"]
+    assert graph["21"]["edges"][0]["type"] == "singleton"
+    assert graph["22"]["edges"] == []
+
+
+def test_mock_graph_drops_jobs_outside_window():
+    """With a 1h window, mock dependencies on older jobs become external edges"""
+    client = MockClient()
+    graph = build_graph(client.get_jobs() + client.get_completed_jobs("1h"))
+    assert graph["1002"]["dependencies"] == ["1001", "1000"]
+    assert graph["1000"]["dependencies"] == []
+    assert graph["1000"]["edges"] == [{"job_id": "995", "type": "afterok", "in_window": False}]
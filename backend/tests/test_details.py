@@ -0,0 +1,63 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.details import (JobDetailCache, check_job_ids, match_scontrol, parse_sacct_details,
+                                   parse_scontrol, scontrol_command)
+from backend.slurm.history import JobHistoryStore
+
+SCONTROL = [
+    "JobId=1201 ArrayJobId=1200 ArrayTaskId=1 JobName=my job v2 UserId=alice(1000) GroupId=users(100) "
+    "JobState=RUNNING Reason=None Command=/home/alice/run.sh --size 4 WorkDir=/home/alice "
+    "StdErr=/home/alice/err-%A_%a.log StdOut=/home/alice/%x-%j.out TRES=cpu=4,mem=8G,node=1",
+    "JobId=1300 JobName=done UserId=alice(1000) JobState=COMPLETED StdErr=(null) StdOut=/scratch/done.out",
+]
+
+
+def test_scontrol_records_match_the_requested_ids():
+    """Values keep their spaces, array tasks answer to their task id and output patterns are filled in"""
+    records = match_scontrol(["1200_1", "1300", "1400"], parse_scontrol(SCONTROL))
+    assert set(records) == {"1200_1", "1300"}
+    task = records["1200_1"]
+    assert task["fields"]["JobName"] == "my job v2"
+    assert task["fields"]["Command"] == "/home/alice/run.sh --size 4"
+    assert task["fields"]["TRES"] == "cpu=4,mem=8G,node=1"
+    assert task["stdout"] == "/home/alice/my job v2-1201.out"
+    assert task["stderr"] == "/home/alice/err-1200_1.log"
+    assert not task["final"] and records["1300"]["final"] and records["1300"]["stderr"] is None
+
+    assert scontrol_command(["1", "2_3"]) == "scontrol -o show job 1; scontrol -o show job 2_3"
+    assert check_job_ids(["7", " 7", "8_1", ""]) == ["7", "8_1"]
+    for bad in (["7; rm -rf ~"], ["$(id)"], [str(i) for i in range(101)]):
+        try:
+            check_job_ids(bad)
+            raise AssertionError(f"accepted {bad}")
+        except ValueError:
+            pass
+
+
+def test_sacct_records_assume_default_output():
+    fields = ["JobID", "State", "WorkDir", "JobName", "SubmitLine"]
+    records = parse_sacct_details(["900_3|TIMEOUT|/work/|long|name|sbatch run.sh", "900_3.batch|x|||"], fields)
+    assert len(records) == 1
+    assert records[0]["fields"]["JobName"] == "long|name"
+    assert records[0]["stdout"] == records[0]["stderr"] == "/work/slurm-900_3.out"
+    assert records[0]["final"] and records[0]["source"] == "sacct"
+
+
+def test_cache_keeps_finished_jobs_for_good():
+    """Finished records outlive the TTL and a restart; running ones are fetched again"""
+    store = JobHistoryStore(":memory:")
+    cache = JobDetailCache(store, "cluster", "alice", ttl=10)
+    records = match_scontrol(["1201", "1300"], parse_scontrol(SCONTROL))
+    cache.add(records.values(), now=100)
+    assert set(cache.lookup(["1201", "1300", "5"], now=105)[0]) == {"1201", "1300"}
+    found, missing = cache.lookup(["1201", "1300"], now=1000)
+    assert set(found) == {"1300"} and missing == ["1201"]
+
+    restarted = JobDetailCache(store, "cluster", "alice")
+    found, missing = restarted.lookup(["1300", "1201"])
+    assert found["1300"] == records["1300"] and missing == ["1201"]
+    assert JobDetailCache(store, "cluster", "bob").lookup(["1300"]) == ({}, ["1300"])
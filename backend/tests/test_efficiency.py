@@ -0,0 +1,125 @@
+import asyncio
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.benchmarks.synthetic import SyntheticCluster
+from backend.loadtest.fake_host import FakeSlurmHost
+from backend.loadtest.fake_rest import FakeSlurmRestd
+from backend.slurm import parser
+from backend.slurm.client import SlurmClient
+from backend.slurm.connection import ConnectionPool
+from backend.slurm.efficiency import USAGE_CHUNK, parse_sacct_usage, report, usage_gaps
+from backend.slurm.history import JobHistoryStore
+from backend.slurm.models import UsageBatch
+from backend.slurm.rest import RestClient
+
+# JobID|State|Elapsed|NNodes|NCPUS|ReqMem|Partition|Submit|Start|End|User|AllocTRES|TotalCPU|MaxRSS|ExitCode|
+# JobName|SubmitLine
+TIMES = "2026-10-01T09:00:00|2026-10-01T10:00:00|2026-10-01T12:00:00"
+SACCT = [
+    f"100|COMPLETED|01:00:00|1|4|8G|compute|{TIMES}|alice|cpu=4,mem=8G,node=1|02:00:00||0:0|align|sbatch a.sh",
+    f"100.batch|COMPLETED|01:00:00|1|4||compute|{TIMES}|alice|cpu=4,mem=8G,node=1|01:30:00|2097152K|0:0|batch|",
+    f"100.extern|COMPLETED|01:00:00|1|4||compute|{TIMES}|alice|cpu=4,mem=8G,node=1|00:00:00|0|0:0|extern|",
+    f"100.0|COMPLETED|01:00:00|1|4||compute|{TIMES}|alice|cpu=4,mem=8G,node=1|30:00.250|4194304K|0:0|0|",
+    # No memory TRES, and a job line without its CPU time
+    f"101|FAILED|02:00:00|2|16|4G|compute|{TIMES}|alice|cpu=16,node=2|||1:0|align|sbatch a.sh",
+    f"101.batch|FAILED|02:00:00|2|16||compute|{TIMES}|alice|cpu=16,node=2|04:00:00|1048576K|1:0|batch|",
+    "102|RUNNING|00:05:00|1|1|1G|compute|2026-10-01T09:00:00|2026-10-01T11:55:00|Unknown|bob|cpu=1,mem=1G"
+    "|00:00:00||0:0|plot|sbatch p.sh",
+    f"103|COMPLETED|00:10:00|1|1|1G|compute|{TIMES}|bob|cpu=1,mem=1G,node=1|00:09:00||0:0|plot|sbatch p.sh",
+    f"103.batch|COMPLETED|00:10:00|1|1||compute|{TIMES}|bob|cpu=1,mem=1G,node=1|00:09:00|524288K|0:0|batch|",
+]
+
+
+def test_usage_and_rollups_from_sacct():
+    """seff's figures per job, with steps folded in, and totals per user and job name"""
+    jobs, usage = parse_sacct_usage(SACCT, parser.HISTORY_SACCT_FIELDS)
+    assert [job.job_id for job in jobs] == ["100", "101", "102", "103"]
+    assert list(usage.column("job_id")) == ["100", "101", "103"]
+    assert list(usage.column("max_rss")) == [4 << 30, 1 << 30, 512 << 20]
+    # Allocated memory falls back to the request per node
+    assert list(usage.column("alloc_mem")) == [8 << 30, 8 << 30, 1 << 30]
+    assert list(usage.column("total_cpu")) == [7200, 14400, 540]
+    assert list(usage.column("cpu_efficiency")) == [0.5, 0.125, 0.9]
+    assert list(usage.column("memory_efficiency")) == [0.5, 0.125, 0.5]
+    assert [round(hours, 3) for hours in usage.column("wasted_core_hours")] == [2.0, 28.0, 0.017]
+
+    result = report(usage, since=0, limit=1)
+    assert result["complete"] and result["totals"]["jobs"] == 3 and result["totals"]["failed"] == 1
+    assert result["by_name"] == [{
+        "name": "align", "jobs": 2, "failed": 1, "core_hours": 36.0, "used_core_hours": 6.0,
+        "wasted_core_hours": 30.0, "cpu_efficiency": 0.1667, "memory_efficiency": 0.3125,
+        "cpu_over_request": 6.0, "memory_over_request": 3.2,
+    }]
+    assert result["by_user"][0]["user"] == "alice"
+    assert [job["job_id"] for job in result["jobs"]] == ["101"]
+    assert report(usage, since=0)["by_user"][1]["memory_over_request"] == 2.0
+
+
+def test_store_keeps_usage_and_its_coverage():
+    store = JobHistoryStore(":memory:")
+    _, usage = parse_sacct_usage(SACCT, parser.HISTORY_SACCT_FIELDS)
+    end = usage.column("end_time")[0]
+    assert store.usage_coverage("c", "alice") is None
+    week = USAGE_CHUNK
+    assert usage_gaps(None, 0, 3 * week) == [(2 * week, 3 * week), (week, 2 * week), (0, week)]
+
+    store.add_usage("c", "alice", usage, end - 100, end + 100)
+    store.add_usage("c", "alice", usage, end - 100, end + 100, all_users=True)
+    # An older span next to the stored one extends it; one past a gap does not
+    store.add_usage("c", "alice", UsageBatch(), end - 500, end - 100)
+    store.add_usage("c", "alice", UsageBatch(), end - 900, end - 600)
+    assert store.usage_coverage("c", "alice") == (end - 500, end + 100)
+    assert usage_gaps((end - 500, end + 100), end - 1000, end + 100) == [(end - 1000, end - 500)]
+
+    own = store.usage("c", "alice", end - 1000)
+    assert list(own.column("job_id")) == ["100", "101"] and own.covered_from == end - 500
+    assert list(own.column("cpu_efficiency")) == [0.5, 0.125]
+    everyone = store.usage("c", "alice", end - 1000, all_users=True)
+    assert list(everyone.column("user")) == ["alice", "alice", "bob"]
+    assert len(store.usage("c", "bob", 0)) == 0
+
+
+def test_usage_backfilled_a_chunk_at_a_time_over_either_transport():
+    """Months of usage come a week per command and are then read back from the store"""
+    cluster = SyntheticCluster(jobs=3000, seed=2, now=time.time(), window=40 * 86400, users=3)
+    since = cluster.now - 30 * 86400
+    ended = {job.job_id: job for job in cluster.jobs() if job.end and job.end >= since}
+    with FakeSlurmHost(cluster) as host:
+        store = JobHistoryStore(":memory:")
+        client = SlurmClient(host.address, "user000", "", pool=ConnectionPool(), history=store)
+
+        async def scenario():
+            await client.fetch_completed_jobs("156h")
+            commands = host.commands["sacct"]
+            # Out of time before the first chunk: only what the regular poll stored
+            recent = await client.fetch_usage(since, deadline=time.monotonic())
+            assert host.commands["sacct"] == commands and recent.covered_from > since + 6 * 86400
+            full = await client.fetch_usage(since)
+            assert host.commands["sacct"] == commands + 4
+            again = await client.fetch_usage(since, all_users=True)
+            assert host.commands["sacct"] == commands + 9
+            assert len(await client.fetch_usage(since, all_users=True)) == len(again)
+            assert host.commands["sacct"] == commands + 9
+            return recent, full, again
+
+        recent, full, everyone = asyncio.run(scenario())
+        client.disconnect()
+    assert 0 < len(recent) < len(full)
+    assert set(full.column("job_id")) == {job_id for job_id, job in ended.items() if job.user == "user000"}
+    assert set(everyone.column("job_id")) == set(ended)
+    job = ended[full.column("job_id")[0]]
+    total_cpu, peak, _ = cluster.usage(job)
+    assert full.column("total_cpu")[0] == total_cpu and full.column("max_rss")[0] == peak
+    assert report(full, since)["complete"] and not report(recent, since)["complete"]
+
+    with FakeSlurmRestd(cluster) as server:
+        rest = RestClient(server.url, "user000", "token", history=JobHistoryStore(":memory:"))
+        rest_everyone = asyncio.run(rest.fetch_usage(since, all_users=True))
+        rest.disconnect()
+    assert report(rest_everyone, since) == report(everyone, since)
+    assert len(report(everyone, since)["by_user"]) == 3
@@ -0,0 +1,42 @@
+import sys
+import os
+import gzip
+import json
+
+import brotli
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm import encoding
+from backend.slurm.encoding import EncodedBody, negotiate_encoding
+from backend.slurm.models import JobInfo
+
+
+def test_negotiate_encoding():
+    """The preferred supported coding wins; q=0 and unknown codings are skipped"""
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("*") == encoding.supported_encodings()[0]
+    assert negotiate_encoding("gzip;q=0.5, br") == "br"
+
+
+def test_encoded_body_compresses_once():
+    """Variants are made on first use and reused; small bodies stay uncompressed"""
+    jobs = [JobInfo(job_id=str(i), name="sim", status="RUNNING", time=60, nodes=1, cpus=4, memory=1 << 30)
+            for i in range(100)]
+    body = EncodedBody({"jobs": jobs})
+    assert json.loads(body.identity)["jobs"][0]["status"] == "RUNNING"
+    assert not body.has("gzip")
+    compressed, coding = body.get("gzip")
+    assert coding == "gzip" and len(compressed) < len(body)
+    assert gzip.decompress(compressed) == body.identity
+    assert body.has("gzip") and body.get("gzip")[0] is compressed
+
+    body.prepare(["br"])
+    assert body.codings() == ["gzip", "br"] and brotli.decompress(body.get("br")[0]) == body.identity
+
+    small = EncodedBody({"jobs": []})
+    assert small.get("gzip") == (small.identity, None)
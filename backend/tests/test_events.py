@@ -0,0 +1,104 @@
+import asyncio
+import json
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend import main
+from backend.slurm.events import EventHub, Subscription
+from backend.slurm.poller import SnapshotPoller
+from backend.tests.test_poller import ChangingClient
+
+
+class FakeRequest:
+    """Just enough of a Starlette request for the stream endpoint"""
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def parse_frame(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+def test_slow_subscriber_is_resynced():
+    """A full queue is replaced by a single resync marker"""
+    async def scenario():
+        hub = EventHub(max_queue=2)
+        subscription = hub.subscribe("24h")
+        for version in range(1, 6):
+            hub.publish("24h", version, {"added": [], "changed": [], "removed": ["1"]})
+        events = []
+        while not subscription.queue.empty():
+            events.append(await subscription.next(0.1))
+        return events, subscription.dropped
+
+    events, dropped = asyncio.run(scenario())
+    assert events == [{"type": Subscription.RESYNC}]
+    assert dropped == 4
+
+
+def test_stream_sends_snapshot_then_changes():
+    """Subscribers get the snapshot, then update events from the shared poll"""
+    client = ChangingClient()
+    poller = SnapshotPoller(client, ttl=60, stream_interval=60)
+    original = main.test_poller
+    main.test_poller = poller
+
+    async def scenario():
+        request = FakeRequest()
+        response = await main.stream_jobs(request, session_id="test", time_range="24h", test_mode=True)
+        frames = response.body_iterator
+        first = parse_frame(await frames.__anext__())
+        client.first_status = "COMPLETED"
+        await poller.refresh("24h")
+        second = parse_frame(await frames.__anext__())
+        request.disconnected = True
+        subscribers = poller.events.subscriber_count()
+        await frames.aclose()
+        poller.stop()
+        return first, second, subscribers, poller.events.subscriber_count()
+
+    try:
+        first, second, subscribers, remaining = asyncio.run(scenario())
+    finally:
+        main.test_poller = original
+
+    assert first[0] == "snapshot"
+    assert len(first[1]["jobs"]) > 0
+    assert second[0] == "update"
+    assert second[1]["jobs"][0]["status"] == "COMPLETED"
+    assert subscribers == 1
+    assert remaining == 0
+
+
+def test_stream_resumes_from_last_event_id():
+    """Reconnecting with Last-Event-ID replays only the missed changes"""
+    client = ChangingClient()
+    poller = SnapshotPoller(client, ttl=60, stream_interval=60)
+    original = main.test_poller
+    main.test_poller = poller
+
+    async def scenario():
+        first = await poller.refresh("24h")
+        client.first_status = "FAILED"
+        await poller.refresh("24h")
+        request = FakeRequest({"last-event-id": str(first.version)})
+        response = await main.stream_jobs(request, session_id="test", time_range="24h", test_mode=True)
+        frame = parse_frame(await response.body_iterator.__anext__())
+        await response.body_iterator.aclose()
+        poller.stop()
+        return frame
+
+    try:
+        event, data = asyncio.run(scenario())
+    finally:
+        main.test_poller = original
+    assert event == "update"
+    assert data["jobs"][0]["status"] == "FAILED"
@@ -0,0 +1,95 @@
+import asyncio
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import MockClient
+from backend.slurm.fanout import FanOutPoller
+from backend.slurm.poller import SnapshotPoller
+from backend.slurm.query import JobQuery
+
+
+class DelayedClient(MockClient):
+    """MockClient answering after ``delay`` seconds, or failing"""
+    def __init__(self, delay=0.0, error=None):
+        super().__init__()
+        self.delay = delay
+        self.error = error
+
+    async def fetch_snapshot(self, time_range):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.get_jobs(), self.get_completed_jobs(time_range)
+
+
+def fan_out(timeout, **clients):
+    members = {name: SnapshotPoller(client, cluster=name) for name, client in clients.items()}
+    return FanOutPoller(members, timeout=timeout)
+
+
+def test_slow_and_failing_clusters_give_partial_results():
+    """Latency is bounded by the timeout and the clusters that answered are merged"""
+    poller = fan_out(0.3, a=DelayedClient(), b=DelayedClient(0.1), slow=DelayedClient(0.8),
+                     broken=DelayedClient(error="ssh: connection refused"))
+
+    async def scenario():
+        started = time.perf_counter()
+        first = await poller.get_snapshot("24h")
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.7)
+        second = await poller.get_snapshot("24h")
+        return first, elapsed, second
+
+    first, elapsed, second = asyncio.run(scenario())
+    assert elapsed < 0.6
+    assert {name: state["ok"] for name, state in first.clusters.items()} == \
+        {"a": True, "b": True, "slow": False, "broken": False}
+    assert "connection refused" in first.clusters["broken"]["error"]
+    assert {job.cluster for job in first.jobs} == {"a", "b"}
+    # Job ids repeat across clusters; the cluster tells them apart
+    assert [job.cluster for job in first.jobs if job.job_id == "1001"] == ["a", "b"]
+    assert len(first.index.query(JobQuery(clusters=["b"])).jobs) == len(first.jobs) // 2
+
+    # The slow cluster's fetch kept going and is included next time
+    assert second.clusters["slow"]["ok"]
+    assert second.version > first.version and second.etag != first.etag
+    assert {job.cluster for job in second.jobs} == {"a", "b", "slow"}
+
+
+def test_merged_snapshot_is_reused_while_clusters_are_unchanged():
+    poller = fan_out(1.0, a=DelayedClient(), b=DelayedClient())
+
+    async def scenario():
+        first = await poller.get_snapshot("24h")
+        return first, await poller.get_snapshot("24h")
+
+    first, second = asyncio.run(scenario())
+    assert second is first
+    assert poller.delta("24h", first.version) == {"added": [], "changed": [], "removed": []}
+    assert poller.delta("24h", first.version - 1) is None
+
+
+def test_graphs_and_totals_are_combined_per_cluster():
+    poller = fan_out(1.0, a=DelayedClient(), b=DelayedClient())
+
+    async def scenario():
+        snapshot = await poller.get_snapshot("156h")
+        return snapshot, await poller.get_graph("156h")
+
+    snapshot, graph = asyncio.run(scenario())
+    nodes = graph.to_dict()
+    assert nodes["a/1002"]["dependencies"] == ["a/1001", "a/1000"]
+    assert nodes["b/1002"]["dependencies"] == ["b/1001", "b/1000"]
+    assert nodes["b/1002"]["y"] > nodes["a/1002"]["y"]
+    assert graph.related("b/1001", "descendants")[0] == "b/1001"
+    assert graph.critical_path()["jobs"][0].startswith(("a/", "b/"))
+
+    summary = poller.aggregates("156h").to_dict()
+    single = poller.members["a"].aggregates("156h").to_dict()
+    assert summary["total"] == len(snapshot.jobs) == 2 * single["total"]
+    assert summary["by_cluster"] == {"a": single["total"], "b": single["total"]}
+    assert summary["by_state"]["RUNNING"] == 2 * single["by_state"]["RUNNING"]
@@ -0,0 +1,113 @@
+import random
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import JobInfo, MockClient
+from backend.slurm.graph import LAYER_SPACING, JobGraph
+
+
+def make_job(job_id, dependency="", time="1:00:00", status="PENDING", name=None):
+    return JobInfo(job_id=job_id, name=name or f"job{job_id}", status=status, time=time,
+                   nodes="1", cpus="1", memory="1G", dependency=dependency)
+
+
+def chain_jobs():
+    # 1 -> 2 -> 4, 1 -> 3 -> 4, 3 is the long branch
+    return [
+        make_job("1", time="1:00:00"),
+        make_job("2", "afterok:1", time="0:10:00"),
+        make_job("3", "afterok:1", time="5:00:00"),
+        make_job("4", "afterok:2:3", time="1:00:00"),
+    ]
+
+
+def test_layers_coordinates_and_critical_path():
+    """Jobs are layered by longest dependency chain and the critical path follows durations"""
+    graph = JobGraph()
+    graph.update(chain_jobs())
+    assert [graph.layer[j] for j in "1234"] == [0, 1, 1, 2]
+    assert graph.position("3") == (LAYER_SPACING, 200)
+    assert graph.critical_path() == {"jobs": ["1", "3", "4"], "seconds": 7 * 3600, "length": 3}
+
+
+def test_update_only_touches_what_changed():
+    """A status change does not re-resolve edges or move nodes"""
+    graph = JobGraph()
+    graph.update(chain_jobs())
+    jobs = chain_jobs()
+    jobs[0].status = "RUNNING"
+    delta = graph.update(jobs)
+    assert delta.changed_nodes == ["1"]
+    assert delta.added_edges == [] and delta.removed_edges == []
+    assert delta.relaid_nodes == 0
+
+    version = graph.version
+    assert graph.update(jobs).empty
+    assert graph.version == version
+
+
+def test_new_upstream_job_links_waiting_dependents():
+    """A dependency outside the window is linked once the job appears"""
+    graph = JobGraph()
+    graph.update([make_job("5", "afterok:4")])
+    assert graph.edges["5"][0]["in_window"] is False
+
+    delta = graph.update([make_job("4"), make_job("5", "afterok:4")])
+    assert delta.added_nodes == ["4"]
+    assert delta.added_edges == [("4", "5")]
+    assert graph.layer["5"] == 1
+
+
+def test_removing_upstream_job_relayouts_descendants():
+    """Dropping a job moves its dependents back up a layer"""
+    graph = JobGraph()
+    graph.update(chain_jobs())
+    delta = graph.update([job for job in chain_jobs() if job.job_id != "1"])
+    assert delta.removed_nodes == ["1"]
+    assert ("1", "2") in delta.removed_edges
+    assert [graph.layer[j] for j in "234"] == [0, 0, 1]
+
+
+def test_related_subgraphs():
+    """Descendant and ancestor sets are rooted at the given job"""
+    graph = JobGraph()
+    graph.update(chain_jobs())
+    assert graph.related("3") == ["3", "4"]
+    assert sorted(graph.related("4", "ancestors")) == ["1", "2", "3", "4"]
+    assert graph.related("missing") == []
+
+
+def test_incremental_updates_match_full_rebuild():
+    """After random churn the graph matches one built from scratch"""
+    rng = random.Random(7)
+    graph = JobGraph()
+    ids = [str(100 + i) for i in range(60)]
+    for _ in range(30):
+        present = rng.sample(ids, 40)
+        jobs = []
+        for job_id in present:
+            parents = [p for p in rng.sample(ids, 3) if int(p) < int(job_id)]
+            dependency = "afterok:" + ":".join(parents) if parents else ""
+            jobs.append(make_job(job_id, dependency, time=f"{rng.randint(0, 5)}:00:00"))
+        graph.update(jobs)
+
+        fresh = JobGraph()
+        fresh.update(jobs)
+        for job_id in fresh.jobs:
+            assert graph.parents[job_id] == fresh.parents[job_id]
+            assert graph.edges[job_id] == fresh.edges[job_id]
+            assert graph.layer[job_id] == fresh.layer[job_id]
+            assert graph.path_seconds[job_id] == fresh.path_seconds[job_id]
+        assert set(graph.jobs) == set(fresh.jobs)
+
+
+def test_mock_jobs_layout():
+    """The mock workflow lays out as a chain from the oldest job"""
+    client = MockClient()
+    graph = JobGraph()
+    graph.update(client.get_jobs() + client.get_completed_jobs("156h"))
+    assert graph.layer["990"] == 0
+    assert graph.layer["1004"] == graph.layer["1002"] + 1
@@ -0,0 +1,94 @@
+import asyncio
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import JobInfo, SlurmClient
+from backend.slurm.history import SYNC_OVERLAP, JobHistoryStore
+from backend.slurm.units import format_timestamp, parse_timestamp
+
+
+def job(job_id, status="COMPLETED", end_time=0.0):
+    return JobInfo(job_id=job_id, name=f"job{job_id}", status=status, time="0:10:00",
+                   nodes="1", cpus="1", memory="1G", end_time=end_time)
+
+
+class SacctClient(SlurmClient):
+    """SlurmClient answering sacct from a scripted list of output lines"""
+    def __init__(self, history):
+        super().__init__("cluster", "alice", "password", history=history)
+        self.commands = []
+        self.lines = []
+        self.error = ""
+
+    def run_command(self, cmd, timeout=None, handle=None, parse=None):
+        self.commands.append(cmd)
+        return parse(iter(self.lines)), self.error
+
+
+def test_sync_start_follows_high_water_mark():
+    """The first sync covers the window, later ones start at the last sync"""
+    store = JobHistoryStore(":memory:")
+    now = time.time()
+    assert store.sync_start("c", "u", now - 3600) == now - 3600
+
+    store.merge("c", "u", [job("1", end_time=now - 60)], now - 3600, now)
+    assert store.sync_start("c", "u", now - 1800) == now - SYNC_OVERLAP
+    # A wider window than the store holds needs a full query
+    assert store.sync_start("c", "u", now - 7200) == now - 7200
+
+
+def test_query_answers_time_ranges_locally():
+    """Jobs are selected by end time; unfinished jobs are always included"""
+    store = JobHistoryStore(":memory:")
+    now = time.time()
+    store.merge("c", "u", [job("10", end_time=now - 7200), job("12", end_time=now - 60),
+                           job("11", status="RUNNING")], now - 86400, now)
+    store.merge("c", "other", [job("13", end_time=now - 60)], now - 86400, now)
+
+    assert [j.job_id for j in store.query("c", "u", now - 3600)] == ["11", "12"]
+    assert [j.job_id for j in store.query("c", "u", now - 86400)] == ["10", "11", "12"]
+
+    # The running job ends: the next sync updates it in place
+    store.merge("c", "u", [job("11", end_time=now)], now - SYNC_OVERLAP, now + 1)
+    assert store.query("c", "u", now - 3600)[0].status == "COMPLETED"
+    assert store.count("c", "u") == 3
+
+
+def test_client_fetches_only_changes_after_first_sync():
+    """Refreshes ask sacct for a short window and merge it into the stored history"""
+    store = JobHistoryStore(":memory:")
+    client = SacctClient(store)
+    ended = format_timestamp(time.time() - 3600)
+    client.lines = [f"1|COMPLETED|0:10:00|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|{ended}|alice|cpu=4,gres/gpu=1|00:08:00||0:0|old|sbatch old.sh",
+                    "2|RUNNING|0:05:00|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|Unknown|alice|cpu=4,gres/gpu=1|00:00:00||0:0|new|sbatch new.sh"]
+
+    first = asyncio.run(client.fetch_completed_jobs("156h"))
+    client.lines = [("2|COMPLETED|0:06:00|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|"
+                    + format_timestamp(time.time()) + "|alice|cpu=1|00:06:00||0:0|new|sbatch new.sh")]
+    second = asyncio.run(client.fetch_completed_jobs("156h"))
+
+    assert [j.job_id for j in first] == ["1", "2"]
+    assert [(j.job_id, j.status) for j in second] == [("1", "COMPLETED"), ("2", "COMPLETED")]
+    first_start = parse_timestamp(client.commands[0].split()[2])
+    second_start = parse_timestamp(client.commands[1].split()[2])
+    assert abs(first_start - (time.time() - 156 * 3600)) < 5
+    assert time.time() - second_start < SYNC_OVERLAP + 5
+    # Usage of the finished jobs is kept alongside
+    assert list(store.usage("cluster", "alice", 0).column("total_cpu")) == [480, 360]
+
+
+def test_failed_sync_counts_as_command_error():
+    """A failing sacct is served from the store and counted, so polling backs off"""
+    store = JobHistoryStore(":memory:")
+    now = time.time()
+    store.merge("cluster", "alice", [job("1", end_time=now - 60)], now - 3600, now)
+    client = SacctClient(store)
+    client.error = "sacct: error: Problem talking to the database"
+
+    jobs = asyncio.run(client.fetch_completed_jobs("1h"))
+    assert [j.job_id for j in jobs] == ["1"]
+    assert client.command_errors == 1
@@ -0,0 +1,83 @@
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.hostlist import NodeIndex, compress, expand
+from backend.slurm.nodes import NodeState, parse_sinfo
+
+SINFO = [
+    "batch*|mixed|40/88/0/128|256000|(null)|node[001-002]",
+    "batch*|idle|0/256/0/256|256000|(null)|node[003-004,010]",
+    "batch*|down*|0/0/64/64|256000|(null)|node005",
+    "gpu|idle|0/128/0/128|512000|gpu:a100:4(S:0-1)|gpu[01-02]",
+    "gpu|allocated|64/0/0/64|512000|gpu:a100:4(S:0-1)|gpu03",
+    "shared|idle|0/128/0/128|256000|(null)|node[003-004]",
+    "broken line",
+]
+
+
+def test_hostlists_expand_and_compress():
+    """Ranges keep their zero padding; brackets may be nested in a name or repeated"""
+    assert list(expand("node[001-003,010],login,gpu7")) == ["node001", "node002", "node003", "node010",
+                                                           "login", "gpu7"]
+    assert list(expand("rack[1-2]-n[01-02]")) == ["rack1-n01", "rack1-n02", "rack2-n01", "rack2-n02"]
+    assert list(expand("n[8-10]-ib")) == ["n8-ib", "n9-ib", "n10-ib"]
+
+    assert compress(["node003", "node001", "node002", "node010", "login", "node002"]) == "login,node[001-003,010]"
+    assert compress(["rack1-n01", "rack1-n02", "rack2-n01"]) == "rack1-n[01-02],rack2-n01"
+    assert compress(["n9", "n10", "n08"]) == "n[08,9-10]"
+    hostlist = "login,a[1-3,7],b[0098-0102]-ib,c05"
+    assert compress(expand(hostlist)) == hostlist
+
+    for bad in ("node[3-1]", "node[a-b]"):
+        try:
+            list(expand(bad))
+            raise AssertionError(f"expanded {bad}")
+        except ValueError:
+            pass
+
+
+def test_node_index_sets_at_cluster_scale():
+    """12k nodes: hostlists become bitmaps range by range, and set operations are integer ones"""
+    index = NodeIndex()
+    started = time.perf_counter()
+    everything = index.add("cn[00001-12000]")
+    evens = index.bitmap(",".join(f"cn{n:05d}" for n in range(2, 12001, 2)))
+    job = index.bitmap("cn[00100-00199],cn99999,other")
+    elapsed = time.perf_counter() - started
+
+    assert len(index) == 12000 and everything == index.all
+    assert evens.bit_count() == 6000
+    assert index.hostlist(evens & job) == "cn[00100,00102,00104,00106,00108" + "".join(
+        f",{n:05d}" for n in range(110, 200, 2)) + "]"
+    assert index.hostlist(job) == "cn[00100-00199]"
+    assert index.hostlist(everything & ~evens).count(",") == 5999
+    assert index.expand(index.bitmap("cn[00003-00004]")) == ["cn00003", "cn00004"]
+    assert elapsed < 2.0
+
+    # Bits stay put when nodes are added later
+    index.add("cn00001,gpu[1-2]")
+    assert len(index) == 12002 and index.bitmap("cn[00001-12000]") == everything
+
+
+def test_node_state_selects_by_partition_state_and_job():
+    state = NodeState(parse_sinfo(SINFO))
+    summary = state.summary()
+    assert summary["nodes"] == 9
+    assert summary["states"] == {"allocated": 1, "down": 1, "idle": 5, "mixed": 2}
+    batch = summary["partitions"]["batch"]
+    assert batch["hostlist"] == "node[001-005,010]"
+    assert batch["cpus"] == {"allocated": 40, "idle": 344, "other": 64, "total": 448}
+    assert summary["partitions"]["gpu"]["gpus"] == 12
+
+    idle_shared = state.select("shared", ["IDLE"])
+    assert state.describe(idle_shared) == {"nodes": 2, "states": {"idle": 2}, "hostlist": "node[003-004]"}
+    assert state.index.hostlist(state.select("batch", ["idle", "down"])) == "node[003-005,010]"
+    job = state.index.bitmap("node[002-003]")
+    assert state.describe(state.select(nodes=job))["states"] == {"idle": 1, "mixed": 1}
+    assert state.select("nope") == 0
+
+    assert NodeState(parse_sinfo(SINFO), state.index).digest == state.digest
@@ -0,0 +1,133 @@
+import sys
+import os
+import asyncio
+import time
+from collections import Counter
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+os.environ.setdefault("SWATCH_HISTORY_DB", "")
+
+from backend.benchmarks.synthetic import SyntheticCluster
+from backend.loadtest.fake_host import FakeSlurmHost
+from backend.loadtest.load import percentile, run_load
+from backend.slurm.client import COMMAND_SECONDS, COMMANDS, SlurmClient
+from backend.slurm.connection import ConnectionPool
+from backend.slurm.nodes import NodeState
+from backend.slurm.poller import PollerRegistry
+from backend.slurm.output import OutputUnavailable
+
+
+def test_client_runs_against_fake_host():
+    """The real client logs in over SSH and parses what the fake host serves"""
+    cluster = SyntheticCluster(jobs=2000, seed=3, now=time.time(), window=100 * 3600)
+    with FakeSlurmHost(cluster, password="secret", seed=3) as host:
+        client = SlurmClient(host.address, "alice", "secret", pool=ConnectionPool())
+        assert client.connect()
+        parsed = COMMAND_SECONDS.count(command="squeue", phase="parse")
+        active = client.get_jobs()
+        assert COMMAND_SECONDS.count(command="squeue", phase="parse") == parsed + 1
+        finished = client.get_completed_jobs("156h")
+        assert {job.job_id for job in active} == {job_id for job_id, job in host.jobs.items() if job.active}
+        assert len(finished) == sum(1 for job in host.jobs.values() if job.start)
+
+        job_id = next(job_id for job_id, job in host.jobs.items() if "_" not in job_id and job.active)
+        detail, error = client.run_command(f"scontrol show job {job_id} -o")
+        assert not error and detail.startswith(f"JobId={job_id} ")
+        nodes, _ = client.run_command("sinfo -N -h -o '%N|%T'")
+        assert len(nodes.splitlines()) == len(host.nodes)
+        # Grouped by partition and state, each group's nodes as a hostlist
+        state = NodeState(asyncio.run(client.fetch_nodes()))
+        assert len(state.groups) < len(host.nodes) and state.nodes.bit_count() == len(host.nodes)
+        assert state.summary()["states"] == dict(sorted(Counter(node.state for node in host.nodes.values()).items()))
+        assert sum(cpus[3] for cpus in state.cpus.values()) == sum(node.cpus for node in host.nodes.values())
+
+        host.failure_rate = 1.0
+        errors = COMMANDS.value(command="squeue", outcome="error")
+        assert client.get_jobs() == []
+        assert COMMANDS.value(command="squeue", outcome="error") == errors + 1
+        assert host.failures == 1
+        assert host.commands["squeue"] == 2 and host.commands["sacct"] == 1
+        client.disconnect()
+
+        rejected = SlurmClient(host.address, "alice", "wrong", pool=ConnectionPool())
+        assert not rejected.connect()
+
+
+def test_poller_slows_down_when_sdiag_reports_load():
+    """The background loop reads sdiag once per interval and stretches the poll interval by the load"""
+    cluster = SyntheticCluster(jobs=50, seed=7, now=time.time())
+    with FakeSlurmHost(cluster, password="secret", seed=7) as host:
+        host.server_threads = 96
+        client = SlurmClient(host.address, "alice", "secret", pool=ConnectionPool())
+        assert client.connect()
+        poller = PollerRegistry(ttl=0.2, stream_interval=0.1).acquire(host.address, "alice", client)
+
+        async def scenario():
+            await poller.get_snapshot("24h")
+            for _ in range(50):
+                await asyncio.sleep(0.05)
+                if poller.scheduler.sdiag:
+                    break
+            poller.stop()
+
+        asyncio.run(scenario())
+        assert host.commands["sdiag"] == 1
+        assert poller.scheduler.sdiag["server_threads"] == 96 and poller.scheduler.sdiag["rpc_count"] >= 1
+        assert poller.scheduler.load_factor == 3 and abs(poller.scheduler.interval() - 0.6) < 1e-9
+        client.disconnect()
+
+
+def test_job_details_and_output_from_fake_host():
+    """Many jobs cost one scontrol and one sacct; a log is read from any byte offset"""
+    cluster = SyntheticCluster(jobs=300, seed=5, now=time.time())
+    with FakeSlurmHost(cluster, password="secret", seed=5) as host:
+        client = SlurmClient(host.address, "alice", "secret", pool=ConnectionPool())
+        assert client.connect()
+        active = [job_id for job_id, job in host.jobs.items() if job.active][:3]
+        purged = [job_id for job_id, job in host.jobs.items() if job.end and job.end < cluster.now - 3600][:3]
+
+        async def scenario():
+            records = await client.fetch_job_details(active + purged + ["999999"])
+            path = records[purged[0]]["stdout"]
+            chunks = [chunk async for chunk in client.tail_output(path, follow=True, idle=1.0)]
+            tail = [chunk async for chunk in client.tail_output(path, offset=-8)]
+            try:
+                async for _ in client.tail_output("/no/such.out"):
+                    pass
+                raise AssertionError("missing file read")
+            except OutputUnavailable:
+                pass
+            return records, chunks, tail
+
+        records, chunks, tail = asyncio.run(scenario())
+        assert set(records) == set(active + purged)
+        assert {records[job_id]["source"] for job_id in active} == {"scontrol"}
+        assert {records[job_id]["source"] for job_id in purged} == {"sacct"}
+        assert all(records[job_id]["final"] for job_id in purged)
+        assert host.commands["scontrol"] == 1 and host.commands["sacct"] == 1
+
+        content = host.output_file(records[purged[0]]["stdout"])
+        assert b"".join(data for _, data in chunks) == content and chunks[-1][0] == len(content)
+        assert tail == [(len(content), content[-8:])]
+        assert client._tails == 0
+        client.disconnect()
+
+def test_load_driver_reports_latencies():
+    """A short in-process run logs every session in and out and counts remote commands"""
+    cluster = SyntheticCluster(jobs=500, seed=4, now=time.time())
+    with FakeSlurmHost(cluster, latency=0.01, seed=4) as host:
+        report = asyncio.run(run_load(host, sessions=6, duration=0.5, users=2, interval=0.1, ramp=0.1))
+    operations = report["operations"]
+    assert operations["login"]["count"] == 6 and operations["logout"]["count"] == 6
+    assert operations["jobs"]["count"] >= 6 and operations["jobs"]["errors"] == 0
+    assert operations["jobs"]["p99_ms"] >= operations["jobs"]["p50_ms"] > 0
+    # Sessions of the same user share one poller, so squeue runs far less than /jobs
+    assert 0 < report["remote_commands"]["squeue"] < operations["jobs"]["count"]
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 99) == 99
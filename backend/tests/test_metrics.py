@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.slurm.metrics import MetricsRegistry
+from backend.slurm.profiler import SamplingProfiler
+
+
+def test_registry_renders_prometheus_text():
+    """Counters, gauges and cumulative histogram buckets in the text format"""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    requests.inc(route="/jobs")
+    requests.inc(2, route="/jobs")
+    registry.gauge("sessions", "Sessions", function=lambda: 3)
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    latency.observe(0.05, route="/jobs")
+    latency.observe(0.5, route="/jobs")
+    latency.observe(5, route="/jobs")
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/jobs"} 3' in text
+    assert "sessions 3" in text
+    assert 'latency_seconds_bucket{route="/jobs",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/jobs",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/jobs",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/jobs"} 3' in text
+    assert registry.counter("requests_total", "Requests", ["route"]) is requests
+
+
+def test_metrics_endpoint_and_profiler_toggle():
+    """/metrics reports request latency by route; the profiler stays off unless enabled"""
+    client = TestClient(main.app)
+    client.get("/jobs/summary?session_id=test&test_mode=True")
+    text = client.get("/metrics").text
+    assert 'swatch_http_request_seconds_count{method="GET",route="/jobs/summary",status="200"}' in text
+    assert "swatch_snapshot_lookups_total" in text
+    assert "swatch_sessions " in text
+
+    assert client.post("/debug/profiler/start").status_code == 404
+    main.PROFILER_ENABLED = True
+    try:
+        assert client.post("/debug/profiler/start?interval=0.001").json()["running"]
+        time.sleep(0.05)
+        stopped = client.post("/debug/profiler/stop").json()
+        assert stopped["samples"] > 0
+        assert client.get("/debug/profiler/collapsed").status_code == 200
+    finally:
+        main.PROFILER_ENABLED = False
+        main.profiler.stop()
+
+
+def test_sampling_profiler_finds_busy_function():
+    def spin(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    spin(0.1)
+    profiler.stop()
+    assert profiler.samples > 0
+    assert any("spin" in row["frame"] for row in profiler.top(5))
+    assert "test_sampling_profiler_finds_busy_function" in profiler.collapsed()
@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.models import JobBatch, JobInfo, JobState
+
+
+def test_job_info_converts_slurm_text():
+    """Slurm's text values are stored as numbers and state enums"""
+    job = JobInfo(job_id="1", name="sim", status="CANCELLED by 42", time="1-02:00:00",
+                  nodes="2-4", cpus="32", memory="64G")
+    assert job.status is JobState.CANCELLED
+    assert job.status == "CANCELLED"
+    assert (job.time, job.nodes, job.cpus, job.memory) == (26 * 3600, 2, 32, 64 << 30)
+    assert JobInfo(job_id="2", name="x", status="BOGUS", time="UNLIMITED", nodes="1", cpus="1",
+                   memory="500").status is JobState.UNKNOWN
+    assert JobInfo.format_memory(job.memory) == "64G"
+    assert not hasattr(job, "__dict__")
+
+
+def test_job_batch_round_trip_filter_and_sort():
+    """A batch holds the same jobs column by column"""
+    jobs = [
+        JobInfo(job_id="1", name="a", status="RUNNING", time="1:00:00", nodes="1", cpus="8", memory="4G"),
+        JobInfo(job_id="2", name="b", status="PENDING", time="UNLIMITED", nodes="1", cpus="2", memory="1G"),
+        JobInfo(job_id="3", name="c", status="RUNNING", time="0:30:00", nodes="2", cpus="4", memory="2G"),
+    ]
+    batch = JobBatch.from_jobs(jobs)
+    assert len(batch) == 3
+    assert list(batch) == jobs
+
+    running = batch.where_state(JobState.RUNNING)
+    by_cpus = batch.argsort("cpus", running)
+    assert [job.job_id for job in batch.select(by_cpus)] == ["3", "1"]
+
+    columns = batch.to_dict()
+    assert columns["status"] == ["RUNNING", "PENDING", "RUNNING"]
+    assert columns["time"] == [3600, None, 1800]
@@ -0,0 +1,75 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm import parser
+
+
+class ChunkedChannel:
+    """Channel that hands out its data in fixed-size chunks"""
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def recv(self, size):
+        size = min(size, self.chunk_size)
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def test_squeue_names_with_spaces_and_delimiters():
+    """Job names are taken whole, even with spaces or pipes in them"""
+    jobs = parser.parse_squeue([
+        "12_[1-4]|PENDING|1-00:00:00|2|16|32G|afterok:11(unfulfilled)|compute|2024-05-01T11:00:00|alice|gpu:1|2024-05-01T11:30:00|align sample | lane 1",
+        "",
+        "garbage line",
+    ])
+    assert len(jobs) == 1
+    assert jobs[0].job_id == "12_[1-4]"
+    assert jobs[0].name == "align sample | lane 1"
+    assert jobs[0].time == 86400
+    assert (jobs[0].nodes, jobs[0].cpus, jobs[0].memory) == (2, 16, 32 << 30)
+
+
+def test_sacct_steps_fold_into_parent():
+    """.batch/.extern/.N rows are not reported as separate jobs"""
+    lines = [
+        "100|COMPLETED|00:05:00|1|4|4G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|2024-05-01T12:05:00|alice|cpu=4,gres/gpu=1|prep|sbatch prep.sh",
+        "100.batch|COMPLETED|00:05:00|1|4||compute|2024-05-01T11:00:00|2024-05-01T11:30:00|2024-05-01T12:05:00|alice|cpu=4,gres/gpu=1|batch|",
+        "100.extern|COMPLETED|00:05:00|1|4||compute|2024-05-01T11:00:00|2024-05-01T11:30:00|2024-05-01T12:05:00|alice|cpu=4,gres/gpu=1|extern|",
+        "101_3|CANCELLED by 1234|00:01:00|1|1|1Gn|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|Unknown|alice|cpu=4,gres/gpu=1|my|job|sbatch -d afterok:100 --wrap 'a | b'",
+        "101_3.0|CANCELLED|00:01:00|1|1||compute|2024-05-01T11:00:00|2024-05-01T11:30:00|Unknown|alice|cpu=4,gres/gpu=1|step|",
+    ]
+    jobs = parser.parse_sacct(lines)
+    assert [job.job_id for job in jobs] == ["100", "101_3"]
+    assert jobs[1].status == "CANCELLED"
+    assert jobs[1].name == "my|job"
+    assert jobs[1].memory == 1 << 30
+    assert jobs[1].dependency == "afterok:100"
+    assert jobs[0].end_time > 0 and jobs[1].end_time == 0
+
+
+def test_merge_step_hook_sees_every_step():
+    """merge_step is called with each step of the job it belongs to"""
+    seen = []
+    lines = ["7|COMPLETED|0:10|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|None|alice|cpu=4,gres/gpu=1|a|sbatch a", "7.batch|COMPLETED|0:10|1|1||compute|2024-05-01T11:00:00|2024-05-01T11:30:00|None|alice|cpu=4,gres/gpu=1|batch|", "8|FAILED|0:10|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|None|alice|cpu=4,gres/gpu=1|b|sbatch b"]
+    rows = list(parser.iter_sacct_jobs(lines, merge_step=lambda job, step: seen.append((job["JobID"], step["JobID"]))))
+    assert [row["JobID"] for row in rows] == ["7", "8"]
+    assert seen == [("7", "7.batch")]
+
+
+def test_sacct_without_submit_line():
+    """Older sacct without SubmitLine still parses"""
+    fields = [f for f in parser.SACCT_FIELDS if f != "SubmitLine"]
+    jobs = parser.parse_sacct(["5|COMPLETED|0:10|1|1|1G|compute|2024-05-01T11:00:00|2024-05-01T11:30:00|None|alice|cpu=4,gres/gpu=1|name|with|pipes"], fields)
+    assert jobs[0].name == "name|with|pipes"
+    assert jobs[0].dependency == ""
+
+
+def test_channel_lines_across_chunk_boundaries():
+    """Lines and multi-byte characters split across reads are reassembled"""
+    text = "1|RUNNING|1:00|1|1|1G|(null)|naïve\n2|PENDING|1:00|1|1|1G|(null)|b"
+    lines = list(parser.iter_channel_lines(ChunkedChannel(text.encode('utf-8'), 3)))
+    assert lines == text.split("\n")
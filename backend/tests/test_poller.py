@@ -0,0 +1,154 @@
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import MockClient
+from backend.slurm.poller import PollerRegistry, SnapshotPoller
+
+
+class CountingClient(MockClient):
+    """MockClient that counts remote calls and takes a while to answer"""
+    def __init__(self, delay=0.05):
+        super().__init__()
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_jobs(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return super().get_jobs()
+
+
+def test_concurrent_requests_share_one_fetch():
+    """Many viewers asking at once trigger a single squeue/sacct round"""
+    client = CountingClient()
+    poller = SnapshotPoller(client, ttl=60)
+
+    async def scenario():
+        snapshots = await asyncio.gather(*[poller.get_snapshot("24h") for _ in range(20)])
+        poller.stop()
+        return snapshots
+
+    snapshots = asyncio.run(scenario())
+    assert client.calls == 1
+    assert all(s is snapshots[0] for s in snapshots)
+
+
+def test_fresh_snapshot_is_served_from_cache():
+    """Requests within the TTL do not reach the cluster"""
+    client = CountingClient(delay=0)
+    poller = SnapshotPoller(client, ttl=60)
+
+    async def scenario():
+        first = await poller.get_snapshot("24h")
+        second = await poller.get_snapshot("24h")
+        poller.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert client.calls == 1
+
+
+def test_stale_snapshot_is_served_while_refreshing():
+    """A stale snapshot is returned immediately and refreshed behind it"""
+    client = CountingClient(delay=0.05)
+    poller = SnapshotPoller(client, ttl=60)
+
+    async def scenario():
+        first = await poller.get_snapshot("24h")
+        first.checked_at -= 120
+        stale_checked_at = first.checked_at
+        started = time.perf_counter()
+        stale = await poller.get_snapshot("24h")
+        elapsed = time.perf_counter() - started
+        fresh = await poller.refresh("24h")
+        poller.stop()
+        return first, stale, fresh, elapsed, stale_checked_at
+
+    first, stale, fresh, elapsed, stale_checked_at = asyncio.run(scenario())
+    assert stale is first
+    assert elapsed < client.delay
+    assert fresh.checked_at > stale_checked_at
+    assert client.calls == 2
+
+
+def test_registry_shares_pollers_per_user_and_host():
+    """Sessions for the same user and cluster share one poller"""
+    registry = PollerRegistry(ttl=60)
+    a, b = MockClient(), MockClient()
+    poller = registry.acquire("cluster", "alice", a)
+    assert registry.acquire("cluster", "alice", b) is poller
+    assert registry.acquire("cluster", "bob", MockClient()) is not poller
+
+    registry.release("cluster", "alice", a)
+    assert poller.client is b
+    registry.release("cluster", "alice", b)
+    assert registry.get("cluster", "alice") is None
+
+
+class ChangingClient(MockClient):
+    """MockClient whose first job changes state on demand"""
+    def __init__(self):
+        super().__init__()
+        self.first_status = "RUNNING"
+        self.extra_jobs = []
+
+    def get_jobs(self):
+        jobs = super().get_jobs()
+        jobs[0].status = self.first_status
+        return jobs + self.extra_jobs
+
+
+def test_version_only_changes_with_content():
+    """Unchanged refreshes keep the version and ETag; changes bump them"""
+    client = ChangingClient()
+    poller = SnapshotPoller(client, ttl=60)
+
+    async def scenario():
+        first = await poller.refresh("24h")
+        same = await poller.refresh("24h")
+        client.first_status = "COMPLETED"
+        changed = await poller.refresh("24h")
+        poller.stop()
+        return first, same, changed
+
+    first, same, changed = asyncio.run(scenario())
+    assert same.version == first.version and same.etag == first.etag
+    assert changed.version > first.version
+    assert changed.etag != first.etag
+
+
+def test_delta_since_version():
+    """Deltas list added, changed and removed jobs; unknown versions give None"""
+    client = ChangingClient()
+    poller = SnapshotPoller(client, ttl=60)
+
+    async def scenario():
+        first = await poller.refresh("24h")
+        first.body("rows").get("gzip")
+        first.index
+        client.first_status = "COMPLETED"
+        client.extra_jobs = [MockClient().get_jobs()[0]]
+        client.extra_jobs[0].job_id = "2000"
+        second = await poller.refresh("24h")
+        poller.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    # The new version is encoded the way the last one was read before anyone asks
+    assert second.encodings() == {"rows": ["gzip"]}
+    # Superseded versions keep their jobs for deltas, not their encodings
+    assert not first.has_body("rows") and first._index is None and first._batch is None
+    delta = poller.delta("24h", first.version)
+    assert [job.job_id for job in delta["added"]] == ["2000"]
+    assert [job.job_id for job in delta["changed"]] == ["1001"]
+    assert delta["removed"] == []
+    assert poller.delta("24h", first.version - 1) is None
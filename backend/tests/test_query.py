@@ -0,0 +1,98 @@
+import base64
+import json
+import sys
+import os
+
+import pytest
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.models import JobInfo
+from backend.slurm.query import InvalidQuery, JobIndex, JobQuery
+
+
+def make_jobs():
+    jobs = []
+    for i in range(40):
+        jobs.append(JobInfo(
+            job_id=str(100 + i), name=f"{'align' if i % 2 else 'sort'}_{i}",
+            status="RUNNING" if i % 4 == 0 else "COMPLETED", time=f"{i}:00", nodes="1",
+            cpus=str(i % 5 + 1), memory="1G", partition="gpu" if i % 3 == 0 else "compute",
+            submit_time=1000.0 + i, end_time=0.0 if i % 4 == 0 else 2000.0 + i,
+        ))
+    return jobs
+
+
+def test_filters_combine():
+    """State, partition, name and time filters intersect"""
+    index = JobIndex(make_jobs())
+    page = index.query(JobQuery(states=["RUNNING"], partitions=["gpu"]))
+    assert [job.job_id for job in page.jobs] == ["100", "112", "124", "136"]
+    assert page.total == 4 and page.next_cursor is None
+
+    assert {job.name for job in index.query(JobQuery(name="align_3")).jobs} == {"align_3", "align_31",
+                                                                                  "align_33", "align_35",
+                                                                                  "align_37", "align_39"}
+    assert [job.name for job in index.query(JobQuery(name="*_1?", sort="name")).jobs] == [
+        "align_11", "align_13", "align_15", "align_17", "align_19",
+        "sort_10", "sort_12", "sort_14", "sort_16", "sort_18"]
+    page = index.query(JobQuery(submitted_after=1010, submitted_before=1019, ended_after=2000))
+    assert [job.job_id for job in page.jobs] == ["110", "111", "113", "114", "115", "117", "118", "119"]
+
+
+def test_time_filters_skip_unset_times():
+    """Running jobs (end time 0) and unknown submit times do not fall under an upper bound"""
+    running = JobInfo(job_id="1", name="running", status="RUNNING", time="1:00", nodes="1", cpus="1",
+                      memory="1G", end_time=0.0)
+    finished = JobInfo(job_id="2", name="finished", status="COMPLETED", time="1:00", nodes="1", cpus="1",
+                       memory="1G", submit_time=100.0, end_time=500.0)
+    index = JobIndex([running, finished])
+    assert [job.job_id for job in index.query(JobQuery(ended_before=1000)).jobs] == ["2"]
+    assert [job.job_id for job in index.query(JobQuery(submitted_before=1000)).jobs] == ["2"]
+    assert [job.job_id for job in index.query(JobQuery(ended_after=0)).jobs] == ["2"]
+
+
+def test_cursor_pages_cover_everything_once():
+    """Following next_cursor walks the sorted result without gaps or repeats"""
+    index = JobIndex(make_jobs())
+    for sort in ("job_id", "-cpus", "end_time", "-name"):
+        seen, cursor = [], None
+        while True:
+            page = index.query(JobQuery(states=["COMPLETED"], sort=sort, limit=7, cursor=cursor))
+            seen.extend(page.jobs)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert len(seen) == 30 and len({job.job_id for job in seen}) == 30
+        key = sort.lstrip("-")
+        values = [getattr(job, key) if key != "job_id" else int(job.job_id) for job in seen]
+        assert values == sorted(values, reverse=sort.startswith("-"))
+
+
+def test_cursor_survives_new_snapshot():
+    """A cursor keeps its place when jobs are added before it"""
+    jobs = make_jobs()
+    first = JobIndex(jobs).query(JobQuery(limit=5))
+    newer = JobIndex([JobInfo(job_id="50", name="early", status="PENDING", time="1:00", nodes="1",
+                              cpus="1", memory="1G")] + jobs)
+    second = newer.query(JobQuery(limit=5, cursor=first.next_cursor))
+    assert [job.job_id for job in second.jobs] == ["105", "106", "107", "108", "109"]
+
+
+def test_invalid_queries():
+    with pytest.raises(InvalidQuery):
+        JobQuery(sort="password")
+    with pytest.raises(InvalidQuery):
+        JobQuery(limit=0)
+    index = JobIndex(make_jobs())
+    cursor = index.query(JobQuery(limit=1)).next_cursor
+    with pytest.raises(InvalidQuery):
+        index.query(JobQuery(sort="name", cursor=cursor))
+    with pytest.raises(InvalidQuery):
+        index.query(JobQuery(cursor="not a cursor"))
+    # Well-formed base64 JSON with the wrong key shape or types
+    for key in (5, [], [1, 2], ["x", 5], ["x", [1, "", ""]], [[1], [1, "", ""]]):
+        cursor = base64.urlsafe_b64encode(json.dumps(["cpus", key]).encode()).decode()
+        with pytest.raises(InvalidQuery):
+            index.query(JobQuery(sort="cpus", cursor=cursor))
@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+# default_client_factory opens the default history store; keep it out of $HOME
+os.environ.setdefault("SWATCH_HISTORY_DB", "")
+
+from backend.benchmarks.bench_transports import compare
+from backend.benchmarks.synthetic import SyntheticCluster
+from backend.loadtest.fake_host import FakeSlurmHost
+from backend.loadtest.fake_rest import FakeSlurmRestd
+from backend.slurm import parser
+from backend.slurm.broker import default_client_factory
+from backend.slurm.client import SlurmClient
+from backend.slurm.connection import ConnectionPool
+from backend.slurm.nodes import NodeState
+from backend.slurm.output import OutputUnavailable
+from backend.slurm.rest import RestClient, job_id_of, number, rest_node_state
+
+
+def test_rest_client_matches_what_the_ssh_path_parses():
+    """Jobs, history and nodes from slurmrestd equal squeue, sacct and sinfo's view of the same cluster"""
+    cluster = SyntheticCluster(jobs=2000, seed=3, now=time.time(), window=100 * 3600)
+    user = "user000"
+    with FakeSlurmRestd(cluster, token="secret") as server:
+        assert not RestClient(server.url, user, "wrong").connect()
+        connections = server.connections
+        client = RestClient(server.url, user, "SLURM_JWT=secret\n")
+        assert client.connect()
+
+        async def scenario():
+            rounds = [await client.fetch_snapshot("156h") for _ in range(3)]
+            return rounds[-1], await client.fetch_nodes()
+
+        (active, completed), groups = asyncio.run(scenario())
+        squeue = [job for job in parser.parse_squeue(cluster.squeue_lines()) if job.user == user]
+        sacct = [job for job in parser.parse_sacct(cluster.sacct_lines(time.time() - 156 * 3600))
+                 if job.user == user]
+        assert active and active == squeue
+        assert completed and completed == sacct
+        assert any("_" in job.job_id for job in active + completed)
+
+        # Three snapshots and the nodes over the login's connection and the pool's two
+        assert server.requests["slurm/jobs"] == 3 and server.requests["slurmdb/jobs"] == 3
+        # Only the first poll got the job list; the others learned it had not changed
+        assert server.unchanged == 2
+        assert server.connections - connections <= 3
+        client.disconnect()
+
+    with FakeSlurmHost(cluster) as host:
+        ssh = SlurmClient(host.address, user, "", pool=ConnectionPool())
+        assert NodeState(groups).summary() == NodeState(asyncio.run(ssh.fetch_nodes())).summary()
+        ssh.disconnect()
+
+
+def test_rest_details_diag_and_failures():
+    cluster = SyntheticCluster(jobs=500, seed=5, now=time.time(), window=12 * 3600)
+    with FakeSlurmRestd(cluster) as server:
+        client = RestClient(server.url, "user000", "token")
+        running = next(job for job in server.jobs.values() if job.state == "RUNNING" and "_" in job.job_id)
+        finished = next(job for job in server.jobs.values() if job.end and job.end < cluster.now - 3600)
+
+        async def scenario():
+            records = await client.fetch_job_details([running.job_id, finished.job_id, "42"])
+            stats = await client.fetch_sdiag()
+            try:
+                async for _ in client.tail_output("/home/user000/slurm-1.out"):
+                    pass
+                raise AssertionError("tailed a file over REST")
+            except OutputUnavailable:
+                pass
+            server.failure_rate = 1.0
+            errors = client.command_errors
+            assert await client.fetch_jobs() == []
+            try:
+                await client.fetch_nodes()
+                raise AssertionError("no error")
+            except RuntimeError as e:
+                assert "Socket timed out" in str(e)
+            assert client.command_errors == errors + 2
+            return records, stats
+
+        records, stats = asyncio.run(scenario())
+        assert set(records) == {running.job_id, finished.job_id}
+        record = records[running.job_id]
+        base, _, task = running.job_id.partition("_")
+        assert record["source"] == "slurmrestd" and record["state"] == "RUNNING" and not record["final"]
+        assert record["stdout"].endswith(f"/slurm-{base}_{task}.out") and record["fields"]["NodeList"]
+        assert records[finished.job_id]["source"] == "slurmdbd" and records[finished.job_id]["final"]
+        assert stats["server_threads"] == 3 and stats["rpc_count"] == 3
+
+    assert number({"set": True, "infinite": False, "number": 7}) == 7 and number(5) == 5
+    assert number({"set": False, "infinite": True, "number": 0}) is None
+    assert number({"set": False, "infinite": False, "number": 0}) == 0 and number(0xfffffffe) == 0
+    assert job_id_of({"job_id": 9, "array_job_id": {"number": 3}, "array_task_string": "1-4%2"}) == "3_[1-4]"
+    assert rest_node_state({"state": ["IDLE", "DRAIN"]}) == "drained"
+    assert rest_node_state({"state": ["MIXED", "DRAIN"]}) == "draining"
+    assert rest_node_state({"state": "DOWN+NOT_RESPONDING"}) == "down"
+
+
+def test_transport_is_chosen_per_cluster():
+    assert isinstance(default_client_factory("https://slurm.example.org:6820", "alice", "jwt"), RestClient)
+    assert isinstance(default_client_factory("login.example.org", "alice", "pw"), SlurmClient)
+
+    cluster = SyntheticCluster(jobs=300, seed=1, now=time.time(), users=1)
+    cluster.users = ["alice"]
+    results = compare(cluster, rounds=2)
+    assert results["ssh"]["jobs"] == results["rest"]["jobs"] > 0
+    assert all(result["snapshot"] > 0 and result["bytes"] > 0 for result in results.values())
@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.client import MockClient
+from backend.slurm.poller import PollerRegistry, SnapshotPoller
+from backend.slurm.scheduler import POLLS_DEFERRED, PollScheduler, parse_sdiag
+
+SDIAG = """*******************************************************
+sdiag output at Sun Oct 18 10:00:00 2026 (1792317600)
+Data since      Sun Oct 18 00:00:00 2026 (1792281600)
+*******************************************************
+Server thread count:  64
+Agent queue size:     12
+Agent count:          0
+DBD Agent queue size: 0
+
+Jobs submitted: 1200
+
+Remote Procedure Call statistics by message type
+\tREQUEST_JOB_INFO                        ( 2003) count:900    ave_time:5000   total_time:4500000
+\tREQUEST_NODE_INFO                       ( 2007) count:100    ave_time:800    total_time:80000
+
+Remote Procedure Call statistics by user
+\talice           (    1000) count:1000   ave_time:4000   total_time:4000000
+""".splitlines()
+
+
+def test_interval_adapts_to_changes_subscribers_load_and_errors():
+    scheduler = PollScheduler("cluster", ttl=15, stream_interval=1, max_interval=60, budget=None)
+    assert scheduler.interval(streaming=True) == 1 and scheduler.interval() == 15
+    # Nothing changing: back off, up to the TTL for streams and max_interval otherwise
+    assert [scheduler.interval(True, unchanged) for unchanged in (1, 2, 3, 4, 10)] == [2, 4, 8, 15, 15]
+    assert [scheduler.interval(False, unchanged) for unchanged in (1, 2, 3)] == [30, 60, 60]
+
+    stats = parse_sdiag(SDIAG)
+    assert stats == {"rpc_count": 1000, "server_threads": 64, "agent_queue": 12, "dbd_agent_queue": 0}
+    scheduler.update_load(stats, now=1000)
+    assert scheduler.load_factor == 2 and scheduler.interval(True) == 2
+    # 4000 RPCs a second is busy however few threads are running
+    scheduler.update_load(dict(stats, server_threads=1, rpc_count=41000), now=1010)
+    assert scheduler.load_factor == 8 and scheduler.sdiag["rpc_rate"] == 4000
+    scheduler.update_load(dict(stats, server_threads=1, rpc_count=5), now=1020)
+    assert scheduler.load_factor == 1
+
+    assert scheduler.interval(True, errors=2) == 30 and scheduler.interval(True) == 1
+
+    assert scheduler.sdiag_due(now=0) and not scheduler.sdiag_due(now=30) and scheduler.sdiag_due(now=61)
+    scheduler.sdiag_failed(RuntimeError("Access/permission denied"))
+    assert not scheduler.sdiag_due(now=1000)
+
+
+def test_budget_is_shared_by_the_pollers_of_a_cluster():
+    registry = PollerRegistry(ttl=15, budget=12)
+    alice = registry.acquire("cluster", "alice", MockClient())
+    bob = registry.acquire("cluster", "bob", MockClient())
+    other = registry.acquire("other", "alice", MockClient())
+    assert alice.scheduler is bob.scheduler and other.scheduler is not alice.scheduler
+
+    deferred = POLLS_DEFERRED.value(cluster="cluster")
+    assert alice.scheduler.acquire() and bob.scheduler.acquire()
+    assert not alice.scheduler.acquire() and not bob.scheduler.acquire()
+    assert POLLS_DEFERRED.value(cluster="cluster") == deferred + 2
+    # Someone waiting on a poll always gets it, and pays for it
+    assert alice.scheduler.acquire(force=True)
+    assert other.scheduler.acquire()
+
+    # One user's failing polls do not slow down the others on the cluster
+    alice.errors = 3
+    assert alice._interval("24h") == 60 and bob._interval("24h") == 15
+
+
+class FlakyClient(MockClient):
+    """MockClient whose first job changes on every call while ``changing``, and that fails while ``failing``"""
+    def __init__(self):
+        super().__init__()
+        self.changing = False
+        self.failing = False
+        self.calls = 0
+
+    def get_jobs(self):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError("Socket timed out on send/recv operation")
+        jobs = super().get_jobs()
+        if self.changing:
+            jobs[0].time = str(self.calls)
+        return jobs
+
+
+def test_poller_backs_off_while_nothing_changes():
+    """Unchanged polls stretch the interval and a change resets it; stale reads respect both"""
+    client = FlakyClient()
+    poller = SnapshotPoller(client, ttl=10, scheduler=PollScheduler(ttl=10, max_interval=80, budget=None))
+
+    async def scenario():
+        first = await poller.get_snapshot("24h")
+        for _ in range(3):
+            await poller.refresh("24h")
+        backed_off = poller._interval("24h")
+        # Stale by the TTL, but not by the backed-off interval
+        first.checked_at -= 20
+        await poller.get_snapshot("24h")
+        calls = client.calls
+        client.changing = True
+        await poller.refresh("24h")
+        reset = poller._interval("24h")
+        client.failing = True
+        for _ in range(3):
+            try:
+                await poller.refresh("24h")
+            except RuntimeError:
+                pass
+        failed = poller._interval("24h")
+        poller.stop()
+        return backed_off, calls, reset, failed
+
+    backed_off, calls, reset, failed = asyncio.run(scenario())
+    assert backed_off == 80 and calls == 4
+    assert reset == 10
+    assert failed == 40 and poller.errors == 3
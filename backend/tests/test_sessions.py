@@ -0,0 +1,47 @@
+import sys
+import os
+import time
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.sessions import TOUCH_INTERVAL, MemorySessionStore, SqliteSessionStore
+
+
+def test_sessions_expire_on_inactivity_not_age():
+    """A session in use stays logged in however old it is"""
+    store = MemorySessionStore()
+    old = store.create("cluster", "alice")
+    idle = store.create("cluster", "bob")
+    now = time.time()
+    old.created_at = idle.created_at = now - 7200
+    old.last_seen = idle.last_seen = now - 7200
+    assert store.get(old.session_id) is old
+
+    expired = store.expire(3600)
+    assert [session.session_id for session in expired] == [idle.session_id]
+    assert store.get(idle.session_id) is None
+    assert len(store) == 1
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    """Workers on the same file see each other's sessions, and each expired one is closed once"""
+    path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SqliteSessionStore(path), SqliteSessionStore(path)
+    session = worker_a.create("cluster", "alice")
+    assert worker_b.get(session.session_id).username == "alice"
+
+    later = time.time() + 7200
+    assert [s.session_id for s in worker_b.expire(3600, now=later)] == [session.session_id]
+    assert worker_a.expire(3600, now=later) == []
+    assert worker_a.get(session.session_id) is None
+
+
+def test_sqlite_store_records_activity(tmp_path):
+    store = SqliteSessionStore(str(tmp_path / "sessions.db"))
+    session = store.create("cluster", "alice")
+    store._db.execute("UPDATE sessions SET last_seen = ?", (time.time() - 2 * TOUCH_INTERVAL,))
+    assert store.get(session.session_id).idle() < 1
+    assert store.expire(TOUCH_INTERVAL) == []
+    assert store.pop(session.session_id).session_id == session.session_id
+    assert store.pop(session.session_id) is None
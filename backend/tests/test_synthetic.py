@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.benchmarks import suite
+from backend.benchmarks.synthetic import SyntheticCluster, task_ranges
+from backend.slurm import parser
+from backend.slurm.dependencies import parse_dependency
+
+
+def test_generated_output_parses_consistently():
+    """squeue and sacct text from one seed parse into the same job population"""
+    cluster = SyntheticCluster(jobs=5000, seed=7)
+    jobs = list(cluster.jobs())
+    assert len(jobs) == 5000
+    assert [job.job_id for job in SyntheticCluster(jobs=5000, seed=7).jobs()] == [job.job_id for job in jobs]
+
+    active = parser.parse_squeue(cluster.squeue_lines())
+    finished = parser.parse_sacct(cluster.sacct_lines())
+    assert {job.job_id for job in active} == {job.job_id for job in jobs if job.active}
+    assert {job.job_id for job in finished} == {job.job_id for job in jobs if job.start}
+    # Names containing the delimiter survive both formats
+    names = {job.job_id: job.name for job in jobs}
+    assert all(job.name == names[job.job_id] for job in active + finished)
+    assert any("|" in name for name in names.values())
+
+    assert any("_" in job.job_id for job in finished)
+    assert any(line.split("|", 1)[0].endswith(".batch") for line in cluster.sacct_lines())
+    upstream = {edge.job_id for job in finished for edge in parse_dependency(job.dependency)}
+    assert upstream and upstream <= {job.job_id.split("_")[0] for job in jobs}
+
+
+def test_task_ranges():
+    assert task_ranges([3, 5, 6, 7, 9]) == "[3,5-7,9]"
+    assert task_ranges([4]) == "4"
+
+
+def test_suite_reports_every_benchmark():
+    """The suite runs at small sizes and flags results over budget"""
+    results = suite.run(jobs=300, repeat=1)
+    thresholds = suite.load_thresholds()
+    assert set(results) == set(thresholds["max_us_per_job"])
+    assert suite.regressions(results, {"max_us_per_job": {"parse_sacct": 0.0}}) != []
+    assert suite.regressions({"parse_sacct": 1.0}, {"max_us_per_job": {"parse_sacct": 2.0}}) == []
@@ -0,0 +1,61 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.aggregates import JobAggregates
+from backend.slurm.models import JobInfo
+from backend.slurm.timeline import Timeline
+
+
+def job(job_id, status, cpus=4, end_time=0.0):
+    return JobInfo(job_id=job_id, name="j", status=status, time=60, nodes=1, cpus=cpus,
+                   memory=0, end_time=end_time)
+
+
+def test_samples_are_averaged_per_bucket():
+    """Gauges are the mean of the polls in a bucket; empty buckets are null"""
+    timeline = Timeline(tiers=[(60, 10), (600, 10)])
+    aggregates = JobAggregates()
+    aggregates.update([job("1", "RUNNING", cpus=8), job("2", "PENDING")])
+    timeline.record(aggregates, now=6000)
+    aggregates.update([job("1", "RUNNING", cpus=8), job("2", "RUNNING")])
+    timeline.record(aggregates, now=6030)
+    timeline.record(aggregates, now=6120)
+
+    result = timeline.query(6000, 6120, metrics=["running_cpus", "pending_jobs"])
+    assert result["resolution"] == 60
+    assert result["timestamps"] == [6000, 6060, 6120]
+    assert result["series"]["running_cpus"] == [10.0, None, 12.0]
+    assert result["series"]["pending_jobs"] == [0.5, None, 0.0]
+
+
+def test_finished_jobs_counted_once_by_end_time():
+    """Completions and failures land in the bucket they ended in, however often they are seen"""
+    timeline = Timeline(tiers=[(60, 10)])
+    aggregates = JobAggregates()
+    finished = [job("1", "COMPLETED", end_time=6010), job("2", "FAILED", end_time=6070),
+                job("3", "COMPLETED", end_time=6075)]
+    timeline.record(aggregates, finished, now=6100)
+    timeline.record(aggregates, finished + [job("4", "TIMEOUT", end_time=6075)], now=6110)
+
+    series = timeline.query(6000, 6100)["series"]
+    assert series["completed_jobs"] == [1, 1]
+    assert series["failed_jobs"] == [0, 2]
+    assert series["failure_rate"] == [0.0, 2 / 3]
+
+
+def test_ring_wraps_and_picks_coarser_tier():
+    """Old buckets are dropped in place and long ranges use a coarser tier"""
+    timeline = Timeline(tiers=[(60, 4), (600, 4)])
+    aggregates = JobAggregates()
+    aggregates.update([job("1", "RUNNING", cpus=2)])
+    for minute in range(10):
+        timeline.record(aggregates, now=60000 + minute * 60)
+
+    recent = timeline.query(60000 + 6 * 60, 60000 + 9 * 60, metrics=["running_cpus"])
+    assert recent["resolution"] == 60 and recent["series"]["running_cpus"] == [2.0] * 4
+    wrapped = timeline.tiers[0].read(60000, 60000 + 60, ["running_cpus"])
+    assert wrapped["series"]["running_cpus"] == [None, None]
+    assert timeline.query(60000, 60000 + 9 * 60)["resolution"] == 600
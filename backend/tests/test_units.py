@@ -0,0 +1,32 @@
+import sys
+import os
+
+# Add the project root to the path to resolve imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.slurm.units import format_duration, format_memory, parse_duration, parse_memory
+
+
+def test_parse_duration():
+    """Slurm time strings convert to seconds"""
+    assert parse_duration("30:15") == 30 * 60 + 15
+    assert parse_duration("12:30:00") == 12 * 3600 + 30 * 60
+    assert parse_duration("2-00:00:00") == 2 * 86400
+    assert parse_duration("1-06") == 30 * 3600
+    assert parse_duration("1-06:30") == 30 * 3600 + 30 * 60
+    assert parse_duration("00:00:01.250") == 1
+    assert parse_duration("UNLIMITED") is None
+    assert parse_duration("") is None
+
+
+def test_memory_and_duration_formatting():
+    """Memory sizes convert to bytes and back; durations print like Slurm"""
+    assert parse_memory("64G") == 64 << 30
+    assert parse_memory("4000M") == 4000 << 20
+    assert parse_memory("512") == 512 << 20
+    assert parse_memory("2Gn") == 2 << 30
+    assert parse_memory("") == 0
+    assert format_memory(64 << 30) == "64G"
+    assert format_memory(1536 << 20) == "1.5G"
+    assert format_duration(26 * 3600 + 61) == "1-02:01:01"
+    assert format_duration(None) == "UNLIMITED"
@@ -22,13 +22,50 @@ class Job {
       jobId: json['job_id'],
       name: json['name'],
       status: json['status'],
-      time: json['time'],
-      nodes: json['nodes'],
-      cpus: json['cpus'],
-      memory: json['memory'],
+      time: formatDuration(json['time']),
+      nodes: json['nodes'].toString(),
+      cpus: json['cpus'].toString(),
+      memory: formatMemory(json['memory']),
     );
   }
 
+  // The backend sends durations in seconds (null for unlimited)
+  static String formatDuration(dynamic seconds) {
+    if (seconds == null) return 'UNLIMITED';
+    if (seconds is String) return seconds;
+    final int total = (seconds as num).toInt();
+    final days = total ~/ 86400;
+    final hours = (total % 86400) ~/ 3600;
+    final minutes = (total % 3600) ~/ 60;
+    final secs = total % 60;
+    String two(int n) => n.toString().padLeft(2, '0');
+    final clock = '${two(hours)}:${two(minutes)}:${two(secs)}';
+    return days > 0 ? '$days-$clock' : clock;
+  }
+
+  static const Map<String, double> _memoryUnits = {
+    'P': 1125899906842624.0,
+    'T': 1099511627776.0,
+    'G': 1073741824.0,
+    'M': 1048576.0,
+    'K': 1024.0,
+  };
+
+  // The backend sends memory in bytes
+  static String formatMemory(dynamic bytes) {
+    if (bytes is String) return bytes;
+    final double size = (bytes as num).toDouble();
+    for (final entry in _memoryUnits.entries) {
+      if (size >= entry.value) {
+        final amount = size / entry.value;
+        return amount == amount.roundToDouble()
+            ? '${amount.toInt()}${entry.key}'
+            : '${amount.toStringAsFixed(1)}${entry.key}';
+      }
+    }
+    return size.toInt().toString();
+  }
+
   String get statusTag {
     if (status == "RUNNING") {
       return 'running';
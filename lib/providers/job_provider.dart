@@ -14,6 +14,15 @@ class JobProvider with ChangeNotifier {
   Timer? _refreshTimer;
   bool _testMode = false;
   String _currentTimeRange = "24h";
+  // Snapshot validators from the last /jobs response, used to skip
+  // unchanged downloads (304) and to ask only for what changed (since=)
+  String? _etag;
+  int? _version;
+  // Push channel (/jobs/stream); polling is only used while it is down
+  http.Client? _streamClient;
+  StreamSubscription<String>? _streamSubscription;
+  Timer? _streamRetryTimer;
+  bool _streaming = false;
   
   final String _baseUrl = 'http://localhost:8080'; // Change in production
   
@@ -21,7 +30,7 @@ class JobProvider with ChangeNotifier {
     _testMode = testMode;
     if (_sessionId != null) {
       fetchJobs();
-      _startAutoRefresh();
+      _startEventStream();
     }
   }
   
@@ -41,6 +50,7 @@ class JobProvider with ChangeNotifier {
   bool get autoRefresh => _autoRefresh;
   int get refreshInterval => _refreshInterval;
   bool get testMode => _testMode;
+  bool get streaming => _streaming;
   String get currentTimeRange => _currentTimeRange;
   
   // Job status counts
@@ -58,25 +68,41 @@ class JobProvider with ChangeNotifier {
       _currentTimeRange = timeRange;
       print("IMPORTANT: Changed time range to: $_currentTimeRange");
       _jobs = []; // Clear jobs to force UI update
+      _etag = null;
+      _version = null;
       notifyListeners(); // Notify listeners of the change
+      _startEventStream();
     }
     
     _isLoading = true;
     notifyListeners();
     
     try {
-      final url = '$_baseUrl/jobs?session_id=$_sessionId&time_range=$_currentTimeRange&test_mode=$_testMode';
+      var url = '$_baseUrl/jobs?session_id=$_sessionId&time_range=$_currentTimeRange&test_mode=$_testMode';
+      if (_version != null) {
+        url += '&since=$_version';
+      }
       print('Fetching jobs from: $url');
       
       final response = await http.get(
         Uri.parse(url),
+        headers: {if (_etag != null) 'If-None-Match': _etag!},
       );
       
-      if (response.statusCode == 200) {
+      if (response.statusCode == 304) {
+        // Nothing changed since our last snapshot
+        _lastUpdated = DateTime.now();
+      } else if (response.statusCode == 200) {
         final responseData = json.decode(response.body);
-        final List<dynamic> jobsData = responseData['jobs'];
         
-        _jobs = jobsData.map((jobData) => Job.fromJson(jobData)).toList();
+        if (responseData['full'] == false) {
+          _applyDelta(responseData);
+        } else {
+          final List<dynamic> jobsData = responseData['jobs'];
+          _jobs = jobsData.map((jobData) => Job.fromJson(jobData)).toList();
+        }
+        _etag = response.headers['etag'];
+        _version = responseData['version'];
         print('IMPORTANT: Received ${_jobs.length} jobs for time range: $_currentTimeRange');
         
         if (responseData.containsKey('last_updated')) {
@@ -93,9 +119,122 @@ class JobProvider with ChangeNotifier {
     }
   }
   
+  void _applyDelta(Map<String, dynamic> delta) {
+    final Map<String, Job> byId = {for (final job in _jobs) job.jobId: job};
+    for (final jobId in delta['removed']) {
+      byId.remove(jobId);
+    }
+    for (final jobData in [...delta['changed'], ...delta['added']]) {
+      final job = Job.fromJson(jobData);
+      byId[job.jobId] = job;
+    }
+    _jobs = byId.values.toList();
+  }
+  
+  void _startEventStream() {
+    _stopEventStream();
+    if (_sessionId == null) return;
+    
+    final client = http.Client();
+    _streamClient = client;
+    final request = http.Request(
+      'GET',
+      Uri.parse('$_baseUrl/jobs/stream?session_id=$_sessionId&time_range=$_currentTimeRange&test_mode=$_testMode'),
+    );
+    request.headers['Accept'] = 'text/event-stream';
+    if (_version != null) {
+      request.headers['Last-Event-ID'] = '$_version';
+    }
+    
+    client.send(request).then((response) {
+      if (_streamClient != client) return;
+      if (response.statusCode != 200) {
+        _onStreamClosed(client);
+        return;
+      }
+      _streaming = true;
+      _stopRefreshTimer();
+      
+      var event = 'message';
+      final data = StringBuffer();
+      _streamSubscription = response.stream
+          .transform(utf8.decoder)
+          .transform(const LineSplitter())
+          .listen((line) {
+        if (line.isEmpty) {
+          _handleStreamEvent(event, data.toString());
+          event = 'message';
+          data.clear();
+        } else if (line.startsWith('event:')) {
+          event = line.substring(6).trim();
+        } else if (line.startsWith('data:')) {
+          if (data.isNotEmpty) data.write('\n');
+          data.write(line.substring(5).trim());
+        }
+      },
+          onError: (_) => _onStreamClosed(client),
+          onDone: () => _onStreamClosed(client),
+          cancelOnError: true);
+    }).catchError((error) {
+      print('Job stream error: $error');
+      _onStreamClosed(client);
+    });
+  }
+  
+  void _handleStreamEvent(String event, String data) {
+    if (data.isEmpty) return;
+    final Map<String, dynamic> payload = json.decode(data);
+    
+    switch (event) {
+      case 'snapshot':
+        final List<dynamic> jobsData = payload['jobs'];
+        _jobs = jobsData.map((jobData) => Job.fromJson(jobData)).toList();
+        break;
+      case 'add':
+      case 'update':
+        _applyDelta({'added': payload['jobs'], 'changed': [], 'removed': []});
+        break;
+      case 'remove':
+        _applyDelta({'added': [], 'changed': [], 'removed': payload['job_ids']});
+        break;
+      case 'heartbeat':
+        _lastUpdated = DateTime.now();
+        notifyListeners();
+        return;
+      default:
+        return;
+    }
+    // The ETag belongs to a full /jobs response, so drop it and let the
+    // version carry the state forward
+    _etag = null;
+    _version = payload['version'];
+    _lastUpdated = DateTime.now();
+    notifyListeners();
+  }
+  
+  void _onStreamClosed(http.Client client) {
+    if (_streamClient != client) return;
+    _stopEventStream();
+    // Fall back to polling and try to reconnect the stream later
+    _startAutoRefresh();
+    _streamRetryTimer = Timer(const Duration(seconds: 30), _startEventStream);
+    notifyListeners();
+  }
+  
+  void _stopEventStream() {
+    _streamRetryTimer?.cancel();
+    _streamRetryTimer = null;
+    _streamSubscription?.cancel();
+    _streamSubscription = null;
+    _streamClient?.close();
+    _streamClient = null;
+    _streaming = false;
+  }
+  
   void toggleAutoRefresh(bool value) {
     _autoRefresh = value;
-    if (_autoRefresh) {
+    // While the stream is up updates are pushed, so no timer is needed
+    if (_autoRefresh && !_streaming) {
       _startRefreshTimer();
     } else {
       _stopRefreshTimer();
@@ -105,7 +244,7 @@ class JobProvider with ChangeNotifier {
   
   void setRefreshInterval(int seconds) {
     _refreshInterval = seconds;
-    if (_autoRefresh) {
+    if (_autoRefresh && !_streaming) {
       _stopRefreshTimer();
       _startRefreshTimer();
     }
@@ -114,7 +253,10 @@ class JobProvider with ChangeNotifier {
   
   void toggleTestMode(bool value) {
     _testMode = value;
+    _etag = null;
+    _version = null;
     fetchJobs();
+    _startEventStream();
     notifyListeners();
   }
   
@@ -145,6 +287,7 @@ class JobProvider with ChangeNotifier {
   
   @override
   void dispose() {
+    _stopEventStream();
     _stopAutoRefresh();
     _stopRefreshTimer();
     super.dispose();